@@ -10,16 +10,20 @@
 """ CSP.LMC subelement Test Master Tango device prototype
 
 Test TANGO device class to test connection with the CSPMaster prototype.
-It simulates the CbfMaster sub-element.
+It simulates the CbfMaster sub-element at the SKA1-Mid scale (197 VCCs and 27 FSPs).
 """
 from __future__ import absolute_import
 import sys
 import os
 import time
 
-file_path = os.path.dirname(os.path.abspath(__file__))
-module_path = os.path.abspath(os.path.join(file_path, os.pardir))
-sys.path.insert(0, module_path)
+# The csplmc package is imported from the installed distribution or, when
+# the device runs from the source tree, from the repository root.
+try:
+    import csplmc
+except ImportError:
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                    "../..")))
 
 # Tango imports
 import tango
@@ -32,26 +36,60 @@ from tango import AttrQuality, DispLevel, DevState
 from tango import AttrWriteType, PipeWriteType
 # Additional import
 # PROTECTED REGION ID(CbfTestMaster.additionnal_import) ENABLED START #
-from future.utils import with_metaclass
 import threading
-from commons.global_enum import HealthState
+import numpy as np
+from csplmc.commons.global_enum import HealthState, AdminMode
+from csplmc.commons.global_enum import NUM_OF_RECEPTORS
+from csplmc.commons.latency import LatencyModel
+from csplmc.commons.event_storm import EventStorm
 from skabase.SKAMaster.SKAMaster import SKAMaster
 # PROTECTED REGION END #    //  CbfTestMaster.additionnal_import
 
 __all__ = ["CbfTestMaster", "main"]
 
+# max number of FSP provided by the Mid CBF
+NUM_OF_FSP = 27
 
-class CbfTestMaster(with_metaclass(DeviceMeta,SKAMaster)):
+class CbfTestMaster(SKAMaster, metaclass=DeviceMeta):
     """
     CbfTestMaster TANGO device class to test connection with the CSPMaster prototype
     """
     # PROTECTED REGION ID(CbfTestMaster.class_variable) ENABLED START #
+
+    # the report attributes pushed by the device on change
+    _report_attributes = ["reportVCCState", "reportVCCHealthState",
+                          "reportVCCAdminMode", "reportVCCSubarrayMembership",
+                          "reportFSPState", "reportFSPHealthState",
+                          "reportFSPAdminMode", "reportFSPSubarrayMembership"]
     # PROTECTED REGION END #    //  CbfTestMaster.class_variable
 
     # -----------------
     # Device Properties
     # -----------------
 
+    NumOfVcc = device_property(
+        dtype='uint16', default_value=NUM_OF_RECEPTORS,
+        doc="The number of simulated VCCs (max 197)",
+    )
+
+    NumOfFsp = device_property(
+        dtype='uint16', default_value=NUM_OF_FSP,
+        doc="The number of simulated FSPs (max 27)",
+    )
+
+    VccToReceptor = device_property(
+        dtype=('str',),
+        doc="The VCC to receptor map as list of 'vccID:receptorID' strings.\n\
+             If not specified each VCC is connected to the receptor with the same ID.",
+    )
+
+    CommandLatency = device_property(
+        dtype=('str',),
+        default_value=["Init:fixed:1", "On:fixed:2", "Off:fixed:1", "Standby:fixed:2"],
+        doc="The command latency distributions as list of strings\n\
+             '<command>:<fixed|uniform|gauss|expo>:<param1>[:<param2>]'",
+    )
+
     # ----------
     # Attributes
     # ----------
@@ -82,7 +120,7 @@ class CbfTestMaster(with_metaclass(DeviceMeta,SKAMaster)):
         max_dim_x=197,
     )
 
-    reportVccHealthState = attribute(
+    reportVCCHealthState = attribute(
         dtype=('uint16',),
         max_dim_x=197,
     )
@@ -117,22 +155,139 @@ class CbfTestMaster(with_metaclass(DeviceMeta,SKAMaster)):
         max_dim_x=197,
     )
 
+    vccToReceptor = attribute(
+        dtype=('str',),
+        max_dim_x=197,
+        doc="The VCC to receptor map as list of 'vccID:receptorID' strings.",
+    )
+
+    receptorToVcc = attribute(
+        dtype=('str',),
+        max_dim_x=197,
+        doc="The receptor to VCC map as list of 'receptorID:vccID' strings.",
+    )
+
+    commandLatency = attribute(
+        dtype=('str',),
+        max_dim_x=20,
+        access=AttrWriteType.READ_WRITE,
+        doc="The command latency distributions.",
+    )
+
+    eventStormReport = attribute(
+        dtype='str',
+        doc="JSON-encoded report of the events and faults injected by the last event storm.",
+    )
+
     # ---------------
     # General methods
     # ---------------
 
+    def _push_report(self, attr_name):
+        """
+        Push a change event for one of the VCC/FSP report attributes.
+        """
+        self.push_change_event(attr_name, getattr(self, "read_" + attr_name)())
+
+    def _push_scm(self):
+        """
+        Push the change events for the device State and healthState.
+        """
+        self.push_change_event("State")
+        self.push_change_event("healthState", self._health_state)
+
+    def _set_capabilities_state(self, state, health_state):
+        """
+        Set the State and healthState of all the VCC and FSP capabilities and
+        push the change events.
+
+        Args:
+            state: the new State of the capabilities.
+            health_state: the new healthState of the capabilities.
+        """
+        with self._sim_lock:
+            self._vcc_state[:] = int(state)
+            self._vcc_health_state[:] = int(health_state)
+            self._fsp_state[:] = int(state)
+            self._fsp_health_state[:] = int(health_state)
+        for attr_name in ["reportVCCState", "reportVCCHealthState",
+                          "reportFSPState", "reportFSPHealthState"]:
+            self._push_report(attr_name)
+
+    def _devstate_list(self, values):
+        """
+        Convert an array of DevState codes into the list of DevState values.
+        """
+        return [self._devstate_lut[code] for code in values]
+
+    def _storm_push(self, attr_name, value):
+        """
+        Push an event generated by the event storm. The State and healthState
+        values are also applied to the device.
+        """
+        if isinstance(value, tango.DevFailed):
+            self.push_change_event(attr_name, value)
+        elif attr_name.lower() == "state":
+            self.set_state(value)
+            self.push_change_event("State")
+        else:
+            if attr_name.lower() == "healthstate":
+                self._health_state = value
+            self.push_change_event(attr_name, value)
+
+    def _storm_value(self, attr_name, rnd):
+        """
+        Return the value to push for an event generated by the event storm.
+        If *rnd* is specified, a random valid value is generated and, for
+        the report attributes, applied to a random capability.
+        """
+        name = attr_name.lower()
+        if name == "state":
+            if rnd:
+                return rnd.choice([DevState.ON, DevState.STANDBY, DevState.OFF,
+                                   DevState.FAULT, DevState.ALARM])
+            return self.get_state()
+        if name == "healthstate":
+            return rnd.choice(list(HealthState)).value if rnd else self._health_state
+        if name == "adminmode":
+            return rnd.choice(list(AdminMode)).value if rnd else self._admin_mode
+        if rnd:
+            arrays = {"reportvccstate": self._vcc_state,
+                      "reportfspstate": self._fsp_state,
+                      "reportvcchealthstate": self._vcc_health_state,
+                      "reportfsphealthstate": self._fsp_health_state,
+                      "reportvccadminmode": self._vcc_admin_mode,
+                      "reportfspadminmode": self._fsp_admin_mode}
+            try:
+                values = arrays[name]
+                if "state" in name and "health" not in name:
+                    choices = [DevState.ON, DevState.OFF, DevState.FAULT, DevState.UNKNOWN]
+                elif "health" in name:
+                    choices = list(HealthState)
+                else:
+                    choices = list(AdminMode)
+                with self._sim_lock:
+                    values[rnd.randrange(values.size)] = int(rnd.choice(choices))
+            except KeyError:
+                pass
+        return getattr(self, "read_" + attr_name)()
+
     def init_subelement(self):
         """
         Simulate the sub-element device initialization
         """
         self.set_state(tango.DevState.STANDBY)
+        self._set_capabilities_state(tango.DevState.OFF, HealthState.UNKNOWN)
+        self._push_scm()
 
     def on_subelement(self):
         """
-        Simulate the sub-element transition from STANDBY to ON 
+        Simulate the sub-element transition from STANDBY to ON
         """
         self.set_state(tango.DevState.ON)
         self._health_state = HealthState.DEGRADED.value
+        self._set_capabilities_state(tango.DevState.ON, HealthState.OK)
+        self._push_scm()
 
     def standby_subelement(self):
         """
@@ -140,6 +295,8 @@ class CbfTestMaster(with_metaclass(DeviceMeta,SKAMaster)):
         """
         self.set_state(tango.DevState.STANDBY)
         self._health_state = HealthState.DEGRADED.value
+        self._set_capabilities_state(tango.DevState.OFF, HealthState.UNKNOWN)
+        self._push_scm()
 
     def off_subelement(self):
         """
@@ -147,17 +304,75 @@ class CbfTestMaster(with_metaclass(DeviceMeta,SKAMaster)):
         """
         self.set_state(tango.DevState.OFF)
         self._health_state = HealthState.UNKNOWN.value
+        self._set_capabilities_state(tango.DevState.OFF, HealthState.UNKNOWN)
+        self._push_scm()
+
+    def _start_transition(self, command_name, transition):
+        """
+        Run the state transition after a delay drawn from the latency model
+        of the command.
+
+        Args:
+            command_name: the name of the command.
+            transition: the method implementing the transition.
+        """
+        thread = threading.Timer(self._latency.sample(command_name), transition)
+        thread.daemon = True
+        thread.start()
 
     def init_device(self):
         SKAMaster.init_device(self)
         # PROTECTED REGION ID(CbfTestMaster.init_device) ENABLED START #
-        
+
         self.set_state(tango.DevState.INIT)
         self._health_state = HealthState.UNKNOWN.value
+        self._sim_lock = threading.Lock()
+        self._num_of_vcc = min(int(self.NumOfVcc), NUM_OF_RECEPTORS)
+        self._num_of_fsp = min(int(self.NumOfFsp), NUM_OF_FSP)
+        self._max_capabilities["VCC"] = self._num_of_vcc
+        self._max_capabilities["FSP"] = self._num_of_fsp
+        # lookup table to convert the DevState codes stored into the arrays
+        self._devstate_lut = [tango.DevState.values[code]
+                              for code in range(len(tango.DevState.values))]
+        # array-backed SCM values and subarray membership of the capabilities
+        self._vcc_state = np.full(self._num_of_vcc, int(tango.DevState.UNKNOWN), dtype=np.uint8)
+        self._vcc_health_state = np.full(self._num_of_vcc, int(HealthState.UNKNOWN),
+                                         dtype=np.uint16)
+        self._vcc_admin_mode = np.full(self._num_of_vcc, int(AdminMode.ONLINE), dtype=np.uint16)
+        self._vcc_membership = np.zeros(self._num_of_vcc, dtype=np.uint16)
+        self._fsp_state = np.full(self._num_of_fsp, int(tango.DevState.UNKNOWN), dtype=np.uint8)
+        self._fsp_health_state = np.full(self._num_of_fsp, int(HealthState.UNKNOWN),
+                                         dtype=np.uint16)
+        self._fsp_admin_mode = np.full(self._num_of_fsp, int(AdminMode.ONLINE), dtype=np.uint16)
+        self._fsp_membership = np.zeros(self._num_of_fsp, dtype=np.uint16)
+        self._vcc_address = ["mid_csp_cbf/vcc/vcc_{:03d}".format(vcc_id + 1)
+                             for vcc_id in range(self._num_of_vcc)]
+        self._fsp_address = ["mid_csp_cbf/fsp/fsp_{:02d}".format(fsp_id + 1)
+                             for fsp_id in range(self._num_of_fsp)]
+        # VCC to receptor map
+        if self.VccToReceptor:
+            self._vcc_to_receptor = dict([int(ID) for ID in pair.split(":")]
+                                         for pair in self.VccToReceptor)
+        else:
+            self._vcc_to_receptor = {vcc_id: vcc_id for vcc_id in range(1, self._num_of_vcc + 1)}
+        try:
+            self._latency = LatencyModel(self.CommandLatency)
+        except ValueError as val_err:
+            self.dev_logging(str(val_err), tango.LogLevel.LOG_ERROR)
+            self._latency = LatencyModel()
+        # the device pushes the change events on the SCM and report attributes
+        self.set_change_event("State", True, False)
+        self.set_change_event("healthState", True, False)
+        self.set_change_event("adminMode", True, False)
+        for attr_name in self._report_attributes:
+            self.set_change_event(attr_name, True, False)
+
+        # the event-storm and fault-injection engine
+        self._event_storm = EventStorm(self._storm_push, self._storm_value,
+                                       origin=self.get_name())
 
         # start a timer to simulate device intialization
-        thread = threading.Timer(1, self.init_subelement)
-        thread.start()
+        self._start_transition("Init", self.init_subelement)
 
         # PROTECTED REGION END #    //  CbfTestMaster.init_device
 
@@ -168,7 +383,7 @@ class CbfTestMaster(with_metaclass(DeviceMeta,SKAMaster)):
 
     def delete_device(self):
         # PROTECTED REGION ID(CbfTestMaster.delete_device) ENABLED START #
-        pass
+        self._event_storm.stop()
         # PROTECTED REGION END #    //  CbfTestMaster.delete_device
 
     # ------------------
@@ -182,78 +397,112 @@ class CbfTestMaster(with_metaclass(DeviceMeta,SKAMaster)):
 
     def read_vccCapabilityAddress(self):
         # PROTECTED REGION ID(CbfTestMaster.vccCapabilityAddress_read) ENABLED START #
-        return ['']
+        return self._vcc_address
         # PROTECTED REGION END #    //  CbfTestMaster.vccCapabilityAddress_read
 
     def read_fspCapabilityAddress(self):
         # PROTECTED REGION ID(CbfTestMaster.fspCapabilityAddress_read) ENABLED START #
-        return ['']
+        return self._fsp_address
         # PROTECTED REGION END #    //  CbfTestMaster.fspCapabilityAddress_read
 
     def read_reportVCCState(self):
         # PROTECTED REGION ID(CbfTestMaster.reportVCCState_read) ENABLED START #
-        return [tango.DevState.UNKNOWN]
+        return self._devstate_list(self._vcc_state)
         # PROTECTED REGION END #    //  CbfTestMaster.reportVCCState_read
 
-    def read_reportVccHealthState(self):
+    def read_reportVCCHealthState(self):
         # PROTECTED REGION ID(CbfTestMaster.reportVccHealthState_read) ENABLED START #
-        return [0]
+        return self._vcc_health_state
         # PROTECTED REGION END #    //  CbfTestMaster.reportVccHealthState_read
 
     def read_reportVCCAdminMode(self):
         # PROTECTED REGION ID(CbfTestMaster.reportVCCAdminMode_read) ENABLED START #
-        return [0]
+        return self._vcc_admin_mode
         # PROTECTED REGION END #    //  CbfTestMaster.reportVCCAdminMode_read
 
     def read_reportFSPState(self):
         # PROTECTED REGION ID(CbfTestMaster.reportFSPState_read) ENABLED START #
-        return [tango.DevState.UNKNOWN]
+        return self._devstate_list(self._fsp_state)
         # PROTECTED REGION END #    //  CbfTestMaster.reportFSPState_read
 
     def read_reportFSPHealthState(self):
         # PROTECTED REGION ID(CbfTestMaster.reportFSPHealthState_read) ENABLED START #
-        return [0]
+        return self._fsp_health_state
         # PROTECTED REGION END #    //  CbfTestMaster.reportFSPHealthState_read
 
     def read_reportFSPAdminMode(self):
         # PROTECTED REGION ID(CbfTestMaster.reportFSPAdminMode_read) ENABLED START #
-        return [0]
+        return self._fsp_admin_mode
         # PROTECTED REGION END #    //  CbfTestMaster.reportFSPAdminMode_read
 
     def read_reportFSPSubarrayMembership(self):
         # PROTECTED REGION ID(CbfTestMaster.fspMembership_read) ENABLED START #
-        return [0]
+        return self._fsp_membership
         # PROTECTED REGION END #    //  CbfTestMaster.fspMembership_read
 
     def read_reportVCCSubarrayMembership(self):
         # PROTECTED REGION ID(CbfTestMaster.vccMembership_read) ENABLED START #
-        return [0]
+        return self._vcc_membership
         # PROTECTED REGION END #    //  CbfTestMaster.vccMembership_read
 
+    def read_vccToReceptor(self):
+        # PROTECTED REGION ID(CbfTestMaster.vccToReceptor_read) ENABLED START #
+        return ["{}:{}".format(vcc_id, receptor_id)
+                for vcc_id, receptor_id in self._vcc_to_receptor.items()]
+        # PROTECTED REGION END #    //  CbfTestMaster.vccToReceptor_read
+
+    def read_receptorToVcc(self):
+        # PROTECTED REGION ID(CbfTestMaster.receptorToVcc_read) ENABLED START #
+        return ["{}:{}".format(receptor_id, vcc_id)
+                for vcc_id, receptor_id in self._vcc_to_receptor.items()]
+        # PROTECTED REGION END #    //  CbfTestMaster.receptorToVcc_read
+
+    def read_commandLatency(self):
+        # PROTECTED REGION ID(CbfTestMaster.commandLatency_read) ENABLED START #
+        return self._latency.specs()
+        # PROTECTED REGION END #    //  CbfTestMaster.commandLatency_read
+
+    def write_commandLatency(self, value):
+        # PROTECTED REGION ID(CbfTestMaster.commandLatency_write) ENABLED START #
+        try:
+            for spec in value:
+                self._latency.set(spec)
+        except ValueError as val_err:
+            tango.Except.throw_exception("Write attribute failure",
+                                         str(val_err),
+                                         "write_commandLatency",
+                                         tango.ErrSeverity.ERR)
+        # PROTECTED REGION END #    //  CbfTestMaster.commandLatency_write
+
+    def read_eventStormReport(self):
+        # PROTECTED REGION ID(CbfTestMaster.eventStormReport_read) ENABLED START #
+        return self._event_storm.report()
+        # PROTECTED REGION END #    //  CbfTestMaster.eventStormReport_read
+
     # --------
     # Commands
     # --------
 
     @command(
-    dtype_in=('str',), 
-    doc_in="If the array length is0, the command apllies to the whole\nCSP Element.\nIf the array length is > 1, each array element specifies the FQDN of the\nCSP SubElement to switch ON.", 
+    dtype_in=('str',),
+    doc_in="If the array length is0, the command apllies to the whole\nCSP Element.\nIf the array length is > 1, each array element specifies the FQDN of the\nCSP SubElement to switch ON.",
     )
     @DebugIt()
     def On(self, argin):
         # PROTECTED REGION ID(CbfTestMaster.On) ENABLED START #
-        thread = threading.Timer(2, self.on_subelement)
-        thread.start()
+        self._event_storm.inject_command_fault("On")
+        self._start_transition("On", self.on_subelement)
         # PROTECTED REGION END #    //  CbfTestMaster.On
 
     @command(
-    dtype_in=('str',), 
-    doc_in="If the array length is0, the command apllies to the whole\nCSP Element.\nIf the array length is > 1, each array element specifies the FQDN of the\nCSP SubElement to switch OFF.", 
+    dtype_in=('str',),
+    doc_in="If the array length is0, the command apllies to the whole\nCSP Element.\nIf the array length is > 1, each array element specifies the FQDN of the\nCSP SubElement to switch OFF.",
     )
     @DebugIt()
     def Off(self, argin):
         # PROTECTED REGION ID(CbfTestMaster.Off) ENABLED START #
-        thread = threading.Timer(1, self.off_subelement)
-        thread.start()
+        self._event_storm.inject_command_fault("Off")
+        self._start_transition("Off", self.off_subelement)
         # PROTECTED REGION END #    //  CbfTestMaster.Off
 
     @command(
@@ -266,10 +515,114 @@ class CbfTestMaster(with_metaclass(DeviceMeta,SKAMaster)):
     @DebugIt()
     def Standby(self, argin):
         # PROTECTED REGION ID(CbfTestMaster.Standby) ENABLED START #
-        thread = threading.Timer(2, self.standby_subelement)
-        thread.start()
+        self._event_storm.inject_command_fault("Standby")
+        self._start_transition("Standby", self.standby_subelement)
         # PROTECTED REGION END #    //  CbfTestMaster.Standby
 
+    @command(
+        dtype_in=('uint16',),
+        doc_in="The subarray ID (0 to release the VCCs) followed by the list of VCC IDs.",
+    )
+    @DebugIt()
+    def SetVCCSubarrayMembership(self, argin):
+        """
+        Simulate the assignment (release) of VCCs to (from) a subarray.
+
+        Args:
+            argin: the subarray ID followed by the IDs of the VCCs to assign. If the\
+                   subarray ID is 0, the VCCs are released.
+        """
+        # PROTECTED REGION ID(CbfTestMaster.SetVCCSubarrayMembership) ENABLED START #
+        self._set_membership(self._vcc_membership, argin, "reportVCCSubarrayMembership")
+        # PROTECTED REGION END #    //  CbfTestMaster.SetVCCSubarrayMembership
+
+    @command(
+        dtype_in=('uint16',),
+        doc_in="The subarray ID (0 to release the FSPs) followed by the list of FSP IDs.",
+    )
+    @DebugIt()
+    def SetFSPSubarrayMembership(self, argin):
+        """
+        Simulate the assignment (release) of FSPs to (from) a subarray.
+
+        Args:
+            argin: the subarray ID followed by the IDs of the FSPs to assign. If the\
+                   subarray ID is 0, the FSPs are released.
+        """
+        # PROTECTED REGION ID(CbfTestMaster.SetFSPSubarrayMembership) ENABLED START #
+        self._set_membership(self._fsp_membership, argin, "reportFSPSubarrayMembership")
+        # PROTECTED REGION END #    //  CbfTestMaster.SetFSPSubarrayMembership
+
+    @command(
+        dtype_in='str',
+        doc_in="JSON-encoded event storm configuration (rates, bursts, faults).",
+    )
+    @DebugIt()
+    def StartEventStorm(self, argin):
+        """
+        Start emitting change events and injecting faults at the configured
+        rates (see commons/event_storm.py for the configuration format).
+
+        Args:
+            argin: the JSON-encoded event storm configuration.
+        Raises:
+            tango.DevFailed: if the configuration is not valid or a storm is\
+            already running.
+        """
+        # PROTECTED REGION ID(CbfTestMaster.StartEventStorm) ENABLED START #
+        try:
+            self._event_storm.start(argin)
+        except ValueError as val_err:
+            tango.Except.throw_exception("Command failed",
+                                         str(val_err),
+                                         "StartEventStorm",
+                                         tango.ErrSeverity.ERR)
+        # PROTECTED REGION END #    //  CbfTestMaster.StartEventStorm
+
+    @command(
+        dtype_out='str',
+        doc_out="JSON-encoded report of the events and faults injected.",
+    )
+    @DebugIt()
+    def StopEventStorm(self):
+        """
+        Stop the running event storm.
+
+        Returns:
+            The JSON-encoded report of the events and faults injected.
+        """
+        # PROTECTED REGION ID(CbfTestMaster.StopEventStorm) ENABLED START #
+        self._event_storm.stop()
+        return self._event_storm.report()
+        # PROTECTED REGION END #    //  CbfTestMaster.StopEventStorm
+
+    def _set_membership(self, membership, argin, attr_name):
+        """
+        Update in bulk the subarray membership array of a capability type and
+        push the change event.
+
+        Args:
+            membership: the membership array to update.
+            argin: the subarray ID followed by the capability IDs.
+            attr_name: the name of the report attribute.
+        Raises:
+            tango.DevFailed: if the capability IDs are out of range.
+        """
+        if len(argin) < 1:
+            tango.Except.throw_exception("Command failed",
+                                         "No subarray ID specified",
+                                         "Set subarray membership",
+                                         tango.ErrSeverity.ERR)
+        ids = np.asarray(argin[1:], dtype=np.int32)
+        if ids.size and (ids.min() < 1 or ids.max() > membership.size):
+            tango.Except.throw_exception("Command failed",
+                                         "Capability IDs out of range [1, {}]".format(membership.size),
+                                         "Set subarray membership",
+                                         tango.ErrSeverity.ERR)
+        with self._sim_lock:
+            membership[ids - 1] = argin[0]
+        self._push_report(attr_name)
+
     def is_Off_allowed(self):
         # PROTECTED REGION ID(CbfTestMaster.is_Off_allowed) ENABLED START #
         if self.get_state() not in [DevState.STANDBY]:
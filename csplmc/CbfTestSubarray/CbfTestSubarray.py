@@ -0,0 +1,511 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the CbfTestSubarray project
+#
+#
+#
+# Distributed under the terms of the GPL license.
+# See LICENSE.txt for more info.
+
+""" CSP.LMC subelement Test Subarray Tango device prototype
+
+Test TANGO device class to test connection with the CspSubarray prototype.
+It simulates the CbfSubarray sub-element: receptors assignment, scan
+configuration and scan execution, with configurable command latencies.
+"""
+from __future__ import absolute_import
+import sys
+import os
+import time
+
+# The csplmc package is imported from the installed distribution or, when
+# the device runs from the source tree, from the repository root.
+try:
+    import csplmc
+except ImportError:
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                    "../..")))
+
+# Tango imports
+import tango
+from tango import DebugIt
+from tango.server import run
+from tango.server import Device, DeviceMeta
+from tango.server import attribute, command
+from tango.server import device_property
+from tango import AttrQuality, DispLevel, DevState
+from tango import AttrWriteType, PipeWriteType
+# Additional import
+# PROTECTED REGION ID(CbfTestSubarray.additionnal_import) ENABLED START #
+import json
+import threading
+from csplmc.commons.global_enum import HealthState, ObsState
+from csplmc.commons.global_enum import NUM_OF_RECEPTORS
+from csplmc.commons.latency import LatencyModel
+from skabase.SKASubarray import SKASubarray
+# PROTECTED REGION END #    //  CbfTestSubarray.additionnal_import
+
+__all__ = ["CbfTestSubarray", "main"]
+
+class CbfTestSubarray(SKASubarray, metaclass=DeviceMeta):
+    """
+    CbfTestSubarray TANGO device class to test connection with the CspSubarray prototype
+    """
+    # PROTECTED REGION ID(CbfTestSubarray.class_variable) ENABLED START #
+    # PROTECTED REGION END #    //  CbfTestSubarray.class_variable
+
+    # -----------------
+    # Device Properties
+    # -----------------
+
+    CbfMaster = device_property(
+        dtype='str', default_value="mid_csp_cbf/sub_elt/master",
+        doc="The FQDN of the CBF Master (simulator)",
+    )
+
+    CommandLatency = device_property(
+        dtype=('str',),
+        default_value=["AddReceptors:fixed:0.1", "RemoveReceptors:fixed:0.1",
+                       "RemoveAllReceptors:fixed:0.1", "ConfigureScan:fixed:1",
+                       "Scan:fixed:0.1", "EndScan:fixed:0.1", "EndSB:fixed:0.1"],
+        doc="The command latency distributions as list of strings\n\
+             '<command>:<fixed|uniform|gauss|expo>:<param1>[:<param2>]'",
+    )
+
+    # ----------
+    # Attributes
+    # ----------
+
+    receptors = attribute(
+        dtype=('uint16',),
+        access=AttrWriteType.READ_WRITE,
+        max_dim_x=197,
+        label="Receptors",
+        doc="List of receptors assigned to the subarray.",
+    )
+
+    vccState = attribute(
+        dtype=('DevState',),
+        max_dim_x=197,
+        label="VCC state",
+        doc="The State of the VCCs assigned to the subarray.",
+    )
+
+    vccHealthState = attribute(
+        dtype=('uint16',),
+        max_dim_x=197,
+        label="VCC health status",
+        doc="The healthState of the VCCs assigned to the subarray.",
+    )
+
+    outputLinksDistribution = attribute(
+        dtype='str',
+        label="Output links distribution",
+        doc="JSON-encoded distribution of the output links, published at the end of\n\
+             the scan configuration.",
+    )
+
+    commandLatency = attribute(
+        dtype=('str',),
+        max_dim_x=20,
+        access=AttrWriteType.READ_WRITE,
+        doc="The command latency distributions.",
+    )
+
+    # ---------------
+    # General methods
+    # ---------------
+
+    def _push_scm(self):
+        """
+        Push the change events for the device State, healthState and obsState.
+        """
+        self.push_change_event("State")
+        self.push_change_event("healthState", self._health_state)
+        self.push_change_event("obsState", self._obs_state)
+
+    def _set_obs_state(self, obs_state):
+        """
+        Set the subarray obsState and push the change event.
+
+        Args:
+            obs_state: the new ObsState value.
+        """
+        self._obs_state = int(obs_state)
+        self.push_change_event("obsState", self._obs_state)
+
+    def _delay(self, command_name):
+        """
+        Sleep for a delay drawn from the latency model of the command.
+        Used by the commands that the real CbfSubarray executes synchronously.
+        """
+        time.sleep(self._latency.sample(command_name))
+
+    def _start_transition(self, command_name, transition):
+        """
+        Run the obsState transition after a delay drawn from the latency model
+        of the command.
+
+        Args:
+            command_name: the name of the command.
+            transition: the method implementing the transition.
+        """
+        thread = threading.Timer(self._latency.sample(command_name), transition)
+        thread.daemon = True
+        thread.start()
+
+    def _set_vcc_membership(self, receptor_ids, sub_id):
+        """
+        Update the subarray membership of the VCCs connected to the specified
+        receptors on the CBF Master simulator.
+        A failure is only logged: the simulator keeps working without the master.
+
+        Args:
+            receptor_ids: the list of receptor IDs.
+            sub_id: the subarray ID (0 to release the VCCs).
+        """
+        if not receptor_ids:
+            return
+        try:
+            if self._cbf_master_proxy is None:
+                self._cbf_master_proxy = tango.DeviceProxy(self.CbfMaster)
+                receptor_to_vcc = self._cbf_master_proxy.receptorToVcc
+                self._receptor_to_vcc = dict([int(ID) for ID in pair.split(":")]
+                                             for pair in receptor_to_vcc)
+            vcc_ids = [self._receptor_to_vcc.get(receptor_id, receptor_id)
+                       for receptor_id in receptor_ids]
+            self._cbf_master_proxy.command_inout("SetVCCSubarrayMembership",
+                                                 [sub_id] + vcc_ids)
+        except tango.DevFailed as df:
+            self._cbf_master_proxy = None
+            log_msg = "Can't update the VCC membership: {}".format(df.args[0].desc)
+            self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
+
+    def _update_receptors(self, receptors):
+        """
+        Set the list of the assigned receptors, the device State and push
+        the change events.
+
+        Args:
+            receptors: the new (sorted) list of receptor IDs.
+        """
+        with self._sim_lock:
+            self._receptors = receptors
+        self.set_state(tango.DevState.ON if receptors else tango.DevState.OFF)
+        self.push_change_event("receptors", self._receptors)
+        self.push_change_event("State")
+
+    def _add_receptors(self, argin):
+        """
+        Assign the receptors to the subarray.
+
+        Raises:
+            tango.DevFailed: if a receptor ID is not valid.
+        """
+        invalid = [receptor_id for receptor_id in argin
+                   if not 0 < receptor_id <= NUM_OF_RECEPTORS]
+        if invalid:
+            tango.Except.throw_exception("Command failed",
+                                         "Invalid receptor IDs: {}".format(invalid),
+                                         "AddReceptors",
+                                         tango.ErrSeverity.ERR)
+        to_add = sorted(set(argin) - set(self._receptors))
+        self._delay("AddReceptors")
+        self._set_vcc_membership(to_add, self._subarray_id)
+        self._update_receptors(sorted(set(self._receptors) | set(to_add)))
+
+    def _remove_receptors(self, argin):
+        """
+        Release the receptors from the subarray. Receptors not assigned to
+        the subarray are ignored.
+        """
+        to_remove = sorted(set(argin) & set(self._receptors))
+        self._delay("RemoveReceptors")
+        self._set_vcc_membership(to_remove, 0)
+        self._update_receptors(sorted(set(self._receptors) - set(to_remove)))
+
+    def configure_subarray(self):
+        """
+        Simulate the end of the scan configuration: publish the output links
+        and move to READY.
+        """
+        self.push_change_event("outputLinksDistribution", self._output_links)
+        self._set_obs_state(ObsState.READY)
+
+    def scan_subarray(self):
+        """
+        Simulate the start of the scan
+        """
+        self._set_obs_state(ObsState.SCANNING)
+
+    def end_scan_subarray(self):
+        """
+        Simulate the end of the scan
+        """
+        self._set_obs_state(ObsState.READY)
+
+    def end_sb_subarray(self):
+        """
+        Simulate the end of the scheduling block: the scan configuration is cleared.
+        """
+        self._scan_ID = 0
+        self._output_links = ""
+        self.push_change_event("outputLinksDistribution", self._output_links)
+        self._set_obs_state(ObsState.IDLE)
+
+    def init_device(self):
+        SKASubarray.init_device(self)
+        # PROTECTED REGION ID(CbfTestSubarray.init_device) ENABLED START #
+
+        self.set_state(tango.DevState.OFF)
+        self._health_state = HealthState.OK.value
+        self._obs_state = ObsState.IDLE.value
+        self._sim_lock = threading.Lock()
+        if self.SubID:
+            self._subarray_id = int(self.SubID)
+        else:
+            self._subarray_id = int(self.get_name()[-2:])  # last two chars of FQDN
+        self._receptors = []
+        self._scan_ID = 0
+        self._output_links = ""
+        # the connection to the CBF Master is established on first use
+        self._cbf_master_proxy = None
+        self._receptor_to_vcc = {}
+        try:
+            self._latency = LatencyModel(self.CommandLatency)
+        except ValueError as val_err:
+            self.dev_logging(str(val_err), tango.LogLevel.LOG_ERROR)
+            self._latency = LatencyModel()
+        # the device pushes the change events: no polling required
+        for attr_name in ["State", "healthState", "obsState", "adminMode",
+                          "receptors", "outputLinksDistribution"]:
+            self.set_change_event(attr_name, True, False)
+        self._push_scm()
+
+        # PROTECTED REGION END #    //  CbfTestSubarray.init_device
+
+    def always_executed_hook(self):
+        # PROTECTED REGION ID(CbfTestSubarray.always_executed_hook) ENABLED START #
+        pass
+        # PROTECTED REGION END #    //  CbfTestSubarray.always_executed_hook
+
+    def delete_device(self):
+        # PROTECTED REGION ID(CbfTestSubarray.delete_device) ENABLED START #
+        pass
+        # PROTECTED REGION END #    //  CbfTestSubarray.delete_device
+
+    # ------------------
+    # Attributes methods
+    # ------------------
+
+    def read_receptors(self):
+        # PROTECTED REGION ID(CbfTestSubarray.receptors_read) ENABLED START #
+        return self._receptors
+        # PROTECTED REGION END #    //  CbfTestSubarray.receptors_read
+
+    def write_receptors(self, value):
+        # PROTECTED REGION ID(CbfTestSubarray.receptors_write) ENABLED START #
+        self.RemoveAllReceptors()
+        self.AddReceptors(value)
+        # PROTECTED REGION END #    //  CbfTestSubarray.receptors_write
+
+    def read_vccState(self):
+        # PROTECTED REGION ID(CbfTestSubarray.vccState_read) ENABLED START #
+        return [tango.DevState.ON] * len(self._receptors)
+        # PROTECTED REGION END #    //  CbfTestSubarray.vccState_read
+
+    def read_vccHealthState(self):
+        # PROTECTED REGION ID(CbfTestSubarray.vccHealthState_read) ENABLED START #
+        return [HealthState.OK.value] * len(self._receptors)
+        # PROTECTED REGION END #    //  CbfTestSubarray.vccHealthState_read
+
+    def read_outputLinksDistribution(self):
+        # PROTECTED REGION ID(CbfTestSubarray.outputLinksDistribution_read) ENABLED START #
+        return self._output_links
+        # PROTECTED REGION END #    //  CbfTestSubarray.outputLinksDistribution_read
+
+    def read_commandLatency(self):
+        # PROTECTED REGION ID(CbfTestSubarray.commandLatency_read) ENABLED START #
+        return self._latency.specs()
+        # PROTECTED REGION END #    //  CbfTestSubarray.commandLatency_read
+
+    def write_commandLatency(self, value):
+        # PROTECTED REGION ID(CbfTestSubarray.commandLatency_write) ENABLED START #
+        try:
+            for spec in value:
+                self._latency.set(spec)
+        except ValueError as val_err:
+            tango.Except.throw_exception("Write attribute failure",
+                                         str(val_err),
+                                         "write_commandLatency",
+                                         tango.ErrSeverity.ERR)
+        # PROTECTED REGION END #    //  CbfTestSubarray.commandLatency_write
+
+    # --------
+    # Commands
+    # --------
+
+    @command(
+        dtype_in=('uint16',),
+        doc_in="List of the receptor IDs to assign to the subarray.",
+    )
+    @DebugIt()
+    def AddReceptors(self, argin):
+        """
+        Assign the receptors to the subarray. As the real CbfSubarray, the
+        command returns when the receptors are assigned.
+
+        Args:
+            argin: the list of the receptor IDs.
+        Raises:
+            tango.DevFailed: if a receptor ID is not valid.
+        """
+        # PROTECTED REGION ID(CbfTestSubarray.AddReceptors) ENABLED START #
+        self._add_receptors(argin)
+        # PROTECTED REGION END #    //  CbfTestSubarray.AddReceptors
+
+    @command(
+        dtype_in=('uint16',),
+        doc_in="List of the receptor IDs to remove from the subarray.",
+    )
+    @DebugIt()
+    def RemoveReceptors(self, argin):
+        """
+        Remove the receptors from the subarray.
+
+        Args:
+            argin: the list of the receptor IDs.
+        """
+        # PROTECTED REGION ID(CbfTestSubarray.RemoveReceptors) ENABLED START #
+        self._remove_receptors(argin)
+        # PROTECTED REGION END #    //  CbfTestSubarray.RemoveReceptors
+
+    @command(
+    )
+    @DebugIt()
+    def RemoveAllReceptors(self):
+        """
+        Remove all the receptors from the subarray.
+        """
+        # PROTECTED REGION ID(CbfTestSubarray.RemoveAllReceptors) ENABLED START #
+        self._remove_receptors(self._receptors)
+        # PROTECTED REGION END #    //  CbfTestSubarray.RemoveAllReceptors
+
+    @command(
+        dtype_in='str',
+        doc_in="JSON-encoded scan configuration.",
+    )
+    @DebugIt()
+    def ConfigureScan(self, argin):
+        """
+        Configure the scan. The obsState moves to CONFIGURING and then,
+        after the command latency, to READY.
+
+        Args:
+            argin: the JSON-encoded scan configuration.
+        Raises:
+            tango.DevFailed: if the configuration is not a valid JSON object\
+            or the scanID is not specified.
+        """
+        # PROTECTED REGION ID(CbfTestSubarray.ConfigureScan) ENABLED START #
+        try:
+            argin_dict = json.loads(argin)
+            self._scan_ID = int(argin_dict["scanID"])
+        except (ValueError, KeyError, TypeError) as err:
+            msg = "Invalid scan configuration: {}".format(err)
+            self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+            tango.Except.throw_exception("Command failed",
+                                         msg,
+                                         "ConfigureScan execution",
+                                         tango.ErrSeverity.ERR)
+        output_links = {"scanID": self._scan_ID, "fsp": []}
+        for fsp in argin_dict.get("fsp", []):
+            # one link for each receptor processed by the FSP
+            links = [[channel, "mid_csp_cbf/fsp/fsp_{:02d}".format(int(fsp["fspID"]))]
+                     for channel, _ in enumerate(fsp.get("receptors", self._receptors))]
+            output_links["fsp"].append({"fspID": fsp["fspID"], "cbfOutputLink": links})
+        self._output_links = json.dumps(output_links)
+        self._set_obs_state(ObsState.CONFIGURING)
+        self._start_transition("ConfigureScan", self.configure_subarray)
+        # PROTECTED REGION END #    //  CbfTestSubarray.ConfigureScan
+
+    @command(
+        dtype_in='str',
+        doc_in="Activation time of the scan, as seconds since the Linux epoch",
+    )
+    @DebugIt()
+    def Scan(self, argin):
+        """
+        Start the scan.
+
+        Args:
+            argin: the scan activation time (unused by the simulator).
+        """
+        # PROTECTED REGION ID(CbfTestSubarray.Scan) ENABLED START #
+        self._start_transition("Scan", self.scan_subarray)
+        # PROTECTED REGION END #    //  CbfTestSubarray.Scan
+
+    @command(
+    )
+    @DebugIt()
+    def EndScan(self):
+        # PROTECTED REGION ID(CbfTestSubarray.EndScan) ENABLED START #
+        self._start_transition("EndScan", self.end_scan_subarray)
+        # PROTECTED REGION END #    //  CbfTestSubarray.EndScan
+
+    @command(
+    )
+    @DebugIt()
+    def EndSB(self):
+        # PROTECTED REGION ID(CbfTestSubarray.EndSB) ENABLED START #
+        self._start_transition("EndSB", self.end_sb_subarray)
+        # PROTECTED REGION END #    //  CbfTestSubarray.EndSB
+
+    def is_AddReceptors_allowed(self):
+        # PROTECTED REGION ID(CbfTestSubarray.is_AddReceptors_allowed) ENABLED START #
+        return self._obs_state == ObsState.IDLE
+        # PROTECTED REGION END #    //  CbfTestSubarray.is_AddReceptors_allowed
+
+    def is_RemoveReceptors_allowed(self):
+        # PROTECTED REGION ID(CbfTestSubarray.is_RemoveReceptors_allowed) ENABLED START #
+        return self._obs_state == ObsState.IDLE
+        # PROTECTED REGION END #    //  CbfTestSubarray.is_RemoveReceptors_allowed
+
+    def is_RemoveAllReceptors_allowed(self):
+        # PROTECTED REGION ID(CbfTestSubarray.is_RemoveAllReceptors_allowed) ENABLED START #
+        return self._obs_state == ObsState.IDLE
+        # PROTECTED REGION END #    //  CbfTestSubarray.is_RemoveAllReceptors_allowed
+
+    def is_ConfigureScan_allowed(self):
+        # PROTECTED REGION ID(CbfTestSubarray.is_ConfigureScan_allowed) ENABLED START #
+        if self.get_state() != DevState.ON:
+            return False
+        return self._obs_state in [ObsState.IDLE, ObsState.READY]
+        # PROTECTED REGION END #    //  CbfTestSubarray.is_ConfigureScan_allowed
+
+    def is_Scan_allowed(self):
+        # PROTECTED REGION ID(CbfTestSubarray.is_Scan_allowed) ENABLED START #
+        return self._obs_state == ObsState.READY
+        # PROTECTED REGION END #    //  CbfTestSubarray.is_Scan_allowed
+
+    def is_EndScan_allowed(self):
+        # PROTECTED REGION ID(CbfTestSubarray.is_EndScan_allowed) ENABLED START #
+        return self._obs_state == ObsState.SCANNING
+        # PROTECTED REGION END #    //  CbfTestSubarray.is_EndScan_allowed
+
+    def is_EndSB_allowed(self):
+        # PROTECTED REGION ID(CbfTestSubarray.is_EndSB_allowed) ENABLED START #
+        return self._obs_state == ObsState.READY
+        # PROTECTED REGION END #    //  CbfTestSubarray.is_EndSB_allowed
+
+# ----------
+# Run server
+# ----------
+
+def main(args=None, **kwargs):
+    # PROTECTED REGION ID(CbfTestSubarray.main) ENABLED START #
+    return run((CbfTestSubarray,), args=args, **kwargs)
+    # PROTECTED REGION END #    //  CbfTestSubarray.main
+
+if __name__ == '__main__':
+    main()
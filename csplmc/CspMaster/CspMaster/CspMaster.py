@@ -16,7 +16,8 @@ CSPMaster TANGO device class for the CSPMaster prototype
 from __future__ import absolute_import
 import sys
 import os
-from future.utils import with_metaclass
+import json
+import time
 from collections import defaultdict
 # PROTECTED REGION END# //CspMaster.standardlibray_import
 
@@ -30,28 +31,34 @@ from tango.server import run, DeviceMeta, attribute, command, device_property
 #
 
 from skabase.SKAMaster import SKAMaster
-from skabase.auxiliary import utils
 
 # PROTECTED REGION END #    //  CspMaster.additionnal_import
 
 # PROTECTED REGION ID (CspMaster.add_path) ENABLED START #
-# add the path to import global_enum package.
-file_path = os.path.dirname(os.path.abspath(__file__))
-commons_pkg_path = os.path.abspath(os.path.join(file_path, "../../commons"))
-sys.path.insert(0, commons_pkg_path)
-import global_enum as const
-from global_enum import HealthState, AdminMode
-#add the path to import release file (!!)
-csplmc_path = os.path.abspath(os.path.join(file_path, "../../"))
-sys.path.insert(0, csplmc_path)
-import release
+# The csplmc package is imported from the installed distribution or, when
+# the device runs from the source tree, from the repository root.
+try:
+    import csplmc
+except ImportError:
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                    "../../..")))
+from csplmc.commons import global_enum as const
+from csplmc.commons.global_enum import HealthState, AdminMode
+from csplmc.commons.receptor_allocation import ReceptorAllocation, receptor_ids
+from csplmc.commons.beam_allocation import BeamAllocation
+from csplmc.commons.state_journal import StateJournal, journal_path
+from csplmc.commons.scm_history import ScmHistory
+from csplmc.commons.subscriptions import SubscriptionManager
+from csplmc.commons.topology_cache import (TopologyCache, topology_cache_path,
+                                           read_cbf_topology, id_map, capabilities)
+from csplmc import release
 # PROTECTED REGION END# //CspMaster.add_path
 
 
 
 __all__ = ["CspMaster", "main"]
 
-class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
+class CspMaster(SKAMaster, metaclass=DeviceMeta):
     """
     CSPMaster TANGO device class for the CSPMaster prototype
     """
@@ -70,8 +77,8 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
 
         :return: None
         """
+        dev_name = evt.device.dev_name()
         if not evt.err:
-            dev_name = evt.device.dev_name()
             try:
                 if dev_name in self._se_fqdn:
                     if evt.attr_value.name.lower() == "state":
@@ -96,6 +103,7 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
                 # update CSP global state
                 if evt.attr_value.name.lower() in ["state", "healthstate"]:
                     self.__set_csp_state()
+                self.__push_scm_change_events(dev_name, evt.attr_value.name.lower())
             except tango.DevFailed as df:
                 self.dev_logging(str(df.args[0].desc), tango.LogLevel.LOG_ERROR)
             except Exception as except_occurred:
@@ -112,6 +120,11 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
                             self._se_state[dev_name] = tango.DevState.OFF
                         # update the State and healthState of the CSP Element
                         self.__set_csp_state()
+                        try:
+                            self.__push_scm_change_events(dev_name, "state")
+                            self.__push_scm_change_events(dev_name, "healthstate")
+                        except tango.DevFailed as df:
+                            self.dev_logging(str(df.args[0].desc), tango.LogLevel.LOG_ERROR)
                 log_msg = item.reason + ": on attribute " + str(evt.attr_name)
                 self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
 
@@ -153,16 +166,50 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
                                                     HealthState.OK,
                                                     HealthState.OK
                                                     ]):
-            self._se_healthstate = HealthState.OK
+            self._health_state = HealthState.OK
         # in all other case the HealthState depends on the CBF
         # sub-element HealthState
-        if self._se_healthstate[self.CspMidCbf] == HealthState.UNKNOWN:
+        elif self._se_healthstate[self.CspMidCbf] == HealthState.UNKNOWN:
             self._health_state = HealthState.UNKNOWN
         elif self._se_healthstate[self.CspMidCbf] == HealthState.FAILED:
             self._health_state = HealthState.FAILED
         else:
             self._health_state = HealthState.DEGRADED
 
+    def __push_scm_change_events(self, dev_name=None, attr_name=None):
+        """
+        Class private method.
+        Push the change events of the CSP State and healthState and, if
+        specified, of the attribute reporting the sub-element SCM value.
+        The SCM attributes are not polled: their change events are pushed
+        only when the values are updated by the sub-element events.
+
+        :param dev_name: the sub-element FQDN
+        :param attr_name: the sub-element attribute name (lower case): state,\
+                          healthstate or adminmode
+
+        :return: None
+        """
+        if dev_name in self._se_attr_prefix:
+            prefix = self._se_attr_prefix[dev_name]
+            if attr_name == "state":
+                self._scm_history.record(dev_name, "State", self._se_state[dev_name])
+                self.push_change_event("csp{}State".format(prefix),
+                                       self._se_state[dev_name])
+            elif attr_name == "healthstate":
+                self._scm_history.record(dev_name, "healthState",
+                                         self._se_healthstate[dev_name])
+                self.push_change_event("csp{}HealthState".format(prefix),
+                                       self._se_healthstate[dev_name])
+            elif attr_name == "adminmode":
+                self._scm_history.record(dev_name, "adminMode", self._se_adminmode[dev_name])
+                self.push_change_event("{}AdminMode".format(prefix.lower()),
+                                       self._se_adminmode[dev_name])
+        self._scm_history.record(self.get_name(), "State", self.get_state())
+        self._scm_history.record(self.get_name(), "healthState", self._health_state)
+        self.push_change_event("State")
+        self.push_change_event("healthState", self._health_state)
+
     def __get_maxnum_of_beams_capabilities(self):
         """
         Class private method.
@@ -211,23 +258,32 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
         """
         Get the maximum number of receptors that can be used for observations.
         This number can be less than 197.
+        If the topology cache is enabled, the cached receptor/VCC mapping is
+        used at once and it is validated against CBF in background.
         """
 
         self._receptors_maxnum = const.NUM_OF_RECEPTORS
-        capability_dict = {}
+        self._topology_cache = None
+        if self.TopologyCacheDir:
+            self._topology_cache = TopologyCache(topology_cache_path(self.TopologyCacheDir,
+                                                                     self.get_name()))
+            topology = self._topology_cache.load()
+            if topology and topology.get("cbfMasterAddress") == self.CspMidCbf:
+                self.__set_cbf_topology(topology)
+                log_msg = "CBF topology loaded from {}".format(self._topology_cache.path)
+                self.dev_logging(log_msg, tango.LogLevel.LOG_INFO)
+                self._topology_cache.refresh(self.__read_cbf_topology,
+                                             self.__update_cbf_topology,
+                                             self.__cbf_topology_error)
+                return
         try:
-            proxy = self._se_proxies[self.CspMidCbf]
-            proxy.ping()
-            vcc_to_receptor = proxy.vccToReceptor
-            self._vcc_to_receptor_map = dict([int(ID) for ID in pair.split(":")]
-                                             for pair in vcc_to_receptor)
-            # get the number of each Capability type allocated by CBF
-            cbf_max_capabilities = proxy.maxCapabilities
-            for capability in cbf_max_capabilities:
-                cap_type, cap_num = capability.split(':')
-                capability_dict[cap_type] = int(cap_num)
-            self._receptors_maxnum = capability_dict["VCC"]
-            self._receptorsMembership = [0]* self._receptors_maxnum
+            topology = self.__read_cbf_topology()
+            self.__set_cbf_topology(topology)
+            if self._topology_cache is not None:
+                self._topology_cache.save(topology)
+        except OSError as os_err:
+            log_msg = "Can't write the CBF topology cache: {}".format(str(os_err))
+            self.dev_logging(log_msg, int(tango.LogLevel.LOG_WARN))
         except KeyError as key_err:
             log_msg = "Error: no key found for {}".format(str(key_err))
             self.dev_logging(log_msg, int(tango.LogLevel.LOG_ERROR))
@@ -239,6 +295,71 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
         except tango.DevFailed as df:
             log_msg = "Error: " + str(df.args[0].reason)
             self.dev_logging(log_msg, int(tango.LogLevel.LOG_ERROR))
+        # CBF not available: the topology is read in background when CBF is up
+        if self._topology_cache is not None and not self._vcc_to_receptor_map:
+            self._topology_cache.refresh(self.__read_cbf_topology,
+                                         self.__update_cbf_topology,
+                                         self.__cbf_topology_error)
+
+    def __read_cbf_topology(self):
+        """
+        Class private method.
+        Read the receptor/VCC mapping and the CBF capabilities from the CBF
+        sub-element Master.
+
+        :return: the topology dictionary (see commons/topology_cache.py)
+        :raise: tango.DevFailed, KeyError
+        """
+        proxy = self._se_proxies[self.CspMidCbf]
+        proxy.ping()
+        return read_cbf_topology(proxy)
+
+    def __set_cbf_topology(self, topology):
+        """
+        Class private method.
+        Set the receptor/VCC mapping and the max number of receptors.
+
+        :param topology: the topology dictionary (see commons/topology_cache.py)
+
+        :return: None
+        :raise: KeyError if the number of VCC capabilities is not reported
+        """
+        self._vcc_to_receptor_map = id_map(topology["vccToReceptor"])
+        # get the number of each Capability type allocated by CBF
+        self._receptors_maxnum = capabilities(topology)["VCC"]
+
+    def __update_cbf_topology(self, topology):
+        """
+        Class private method.
+        Called by the topology cache when CBF reports a topology different
+        from the cached one: the mapping is updated and the receptors
+        information is read again from CBF on the next request.
+
+        :param topology: the topology dictionary (see commons/topology_cache.py)
+
+        :return: None
+        """
+        try:
+            self.__set_cbf_topology(topology)
+        except (KeyError, ValueError) as err:
+            log_msg = "Invalid CBF topology: {}".format(str(err))
+            self.dev_logging(log_msg, int(tango.LogLevel.LOG_ERROR))
+            return
+        for attr_name in self._vcc_report_events:
+            self._vcc_report_events[attr_name] = False
+        self.dev_logging("CBF topology changed: cache updated", int(tango.LogLevel.LOG_WARN))
+
+    def __cbf_topology_error(self, err):
+        """
+        Class private method.
+        Log the failures of the CBF topology validation.
+
+        :param err: the exception raised reading the CBF topology
+
+        :return: None
+        """
+        log_msg = "CBF topology validation failure: {}".format(str(err))
+        self.dev_logging(log_msg, int(tango.LogLevel.LOG_WARN))
 
     def __init_beams_capabilities(self):
         """
@@ -275,6 +396,191 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
                                   for i in range(self._vlbi_beams_maxnum)
                                  ]
 
+    def __update_receptor_allocation(self, vcc_membership=None, vcc_state=None):
+        """
+        Class private method.
+        Align the receptors allocation table with the VCC subarray membership
+        and State reported by the CBF sub-element.
+        A receptor is usable if its link with the VCC is valid and the VCC
+        State is not UNKNOWN.
+
+        :param vcc_membership: the subarray ID of each VCC
+        :param vcc_state: the State of each VCC
+
+        :return: None
+        """
+        if vcc_state is not None:
+            usable = []
+            usable_mask = self._receptor_allocation.usable_mask
+            for vcc_id, receptor_id in self._vcc_to_receptor_map.items():
+                # OSS: valid receptorIDs are in [1,197] range
+                # receptorID = 0 means the link connection between
+                # the receptor and the VCC is off
+                if receptor_id == 0:
+                    log_msg = "Link problem with receptor connected to Vcc {}".format(vcc_id)
+                    self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
+                elif vcc_state[vcc_id - 1] != tango.DevState.UNKNOWN:
+                    usable.append(receptor_id)
+            self._receptor_allocation.set_usable(usable)
+            if self._receptor_allocation.usable_mask != usable_mask:
+                self.__journal_receptor_allocation()
+        if vcc_membership is not None:
+            membership = [0] * self._receptor_allocation.num_of_receptors
+            for vcc_id, receptor_id in self._vcc_to_receptor_map.items():
+                if receptor_id > 0:
+                    membership[receptor_id - 1] = vcc_membership[vcc_id - 1]
+            if self._receptor_allocation.update(membership):
+                self.__journal_receptor_allocation()
+                self.push_change_event("receptorMembershipRLE",
+                                       self._receptor_allocation.membership_runs(
+                                           self._receptors_maxnum))
+
+    def __sync_receptor_allocation(self, attr_method):
+        """
+        Class private method.
+        Align the receptors allocation table with CBF before a membership
+        attribute is read, if the VCC reports events are not available.
+
+        :param attr_method: the name of the attribute read method
+
+        :return: None
+        :raise: tango.DevFailed if the information can't be read from CBF.
+        """
+        if self.__is_subelement_available(self.CspMidCbf):
+            try:
+                if not all(self._vcc_report_events.values()):
+                    self.__refresh_receptor_allocation()
+            except tango.DevFailed as df:
+                tango.Except.re_throw_exception(df,
+                                                "CommandFailed",
+                                                "{} failed".format(attr_method),
+                                                "Command()")
+            except KeyError as key_err:
+                msg = "Can't retrieve the information of key {}".format(key_err)
+                self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+                tango.Except.throw_exception("Attribute reading failure",
+                                             msg,
+                                             attr_method,
+                                             tango.ErrSeverity.ERR)
+            except AttributeError as attr_err:
+                msg = "Error in reading {}: {} ".format(str(attr_err.args[0]), attr_err.__doc__)
+                tango.Except.throw_exception("Attribute reading failure",
+                                             msg,
+                                             attr_method,
+                                             tango.ErrSeverity.ERR)
+
+    def __open_journal(self):
+        """
+        Class private method.
+        Open the state journal of the device and restore the receptors
+        allocation table saved before the last restart. The table is then
+        aligned with CBF when the VCC reports are received.
+
+        :return: None
+        """
+        try:
+            self._journal = StateJournal(journal_path(self.JournalDir, self.get_name()))
+            state = self._journal.replay()
+        except (OSError, ValueError) as err:
+            log_msg = "Can't open the state journal: {}".format(str(err))
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+            self._journal = None
+            return
+        if "usableReceptors" in state:
+            self._receptor_allocation.set_usable(
+                [receptor_id for receptor_id in state["usableReceptors"]
+                 if receptor_id <= self._receptor_allocation.num_of_receptors])
+        if "receptorMembership" in state:
+            self._receptor_allocation.update(state["receptorMembership"])
+        log_msg = "Receptors allocation restored from {}".format(self._journal.path)
+        self.dev_logging(log_msg, tango.LogLevel.LOG_INFO)
+
+    def __journal_receptor_allocation(self):
+        """
+        Class private method.
+        Record the receptors allocation table in the state journal (if enabled).
+
+        :return: None
+        """
+        if self._journal is None:
+            return
+        try:
+            self._journal.append({
+                "receptorMembership": self._receptor_allocation.membership(),
+                "usableReceptors": receptor_ids(self._receptor_allocation.usable_mask)})
+        except (OSError, ValueError) as err:
+            log_msg = "Can't write the state journal: {}".format(str(err))
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+
+    def __refresh_receptor_allocation(self):
+        """
+        Class private method.
+        Read the VCC subarray membership and State from the CBF sub-element
+        (with one call) and update the receptors allocation table.
+
+        :raise: tango.DevFailed, KeyError, AttributeError
+        """
+        proxy = self._se_proxies[self.CspMidCbf]
+        vcc_state, vcc_membership = [attr.value for attr in
+                                     proxy.read_attributes(["reportVCCState",
+                                                            "reportVCCSubarrayMembership"])]
+        try:
+            self.__update_receptor_allocation(vcc_membership, vcc_state)
+        except (IndexError, TypeError) as err:
+            log_msg = "Error in accessing the VCC information: {}".format(str(err))
+            self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
+        # CBF is reachable: retry the failed subscriptions of the VCC reports
+        self._subscriptions.resubscribe(self.CspMidCbf)
+
+    def __vcc_report_callback(self, evt):
+        """
+        Class private method.
+        Update the receptors allocation table on the change events of the CBF
+        reportVCCState and reportVCCSubarrayMembership attributes.
+        On error, the information is read from CBF on request until a new
+        valid event is received.
+
+        :param evt: The event data
+
+        :return: None
+        """
+        attr_name = evt.attr_name.split("/")[-1].lower()
+        if evt.err:
+            self._vcc_report_events[attr_name] = False
+            log_msg = "{}: on attribute {}".format(evt.errors[0].reason, str(evt.attr_name))
+            self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
+            return
+        try:
+            if attr_name == "reportvccstate":
+                self.__update_receptor_allocation(vcc_state=evt.attr_value.value)
+            elif attr_name == "reportvccsubarraymembership":
+                self.__update_receptor_allocation(vcc_membership=evt.attr_value.value)
+            else:
+                return
+            self._vcc_report_events[attr_name] = True
+        except (IndexError, TypeError) as err:
+            self._vcc_report_events[attr_name] = False
+            log_msg = "Error in accessing the VCC information: {}".format(str(err))
+            self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
+
+    def __subscribe_vcc_reports(self):
+        """
+        Class private method.
+        Subscribe the change events of the CBF attributes reporting the VCC
+        State and subarray membership.
+        If the subscription fails, the information is read from CBF on request.
+
+        :return: None
+        """
+        if self.CspMidCbf not in self._se_proxies:
+            return
+        failed = self._subscriptions.subscribe(self._se_proxies[self.CspMidCbf],
+                                               ["reportVCCState", "reportVCCSubarrayMembership"],
+                                               self.__vcc_report_callback, stateless=False)
+        for attr_name in failed:
+            log_msg = "{} is read on request".format(attr_name)
+            self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
+
     def __connect_to_subelements(self):
         """
         Class private method.
@@ -288,8 +594,6 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
             None
         """
         for fqdn in self._se_fqdn:
-            # initialize the list for each dictionary key-name
-            self._se_event_id[fqdn] = []
             try:
                 self._se_to_switch_off[fqdn] = False
                 log_msg = "Trying connection to" + str(fqdn) + " device"
@@ -301,23 +605,9 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
                 self._se_proxies[fqdn] = device_proxy
 
                 # Subscription of the sub-element State,healthState and adminMode
-                ev_id = device_proxy.subscribe_event("State",
-                                                     EventType.CHANGE_EVENT,
-                                                     self.__seSCMCallback,
-                                                     stateless=True)
-                self._se_event_id[fqdn].append(ev_id)
-
-                ev_id = device_proxy.subscribe_event("healthState",
-                                                     EventType.CHANGE_EVENT,
-                                                     self.__seSCMCallback,
-                                                     stateless=True)
-                self._se_event_id[fqdn].append(ev_id)
-
-                ev_id = device_proxy.subscribe_event("adminMode",
-                                                     EventType.CHANGE_EVENT,
-                                                     self.__seSCMCallback,
-                                                     stateless=True)
-                self._se_event_id[fqdn].append(ev_id)
+                self._subscriptions.subscribe(device_proxy,
+                                              ["State", "healthState", "adminMode"],
+                                              self.__seSCMCallback)
             except tango.DevFailed as df:
                 #for item in df.args:
                 log_msg = ("Failure in connection to {}"
@@ -353,12 +643,251 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
             proxy = tango.DeviceProxy(subelement_name)
             proxy.ping()
             self._se_proxies[subelement_name] = proxy
+            # subscribe the SCM attributes with the new proxy
+            self._subscriptions.subscribe(proxy, ["State", "healthState", "adminMode"],
+                                          self.__seSCMCallback)
+            if subelement_name == self.CspMidCbf:
+                self.__subscribe_vcc_reports()
         except tango.DevFailed as df:
             msg = "Failure reason: {} Desc: {}".format(str(df.args[0].reason), str(df.args[0].desc))
             self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
             return False
         return True
 
+    def __get_subarray_proxy(self, sub_id):
+        """
+        Class private method.
+        Return the proxy of a CspSubarray, connecting to the device on the
+        first request.
+
+        :param sub_id: the subarray ID
+
+        :return: the DeviceProxy of the CspSubarray.
+        :raise: KeyError if no CspSubarray with this ID is configured,
+                tango.DevFailed if the device is not reachable.
+        """
+        proxy = self._subarray_proxies.get(sub_id)
+        if proxy is None:
+            proxy = tango.DeviceProxy(self._subarray_fqdn[sub_id])
+            self._subarray_proxies[sub_id] = proxy
+        return proxy
+
+    def __subarray_cmd_ended(self, evt):
+        """
+        Class private method.
+        Log the result of a command issued asynchronously to a CspSubarray.
+
+        :param evt: A CmdDoneEvent object.
+
+        :return: None
+        """
+        try:
+            if evt.err:
+                msg = "Error in executing command {} on device {}. Desc: {}".format(
+                    evt.cmd_name, evt.device.dev_name(), evt.errors[0].desc)
+                self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+            else:
+                msg = "Command {} executed on device {}".format(evt.cmd_name,
+                                                                evt.device.dev_name())
+                self.dev_logging(msg, tango.LogLevel.LOG_INFO)
+        except Exception as ex:
+            msg = "CommandCallBack cmd_ended general exception: {}".format(str(ex))
+            self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+
+    def __parse_scan_request(self, argin, cmd_name):
+        """
+        Class private method.
+        Decode the JSON-encoded request of the ScanSubarrays/EndScanSubarrays
+        commands.
+
+        :param argin: the JSON-encoded request
+        :param cmd_name: the command name
+
+        :return: the request dictionary, with the list of the subarray IDs.
+        :raise: tango.DevFailed if the request is not valid.
+        """
+        try:
+            request = json.loads(argin)
+            request["subarrayIDs"] = sorted(set(int(sub_id)
+                                                for sub_id in request["subarrayIDs"]))
+            if not request["subarrayIDs"]:
+                raise ValueError("no subarray ID")
+        except (ValueError, TypeError, KeyError, AttributeError) as err:
+            log_msg = "Invalid {} request: {}".format(cmd_name, str(err))
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+            tango.Except.throw_exception("Command failed",
+                                         log_msg,
+                                         cmd_name,
+                                         tango.ErrSeverity.ERR)
+        return request
+
+    def __send_to_subarrays(self, cmd_name, sub_ids, argin):
+        """
+        Class private method.
+        Send a command to several CspSubarrays concurrently: all the requests
+        are sent (asynchronously) before waiting for the replies.
+        NOTE: the CspSubarray Scan/EndScan commands don't call the CspMaster,
+        so the replies can be waited for without deadlock.
+
+        :param cmd_name: the CspSubarray command
+        :param sub_ids: the list of the subarray IDs
+        :param argin: the command argument
+
+        :return: the dictionary {subarray ID: {"dispatched", "acknowledged", "sent",
+                 "replied", "error"}}, where sent and replied are the times (ms)
+                 from the first request.
+        """
+        results = {}
+        requests = []
+        for sub_id in sub_ids:
+            results[sub_id] = {"dispatched": False, "acknowledged": False}
+            try:
+                proxy = self.__get_subarray_proxy(sub_id)
+                sent = time.time()
+                requests.append((sub_id, proxy, proxy.command_inout_asynch(cmd_name, argin),
+                                 sent))
+                results[sub_id]["dispatched"] = True
+            except KeyError:
+                results[sub_id]["error"] = "No CspSubarray with ID {}".format(sub_id)
+            except tango.DevFailed as df:
+                results[sub_id]["error"] = str(df.args[0].desc)
+        first = min([sent for _, _, _, sent in requests], default=0)
+        for sub_id, proxy, request_id, sent in requests:
+            result = results[sub_id]
+            result["sent"] = (sent - first) * 1000.
+            try:
+                proxy.command_inout_reply(request_id, proxy.get_timeout_millis())
+                result["acknowledged"] = True
+            except tango.DevFailed as df:
+                result["error"] = str(df.args[0].desc)
+            result["replied"] = (time.time() - first) * 1000.
+        for sub_id, result in results.items():
+            if "error" in result:
+                log_msg = "{} failed on subarray {}: {}".format(cmd_name, sub_id,
+                                                                result["error"])
+                self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+        return results
+
+    def __coordinated_result(self, results, activation_time):
+        """
+        Class private method.
+
+        :param results: the results of __send_to_subarrays()
+        :param activation_time: the common activation time (None if not scheduled)
+
+        :return: the JSON-encoded result of the ScanSubarrays/EndScanSubarrays
+                 commands. The requestSpread is the time (ms) between the first
+                 and the last request: the spread of the subarrays dispatches is
+                 reported by the coordinatedDispatch attribute.
+        """
+        sent = [result["sent"] for result in results.values() if result["dispatched"]]
+        return json.dumps({"activationTime": activation_time,
+                           "requestSpread": max(sent) - min(sent) if sent else None,
+                           "subarrays": {str(sub_id): result
+                                         for sub_id, result in sorted(results.items())}})
+
+    def __set_last_coordinated(self, cmd_name, activation_time, results):
+        """
+        Class private method.
+        Record the last ScanSubarrays/EndScanSubarrays command, whose
+        dispatches are reported by the coordinatedDispatch attribute.
+
+        :param cmd_name: the scheduled CspSubarray command (Scan or EndScan)
+        :param activation_time: the activation time (None if not scheduled)
+        :param results: the results of __send_to_subarrays()
+
+        :return: None
+        """
+        if activation_time is None:
+            # the commands are dispatched at once by the subarrays
+            self._last_coordinated = None
+            return
+        self._last_coordinated = (cmd_name, activation_time,
+                                  [sub_id for sub_id, result in sorted(results.items())
+                                   if result["acknowledged"]])
+
+    def __coordinated_dispatch(self):
+        """
+        Class private method.
+        Collect the times the CspSubarrays dispatched the Scan/EndScan of the
+        last ScanSubarrays/EndScanSubarrays command to the sub-elements, from
+        their scanDispatchStats attribute.
+
+        :return: the dictionary {"command", "activationTime", "subarrays",
+                 "spread"}: subarrays reports for each subarray the delay (ms)
+                 of its dispatch from the activation time (None if not
+                 dispatched yet) or the error reading it; spread is the time
+                 (ms) between the first and the last dispatch, None until all
+                 the subarrays have dispatched the command.
+        """
+        if self._last_coordinated is None:
+            return {"command": None, "activationTime": None, "subarrays": {}, "spread": None}
+        cmd_name, activation_time, sub_ids = self._last_coordinated
+        subarrays = {}
+        started = []
+        for sub_id in sub_ids:
+            try:
+                stats = json.loads(self.__get_subarray_proxy(sub_id).scanDispatchStats)
+                last = stats[cmd_name]["last"]
+            except (KeyError, ValueError) as err:
+                subarrays[str(sub_id)] = {"error": "Invalid scanDispatchStats: {}".format(err)}
+                continue
+            except tango.DevFailed as df:
+                subarrays[str(sub_id)] = {"error": str(df.args[0].desc)}
+                continue
+            # a dispatch scheduled at another time belongs to another command
+            if last is None or abs(last["scheduled"] - activation_time) > 1e-6:
+                subarrays[str(sub_id)] = {"delay": None}
+                continue
+            started.append(last["started"])
+            subarrays[str(sub_id)] = {"delay": (last["started"] - activation_time) * 1000.}
+        spread = None
+        if started and len(started) == len(sub_ids):
+            spread = (max(started) - min(started)) * 1000.
+        return {"command": cmd_name, "activationTime": activation_time,
+                "subarrays": subarrays, "spread": spread}
+
+    def __parse_beam_request(self, argin, cmd_name):
+        """
+        Class private method.
+        Decode the JSON-encoded request of the AssignBeams/ReleaseBeams commands.
+
+        :param argin: the JSON-encoded request
+        :param cmd_name: the command name
+
+        :return: the request dictionary and the allocation table of the beam type.
+        :raise: tango.DevFailed if the request is not valid.
+        """
+        try:
+            request = json.loads(argin)
+            allocation = self._beam_allocation[request["beamType"]]
+            request["subarrayID"] = int(request["subarrayID"])
+            if not 1 <= request["subarrayID"] <= allocation.num_of_subarrays:
+                raise ValueError("Invalid subarray id: {}".format(request["subarrayID"]))
+        except (ValueError, TypeError, KeyError) as err:
+            log_msg = "Invalid {} request: {}".format(cmd_name, str(err))
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+            tango.Except.throw_exception("Command failed",
+                                         log_msg,
+                                         cmd_name,
+                                         tango.ErrSeverity.ERR)
+        return request, allocation
+
+    def __push_beam_membership(self, beam_type):
+        """
+        Class private method.
+        Push the change events of the membership attributes of a beam type.
+
+        :param beam_type: SearchBeam, TimingBeam or VlbiBeam
+
+        :return: None
+        """
+        allocation = self._beam_allocation[beam_type]
+        self.push_change_event(self._beam_membership_attr[beam_type], allocation.membership())
+        if beam_type in self._beam_membership_runs_attr:
+            self.push_change_event(self._beam_membership_runs_attr[beam_type],
+                                   allocation.membership_runs())
+
     def __create_search_beam_group(self):
         """
         Class private method.
@@ -488,6 +1017,57 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
     *Type*: DevString
     """
 
+    JournalDir = device_property(
+        dtype='str', default_value=""
+    )
+    """
+    *Device property*
+
+    The directory of the state journal, used to restore the receptors\
+    allocation at restart. The journal is disabled if empty.
+
+    *Type*: DevString
+    """
+
+    HistorySize = device_property(
+        dtype='uint32', default_value=4096
+    )
+    """
+    *Device property*
+
+    The max number of SCM transitions kept in memory and reported by the\
+    GetHistory command.
+
+    *Type*: DevULong
+    """
+
+    TopologyCacheDir = device_property(
+        dtype='str', default_value=""
+    )
+    """
+    *Device property*
+
+    The directory of the CBF topology cache (receptor/VCC mapping and CBF\
+    capabilities), shared with the CspSubarray devices. The cache is disabled\
+    if empty.
+
+    *Type*: DevString
+    """
+
+    ScanLeadTime = device_property(
+        dtype='float', default_value=0.5
+    )
+    """
+    *Device property*
+
+    The time (sec) from a ScanSubarrays/EndScanSubarrays request to the\
+    common activation time of the subarrays, when the request doesn't\
+    specify it. It has to cover the dispatch of the requests to all the\
+    subarrays.
+
+    *Type*: DevDouble
+    """
+
     # ----------
     # Attributes
     # ----------
@@ -537,7 +1117,6 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
     cspCbfState = attribute(
         dtype='DevState',
         label="CBF status",
-        polling_period=3000,
         doc="The CBF sub-element State.",
     )
     """
@@ -550,7 +1129,6 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
     cspPssState = attribute(
         dtype='DevState',
         label="PSS status",
-        polling_period=3000,
         doc="The PSS sub-element State.",
     )
     """
@@ -563,7 +1141,6 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
     cspPstState = attribute(
         dtype='DevState',
         label="PST status",
-        polling_period=3000,
         doc="The PST sub-element State",
     )
     """
@@ -577,7 +1154,6 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
         dtype='DevEnum',
         label="CBF Health status",
         enum_labels=["OK", "DEGRADED", "FAILED", "UNKNOWN",],
-        polling_period=3000,
         abs_change=1,
         doc="The CBF sub-element health status.",
     )
@@ -592,7 +1168,6 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
         dtype='DevEnum',
         label="PSS Health status",
         enum_labels=["OK", "DEGRADED", "FAILED", "UNKNOWN",],
-        polling_period=3000,
         abs_change=1,
         doc="The PSS sub-element health status",
     )
@@ -607,7 +1182,6 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
         dtype='DevEnum',
         label="PST health status",
         enum_labels=["OK", "DEGRADED", "FAILED", "UNKNOWN",],
-        polling_period=3000,
         abs_change=1,
         doc="The PST sub-element health status.",
     )
@@ -655,7 +1229,6 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
         dtype='DevEnum',
         access=AttrWriteType.READ_WRITE,
         label="CBF administrative Mode",
-        polling_period=3000,
         abs_change=1,
         enum_labels=["ON-LINE", "OFF-LINE", "MAINTENANCE", "NOT-FITTED", "RESERVED", ],
         doc="The CbfMaster TANGO Device administration mode",
@@ -671,7 +1244,6 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
         dtype='DevEnum',
         access=AttrWriteType.READ_WRITE,
         label="PSS administrative mode",
-        polling_period=3000,
         abs_change=1,
         enum_labels=["ON-LINE", "OFF-LINE", "MAINTENANCE", "NOT-FITTED", "RESERVED", ],
         doc="The PssMaster TANGO Device administration mode",
@@ -687,7 +1259,6 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
         dtype='DevEnum',
         access=AttrWriteType.READ_WRITE,
         label="PST administrative mode",
-        polling_period=3000,
         abs_change=1,
         enum_labels=["ON-LINE", "OFF-LINE", "MAINTENANCE", "NOT-FITTED", "RESERVED", ],
         doc="The PstMaster TANGO Device administration mode",
@@ -904,6 +1475,22 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
     *Type*: array of DevUShort.
     """
 
+    receptorMembershipRLE = attribute(
+        dtype=('uint16',),
+        max_dim_x=591,
+        label="Receptor Membership (RLE)",
+        doc="The receptors affiliation to CSP sub-arrays, run-length encoded as "
+            "(start, length, subarray ID) triplets.",
+    )
+    """
+    *Class attribute*
+
+    The receptors subarray affiliation as the flat list of the runs\
+    [start receptor ID, length, subarray ID, ...] of receptors assigned to the\
+    same subarray. The not assigned receptors are not encoded.\n
+    *Type*: array of DevUShort.
+    """
+
     searchBeamMembership = attribute(
         dtype=('uint16',),
         max_dim_x=1500,
@@ -917,6 +1504,22 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
     *Type*: array of DevUShort.
     """
 
+    searchBeamMembershipRLE = attribute(
+        dtype=('uint16',),
+        max_dim_x=4500,
+        label="SearchBeam Membership (RLE)",
+        doc="The CSP sub-array affiliation of search beams, run-length encoded as "
+            "(start, length, subarray ID) triplets.",
+    )
+    """
+    *Class attribute*
+
+    The SearchBeam Capabilities subarray affiliation as the flat list of the\
+    runs [start beam ID, length, subarray ID, ...] of beams assigned to the\
+    same subarray. The not assigned beams are not encoded.\n
+    *Type*: array of DevUShort.
+    """
+
     timingBeamMembership = attribute(
         dtype=('uint16',),
         max_dim_x=16,
@@ -956,6 +1559,38 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
     *Type*: array of DevUShort.
     """
 
+    subscriptionStats = attribute(
+        dtype='str',
+        label="Event subscriptions statistics",
+        doc="The number of events received and the time of the last event for each "
+            "sub-element attribute subscribed (JSON-encoded).",
+    )
+    """
+    *Class attribute*
+
+    The statistics of the sub-element events subscriptions:\n
+    {device: {attribute: {"subscribed", "events", "errors", "last_event"}}}.\n
+    *Type*: DevString (JSON-encoded).
+    """
+
+    coordinatedDispatch = attribute(
+        dtype='str',
+        label="Coordinated dispatch",
+        doc="The delay (ms) from the activation time of the Scan/EndScan dispatch of each "
+            "subarray of the last ScanSubarrays/EndScanSubarrays command and their "
+            "spread (JSON-encoded).",
+    )
+    """
+    *Class attribute*
+
+    The dispatches of the last ScanSubarrays/EndScanSubarrays command, read from\
+    the scanDispatchStats of the CspSubarrays:\n
+    {"command", "activationTime", "subarrays": {subarray ID: {"delay"}},\
+    "spread"}, where spread is the time (ms) between the first and the last\
+    subarray dispatch (None until all the subarrays have dispatched).\n
+    *Type*: DevString (JSON-encoded).
+    """
+
     # TODO: understand why device crashes if these forwarded attributes are declared
     #vccCapabilityAddress = attribute(name="vccCapabilityAddress", label="vccCapabilityAddress",
     #    forwarded=True
@@ -1072,6 +1707,11 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
         self.set_state(tango.DevState.INIT)
         self._health_state = HealthState.UNKNOWN
         self._admin_mode = AdminMode.ONLINE
+        # the history of the SCM transitions of the CSP Element and Sub-elements
+        self._scm_history = ScmHistory(self.HistorySize)
+        self._scm_history.record(self.get_name(), "State", tango.DevState.INIT)
+        self._scm_history.record(self.get_name(), "healthState", self._health_state)
+        self._scm_history.record(self.get_name(), "adminMode", self._admin_mode)
         # use defaultdict to initialize the sub-element State,healthState
         # and adminMode. The dictionary uses as keys the sub-element
         # fqdn, for example
@@ -1080,6 +1720,14 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
         self._se_state         = defaultdict(lambda: tango.DevState.UNKNOWN)
         self._se_healthstate   = defaultdict(lambda: HealthState.UNKNOWN)
         self._se_adminmode     = defaultdict(lambda: AdminMode.OFFLINE)
+        # The SCM attributes are not polled: their values change only when a
+        # sub-element event is received and the change events are pushed from
+        # the event callback.
+        for attr_name in ["State", "healthState", "adminMode",
+                          "cspCbfState", "cspPssState", "cspPstState",
+                          "cspCbfHealthState", "cspPssHealthState", "cspPstHealthState",
+                          "cbfAdminMode", "pssAdminMode", "pstAdminMode"]:
+            self.set_change_event(attr_name, True, False)
 
         # initialize attribute values
         self._available_receptorIDs = []
@@ -1087,10 +1735,23 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
 
         #initialize the SCM states for CSP Search/Timing/Vlbi beams Capabilities
         self.__init_beams_capabilities()
-        #initialize Csp capabilities subarray membership
-        self._searchBeamsMembership = [0] * self._search_beams_maxnum
-        self._timingBeamsMembership = [0] * self._timing_beams_maxnum
-        self._vlbiBeamsMembership   = [0] * self._vlbi_beams_maxnum
+        # the allocation tables of the Search/Timing/Vlbi beams: they keep the
+        # beams subarray membership
+        self._beam_allocation = {
+            "SearchBeam": BeamAllocation(self._search_beams_maxnum, self._subarrays_maxnum),
+            "TimingBeam": BeamAllocation(self._timing_beams_maxnum, self._subarrays_maxnum),
+            "VlbiBeam": BeamAllocation(self._vlbi_beams_maxnum, self._subarrays_maxnum)}
+        # the membership attribute of each beam type: its change event is pushed
+        # when the beams are assigned/released
+        self._beam_membership_attr = {"SearchBeam": "searchBeamMembership",
+                                      "TimingBeam": "timingBeamMembership",
+                                      "VlbiBeam": "vlbiBeamMembership"}
+        # the run-length encoded membership attributes of the large pools
+        self._beam_membership_runs_attr = {"SearchBeam": "searchBeamMembershipRLE"}
+        for attr_name in (list(self._beam_membership_attr.values()) +
+                          list(self._beam_membership_runs_attr.values()) +
+                          ["receptorMembershipRLE"]):
+            self.set_change_event(attr_name, True, False)
 
         # initialize list with CSP sub-element FQDNs
         self._se_fqdn = []
@@ -1104,6 +1765,10 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
         self._se_fqdn.append(self.CspMidCbf)
         self._se_fqdn.append(self.CspMidPss)
         self._se_fqdn.append(self.CspMidPst)
+        # the prefix of the attributes reporting the SCM values of each sub-element
+        self._se_attr_prefix = {self.CspMidCbf: "Cbf",
+                                self.CspMidPss: "Pss",
+                                self.CspMidPst: "Pst"}
 
         # flag to signal sub-element switch-off request
         self._se_to_switch_off = {}
@@ -1111,15 +1776,13 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
             self._se_to_switch_off[device_name] = False
         # initialize the dictionary with sub-element proxies
         self._se_proxies = {}
-        # dictionary with list of event ids/sub-element. Need to
-        # store the event ids for each sub-element to un-subscribe
-        # them at sub-element disconnection.
-        self._se_event_id = {}
+        # the sub-element events subscriptions: the event ids are stored
+        # to un-subscribe them at sub-element disconnection.
+        self._subscriptions = SubscriptionManager(self.dev_logging)
         # Try connection with sub-elements
         self.__connect_to_subelements()
         # initialize class attributes related to CBF receptors capabilities
         self._vcc_to_receptor_map = {}
-        self._receptorsMembership = []
         # NOTE: VCC (Receptors) and FSP capabilities are implemented at
         #       CBF sub-element level. Need to evaluate if these capabilities
         #       have to be implemented also at CSP level.
@@ -1127,7 +1790,21 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
         #       by CBF the CSP master has to connect to the Cbf Master. For this
         #       reason the __get_maxnum_of_receptors() method gas to be called
         #       after connection.
+        self._vcc_report_events = {"reportvccstate": False,
+                                   "reportvccsubarraymembership": False}
         self.__get_maxnum_of_receptors()
+        # the receptors allocation table: it is aligned with the VCC subarray
+        # membership and State reported by CBF via change events or, if the
+        # events are not available, read from CBF on request.
+        self._receptor_allocation = ReceptorAllocation(max(const.NUM_OF_RECEPTORS,
+                                                           self._receptors_maxnum),
+                                                       self._subarrays_maxnum)
+        # warm restart: the allocation table saved in the state journal is
+        # available before the first VCC report is received from CBF
+        self._journal = None
+        if self.JournalDir:
+            self.__open_journal()
+        self.__subscribe_vcc_reports()
         # TODO:
         # report FSP number/availability
         # for each FSP Master should report the resources for each
@@ -1140,6 +1817,22 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
         self.__create_search_beam_group()
         self.__create_timing_beam_group()
         self.__create_vlbi_beam_group()
+        # the CspSubarray FQDNs, indexed by subarray ID (the last two chars of
+        # the FQDN), and their proxies, created on the first request
+        self._subarray_fqdn = {}
+        for index, fqdn in enumerate(self.CspSubarrays or []):
+            try:
+                self._subarray_fqdn[int(fqdn[-2:])] = fqdn
+            except ValueError:
+                self._subarray_fqdn[index + 1] = fqdn
+        self._subarray_proxies = {}
+        # the last ScanSubarrays/EndScanSubarrays: (command, activation time,
+        # IDs of the subarrays that accepted it)
+        self._last_coordinated = None
+        # the commands are issued to the CspSubarrays with command_inout_asynch:
+        # use the push model (the one with the callback parameter)
+        apiutil = tango.ApiUtil.instance()
+        apiutil.set_asynch_cb_sub_model(tango.cb_sub_model.PUSH_CALLBACK)
         # PROTECTED REGION END #    //  CspMaster.init_device
 
     def always_executed_hook(self):
@@ -1153,45 +1846,19 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
         Release all the allocated resources.
         """
         # PROTECTED REGION ID(CspMaster.delete_device) ENABLED START #
-        for fqdn in self._se_fqdn:
-            try:
-                event_to_remove = []
-                for event_id in self._se_event_id[fqdn]:
-                    try:
-                        self._se_proxies[fqdn].unsubscribe_event(event_id)
-                        event_to_remove.append(event_id)
-                    # NOTE: in PyTango unsubscription of not-existing event
-                    # id raises a KeyError exception not a DevFailed !!
-                    except KeyError as key_err:
-                        msg = "Can't retrieve the information of key {}".format(key_err)
-                        self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
-                    except tango.DevFailed as df:
-                        msg = ("Failure reason: {} Desc: {}".format(str(df.args[0].reason),
-                                                                    str(df.args[0].desc)))
-                        self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
-                # remove the events id from the list
-                for k in event_to_remove:
-                    self._se_event_id[fqdn].remove(k)
-                # check if there are still some registered events.
-                # What to do in this case??
-                if self._se_event_id[fqdn]:
-                    msg = "Still subscribed events: {}".format(self._se_event_id)
-                    self.dev_logging(msg, tango.LogLevel.LOG_WARN)
-                else:
-                    # remove the dictionary element
-                    self._se_event_id.pop(fqdn)
-            except KeyError as key_err:
-                msg = " Can't retrieve the information of key {}".format(key_err)
-                self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+        # unsubscribe the sub-elements events
+        self._subscriptions.unsubscribe_all()
         # clear any list and dict
         self._se_fqdn.clear()
         self._se_proxies.clear()
         self._vcc_to_receptor_map.clear()
-        self._receptorsMembership.clear()
-        self._searchBeamsMembership.clear()
-        self._timingBeamsMembership.clear()
-        self._vlbiBeamsMembership.clear()
         self._se_to_switch_off.clear()
+        self._subarray_proxies.clear()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self._topology_cache is not None:
+            self._topology_cache.stop()
         # PROTECTED REGION END #    //  CspMaster.delete_device
 
     # PROTECTED REGION ID#    //  CspMaster private methods
@@ -1228,6 +1895,8 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
                 self.dev_logging(log_msg, int(tango.LogLevel.LOG_ERROR))
         #TODO: what happens if one sub-element fails?
         self._admin_mode = value
+        self._scm_history.record(self.get_name(), "adminMode", self._admin_mode)
+        self.push_change_event("adminMode", self._admin_mode)
         # PROTECTED REGION END #    //  CspMaster.adminMode_write
 
     def read_commandProgress(self):
@@ -1515,6 +2184,8 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
                                          msg,
                                          "read_availableCapabilities",
                                          tango.ErrSeverity.ERR)
+        # imported here: the skabase auxiliary module is not needed at startup
+        from skabase.auxiliary import utils
         return utils.convert_dict_to_list(self._available_capabilities)
         # PROTECTED REGION END #    //  CspMaster.availableCapabilities_read
 
@@ -1695,34 +2366,22 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
            The subarray affiliation of the receptors.
         """
         # PROTECTED REGION ID(CspMaster.receptorMembership_read) ENABLED START #
-        if self.__is_subelement_available(self.CspMidCbf):
-            try:
-                proxy = self._se_proxies[self.CspMidCbf]
-                proxy.ping()
-                vcc_membership = proxy.reportVccSubarrayMembership
-                for vcc_id, receptorID in self._vcc_to_receptor_map.items():
-                    self._receptorsMembership[receptorID - 1] = vcc_membership[vcc_id - 1]
-            except tango.DevFailed as df:
-                tango.Except.re_throw_exception(df,
-                                                "CommandFailed",
-                                                "read_receptorsMembership failed",
-                                                "Command()")
-            except KeyError as key_err:
-                msg = "Can't retrieve the information of key {}".format(key_err)
-                self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
-                tango.Except.throw_exception("Attribute reading failure",
-                                             msg,
-                                             "read_receptorMembership",
-                                             tango.ErrSeverity.ERR)
-            except AttributeError as attr_err:
-                msg = "Error in reading {}: {} ".format(str(attr_err.args[0]), attr_err.__doc__)
-                tango.Except.throw_exception("Attribute reading failure",
-                                             msg,
-                                             "read_receptorMembership",
-                                             tango.ErrSeverity.ERR)
-        return self._receptorsMembership
+        self.__sync_receptor_allocation("read_receptorMembership")
+        return self._receptor_allocation.membership(self._receptors_maxnum)
         # PROTECTED REGION END #    //  CspMaster.receptorMembership_read
 
+    def read_receptorMembershipRLE(self):
+        """
+        Class attribute method.
+
+        Returns:
+           The run-length encoded subarray affiliation of the receptors.
+        """
+        # PROTECTED REGION ID(CspMaster.receptorMembershipRLE_read) ENABLED START #
+        self.__sync_receptor_allocation("read_receptorMembershipRLE")
+        return self._receptor_allocation.membership_runs(self._receptors_maxnum)
+        # PROTECTED REGION END #    //  CspMaster.receptorMembershipRLE_read
+
     def read_searchBeamMembership(self):
         """
         Class attribute method.
@@ -1731,9 +2390,20 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
            The subarray affilitiaion of the Search Beams.
         """
         # PROTECTED REGION ID(CspMaster.searchBeamMembership_read) ENABLED START #
-        return self._searchBeamsMembership
+        return self._beam_allocation["SearchBeam"].membership()
         # PROTECTED REGION END #    //  CspMaster.searchBeamMembership_read
 
+    def read_searchBeamMembershipRLE(self):
+        """
+        Class attribute method.
+
+        Returns:
+           The run-length encoded subarray affiliation of the Search Beams.
+        """
+        # PROTECTED REGION ID(CspMaster.searchBeamMembershipRLE_read) ENABLED START #
+        return self._beam_allocation["SearchBeam"].membership_runs()
+        # PROTECTED REGION END #    //  CspMaster.searchBeamMembershipRLE_read
+
     def read_timingBeamMembership(self):
         """
         Class attribute method.
@@ -1742,7 +2412,7 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
            The subarray affilitiaion of the Timing Beams.
         """
         # PROTECTED REGION ID(CspMaster.timingBeamMembership_read) ENABLED START #
-        return self._timingBeamsMembership
+        return self._beam_allocation["TimingBeam"].membership()
         # PROTECTED REGION END #    //  CspMaster.timingBeamMembership_read
 
     def read_vlbiBeamMembership(self):
@@ -1753,7 +2423,7 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
            The subarray affilitiaion of the Vlbi Beams.
         """
         # PROTECTED REGION ID(CspMaster.vlbiBeamMembership_read) ENABLED START #
-        return self._vlbiBeamsMembership
+        return self._beam_allocation["VlbiBeam"].membership()
         # PROTECTED REGION END #    //  CspMaster.vlbiBeamMembership_read
 
     def read_availableReceptorIDs(self):
@@ -1774,37 +2444,9 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
                     command execution.
         """
         # PROTECTED REGION ID(CspMaster.availableReceptorIDs_read) ENABLED START #
-        self._available_receptorIDs = []
         try:
-            proxy = self._se_proxies[self.CspMidCbf]
-            proxy.ping()
-            vcc_state = proxy.reportVCCState
-            vcc_membership = proxy.reportVccSubarrayMembership
-            # get the list with the IDs of the available VCC
-            for vcc_id, receptorID in self._vcc_to_receptor_map.items():
-                try:
-                    if vcc_state[vcc_id - 1] not in [tango.DevState.UNKNOWN]:
-                        # skip the vcc already assigned to a sub-array
-                        if vcc_membership[vcc_id - 1] != 0:
-                            continue
-                        # OSS: valid receptorIDs are in [1,197] range
-                        # receptorID = 0 means the link connection between
-                        # the receptor and the VCC is off
-                        if receptorID > 0:
-                            self._available_receptorIDs.append(receptorID)
-                        else:
-                            log_msg = ("Link problem with receptor connected"
-                                       " to Vcc {}".format(vcc_id + 1))
-                            self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
-                except KeyError as key_err:
-                    log_msg = ("No key {} found while accessing VCC {}".format(str(key_err),
-                                                                               vcc_id))
-                    self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
-                except IndexError as idx_error:
-                    log_msg = ("Error accessing VCC"
-                               " element {}: {}".format(vcc_id,
-                                                        str(idx_error)))
-                    self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
+            if not all(self._vcc_report_events.values()):
+                self.__refresh_receptor_allocation()
         except KeyError as key_err:
             log_msg = "Can't retrieve the information of key {}".format(key_err)
             tango.Except.throw_exception("Attribute reading failure",
@@ -1833,11 +2475,35 @@ class CspMaster(with_metaclass(DeviceMeta, SKAMaster)):
         # returns a NoneType object, as happed before with PyTango 9.2.5, TANGO 9.2.5 images.
         # The beavior now is coherent, but I don't revert to the old code: this methods
         # keep returning an array with one element = 0 when no receptors are available.
+        self._available_receptorIDs = self._receptor_allocation.available_ids()
         if len(self._available_receptorIDs) == 0:
             return [0]
         return self._available_receptorIDs
         # PROTECTED REGION END #    //  CspMaster.vlbiBeamMembership_read
 
+    def read_subscriptionStats(self):
+        """
+        Class attribute method.
+
+        Returns:
+            The statistics of the sub-element events subscriptions (JSON-encoded).
+        """
+        # PROTECTED REGION ID(CspMaster.subscriptionStats_read) ENABLED START #
+        return json.dumps(self._subscriptions.stats())
+        # PROTECTED REGION END #    //  CspMaster.subscriptionStats_read
+
+    def read_coordinatedDispatch(self):
+        """
+        Class attribute method.
+
+        Returns:
+            The dispatches of the last ScanSubarrays/EndScanSubarrays command\
+            (JSON-encoded).
+        """
+        # PROTECTED REGION ID(CspMaster.coordinatedDispatch_read) ENABLED START #
+        return json.dumps(self.__coordinated_dispatch())
+        # PROTECTED REGION END #    //  CspMaster.coordinatedDispatch_read
+
     # --------
     # Commands
     # --------
@@ -2112,6 +2778,338 @@ If the array length is > 1, each array element specifies the FQDN of the\
                                          tango.ErrSeverity.ERR)
         # PROTECTED REGION END #    //  CspMaster.Standby
 
+    def is_AssignReceptors_allowed(self):
+        """
+        *TANGO is_allowed method*
+
+        Command *AssignReceptors* is allowed when the State is ON.
+
+        Returns:
+            True if the method is allowed, otherwise False.
+        """
+        # PROTECTED REGION ID(CspMaster.is_AssignReceptors_allowed) ENABLED START #
+        return self.get_state() == tango.DevState.ON
+        # PROTECTED REGION END #    //  CspMaster.is_AssignReceptors_allowed
+
+    @command(
+        dtype_in='str',
+        doc_in="The JSON-encoded allocation plan: {subarray ID: list of receptor IDs}.",
+        dtype_out='str',
+        doc_out="The JSON-encoded result of each subarray: {subarray ID: {assignable, "
+                "assigned, conflicts, unavailable, invalid, dispatched, error}}.",
+    )
+    @DebugIt()
+    def AssignReceptors(self, argin):
+        """
+        *Class method*
+
+        Assign the receptors to several subarrays with one call.\
+        The allocation plan is validated against the receptors allocation table\
+        in one pass (a receptor requested by more than one subarray is granted to\
+        the lowest subarray ID) and the AddReceptors command is issued\
+        asynchronously to all the CspSubarrays at once: the command returns when\
+        the requests have been dispatched. The assignment progress is reported\
+        by the CspSubarray *resourcingProgress* attributes.
+
+        Args:
+            argin: the JSON-encoded plan, for example {"1": [1, 4], "2": [2, 3]}.
+            Type: DevString
+        Returns:
+            The JSON-encoded result of each subarray:\
+            {"1": {"assignable": [1, 4], "assigned": [], "conflicts": {},\
+            "unavailable": [], "invalid": [], "dispatched": true}, ...}.\
+            The *error* entry reports why the request has not been dispatched.
+        Raises:
+            tango.DevFailed: if the plan is not valid JSON or the receptors\
+                    information can't be retrieved from CBF.
+        """
+        # PROTECTED REGION ID(CspMaster.AssignReceptors) ENABLED START #
+        try:
+            plan = {int(sub_id): [int(receptor_id) for receptor_id in receptors]
+                    for sub_id, receptors in json.loads(argin).items()}
+        except (ValueError, TypeError, AttributeError) as err:
+            log_msg = "Invalid allocation plan: {}".format(str(err))
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+            tango.Except.throw_exception("Command failed",
+                                         log_msg,
+                                         "AssignReceptors",
+                                         tango.ErrSeverity.ERR)
+        results = {}
+        for sub_id in list(plan):
+            if (sub_id not in self._subarray_fqdn or
+                    not 1 <= sub_id <= self._receptor_allocation.num_of_subarrays):
+                results[sub_id] = {"dispatched": False,
+                                   "error": "No CspSubarray with ID {}".format(sub_id)}
+                del plan[sub_id]
+        # the plan is validated against the current allocation table
+        try:
+            if not all(self._vcc_report_events.values()):
+                self.__refresh_receptor_allocation()
+        except (KeyError, AttributeError) as err:
+            log_msg = "Can't retrieve the receptors information: {}".format(str(err))
+            tango.Except.throw_exception("Command failed",
+                                         log_msg,
+                                         "AssignReceptors",
+                                         tango.ErrSeverity.ERR)
+        except tango.DevFailed as df:
+            tango.Except.re_throw_exception(df,
+                                            "Command failed",
+                                            "Can't retrieve the receptors information",
+                                            "AssignReceptors")
+        results.update(self._receptor_allocation.check_plan(plan))
+        # dispatch the requests to all the subarrays: each CspSubarray validates
+        # and forwards its request to CBF at the same time as the others
+        for sub_id in sorted(plan):
+            result = results[sub_id]
+            result["dispatched"] = False
+            if not result["assignable"]:
+                continue
+            try:
+                proxy = self.__get_subarray_proxy(sub_id)
+                proxy.command_inout_asynch("AddReceptors", result["assignable"],
+                                           self.__subarray_cmd_ended)
+                result["dispatched"] = True
+            except tango.DevFailed as df:
+                result["error"] = str(df.args[0].desc)
+                log_msg = "AddReceptors not dispatched to subarray {}: {}".format(sub_id,
+                                                                                  result["error"])
+                self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+        return json.dumps({str(sub_id): result for sub_id, result in sorted(results.items())})
+        # PROTECTED REGION END #    //  CspMaster.AssignReceptors
+
+    def is_ScanSubarrays_allowed(self):
+        """
+        *TANGO is_allowed method*
+
+        Returns:
+            True if the CspMaster State is ON.
+        """
+        # PROTECTED REGION ID(CspMaster.is_ScanSubarrays_allowed) ENABLED START #
+        return self.get_state() == tango.DevState.ON
+        # PROTECTED REGION END #    //  CspMaster.is_ScanSubarrays_allowed
+
+    @command(
+        dtype_in='str',
+        doc_in="The JSON-encoded request: {subarrayIDs: list of subarray IDs, scanArgument: "
+               "the Scan argument (optional)}.",
+        dtype_out='str',
+        doc_out="The JSON-encoded result: {activationTime, requestSpread, subarrays: "
+                "{subarray ID: {dispatched, acknowledged, sent, replied, error}}}.",
+    )
+    @DebugIt()
+    def ScanSubarrays(self, argin):
+        """
+        *Class method*
+
+        Start a scan on several subarrays with one call.\
+        The Scan command is sent to all the CspSubarrays concurrently with the\
+        same argument. If the scan argument is not specified, it is set to a\
+        common activation time (*ScanLeadTime* seconds from now): the\
+        subarrays schedulers dispatch the scan to the sub-elements at that\
+        instant, so the subarrays start together. A numeric scan argument is\
+        the activation time chosen by the caller.
+
+        Args:
+            argin: the JSON-encoded request, for example {"subarrayIDs": [1, 2]}.
+            Type: DevString
+        Returns:
+            The JSON-encoded result: the activation time, the time (ms) between\
+            the first and the last request and the outcome of each subarray\
+            ("sent" and "replied" are the ms from the first request). The\
+            spread of the actual dispatches of the subarrays is reported by the\
+            *coordinatedDispatch* attribute once the activation time is past.
+        Raises:
+            tango.DevFailed: if the request is not valid.
+        """
+        # PROTECTED REGION ID(CspMaster.ScanSubarrays) ENABLED START #
+        request = self.__parse_scan_request(argin, "ScanSubarrays")
+        activation_time = None
+        scan_argument = request.get("scanArgument")
+        if scan_argument is None:
+            activation_time = time.time() + self.ScanLeadTime
+            scan_argument = repr(activation_time)
+        else:
+            # a numeric argument is the activation time of the scan
+            try:
+                activation_time = float(scan_argument)
+            except (TypeError, ValueError):
+                pass
+        results = self.__send_to_subarrays("Scan", request["subarrayIDs"], str(scan_argument))
+        self.__set_last_coordinated("Scan", activation_time, results)
+        return self.__coordinated_result(results, activation_time)
+        # PROTECTED REGION END #    //  CspMaster.ScanSubarrays
+
+    def is_EndScanSubarrays_allowed(self):
+        """
+        *TANGO is_allowed method*
+
+        Returns:
+            True if the CspMaster State is ON.
+        """
+        # PROTECTED REGION ID(CspMaster.is_EndScanSubarrays_allowed) ENABLED START #
+        return self.get_state() == tango.DevState.ON
+        # PROTECTED REGION END #    //  CspMaster.is_EndScanSubarrays_allowed
+
+    @command(
+        dtype_in='str',
+        doc_in="The JSON-encoded request: {subarrayIDs: list of subarray IDs, endTime: the "
+               "end time of the scan, as seconds since the epoch (optional, 0 for now)}. "
+               "The CspSubarray EndScanAt command (not EndScan) is sent with the end time.",
+        dtype_out='str',
+        doc_out="The JSON-encoded result: {activationTime, requestSpread, subarrays: "
+                "{subarray ID: {dispatched, acknowledged, sent, replied, error}}}.",
+    )
+    @DebugIt()
+    def EndScanSubarrays(self, argin):
+        """
+        *Class method*
+
+        End the scan on several subarrays with one call.\
+        The EndScanAt command, not EndScan, is sent to all the CspSubarrays\
+        concurrently with the same end time (*ScanLeadTime* seconds from now if\
+        not specified, at once if 0): the subarrays end the scan together.
+
+        Args:
+            argin: the JSON-encoded request, for example {"subarrayIDs": [1, 2]}.
+            Type: DevString
+        Returns:
+            The JSON-encoded result (see ScanSubarrays).
+        Raises:
+            tango.DevFailed: if the request is not valid.
+        """
+        # PROTECTED REGION ID(CspMaster.EndScanSubarrays) ENABLED START #
+        request = self.__parse_scan_request(argin, "EndScanSubarrays")
+        try:
+            end_time = float(request.get("endTime", time.time() + self.ScanLeadTime))
+        except (ValueError, TypeError) as err:
+            log_msg = "Invalid EndScanSubarrays end time: {}".format(str(err))
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+            tango.Except.throw_exception("Command failed",
+                                         log_msg,
+                                         "EndScanSubarrays",
+                                         tango.ErrSeverity.ERR)
+        results = self.__send_to_subarrays("EndScanAt", request["subarrayIDs"], end_time)
+        self.__set_last_coordinated("EndScan", end_time or None, results)
+        return self.__coordinated_result(results, end_time or None)
+        # PROTECTED REGION END #    //  CspMaster.EndScanSubarrays
+
+    @command(
+        dtype_in='str',
+        doc_in="The JSON-encoded request: {subarrayID, beamType (SearchBeam, TimingBeam or "
+               "VlbiBeam) and the number of beams (number) or their IDs (beamIDs)}.",
+        dtype_out='str',
+        doc_out="The JSON-encoded result: {beamIDs: the assigned beam IDs, "
+                "conflicts: {beam ID: owner subarray ID}}.",
+    )
+    @DebugIt()
+    def AssignBeams(self, argin):
+        """
+        *Class method*
+
+        Assign Search, Timing or Vlbi beams to a subarray: a number of beams\
+        (granted in the smallest free contiguous range holding them, or in the\
+        fewest free ranges) or the beams with the specified IDs.\
+        The beams membership attribute is updated and its change event pushed.
+
+        Args:
+            argin: the JSON-encoded request, for example\
+            {"subarrayID": 1, "beamType": "SearchBeam", "number": 300} or\
+            {"subarrayID": 1, "beamType": "TimingBeam", "beamIDs": [1, 2]}.
+            Type: DevString
+        Returns:
+            The JSON-encoded result: {"beamIDs": [...], "conflicts": {...}}.
+        Raises:
+            tango.DevFailed: if the request is not valid or the beams are not available.
+        """
+        # PROTECTED REGION ID(CspMaster.AssignBeams) ENABLED START #
+        request, allocation = self.__parse_beam_request(argin, "AssignBeams")
+        try:
+            if "beamIDs" in request:
+                beam_ids, conflicts = allocation.assign(request["subarrayID"],
+                                                        request["beamIDs"])
+            else:
+                beam_ids = allocation.allocate(request["subarrayID"], int(request["number"]))
+                conflicts = {}
+        except (ValueError, TypeError, KeyError) as err:
+            log_msg = "AssignBeams failure: {}".format(str(err))
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+            tango.Except.throw_exception("Command failed",
+                                         log_msg,
+                                         "AssignBeams",
+                                         tango.ErrSeverity.ERR)
+        if beam_ids:
+            self.__push_beam_membership(request["beamType"])
+        return json.dumps({"beamIDs": beam_ids, "conflicts": conflicts})
+        # PROTECTED REGION END #    //  CspMaster.AssignBeams
+
+    @command(
+        dtype_in='str',
+        doc_in="The JSON-encoded request: {subarrayID, beamType (SearchBeam, TimingBeam or "
+               "VlbiBeam) and optionally the number of beams (number) or their IDs "
+               "(beamIDs)}. All the beams of the type are released if neither is specified.",
+        dtype_out=('uint16',),
+        doc_out="The released beam IDs.",
+    )
+    @DebugIt()
+    def ReleaseBeams(self, argin):
+        """
+        *Class method*
+
+        Release Search, Timing or Vlbi beams from a subarray: the beams with the\
+        specified IDs, the specified number of beams (the highest IDs first) or\
+        all the beams of the type.
+
+        Args:
+            argin: the JSON-encoded request, for example\
+            {"subarrayID": 1, "beamType": "SearchBeam", "number": 100}.
+            Type: DevString
+        Returns:
+            The list of the released beam IDs.
+        Raises:
+            tango.DevFailed: if the request is not valid.
+        """
+        # PROTECTED REGION ID(CspMaster.ReleaseBeams) ENABLED START #
+        request, allocation = self.__parse_beam_request(argin, "ReleaseBeams")
+        try:
+            beam_ids = allocation.release(request["subarrayID"], ids=request.get("beamIDs"),
+                                          num=request.get("number"))
+        except (ValueError, TypeError) as err:
+            log_msg = "ReleaseBeams failure: {}".format(str(err))
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+            tango.Except.throw_exception("Command failed",
+                                         log_msg,
+                                         "ReleaseBeams",
+                                         tango.ErrSeverity.ERR)
+        if beam_ids:
+            self.__push_beam_membership(request["beamType"])
+        return beam_ids
+        # PROTECTED REGION END #    //  CspMaster.ReleaseBeams
+
+    @command(
+        dtype_in='float',
+        doc_in="The time (seconds since the epoch) of the oldest transition to report. "
+               "0 to report all the recorded transitions.",
+        dtype_out='str',
+        doc_out="The JSON-encoded transitions: {sources, attributes, entries} where each "
+                "entry is [timestamp, source index, attribute index, value].",
+    )
+    @DebugIt()
+    def GetHistory(self, argin):
+        """
+        *Class method*
+
+        Report the State, healthState and adminMode transitions of the CSP\
+        Element and of the CSP Sub-elements recorded after the specified time.\
+        The device keeps the last *HistorySize* transitions.
+
+        :param argin: the time (seconds since the epoch) of the oldest transition.
+
+        :return: the JSON-encoded transitions (see commons/scm_history.py).
+        """
+        # PROTECTED REGION ID(CspMaster.GetHistory) ENABLED START #
+        return self._scm_history.to_json(argin)
+        # PROTECTED REGION END #    //  CspMaster.GetHistory
+
 # ----------
 # Run server
 # ----------
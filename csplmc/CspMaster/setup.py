@@ -32,7 +32,7 @@ setup(
         ],
         include_package_data=True,
         test_suite="test",
-        entry_points={'console_scripts':['CspMaster = CspMaster:main']},
+        entry_points={'console_scripts':['CspMaster = CspMaster.CspMaster:main']},
         author='E.G',
         author_email='elisabetta.giani@inaf.it',
         license='BSD-3-Clause',
@@ -40,7 +40,7 @@ setup(
         url='www.tango-controls.org',
         platforms="All Platforms",
         install_requires = [
-            'pytango==9.3.1', 
+            'pytango>=9.3.3', 
         ],
         #test_suite='test',
         setup_requires=[
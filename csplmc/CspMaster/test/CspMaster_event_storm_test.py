@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the csp-lmc-prototype project
+#
+#
+#
+# Distributed under the terms of the BSD-3-Clause license.
+# See LICENSE.txt for more info.
+"""Contain the tests for the CspMaster handling of a CBF event storm."""
+
+# Standard imports
+import sys
+import os
+import time
+import json
+import threading
+import pytest
+
+# Path
+file_path = os.path.dirname(os.path.abspath(__file__))
+# insert base package directory to import global_enum
+# module in commons folder
+commons_pkg_path = os.path.abspath(os.path.join(file_path, "../../commons"))
+sys.path.insert(0, commons_pkg_path)
+
+path = os.path.join(os.path.dirname(__file__), os.pardir)
+sys.path.insert(0, os.path.abspath(path))
+
+#Local imports
+from event_storm import EventStorm
+
+SCM_ATTRIBUTES = ["State", "healthState", "adminMode"]
+
+def cbf_events(csp_master, cbf_name):
+    """
+    Returns:
+        The number of the events received by the CspMaster for each SCM\
+        attribute of the CBF Master.
+    """
+    stats = json.loads(csp_master.subscriptionStats)
+    device = [name for name in stats if name.endswith(cbf_name.lower())][0]
+    return {attr_name: stats[device][attr_name]["events"] for attr_name in SCM_ATTRIBUTES}
+
+@pytest.fixture(scope="class")
+def storm_csp():
+    """Run the CspMaster and the CBF simulators."""
+    try:
+        from sim_context import SimulatedCspContext, CBF_MASTER
+    except ImportError:
+        # MultiDeviceTestContext requires PyTango >= 9.3.3
+        pytest.skip("MultiDeviceTestContext not available")
+    with SimulatedCspContext(num_of_subarrays=1) as context:
+        context.cbf_name = CBF_MASTER
+        yield context
+
+@pytest.mark.usefixtures("storm_csp")
+
+class TestEventStorm(object):
+
+    def test_storm_delivered(self, storm_csp):
+        """
+        Test that all the SCM change events of a short storm pushed by the
+        CBF Master are handled by the CspMaster (__seSCMCallback) and that
+        the device stays responsive during the storm.
+        """
+        csp_master = storm_csp.csp_master
+        cbf_master = storm_csp.cbf_master
+        before = cbf_events(csp_master, storm_csp.cbf_name)
+        storm = {"duration": 2,
+                 "rates": {attr_name: 100 for attr_name in SCM_ATTRIBUTES},
+                 "values": "current"}
+        cbf_master.StartEventStorm(json.dumps(storm))
+        # the CspMaster serves the clients while handling the storm
+        max_reply = 0.
+        while json.loads(cbf_master.eventStormReport)["running"]:
+            start = time.time()
+            csp_master.read_attribute("healthState")
+            max_reply = max(max_reply, time.time() - start)
+            time.sleep(0.05)
+        report = json.loads(cbf_master.StopEventStorm())
+        assert report["push_failures"] == 0
+        assert report["emitted"] == {attr_name: 200 for attr_name in SCM_ATTRIBUTES}
+        assert max_reply < 1.
+        # no event is lost or left behind the SCM callback
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            received = cbf_events(csp_master, storm_csp.cbf_name)
+            if all(received[attr_name] - before[attr_name] >= report["emitted"][attr_name]
+                   for attr_name in SCM_ATTRIBUTES):
+                break
+            time.sleep(0.1)
+        received = cbf_events(csp_master, storm_csp.cbf_name)
+        assert {attr_name: received[attr_name] - before[attr_name]
+                for attr_name in SCM_ATTRIBUTES} == report["emitted"]
+
+class TestEventStormEngine(object):
+
+    def test_concurrent_start(self):
+        """
+        Test that a single generator thread runs when the storm is started
+        concurrently by several clients and that stop() joins it.
+        """
+        storm = EventStorm(lambda attr_name, value: None, lambda attr_name, rnd: 0)
+        barrier = threading.Barrier(8)
+        started = []
+        def start():
+            barrier.wait()
+            try:
+                storm.start(json.dumps({"rates": {"State": 10}}))
+                started.append(True)
+            except ValueError:
+                pass
+        clients = [threading.Thread(target=start) for _ in range(8)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        assert started == [True]
+        assert len([thread for thread in threading.enumerate()
+                    if thread.name == "EventStorm"]) == 1
+        storm.stop()
+        assert not storm.is_running()
+        assert not [thread for thread in threading.enumerate()
+                    if thread.name == "EventStorm"]
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the csp-lmc-prototype project
+#
+#
+#
+# Distributed under the terms of the BSD-3-Clause license.
+# See LICENSE.txt for more info.
+"""Contain the tests for the receptors allocation table of the CspMaster."""
+
+# Standard imports
+import sys
+import os
+import pytest
+
+# Path
+file_path = os.path.dirname(os.path.abspath(__file__))
+# insert the repository root to import the csplmc package
+# when it is not installed
+try:
+    import csplmc
+except ImportError:
+    sys.path.insert(0, os.path.abspath(os.path.join(file_path, "../../..")))
+
+#Local imports
+from csplmc.commons.receptor_allocation import (ReceptorAllocation, receptor_mask,
+                                                receptor_ids)
+
+class TestReceptorMask(object):
+
+    def test_mask_and_ids(self):
+        """
+        Test the conversion between the receptor IDs and the bitmap.
+        """
+        assert receptor_mask([1, 3, 3, 197]) == 0b101 | 1 << 196
+        assert receptor_ids(receptor_mask([197, 3, 1])) == [1, 3, 197]
+        assert receptor_ids(0) == []
+
+    def test_invalid_id(self):
+        """
+        Test that a not positive receptor ID is rejected.
+        """
+        with pytest.raises(ValueError):
+            receptor_mask([1, 0])
+        with pytest.raises(ValueError):
+            receptor_mask([-2])
+
+class TestReceptorAllocation(object):
+
+    def test_assign_release(self):
+        """
+        Test the assignment and the release of the receptors.
+        """
+        table = ReceptorAllocation(8, 2)
+        assert table.assign(1, [1, 2, 3]) == ([1, 2, 3], {})
+        assert table.available_ids() == [4, 5, 6, 7, 8]
+        assert table.membership() == [1, 1, 1, 0, 0, 0, 0, 0]
+        assert table.membership_runs() == [1, 3, 1]
+        assert table.owner(2) == 1
+        assert not table.is_free(2)
+        # the receptors already assigned to the subarray are not conflicts
+        assert table.assign(1, [3, 4]) == ([4], {})
+        assert table.release(1, [2, 5]) == [2]
+        assert table.membership() == [1, 0, 1, 1, 0, 0, 0, 0]
+        assert table.release(1) == [1, 3, 4]
+        assert table.allocated_mask == 0
+        assert table.membership_runs() == []
+
+    def test_assign_conflicts(self):
+        """
+        Test that the receptors assigned to another subarray are reported as
+        conflicts and not assigned.
+        """
+        table = ReceptorAllocation(8, 2)
+        table.assign(1, [1, 2])
+        assigned, conflicts = table.assign(2, [2, 3])
+        assert assigned == [3]
+        assert conflicts == {2: 1}
+        assert table.subarray_mask(1) == receptor_mask([1, 2])
+        assert table.subarray_mask(2) == receptor_mask([3])
+        # a subarray can't release the receptors of another one
+        assert table.release(2, [1, 2]) == []
+        assert table.membership()[:3] == [1, 1, 2]
+
+    def test_invalid_ids(self):
+        """
+        Test that the out of range receptor and subarray IDs are rejected
+        without changing the table.
+        """
+        table = ReceptorAllocation(8, 2)
+        with pytest.raises(ValueError):
+            table.assign(1, [1, 9])
+        with pytest.raises(ValueError):
+            table.assign(1, [0])
+        with pytest.raises(ValueError):
+            table.assign(3, [1])
+        with pytest.raises(ValueError):
+            table.release(0)
+        with pytest.raises(ValueError):
+            table.check(1, [9])
+        assert table.allocated_mask == 0
+        assert table.available_ids() == list(range(1, 9))
+
+    def test_not_usable(self):
+        """
+        Test that the receptors without a working VCC are not assigned.
+        """
+        table = ReceptorAllocation(8, 2)
+        table.set_usable([1, 2, 3, 4])
+        assert table.assign(1, [3, 4, 5]) == ([3, 4], {})
+        assert table.available_ids() == [1, 2]
+        assert table.check(2, [1, 4, 6]) == (receptor_mask([1]), {4: 1})
+
+    def test_check_plan(self):
+        """
+        Test the check of the assignment to several subarrays: a receptor
+        requested twice is granted to the lowest subarray ID.
+        """
+        table = ReceptorAllocation(8, 3)
+        table.set_usable([1, 2, 3, 4, 5, 6])
+        table.assign(1, [1, 2])
+        results = table.check_plan({3: [4, 5], 2: [2, 3, 4, 7, 9], 1: [1, 6]})
+        assert results[1] == {"assignable": [6], "assigned": [1], "conflicts": {},
+                              "unavailable": [], "invalid": []}
+        assert results[2] == {"assignable": [3, 4], "assigned": [],
+                              "conflicts": {2: 1}, "unavailable": [7], "invalid": [9]}
+        assert results[3] == {"assignable": [5], "assigned": [],
+                              "conflicts": {4: 2}, "unavailable": [], "invalid": []}
+        # the check doesn't change the table
+        assert table.membership() == [1, 1, 0, 0, 0, 0, 0, 0]
+        with pytest.raises(ValueError):
+            table.check_plan({4: [1]})
+
+    def test_update(self):
+        """
+        Test the alignment of the table with the membership reported by CBF.
+        """
+        table = ReceptorAllocation(8, 2)
+        table.assign(1, [1, 2])
+        changed = table.update([1, 2, 2, 0, 0, 0, 0, 0])
+        assert receptor_ids(changed) == [2, 3]
+        assert table.membership() == [1, 2, 2, 0, 0, 0, 0, 0]
+        assert table.subarray_mask(1) == receptor_mask([1])
+        assert table.subarray_mask(2) == receptor_mask([2, 3])
+        assert table.membership_runs() == [1, 1, 1, 2, 2, 2]
+        # the out of range subarray IDs are ignored
+        assert table.update([0, 2, 2, 5, 0, 0, 0, 0]) == receptor_mask([1])
+        assert table.membership() == [0, 2, 2, 0, 0, 0, 0, 0]
+        assert table.release(1) == []
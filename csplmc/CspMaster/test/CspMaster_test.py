@@ -13,6 +13,7 @@
 import sys
 import os
 import time
+import json
 import numpy as np
 # Tango imports
 import tango
@@ -34,6 +35,7 @@ sys.path.insert(0, os.path.abspath(path))
 from CspMaster import CspMaster
 #from global_enum import HealthState, AdminMode
 from global_enum import AdminMode
+from attribute_wait import wait_for_attribute
 
 # Device test case
 @pytest.mark.usefixtures("cbf_master", "csp_master", "cbf_subarray01", "csp_subarray01")
@@ -44,22 +46,24 @@ class TestCspMaster(object):
         """Test for State after initialization """
         # reinitalize Csp Master and CbfMaster devices
         cbf_master.Init()
-        time.sleep(2)
+        wait_for_attribute(cbf_master, "State", DevState.STANDBY, timeout=5)
         csp_master.Init()
-        time.sleep(2)
+        wait_for_attribute(csp_master, "State",
+                           lambda state: state in [DevState.STANDBY, DevState.INIT,
+                                                   DevState.DISABLE], timeout=5)
         csp_state = csp_master.state()
         assert csp_state in [DevState.STANDBY, DevState.INIT, DevState.DISABLE]
 
     def test_adminMode(self, csp_master):
         """ Test the adminMode attribute w/r"""
         csp_master.adminMode = AdminMode.OFFLINE
-        time.sleep(3)
+        wait_for_attribute(csp_master, "adminMode", AdminMode.OFFLINE, timeout=5)
         assert csp_master.adminMode.value == AdminMode.OFFLINE
 
     def test_cbfAdminMode(self, csp_master):
         """ Test the CBF adminMode attribute w/r"""
         csp_master.cbfAdminMode = AdminMode.ONLINE
-        time.sleep(3)
+        wait_for_attribute(csp_master, "cbfAdminMode", AdminMode.ONLINE, timeout=5)
         assert csp_master.cbfAdminMode.value == AdminMode.ONLINE
 
     def test_pssAdminMode(self, csp_master):
@@ -166,6 +170,15 @@ class TestCspMaster(object):
         else:
             assert np.array_equal(list_of_receptors, [0])
 
+    def test_subscription_stats(self, csp_master, cbf_master):
+        """ Test the statistics of the CBF Master events subscriptions """
+        stats = json.loads(csp_master.subscriptionStats)
+        cbf_stats = stats[cbf_master.dev_name().lower()]
+        for attr_name in ["State", "healthState", "adminMode"]:
+            assert cbf_stats[attr_name]["subscribed"]
+            # the first event is received at subscription
+            assert cbf_stats[attr_name]["events"] > 0
+
     def test_available_capabilities(self, csp_master):
         """ Test the reading of availableCapabilities attribute """
         available_cap = csp_master.availableCapabilities
@@ -176,7 +189,7 @@ class TestCspMaster(object):
         # NOTE: here adminMode is OFFLINE for  the previous test. To
         # execute command on the device It has to be set to ONLINE
         csp_master.adminMode = AdminMode.ONLINE
-        time.sleep(3)
+        wait_for_attribute(csp_master, "adminMode", AdminMode.ONLINE, timeout=5)
         assert csp_master.adminMode.value == AdminMode.ONLINE
         with pytest.raises(tango.DevFailed) as df:
             argin = ["cbf", ]
@@ -189,15 +202,15 @@ class TestCspMaster(object):
         """
         #reinit CSP and CBF master devices
         cbf_master.Init()
-        time.sleep(2)
-        # sleep for a while to wait state transition
+        # wait for the state transition
+        wait_for_attribute(cbf_master, "State", DevState.STANDBY, timeout=5)
         # check CspMaster state
         csp_master.Init()
         assert csp_master.State() == DevState.STANDBY
         # issue the "On" command on CbfMaster device
         argin = ["mid_csp_cbf/sub_elt/master",]
         csp_master.On(argin)
-        time.sleep(3)
+        wait_for_attribute(csp_master, "State", DevState.ON, timeout=5)
         assert csp_master.state() == DevState.ON
 
     def test_On_invalid_state(self, csp_master, cbf_master):
@@ -208,15 +221,15 @@ class TestCspMaster(object):
         #reinit CSP and CBF master devices
         cbf_master.Init()
         csp_master.Init()
-        # sleep for a while to wait for state transitions
-        time.sleep(3)
+        # wait for the state transitions
+        wait_for_attribute(csp_master, "cspCbfState", DevState.STANDBY, timeout=5)
         assert csp_master.cspCbfState == DevState.STANDBY
         # issue the command to switch off the CbfMaster
         #argin=["",]
         argin = ["mid_csp_cbf/sub_elt/master",]
         csp_master.Off(argin)
         # wait for the state transition from STANDBY to OFF
-        time.sleep(3)
+        wait_for_attribute(csp_master, "cspCbfState", DevState.OFF, timeout=5)
         assert csp_master.cspCbfState == DevState.OFF
         # issue the command to switch on the CbfMaster device
         with pytest.raises(tango.DevFailed) as df:
@@ -229,15 +242,71 @@ class TestCspMaster(object):
         #reinit CSP and CBF master devices
         cbf_master.Init()
         #csp_master.Init()
-        # sleep for a while to wait for state transitions
-        time.sleep(3)
+        # wait for the state transitions
+        wait_for_attribute(csp_master, "State", DevState.STANDBY, timeout=5)
         csp_master.On("")
-        time.sleep(3)
+        wait_for_attribute(csp_master, "State", DevState.ON, timeout=5)
         with pytest.raises(tango.DevFailed) as df:
             argin = ["cbf", ]
             csp_master.Standby(argin)
         assert "No proxy found for device" in str(df.value)
 
+    def test_AssignReceptors_invalid_plan(self, csp_master):
+        """
+        Test the validation of an allocation plan with invalid subarray and
+        receptor IDs: no request is dispatched to the subarrays.
+        """
+        assert csp_master.State() == DevState.ON
+        result = json.loads(csp_master.AssignReceptors(json.dumps({"1": [0, 300],
+                                                                   "99": [1]})))
+        assert result["1"]["invalid"] == [0, 300]
+        assert not result["1"]["assignable"]
+        assert not result["1"]["dispatched"]
+        assert "No CspSubarray" in result["99"]["error"]
+        with pytest.raises(tango.DevFailed):
+            csp_master.AssignReceptors("not a plan")
+
+    def test_AssignBeams_ReleaseBeams(self, csp_master):
+        """
+        Test the assignment and release of the Timing Beams and the update
+        of the timingBeamMembership attribute.
+        """
+        result = json.loads(csp_master.AssignBeams(json.dumps({"subarrayID": 1,
+                                                                "beamType": "TimingBeam",
+                                                                "number": 3})))
+        assert result["beamIDs"] == [1, 2, 3]
+        result = json.loads(csp_master.AssignBeams(json.dumps({"subarrayID": 2,
+                                                                "beamType": "TimingBeam",
+                                                                "beamIDs": [3, 4]})))
+        assert result["beamIDs"] == [4]
+        assert result["conflicts"] == {"3": 1}
+        assert list(csp_master.timingBeamMembership[:5]) == [1, 1, 1, 2, 0]
+        released = csp_master.ReleaseBeams(json.dumps({"subarrayID": 1,
+                                                       "beamType": "TimingBeam",
+                                                       "number": 1}))
+        assert list(released) == [3]
+        csp_master.ReleaseBeams(json.dumps({"subarrayID": 1, "beamType": "TimingBeam"}))
+        csp_master.ReleaseBeams(json.dumps({"subarrayID": 2, "beamType": "TimingBeam"}))
+        assert not any(csp_master.timingBeamMembership)
+        with pytest.raises(tango.DevFailed):
+            csp_master.AssignBeams(json.dumps({"subarrayID": 1, "beamType": "Beam",
+                                               "number": 1}))
+
+    def test_searchBeamMembershipRLE(self, csp_master):
+        """
+        Test the run-length encoding of the Search Beams subarray membership.
+        """
+        csp_master.AssignBeams(json.dumps({"subarrayID": 1, "beamType": "SearchBeam",
+                                           "number": 300}))
+        csp_master.AssignBeams(json.dumps({"subarrayID": 2, "beamType": "SearchBeam",
+                                           "beamIDs": [301, 302]}))
+        csp_master.ReleaseBeams(json.dumps({"subarrayID": 1, "beamType": "SearchBeam",
+                                            "number": 100}))
+        assert list(csp_master.searchBeamMembershipRLE) == [1, 200, 1, 301, 2, 2]
+        csp_master.ReleaseBeams(json.dumps({"subarrayID": 1, "beamType": "SearchBeam"}))
+        csp_master.ReleaseBeams(json.dumps({"subarrayID": 2, "beamType": "SearchBeam"}))
+        assert not csp_master.searchBeamMembershipRLE
+
     def test_Standby_valid_state(self, csp_master):
         """
         Test for execution of On command when the CbfTestMaster is in the right state
@@ -246,7 +315,7 @@ class TestCspMaster(object):
         # issue the "Standby" command on CbfMaster device
         argin = ["mid_csp_cbf/sub_elt/master",]
         csp_master.Standby(argin)
-        time.sleep(3)
+        wait_for_attribute(csp_master, "State", DevState.STANDBY, timeout=5)
         assert csp_master.state() == DevState.STANDBY
 
     def test_Off_invalid_argument(self, csp_master):
@@ -264,11 +333,11 @@ class TestCspMaster(object):
         """
         cbf_master.Init()
         # csp_master.Init()
-        # sleep for a while to wait for state transitions
-        time.sleep(3)
+        # wait for the state transitions
+        wait_for_attribute(csp_master, "State", DevState.STANDBY, timeout=5)
         assert csp_master.State() == DevState.STANDBY
         csp_master.On("")
-        time.sleep(3)
+        wait_for_attribute(csp_master, "State", DevState.ON, timeout=5)
         assert csp_master.State() == DevState.ON
         # issue the command to switch off the CSP
         with pytest.raises(tango.DevFailed) as df:
@@ -282,18 +351,18 @@ class TestCspMaster(object):
         #reinit CSP and CBFTest master devices
         cbf_master.Init()
         #csp_master.Init()
-        time.sleep(2)
+        wait_for_attribute(csp_master, "State", DevState.STANDBY, timeout=5)
         assert csp_master.State() == DevState.STANDBY
         # issue the "Off" command on CbfMaster device
         csp_master.Off("")
-        time.sleep(3)
+        wait_for_attribute(csp_master, "State", DevState.OFF, timeout=5)
         assert csp_master.state() == DevState.OFF
  
     def test_reinit_csp_master(self, csp_master, cbf_master):
         """ Test CspMaster reinitialization """
         #reinit CSP and CBFTest master devices
         cbf_master.Init()
-        time.sleep(2)
+        wait_for_attribute(cbf_master, "State", DevState.STANDBY, timeout=5)
         csp_master.Init()
-        time.sleep(2)
+        wait_for_attribute(csp_master, "State", DevState.STANDBY, timeout=5)
         assert csp_master.State() == DevState.STANDBY
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the csp-lmc-prototype project
+#
+#
+#
+# Distributed under the terms of the BSD-3-Clause license.
+# See LICENSE.txt for more info.
+"""Contain the tests for the CBF topology cache of the CspMaster and CspSubarray."""
+
+# Standard imports
+import sys
+import os
+import time
+import pytest
+
+# Path
+file_path = os.path.dirname(os.path.abspath(__file__))
+# insert base package directory to import global_enum
+# module in commons folder
+commons_pkg_path = os.path.abspath(os.path.join(file_path, "../../commons"))
+sys.path.insert(0, commons_pkg_path)
+
+path = os.path.join(os.path.dirname(__file__), os.pardir)
+sys.path.insert(0, os.path.abspath(path))
+
+#Local imports
+from topology_cache import TopologyCache, topology_cache_path, TOPOLOGY_ATTRIBUTES
+
+def cached_tables(cache_file):
+    """
+    Returns:
+        The topology tables of the cache file, None if the file is missing.
+    """
+    topology = TopologyCache(cache_file).load()
+    if topology is None:
+        return None
+    return {attr_name: topology[attr_name] for attr_name in TOPOLOGY_ATTRIBUTES}
+
+def cbf_tables(cbf_master):
+    """
+    Returns:
+        The topology tables reported by the CBF Master.
+    """
+    return {attr_name: list(cbf_master.read_attribute(attr_name).value)
+            for attr_name in TOPOLOGY_ATTRIBUTES}
+
+def wait_for_cache(cache_file, expected, timeout):
+    """
+    Wait for the cache file to hold the expected topology tables.
+
+    Returns:
+        True if the tables have been written within *timeout* sec.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if cached_tables(cache_file) == expected:
+            return True
+        time.sleep(0.1)
+    return False
+
+@pytest.fixture(scope="class")
+def cached_csp(tmp_path_factory):
+    """Run the CspMaster, the CspSubarray and the CBF simulators with the
+       CBF topology cache enabled.
+    """
+    try:
+        from sim_context import SimulatedCspContext
+    except ImportError:
+        # MultiDeviceTestContext requires PyTango >= 9.3.3
+        pytest.skip("MultiDeviceTestContext not available")
+    cache_dir = str(tmp_path_factory.mktemp("topology"))
+    with SimulatedCspContext(num_of_subarrays=1,
+                             csp_properties={"TopologyCacheDir": cache_dir}) as context:
+        context.cache_file = topology_cache_path(cache_dir, context.csp_master.dev_name())
+        yield context
+
+@pytest.mark.usefixtures("cached_csp")
+
+class TestTopologyCache(object):
+
+    def test_cache_written(self, cached_csp):
+        """
+        Test that the CspMaster writes the topology read from CBF into the
+        cache file.
+        """
+        assert wait_for_cache(cached_csp.cache_file, cbf_tables(cached_csp.cbf_master),
+                              timeout=5)
+        assert not [name for name in os.listdir(os.path.dirname(cached_csp.cache_file))
+                    if name.endswith(".tmp")]
+
+    def test_init_from_cache(self, cached_csp):
+        """
+        Test that the devices come up from the cache file at the next
+        initialization: the topology reported by CBF is unchanged, so the
+        file is not rewritten.
+        """
+        cache_file = cached_csp.cache_file
+        expected = cbf_tables(cached_csp.cbf_master)
+        assert wait_for_cache(cache_file, expected, timeout=5)
+        stat = os.stat(cache_file)
+        # a device not finding the cache reads CBF and writes a new file
+        # inside init_device, before Init() returns
+        cached_csp.csp_master.Init()
+        cached_csp.csp_subarrays[0].Init()
+        assert os.stat(cache_file).st_mtime_ns == stat.st_mtime_ns
+        assert os.stat(cache_file).st_ino == stat.st_ino
+        assert cached_tables(cache_file) == expected
+
+    def test_changed_topology(self, cached_csp):
+        """
+        Test that the cache file is rewritten when CBF reports a topology
+        different from the cached one.
+        """
+        cache_file = cached_csp.cache_file
+        expected = cbf_tables(cached_csp.cbf_master)
+        topology = TopologyCache(cache_file).load()
+        # the cached receptors are connected to the VCCs in the reversed order
+        vcc_ids = [pair.split(":")[0] for pair in topology["vccToReceptor"]]
+        receptor_ids = [pair.split(":")[1] for pair in topology["vccToReceptor"]]
+        stale_map = list(zip(vcc_ids, reversed(receptor_ids)))
+        topology["vccToReceptor"] = ["{}:{}".format(vcc_id, receptor_id)
+                                     for vcc_id, receptor_id in stale_map]
+        topology["receptorToVcc"] = ["{}:{}".format(receptor_id, vcc_id)
+                                     for vcc_id, receptor_id in stale_map]
+        assert TopologyCache(cache_file).save(topology)
+        assert cached_tables(cache_file) != expected
+        cached_csp.csp_master.Init()
+        assert wait_for_cache(cache_file, expected, timeout=5)
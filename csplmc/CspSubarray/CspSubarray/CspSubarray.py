@@ -20,7 +20,9 @@ control and monitoring of the subarray.
 from __future__ import absolute_import
 import sys
 import os
-from future.utils import with_metaclass
+import functools
+import threading
+import time
 from collections import defaultdict
 # PROTECTED REGION END# //CspMaster.standardlibray_import
 
@@ -37,16 +39,31 @@ import json
 # PROTECTED REGION END #    //  CspMaster.additionnal_import
 
 # PROTECTED REGION ID (CspSubarray.add_path) ENABLED START #
-# add the path to import global_enum package.
-file_path = os.path.dirname(os.path.abspath(__file__))
-commons_pkg_path = os.path.abspath(os.path.join(file_path, "../../commons"))
-sys.path.insert(0, commons_pkg_path)
-from global_enum import HealthState, AdminMode, ObsState, ObsMode
+# The csplmc package is imported from the installed distribution or, when
+# the device runs from the source tree, from the repository root.
+try:
+    import csplmc
+except ImportError:
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                    "../../..")))
+from csplmc.commons.global_enum import HealthState, AdminMode, ObsState, ObsMode
+from csplmc.commons.receptor_allocation import receptor_mask, receptor_ids
+from csplmc.commons.delay_model import parse_delay_models
+from csplmc.commons.latency import LatencyStats
+from csplmc.commons.dispatch_scheduler import DispatchScheduler
+from csplmc.commons.scan_configuration import StagedConfigurations, encoded_key
+from csplmc.commons.encoded_configuration import decode_configuration
+from csplmc.commons.state_journal import StateJournal, journal_path
+from csplmc.commons.scm_history import ScmHistory
+from csplmc.commons.subscriptions import SubscriptionManager
+from csplmc.commons.topology_cache import (TopologyCache, topology_cache_path,
+                                           read_cbf_topology, id_map, capabilities)
+import csplmc.commons
 # PROTECTED REGION END# //CspSubarray.add_path
 
 __all__ = ["CspSubarray", "main"]
 
-class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
+class CspSubarray(SKASubarray, metaclass=DeviceMeta):
     """
     CSP subarray functionality is modeled via a TANGO Device Class, named *CspSubarray*.
     This class exports a set of attributes and methods required for configuration,
@@ -90,12 +107,22 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
                 if not evt.err:
                     msg = "Device {} is processing command {}".format(evt.device,
                                                                       evt.cmd_name)
-                    # TODO:
                     # update the valid_scan_configuration attribute. If the command
                     # is running the configuration has been validated
-                    # if cmd == "ConfigureScan":
-                    # .......
+                    if evt.cmd_name == "ConfigureScan":
+                        self._valid_scan_configuration = self._pending_scan_configuration
+                        self.__journal_state({"scanID": self._scan_ID,
+                                              "validScanConfiguration":
+                                              self._valid_scan_configuration})
+                        # the delay model is subscribed here and not by the command:
+                        # TM would deadlock if subscribed while it waits for the
+                        # command end
+                        self.__subscribe_delay_model(self._pending_delay_model_point)
+                    elif evt.cmd_name == "EndSB":
+                        self.__subscribe_delay_model('')
                     self.dev_logging(msg, tango.LogLevel.LOG_INFO)
+                    if evt.cmd_name in ["AddReceptors", "RemoveReceptors", "RemoveAllReceptors"]:
+                        self.__end_resourcing(evt.device)
                 else:
                     msg = "Error in executing command {} ended on device {}.\n".format(evt.cmd_name,
                                                                                        evt.device)
@@ -103,6 +130,8 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
                     self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
                     # obsState and obsMode values take on the CbfSubarray's values via
                     # the subscribe/publish mechanism
+                    if evt.cmd_name in ["AddReceptors", "RemoveReceptors", "RemoveAllReceptors"]:
+                        self.__end_resourcing(evt.device)
             else:
                 self.dev_logging("cmd_ended callback: evt is empty!!",
                                  tango.LogLevel.LOG_ERRO)
@@ -159,6 +188,7 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
                     self.__set_subarray_state()
                 if evt.attr_value.name.lower() == "obsstate":
                     self.__set_subarray_obs_state()
+                self.__push_se_change_event(dev_name, evt.attr_value.name.lower())
             else:
                 for item in evt.errors:
                     # TODO:handle API_EventTimeout
@@ -171,6 +201,67 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         except tango.DevFailed as df:
             self.dev_logging(str(df.args[0].desc), tango.LogLevel.LOG_ERR)
 
+    def __receptors_change_callback(self, evt):
+        """
+        *Class private method.*
+
+        Retrieve the list of the receptors assigned to the CbfSubarray and\
+        update the progress of the running AddReceptors/RemoveReceptors/\
+        RemoveAllReceptors command.
+
+        Args:
+            evt: The event data
+
+        Returns:
+            None
+        """
+        if evt.err:
+            for item in evt.errors:
+                log_msg = "{}: on attribute {}".format(item.reason, str(evt.attr_name))
+                self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
+            return
+        # the value of an empty array is None
+        receptors = evt.attr_value.value
+        assigned = receptor_mask(receptors if receptors is not None else [])
+        self.__set_cbf_receptors(assigned)
+        self.__update_resourcing(assigned)
+
+    def __delay_model_callback(self, evt):
+        """
+        *Class private method.*
+
+        Decode the delay models published by TM and deliver to the VCC of each\
+        assigned receptor its own delay details. The delivery latency is\
+        measured from the TM attribute timestamp.
+
+        Args:
+            evt: The event data
+
+        Returns:
+            None
+        """
+        if evt.err:
+            for item in evt.errors:
+                log_msg = "{}: on attribute {}".format(item.reason, str(evt.attr_name))
+                self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
+            return
+        value = evt.attr_value.value
+        # TM re-publishes the same model when the attribute is polled
+        if not value or value == self._last_delay_model:
+            return
+        self._last_delay_model = value
+        publish_time = evt.attr_value.time.totime()
+        try:
+            models = parse_delay_models(value)
+        except ValueError as err:
+            self._delay_model_counters["errors"] += 1
+            self.dev_logging(str(err), tango.LogLevel.LOG_ERROR)
+            return
+        self._delay_model_parse_latency.record(time.time() - publish_time)
+        for model in models:
+            self._delay_model_counters["models"] += 1
+            self.__deliver_delay_model(model, publish_time)
+
     #
     # Class private methods
     #
@@ -194,8 +285,6 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         subarrays_fqdn.append(self._cbf_subarray_fqdn)
         subarrays_fqdn.append(self._pss_subarray_fqdn)
         for fqdn in subarrays_fqdn:
-            # initialize the list for each dictionary key-name
-            self._se_subarray_event_id[fqdn] = []
             try:
                 log_msg = "Trying connection to {} device".format(str(fqdn))
                 self.dev_logging(log_msg, int(tango.LogLevel.LOG_INFO))
@@ -207,30 +296,9 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
                 # store the Sub-elements subarray proxies
                 self._se_subarrays_proxies[fqdn] = device_proxy
 
-                # Subscription of the Sub-element subarray SCM states
-                ev_id = device_proxy.subscribe_event("State",
-                                                     EventType.CHANGE_EVENT,
-                                                     self.__scm_change_callback,
-                                                     stateless=True)
-                self._se_subarray_event_id[fqdn].append(ev_id)
-
-                ev_id = device_proxy.subscribe_event("healthState",
-                                                     EventType.CHANGE_EVENT,
-                                                     self.__scm_change_callback,
-                                                     stateless=True)
-                self._se_subarray_event_id[fqdn].append(ev_id)
-
-                ev_id = device_proxy.subscribe_event("obsState",
-                                                     EventType.CHANGE_EVENT,
-                                                     self.__scm_change_callback,
-                                                     stateless=True)
-                self._se_subarray_event_id[fqdn].append(ev_id)
-
-                ev_id = device_proxy.subscribe_event("adminMode",
-                                                     EventType.CHANGE_EVENT,
-                                                     self.__scm_change_callback,
-                                                     stateless=True)
-                self._se_subarray_event_id[fqdn].append(ev_id)
+                # Subscription of the Sub-element subarray SCM states (the failures
+                # are logged by the subscription manager)
+                self.__subscribe_subarray_events(device_proxy)
             except tango.DevFailed as df:
                 for item in df.args:
                     if "DB_DeviceNotDefined" in item.reason:
@@ -242,6 +310,26 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
                                              "Connect to subarrays",
                                              tango.ErrSeverity.ERR)
 
+    def __subscribe_subarray_events(self, proxy):
+        """
+        *Class private method.*
+
+        Subscribe the SCM attributes of a sub-element subarray and, for the\
+        CbfSubarray, the list of the assigned receptors. The failures are\
+        logged by the subscription manager.
+
+        Args:
+            proxy: the DeviceProxy of the sub-element subarray
+        Returns:
+            None
+        """
+        self._subscriptions.subscribe(proxy,
+                                      ["State", "healthState", "obsState", "adminMode"],
+                                      self.__scm_change_callback)
+        if proxy.dev_name() == self._cbf_subarray_fqdn:
+            self._subscriptions.subscribe(proxy, ["receptors"],
+                                          self.__receptors_change_callback)
+
     def __connect_to_master(self):
         """
         *Class private method.*
@@ -268,20 +356,20 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
             self._csp_capabilities = cspMasterProxy.maxCapabilities
             # try connection to CbfMaster to get information about the number of
             # capabilities and the receptor/vcc mapping
-            if cspMasterProxy.cbfAdminMode in [AdminMode.ONLINE, AdminMode.MAINTENANCE]:
+            # (already known if loaded from the topology cache)
+            if (not self._receptor_id_list and
+                    cspMasterProxy.cbfAdminMode in [AdminMode.ONLINE, AdminMode.MAINTENANCE]):
                 self._cbfAddress = cspMasterProxy.cbfMasterAddress
                 self._cbfMasterProxy = tango.DeviceProxy(self._cbfAddress)
                 self._cbfMasterProxy.ping()
-                cbf_capabilities = self._cbfMasterProxy.maxCapabilities
-                # build the list of receptor ids
-                receptor_to_vcc = self._cbfMasterProxy.receptorToVcc
-                self._receptor_to_vcc_map = dict([int(ID) for ID in pair.split(":")]
-                                                 for pair in receptor_to_vcc)
-                # build the list of the installed receptors
-                self._receptor_id_list = list(self._receptor_to_vcc_map.keys())
-                for _, cap_string in enumerate(cbf_capabilities):
-                    cap_type, cap_num = cap_string.split(':')
-                    self._cbf_capabilities[cap_type] = int(cap_num)
+                topology = read_cbf_topology(self._cbfMasterProxy)
+                self.__set_cbf_topology(topology)
+                if self._topology_cache is not None:
+                    try:
+                        self._topology_cache.save(topology)
+                    except OSError as os_err:
+                        msg = "Can't write the CBF topology cache: {}".format(str(os_err))
+                        self.dev_logging(msg, tango.LogLevel.LOG_WARN)
             # try connection to PssMaster
             # Do we need to connect to PssMaster?
             # All SearchBeams information should be available via the CspMaster
@@ -308,6 +396,102 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
                                          "connect_to_master",
                                          tango.ErrSeverity.ERR)
 
+    def __load_cbf_topology(self):
+        """
+        *Class private method.*
+
+        Load the CBF topology (CBF Master address, receptor/VCC mapping and\
+        CBF capabilities) from the cache shared with the CspMaster and start\
+        its validation against the CBF Master in background.
+
+        Returns:
+            None
+        """
+        self._topology_cache = TopologyCache(topology_cache_path(self.TopologyCacheDir,
+                                                                 self.CspMaster))
+        topology = self._topology_cache.load()
+        if not topology:
+            return
+        try:
+            self.__set_cbf_topology(topology)
+        except (KeyError, ValueError) as err:
+            msg = "Invalid CBF topology cache: {}".format(str(err))
+            self.dev_logging(msg, tango.LogLevel.LOG_WARN)
+            return
+        msg = "CBF topology loaded from {}".format(self._topology_cache.path)
+        self.dev_logging(msg, tango.LogLevel.LOG_INFO)
+        self._topology_cache.refresh(self.__read_cbf_topology, self.__update_cbf_topology,
+                                     self.__cbf_topology_error)
+
+    def __read_cbf_topology(self):
+        """
+        *Class private method.*
+
+        Read the CBF topology from the CBF Master.
+
+        Returns:
+            The topology dictionary (see commons/topology_cache.py).
+        Raises:
+            tango.DevFailed: if the CBF Master is not reachable.
+        """
+        self._cbfMasterProxy = tango.DeviceProxy(self._cbfAddress)
+        self._cbfMasterProxy.ping()
+        return read_cbf_topology(self._cbfMasterProxy)
+
+    def __set_cbf_topology(self, topology):
+        """
+        *Class private method.*
+
+        Set the CBF Master address, the receptor/VCC mapping, the list of the\
+        installed receptors and the CBF capabilities.
+
+        Args:
+            topology: the topology dictionary (see commons/topology_cache.py).
+        Returns:
+            None
+        """
+        receptor_to_vcc_map = id_map(topology["receptorToVcc"])
+        self._cbf_capabilities = capabilities(topology)
+        self._cbfAddress = topology["cbfMasterAddress"]
+        self._receptor_to_vcc_map = receptor_to_vcc_map
+        self._receptor_id_list = list(receptor_to_vcc_map.keys())
+        # the VCCs of the assigned receptors are mapped again
+        self.__set_cbf_receptors(self._cbf_receptors, rebuild=True)
+
+    def __update_cbf_topology(self, topology):
+        """
+        *Class private method.*
+
+        Called by the topology cache when the CBF Master reports a topology\
+        different from the cached one.
+
+        Args:
+            topology: the topology dictionary (see commons/topology_cache.py).
+        Returns:
+            None
+        """
+        try:
+            self.__set_cbf_topology(topology)
+        except (KeyError, ValueError) as err:
+            msg = "Invalid CBF topology: {}".format(str(err))
+            self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+            return
+        self.dev_logging("CBF topology changed: cache updated", tango.LogLevel.LOG_WARN)
+
+    def __cbf_topology_error(self, err):
+        """
+        *Class private method.*
+
+        Log the failures of the CBF topology validation.
+
+        Args:
+            err: the exception raised reading the CBF topology.
+        Returns:
+            None
+        """
+        msg = "CBF topology validation failure: {}".format(str(err))
+        self.dev_logging(msg, tango.LogLevel.LOG_WARN)
+
     def __is_subarray_available(self, subarray_name):
         """
         *Class private method.*
@@ -331,6 +515,10 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
             proxy = tango.DeviceProxy(subarray_name)
             proxy.ping()
             self._se_subarrays_proxies[subarray_name] = proxy
+            if subarray_name not in self._se_subarrays_fqdn:
+                self._se_subarrays_fqdn.append(subarray_name)
+            # subscribe the sub-element subarray attributes with the new proxy
+            self.__subscribe_subarray_events(proxy)
         except tango.DevFailed:
             return False
         return True
@@ -339,46 +527,872 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         """
         *Class private method*
 
-        Set the subarray State and healthState.
+        Set the subarray State and healthState.
+        Args:
+            None
+        Returns:
+            None
+        """
+        self.set_state(self._se_subarray_state[self._cbf_subarray_fqdn])
+        self._health_state = HealthState.DEGRADED
+        if ((self._se_subarray_healthstate[self._cbf_subarray_fqdn] == HealthState.FAILED) or \
+            (self._se_subarray_state[self._cbf_subarray_fqdn] == tango.DevState.FAULT)):
+            self._health_state = HealthState.FAILED
+            self.set_state(tango.DevState.FAULT)
+        if len(self._se_subarray_healthstate) == 3 and \
+                list(self._se_subarray_healthstate.values()) == [HealthState.OK,
+                                                                 HealthState.OK,
+                                                                 HealthState.OK]:
+            self._health_state = HealthState.OK
+        self._scm_history.record(self.get_name(), "State", self.get_state())
+        self._scm_history.record(self.get_name(), "healthState", self._health_state)
+        self.push_change_event("State")
+        self.push_change_event("healthState", self._health_state)
+
+    def __set_subarray_obs_state(self):
+        """
+        *Class private method*
+
+        Set the subarray obsState attribute value. It works only for IMAGING.
+        Args:
+            None
+        Returns:
+            None
+        """
+        # NOTE: when ObsMode value is set, it should be considered to set the final
+        # sub-array ObsState value
+        cbf_sub_obstate = self._se_subarray_obsstate[self._cbf_subarray_fqdn]
+        # next line currently not used
+        # pss_sub_obstate = self._se_subarray_obsstate[self._pss_subarray_fqdn]
+        # TODO: how implement ObsState for PST?
+ 
+        # Next lines are valid only for IMAGING mode!!
+        self._obs_state = cbf_sub_obstate
+        if cbf_sub_obstate == ObsState.IDLE:
+            self._obs_mode = ObsMode.IDLE
+        self._scm_history.record(self.get_name(), "obsState", self._obs_state)
+        self.push_change_event("obsState", self._obs_state)
+        self.push_change_event("obsMode", self._obs_mode)
+        # TODO:ObsMode could be defined as a mask because we can have more
+        # than one obs_mode active for a sub-array
+
+    def __push_se_change_event(self, dev_name, attr_name):
+        """
+        *Class private method*
+
+        Push the change event of the attribute reporting the SCM value of a\
+        sub-element subarray and record the transition in the SCM history.
+        Args:
+            dev_name: the sub-element subarray FQDN
+            attr_name: the sub-element subarray attribute name (lower case)
+        Returns:
+            None
+        """
+        se_values = {"state": self._se_subarray_state,
+                     "healthstate": self._se_subarray_healthstate,
+                     "adminmode": self._se_subarray_adminmode,
+                     "obsstate": self._se_subarray_obsstate}
+        if attr_name in se_values:
+            self._scm_history.record(dev_name, attr_name, se_values[attr_name][dev_name])
+        if dev_name == self._cbf_subarray_fqdn:
+            prefix = "cbfSubarray"
+        elif dev_name == self._pss_subarray_fqdn:
+            prefix = "pssSubarray"
+        else:
+            return
+        if attr_name == "state":
+            self.push_change_event(prefix + "State", self._se_subarray_state[dev_name])
+        elif attr_name == "healthstate":
+            self.push_change_event(prefix + "HealthState",
+                                   self._se_subarray_healthstate[dev_name])
+        elif attr_name == "obsstate":
+            self.push_change_event(prefix + "ObsState", self._se_subarray_obsstate[dev_name])
+
+    def __open_journal(self):
+        """
+        *Class private method*
+
+        Open the state journal of the device and restore the scan ID and the
+        scan configuration saved before the last restart.
+        Returns:
+            None
+        """
+        try:
+            self._journal = StateJournal(journal_path(self.JournalDir, self.get_name()))
+            state = self._journal.replay()
+        except (OSError, ValueError) as err:
+            log_msg = "Can't open the state journal: {}".format(str(err))
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+            self._journal = None
+            return
+        if "scanID" in state:
+            self._scan_ID = state["scanID"]
+        if "validScanConfiguration" in state:
+            self._valid_scan_configuration = state["validScanConfiguration"]
+        log_msg = "Scan state restored from {}".format(self._journal.path)
+        self.dev_logging(log_msg, tango.LogLevel.LOG_INFO)
+
+    def __journal_state(self, changes):
+        """
+        *Class private method*
+
+        Record the changed state entries in the state journal (if enabled).
+        Args:
+            changes: dictionary {state entry: value}
+        Returns:
+            None
+        """
+        if self._journal is None:
+            return
+        try:
+            self._journal.append(changes)
+        except (OSError, ValueError) as err:
+            log_msg = "Can't write the state journal: {}".format(str(err))
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+
+    def __get_assigned_receptors(self, proxy):
+        """
+        *Class private method*
+
+        Return the bitmap of the receptors assigned to the CbfSubarray. The
+        value is maintained by the receptors change events: the CbfSubarray is
+        read only if no event has been received yet.
+        Args:
+            proxy: the DeviceProxy of the CbfSubarray
+        Returns:
+            The bitmap of the assigned receptors.
+        Raises:
+            tango.DevFailed: if the CbfSubarray can't be read.
+        """
+        with self._resourcing_lock:
+            if self._cbf_receptors is not None:
+                return self._cbf_receptors
+        #!!!!!!!!!!!!!!!!!
+        # 2019-09-20:  New images for TANGO and PyTango images has been released. PyTango
+        # is now compiled with th numpy support. In this case the proxy.receptors call
+        # does no more return an empty tuple but an empty numpy array.
+        # NB: the receptors attribute implemented by the CbfSubarray is declared as RW.
+        # In this case the read method returns an empty numpy array ([]) whose length is 0.
+        #!!!!!!!!!!!!!!!!!
+        receptors = proxy.receptors
+        return receptor_mask(receptors if receptors is not None else [])
+
+    def __check_resourcing(self, cmd_name):
+        """
+        *Class private method*
+
+        Check that no resourcing command is running.
+        Args:
+            cmd_name: the name of the requested command
+        Returns:
+            None
+        Raises:
+            tango.DevFailed: if a resourcing command is running.
+        """
+        with self._resourcing_lock:
+            if self._resourcing is None:
+                return
+            log_msg = "{} not allowed while {} is running".format(cmd_name,
+                                                                self._resourcing["command"])
+        tango.Except.throw_exception("Command failed",
+                                     log_msg,
+                                     cmd_name,
+                                     tango.ErrSeverity.ERR)
+
+    def __start_resourcing(self, cmd_name, current, target):
+        """
+        *Class private method*
+
+        Start tracking a resourcing command: the command progress is computed
+        from the receptors change events of the CbfSubarray until the assigned
+        receptors match the target ones.
+        Args:
+            cmd_name: the command name
+            current: the bitmap of the receptors assigned at the command start
+            target: the bitmap of the receptors assigned at the command end
+        Returns:
+            None
+        """
+        with self._resourcing_lock:
+            self._resourcing = {"command": cmd_name,
+                                "target": target,
+                                "changing": current ^ target}
+            self._resourcing_progress = 0
+        self.push_change_event("resourcingProgress", 0)
+
+    def __cancel_resourcing(self):
+        """
+        *Class private method*
+
+        Stop tracking the resourcing command (the command has not been\
+        forwarded to the CbfSubarray).
+        Returns:
+            None
+        """
+        with self._resourcing_lock:
+            self._resourcing = None
+
+    @staticmethod
+    def __resourcing_progress(resourcing, assigned):
+        """
+        *Class private method*
+
+        Returns:
+            The percentage of the receptors to add/remove whose assignment\
+            matches the target one.
+        """
+        changing = resourcing["changing"]
+        done = changing & ~(assigned ^ resourcing["target"])
+        return 100 * bin(done).count("1") // max(bin(changing).count("1"), 1)
+
+    def __set_cbf_receptors(self, assigned, rebuild=False):
+        """
+        *Class private method*
+
+        Store the bitmap of the receptors assigned to the CbfSubarray and
+        update the list of the assigned VCCs: only the VCCs of the added and
+        removed receptors are mapped. The change event of the vcc attribute
+        is pushed if the list changes.
+        Args:
+            assigned: the bitmap of the assigned receptors (None if unknown)
+            rebuild: map all the assigned receptors (the receptor/VCC map\
+                     has changed)
+        Returns:
+            None
+        """
+        unmapped = []
+        with self._resourcing_lock:
+            previous = 0 if rebuild else self._cbf_receptors or 0
+            if not rebuild:
+                self._cbf_receptors = assigned
+            assigned = assigned or 0
+            vcc_mask = 0 if rebuild else self._vcc_mask
+            # the bitmaps of the VCCs to add and to remove
+            to_add = to_remove = 0
+            for receptor_id in receptor_ids(assigned ^ previous):
+                vcc_id = self._receptor_to_vcc_map.get(receptor_id)
+                if vcc_id is None:
+                    unmapped.append(receptor_id)
+                elif assigned >> (receptor_id - 1) & 1:
+                    to_add |= 1 << (vcc_id - 1)
+                else:
+                    to_remove |= 1 << (vcc_id - 1)
+            vcc_mask = (vcc_mask & ~to_remove) | to_add
+            changed = vcc_mask != self._vcc_mask
+            self._vcc_mask = vcc_mask
+            # the VCC IDs are encoded as the receptor IDs: bit (id - 1)
+            self._vcc = receptor_ids(vcc_mask)
+            vcc = self._vcc
+        if unmapped and self._receptor_to_vcc_map:
+            log_msg = "No VCC mapped to receptors {}".format(unmapped)
+            self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
+        if changed:
+            self.push_change_event("vcc", vcc)
+
+    def __update_resourcing(self, assigned):
+        """
+        *Class private method*
+
+        Update the progress of the running resourcing command. The change
+        event of the assignedReceptors attribute is pushed when the command
+        is completed.
+        Args:
+            assigned: the bitmap of the assigned receptors
+        Returns:
+            None
+        """
+        with self._resourcing_lock:
+            if self._resourcing is None:
+                return
+            progress = self.__resourcing_progress(self._resourcing, assigned)
+            completed = assigned == self._resourcing["target"]
+            if completed:
+                self._resourcing = None
+            elif progress == self._resourcing_progress:
+                return
+            self._resourcing_progress = progress
+        self.push_change_event("resourcingProgress", progress)
+        if completed:
+            self.__confirm_receptors(assigned)
+
+    def __end_resourcing(self, proxy):
+        """
+        *Class private method*
+
+        Complete the running resourcing command when the CbfSubarray command
+        returns. If the receptors change events have not reported the final
+        assignment (command failed or events not pushed), the assigned
+        receptors are read from the CbfSubarray and confirmed as they are.
+        Args:
+            proxy: the DeviceProxy of the CbfSubarray
+        Returns:
+            None
+        """
+        with self._resourcing_lock:
+            resourcing = self._resourcing
+            if resourcing is None:
+                return
+            self._resourcing = None
+        try:
+            receptors = proxy.receptors
+            assigned = receptor_mask(receptors if receptors is not None else [])
+        except tango.DevFailed as df:
+            log_msg = "Can't read the CbfSubarray receptors: {}".format(df.args[0].desc)
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+            assigned = self._cbf_receptors or 0
+        self.__set_cbf_receptors(assigned)
+        progress = self.__resourcing_progress(resourcing, assigned)
+        with self._resourcing_lock:
+            self._resourcing_progress = progress
+        self.push_change_event("resourcingProgress", progress)
+        self.__confirm_receptors(assigned)
+
+    def __confirm_receptors(self, assigned):
+        """
+        *Class private method*
+
+        Publish the receptors assigned at the end of a resourcing command
+        (one change event of the assignedReceptors attribute).
+        Args:
+            assigned: the bitmap of the assigned receptors
+        Returns:
+            None
+        """
+        self._assigned_receptors = receptor_ids(assigned)
+        self.push_change_event("assignedReceptors", self._assigned_receptors)
+        log_msg = "Receptors assigned to subarray {}: {}".format(self._subarray_id,
+                                                                 self._assigned_receptors)
+        self.dev_logging(log_msg, tango.LogLevel.LOG_INFO)
+
+    def __subscribe_delay_model(self, subscription_point):
+        """
+        *Class private method*
+
+        Subscribe the delay model attribute of the scan configuration,\
+        replacing the previous subscription.
+        Args:
+            subscription_point: the FQDN of the TM attribute publishing the delay\
+                                models (empty to unsubscribe)
+        Returns:
+            None
+        """
+        if subscription_point == self._delay_model_point:
+            return
+        if self._delay_model_point:
+            self._subscriptions.unsubscribe(self._delay_model_point.rsplit("/", 1)[0])
+        self._delay_model_point = ''
+        self._last_delay_model = None
+        if not subscription_point:
+            return
+        device_name, attr_name = subscription_point.rsplit("/", 1)
+        try:
+            proxy = tango.DeviceProxy(device_name)
+        except tango.DevFailed as df:
+            log_msg = "Can't subscribe the delay model {}: {}".format(subscription_point,
+                                                                     df.args[0].desc)
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+            return
+        self._delay_model_point = subscription_point
+        # the failures are logged (and the subscription retried) by the
+        # subscription manager
+        self._subscriptions.subscribe(proxy, [attr_name], self.__delay_model_callback)
+
+    def __get_vcc_proxy(self, vcc_id):
+        """
+        *Class private method*
+
+        Args:
+            vcc_id: the VCC ID
+        Returns:
+            The DeviceProxy of the VCC (created at first use).
+        Raises:
+            tango.DevFailed: if the VCC device is not defined.
+        """
+        proxy = self._vcc_proxies.get(vcc_id)
+        if proxy is None:
+            proxy = tango.DeviceProxy("{}{:03d}".format(self.VccPrefix, vcc_id))
+            self._vcc_proxies[vcc_id] = proxy
+        return proxy
+
+    def __deliver_delay_model(self, model, publish_time):
+        """
+        *Class private method*
+
+        Send asynchronously to the VCC of each receptor assigned to the\
+        subarray the delay details of the receptor. The models of the\
+        receptors not assigned are discarded.
+        Args:
+            model: the decoded delay model (see commons/delay_model.py)
+            publish_time: the timestamp of the TM attribute
+        Returns:
+            None
+        """
+        def delivered(evt):
+            if evt.err:
+                self._delay_model_counters["errors"] += 1
+                log_msg = "UpdateDelayModel failure on {}: {}".format(evt.device,
+                                                                       evt.errors[0].desc)
+                self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+            else:
+                self._delay_model_delivery_latency.record(time.time() - publish_time)
+
+        assigned = self._cbf_receptors or 0
+        for receptor_id in model.receptor_ids():
+            vcc_id = self._receptor_to_vcc_map.get(receptor_id)
+            if not assigned >> (receptor_id - 1) & 1 or vcc_id is None:
+                self._delay_model_counters["discarded"] += 1
+                continue
+            try:
+                self.__get_vcc_proxy(vcc_id).command_inout_asynch(
+                    "UpdateDelayModel", model.receptor_json(receptor_id), delivered)
+            except tango.DevFailed as df:
+                self._delay_model_counters["errors"] += 1
+                log_msg = "Can't deliver the delay model to VCC {}: {}".format(
+                    vcc_id, df.args[0].desc)
+                self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+
+    def __check_configure_scan(self, cmd_name):
+        """
+        *Class private method*
+
+        Check that the subarray can be configured.
+        Args:
+            cmd_name: the name of the command
+        Returns:
+            None
+        Raises:
+            tango.DevFailed: if the scan can't be configured.
+        """
+        # TODO: add check for adminMode.  The subarray is able to perform configuration only
+        # if its adminMode is ONLINE/MAINTENANCE,
+        #
+        # check obs_state: the subarray can be configured only when the obs_state is
+        # IDLE or READY (re-configuration)
+
+        if self._obs_state not in [ObsState.IDLE, ObsState.READY]:
+            log_msg = ("Subarray is in {} state, not IDLE or"
+                       " READY".format(ObsState(self._obs_state).name))
+            tango.Except.throw_exception("Command failed",
+                                         log_msg,
+                                         cmd_name,
+                                         tango.ErrSeverity.ERR)
+        # the scan can't be configured while the receptors are assigned/released
+        self.__check_resourcing(cmd_name)
+        self.__check_scan_scheduled(cmd_name)
+        # check connection with CbfSubarray
+        if not self.__is_subarray_available(self._cbf_subarray_fqdn):
+            log_msg = "Subarray {} not registered!".format(str(self._cbf_subarray_fqdn))
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+            tango.Except.throw_exception("Command failed",
+                                         log_msg,
+                                         cmd_name + " execution",
+                                         tango.ErrSeverity.ERR)
+
+    def __forward_scan_configuration(self, staged, cmd_name):
+        """
+        *Class private method*
+
+        Apply a validated scan configuration: the configuration is forwarded\
+        to the CbfSubarray and applied at the command end (see __cmd_ended).
+        Args:
+            staged: the StagedConfiguration entry
+            cmd_name: the name of the command
+        Returns:
+            None
+        Raises:
+            tango.DevFailed: if the configuration can't be forwarded.
+        """
+        self._scan_ID = staged.scan_id
+        # The delay models are subscribed by the subarray and delivered to the
+        # VCCs of its receptors: the subscription point is not forwarded.
+        self._pending_delay_model_point = staged.delay_model_point
+        # Forward the ConfigureScan command to CbfSubarray.
+        try:
+            proxy = self._se_subarrays_proxies[self._cbf_subarray_fqdn]
+            proxy.ping()
+            # self._obs_state = ObsState.CONFIGURING.value
+            # use asynchrnous model
+            # in this case the obsMode and the valid scan configuraiton are set
+            # at command end
+            self._pending_scan_configuration = staged.text
+            proxy.command_inout_asynch("ConfigureScan", staged.cbf_configuration,
+                                       self.__cmd_ended)
+            #self._valid_scan_configuration = argin
+        except tango.DevFailed as df:
+            log_msg = ''
+            for item in df.args:
+                log_msg += item.reason + " " + item.desc
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+            tango.Except.re_throw_exception(df,
+                                            "Command failed",
+                                            "CspSubarray {} command failed".format(cmd_name),
+                                            "Command()",
+                                            tango.ErrSeverity.ERR)
+
+    def __validate_scan_configuration(self, argin, cmd_name, argin_dict=None):
+        """
+        *Class private method*
+
+        Note:
+            Part of this code (the input string parsing) comes from the CBF project\
+            developed by J.Jjang (NRC-Canada)
+
+        Parse and validate a scan configuration and stage it (see\
+        commons/scan_configuration.py).
+        Args:
+            argin: the JSON-encoded scan configuration
+            cmd_name: the name of the command
+            argin_dict: the configuration already decoded (ConfigureScanEncoded):\
+                        in this case argin is only the key of the staged entry.
+        Returns:
+            The StagedConfiguration entry.
+        Raises:
+            tango.DevFailed: if the configuration is not valid.
+        """
+        # the dictionary with the scan configuration
+        if argin_dict is None:
+            argin_dict = {}
+            try:
+                # for test purpose we load the json configuration from an
+                # external file.
+                # TO REMOVE!!
+                if "load" in argin:
+                    # skip the 'load' chars and remove spaces from the filename
+                    fn = (argin[4:]).strip()
+                    filename = os.path.join(os.path.dirname(csplmc.commons.__file__), fn)
+                    with open(filename) as json_file:
+                        # load the file into a dictionary
+                        argin_dict = json.load(json_file)
+                        # dump the dictionary into the input string to forward
+                        # to CbfSubarray
+                        argin = json.dumps(argin_dict)
+                else:
+                    argin_dict = json.loads(argin)
+            except FileNotFoundError as file_err:
+                self.dev_logging(str(file_err), tango.LogLevel.LOG_ERROR)
+                tango.Except.throw_exception("Command failed",
+                                             str(file_err),
+                                             cmd_name + " execution",
+                                             tango.ErrSeverity.ERR)
+            except json.JSONDecodeError as e:  # argument not a valid JSON object
+                # this is a fatal error
+                msg = ("Scan configuration object is not a valid JSON object."
+                       "Aborting configuration:{}".format(str(e)))
+                self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+                tango.Except.throw_exception("Command failed",
+                                             msg,
+                                             cmd_name + " execution",
+                                             tango.ErrSeverity.ERR)
+        # Validate scanID.
+        # If not given, abort the scan configuration.
+        # If malformed, abort the scan configuration.
+        if "scanID" in argin_dict:
+            if int(argin_dict["scanID"]) <= 0:  # scanID not positive
+                msg = ("'scanID' must be positive (received {}). "
+                       "Aborting configuration.".format(int(argin_dict["scanID"])))
+                # this is a fatal error
+                self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+                tango.Except.throw_exception("Command failed",
+                                             msg,
+                                             cmd_name + " execution",
+                                             tango.ErrSeverity.ERR)
+            #TODO:add on CspMaster the an attribute with the list of scanID
+            # of each sub-array
+            #elif any(map(lambda i: i == int(argin_dict["scanID"]),
+            #             self._proxy_csp_master.subarrayScanID)):  # scanID already taken
+            #    msg = "'scanID' must be unique (received {}). "\
+            #        "Aborting configuration.".format(int(argin_dict["scanID"]))
+            # this is a fatal error
+            #    self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+            #    tango.Except.throw_exception("Command failed", msg, cmd_name + " execution",
+            #                                   tango.ErrSeverity.ERR)
+            else:  # scanID is valid
+                scan_id = int(argin_dict["scanID"])
+        else:  # scanID not given
+            msg = "'scanID' must be given. Aborting configuration."
+            # this is a fatal error
+            self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+            tango.Except.throw_exception("Command failed",
+                                         msg,
+                                         cmd_name + " execution",
+                                         tango.ErrSeverity.ERR)
+        # Validate frequencyBand.
+        # If not given, abort the scan configuration.
+        # If malformed, abort the scan configuration.
+        frequency_band = 0
+        if "frequencyBand" in argin_dict:
+            frequency_bands = ["1", "2", "3", "4", "5a", "5b"]
+            if argin_dict["frequencyBand"] in frequency_bands:
+                frequency_band = frequency_bands.index(argin_dict["frequencyBand"])
+            else:
+                msg = ("'frequencyBand' must be one of {} (received {}). "
+                       "Aborting configuration.".format(frequency_bands,
+                                                        argin_dict["frequencyBand"]))
+                # this is a fatal error
+                self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+                tango.Except.throw_exception("Command failed",
+                                             msg,
+                                             cmd_name + " execution",
+                                             tango.ErrSeverity.ERR)
+        else:  # frequencyBand not given
+            msg = "'frequencyBand' must be given. Aborting configuration."
+            # this is a fatal error
+            self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+            tango.Except.throw_exception("Command failed",
+                                         msg,
+                                         cmd_name + " execution",
+                                         tango.ErrSeverity.ERR)
+
+        # ======================================================================= #
+        # At this point, the scan ID, the receptors and the frequency band are    #
+        # guaranteed to be properly configured.                                   #
+        # ======================================================================= #
+
+        # Validate band5Tuning, if frequencyBand is 5a or 5b.
+        # If not given, abort the scan configuration.
+        # If malformed, abort the scan configuration.
+        if frequency_band in [4, 5]:  # frequency band is 5a or 5b
+            if "band5Tuning" in argin_dict:
+                # check if streamTuning is an array of length 2
+                try:
+                    assert len(argin_dict["band5Tuning"]) == 2
+                except (TypeError, AssertionError):
+                    msg = ("'band5Tuning' must be an array of length 2."
+                           "Aborting configuration.")
+                    # this is a fatal error
+                    self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+                    tango.Except.throw_exception("Command failed",
+                                                 msg,
+                                                 cmd_name + " execution",
+                                                 tango.ErrSeverity.ERR)
+
+                stream_tuning = [*map(float, argin_dict["band5Tuning"])]
+                if frequency_band == 4:
+                    if not all([5.85 <= stream_tuning[i] <= 7.25 for i in [0, 1]]):
+                        msg = ("Elements in 'band5Tuning must be floats between"
+                               " 5.85 and 7.25 (received {} and {}) for a "
+                               "'frequencyBand' of 5a."
+                               "Aborting configuration.".format(stream_tuning[0],
+                                                                stream_tuning[1]))
+                        # this is a fatal error
+                        self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+                        tango.Except.throw_exception("Command failed",
+                                                     msg,
+                                                     cmd_name + " execution",
+                                                     tango.ErrSeverity.ERR)
+                else:  # self._frequency_band == 5
+                    if not all([9.55 <= stream_tuning[i] <= 14.05 for i in [0, 1]]):
+                        msg = ("Elements in 'band5Tuning must be floats between "
+                               "9.55 and 14.05 (received {} and {}) for a "
+                               "'frequencyBand' of 5b. "
+                               "Aborting configuration.".format(stream_tuning[0],
+                                                                stream_tuning[1]))
+                        # this is a fatal error
+                        self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+                        tango.Except.throw_exception("Command failed",
+                                                     msg,
+                                                     cmd_name + " execution",
+                                                     tango.ErrSeverity.ERR)
+            else:
+                msg = ("'band5Tuning' must be given for a"
+                       " 'frequencyBand' of {}. "
+                       "Aborting configuration".format(["5a", "5b"][frequency_band - 4]))
+                # this is a fatal error
+                self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+                tango.Except.throw_exception("Command failed",
+                                             msg,
+                                             cmd_name + " execution",
+                                             tango.ErrSeverity.ERR)
+        return self._staged_configurations.add(argin, argin_dict, scan_id,
+                                               argin_dict.get("delayModelSubscriptionPoint", ''))
+
+    def __scan_participants(self, cmd_name):
+        """
+        *Class private method*
+
+        Args:
+            cmd_name: Scan or EndScan
+        Returns:
+            The proxies of the sub-element subarrays taking part in the scan: the\
+            CbfSubarray and the other sub-element subarrays whose obsState is the\
+            one required by the command (READY for Scan, SCANNING for EndScan).
+        Raises:
+            KeyError: if the CbfSubarray is not connected.
+        """
+        obs_state = ObsState.READY if cmd_name == "Scan" else ObsState.SCANNING
+        proxies = [self._se_subarrays_proxies[self._cbf_subarray_fqdn]]
+        for fqdn, proxy in self._se_subarrays_proxies.items():
+            if fqdn != self._cbf_subarray_fqdn and self._se_subarray_obsstate[fqdn] == obs_state:
+                proxies.append(proxy)
+        return proxies
+
+    def __dispatch_scan_command(self, scheduler, argin, when):
+        """
+        *Class private method*
+
+        Forward the Scan/EndScan command asynchronously to the participating\
+        sub-element subarrays: at once or, if *when* is in the future, at that\
+        time via the command scheduler. The sub-element subarrays are pinged\
+        when the command is scheduled, so that their connections are ready at\
+        the dispatch time.
+        Args:
+            scheduler: the DispatchScheduler of the command
+            argin: the command argument (None if the command has no argument)
+            when: the dispatch time (seconds since the epoch) or None
+        Returns:
+            None
+        Raises:
+            tango.DevFailed: if the CbfSubarray is not available, if the command is\
+            already scheduled or if an exception is caught forwarding the command.
+        """
+        cmd_name = scheduler.name
+        if not self.__is_subarray_available(self._cbf_subarray_fqdn):
+            log_msg = "Subarray {} not registered".format(str(self._cbf_subarray_fqdn))
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+            tango.Except.throw_exception("Command failed",
+                                         log_msg,
+                                         cmd_name,
+                                         tango.ErrSeverity.ERR)
+        if argin is None:
+            args = (cmd_name, self.__cmd_ended)
+        else:
+            args = (cmd_name, argin, self.__cmd_ended)
+        try:
+            # the pending dispatch would be sent after this one
+            if scheduler.pending is not None:
+                raise ValueError("{} already scheduled at {}".format(cmd_name,
+                                                                     scheduler.pending))
+            proxies = self.__scan_participants(cmd_name)
+            if when is None or when <= time.time():
+                for proxy in proxies:
+                    proxy.command_inout_asynch(*args)
+                return
+            for proxy in proxies:
+                proxy.ping()
+            scheduler.schedule(when, [functools.partial(proxy.command_inout_asynch, *args)
+                                      for proxy in proxies])
+            log_msg = "{} scheduled at {} on {}".format(cmd_name, when,
+                                                       [proxy.dev_name() for proxy in proxies])
+            self.dev_logging(log_msg, tango.LogLevel.LOG_INFO)
+        except tango.DevFailed as df:
+            log_msg = ''
+            for item in df.args:
+                log_msg += item.reason + " " + item.desc
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+            tango.Except.re_throw_exception(df, "Command failed",
+                                            "CspSubarray {} command failed".format(cmd_name),
+                                            "Command()",
+                                            tango.ErrSeverity.ERR)
+        except KeyError as key_err:
+            msg = " Can't retrieve the information of key {}".format(key_err)
+            self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+            tango.Except.throw_exception("Command failed", msg, cmd_name, tango.ErrSeverity.ERR)
+        except ValueError as err:
+            self.dev_logging(str(err), tango.LogLevel.LOG_ERROR)
+            tango.Except.throw_exception("Command failed", str(err), cmd_name,
+                                         tango.ErrSeverity.ERR)
+
+    def __check_scan_scheduled(self, cmd_name):
+        """
+        *Class private method*
+
         Args:
-            None
+            cmd_name: the name of the command to execute
         Returns:
             None
+        Raises:
+            tango.DevFailed: if the start or the end of a scan is scheduled.
         """
-        self.set_state(self._se_subarray_state[self._cbf_subarray_fqdn])
-        self._health_state = HealthState.DEGRADED
-        if ((self._se_subarray_healthstate[self._cbf_subarray_fqdn] == HealthState.FAILED) or \
-            (self._se_subarray_state[self._cbf_subarray_fqdn] == tango.DevState.FAULT)):
-            self._health_state = HealthState.FAILED
-            self.set_state(tango.DevState.FAULT)
-        if len(self._se_subarray_healthstate) == 3 and \
-                list(self._se_subarray_healthstate.values()) == [HealthState.OK,
-                                                                 HealthState.OK,
-                                                                 HealthState.OK]:
-            self._health_state = HealthState.OK
-    def __set_subarray_obs_state(self):
+        for scheduler in [self._scan_scheduler, self._end_scan_scheduler]:
+            dispatch_time = scheduler.pending
+            if dispatch_time is not None:
+                log_msg = ("{} not allowed: {} scheduled at {} (EndScan to "
+                           "cancel it)".format(cmd_name, scheduler.name, dispatch_time))
+                tango.Except.throw_exception("Command failed",
+                                             log_msg,
+                                             cmd_name,
+                                             tango.ErrSeverity.ERR)
+
+    def __assign_beams(self, cmd_name, beam_type, beams, request):
         """
         *Class private method*
 
-        Set the subarray obsState attribute value. It works only for IMAGING.
+        Request to the CspMaster the assignment of beams to the subarray.
         Args:
+            cmd_name: the name of the subarray command
+            beam_type: SearchBeam, TimingBeam or VlbiBeam
+            beams: the list of the beam IDs of this type assigned to the\
+                   subarray (updated in place)
+            request: the number of beams ({"number": num}) or their IDs\
+                     ({"beamIDs": [...]})
+        Returns:
             None
+        Raises:
+            tango.DevFailed: if the subarray ObsState is not IDLE or the CspMaster\
+            request fails.
+        """
+        if self._obs_state != ObsState.IDLE:
+            log_msg = ("{} not allowed when subarray ObsState"
+                       " is {}".format(cmd_name, ObsState(self._obs_state).name))
+            tango.Except.throw_exception("Command failed",
+                                         log_msg,
+                                         cmd_name,
+                                         tango.ErrSeverity.ERR)
+        request.update({"subarrayID": self._subarray_id, "beamType": beam_type})
+        try:
+            csp_master_proxy = tango.DeviceProxy(self.CspMaster)
+            result = json.loads(csp_master_proxy.AssignBeams(json.dumps(request)))
+        except tango.DevFailed as df:
+            log_msg = "{} failure: {}".format(cmd_name, df.args[0].desc)
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+            tango.Except.re_throw_exception(df, "Command failed",
+                                            "CspSubarray {} command failed".format(cmd_name),
+                                            "Command()",
+                                            tango.ErrSeverity.ERR)
+        for beam_id, sub_id in result["conflicts"].items():
+            log_msg = "{} {} already assigned to subarray {}".format(beam_type, beam_id, sub_id)
+            self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
+        beams[:] = sorted(set(beams) | set(result["beamIDs"]))
+
+    def __release_beams(self, cmd_name, beam_type, beams, request):
+        """
+        *Class private method*
+
+        Request to the CspMaster the release of beams of the subarray.
+        Args:
+            cmd_name: the name of the subarray command
+            beam_type: SearchBeam, TimingBeam or VlbiBeam
+            beams: the list of the beam IDs of this type assigned to the\
+                   subarray (updated in place)
+            request: the number of beams ({"number": num}) or their IDs\
+                     ({"beamIDs": [...]})
         Returns:
             None
+        Raises:
+            tango.DevFailed: if the subarray ObsState is not IDLE or the CspMaster\
+            request fails.
         """
-        # NOTE: when ObsMode value is set, it should be considered to set the final
-        # sub-array ObsState value
-        cbf_sub_obstate = self._se_subarray_obsstate[self._cbf_subarray_fqdn]
-        # next line currently not used
-        # pss_sub_obstate = self._se_subarray_obsstate[self._pss_subarray_fqdn]
-        # TODO: how implement ObsState for PST?
- 
-        # Next lines are valid only for IMAGING mode!!
-        self._obs_state = cbf_sub_obstate
-        if cbf_sub_obstate == ObsState.IDLE:
-            self._obs_mode = ObsMode.IDLE
-        # TODO:ObsMode could be defined as a mask because we can have more
-        # than one obs_mode active for a sub-array
+        if self._obs_state != ObsState.IDLE:
+            log_msg = ("{} not allowed when subarray ObsState"
+                       " is {}".format(cmd_name, ObsState(self._obs_state).name))
+            tango.Except.throw_exception("Command failed",
+                                         log_msg,
+                                         cmd_name,
+                                         tango.ErrSeverity.ERR)
+        request.update({"subarrayID": self._subarray_id, "beamType": beam_type})
+        try:
+            csp_master_proxy = tango.DeviceProxy(self.CspMaster)
+            released = csp_master_proxy.ReleaseBeams(json.dumps(request))
+        except tango.DevFailed as df:
+            log_msg = "{} failure: {}".format(cmd_name, df.args[0].desc)
+            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+            tango.Except.re_throw_exception(df, "Command failed",
+                                            "CspSubarray {} command failed".format(cmd_name),
+                                            "Command()",
+                                            tango.ErrSeverity.ERR)
+        # the value of an empty array is None
+        if released is not None:
+            beams[:] = sorted(set(beams) - set(released))
 
     def __is_remove_resources_allowed(self):
         """
@@ -432,6 +1446,20 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         *mid_csp_cbf/sub_elt/subarray_*
     """
 
+    VccPrefix = class_property(
+        dtype='str', default_value="mid_csp_cbf/vcc/vcc_"
+    )
+    """
+    *Class property*
+
+    The CBF VCC FQDN prefix: the VCC ID is appended as three digits.
+
+    *Type*: DevString
+
+    Example:
+        *mid_csp_cbf/vcc/vcc_*
+    """
+
     PssSubarrayPrefix = class_property(
         dtype='str', default_value="mid_csp_pss/sub_elt/subarray_"
     )
@@ -461,6 +1489,66 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
     *Type*: DevString
     """
 
+    HistorySize = device_property(
+        dtype='uint32', default_value=4096
+    )
+    """
+    *Device property*
+
+    The max number of SCM transitions kept in memory and reported by the\
+    GetHistory command.
+
+    *Type*: DevULong
+    """
+
+    JournalDir = device_property(
+        dtype='str', default_value=""
+    )
+    """
+    *Device property*
+
+    The directory of the state journal, used to restore the scan ID and the\
+    scan configuration at restart. The journal is disabled if empty.
+
+    *Type*: DevString
+    """
+
+    TopologyCacheDir = device_property(
+        dtype='str', default_value=""
+    )
+    """
+    *Device property*
+
+    The directory of the CBF topology cache written by the CspMaster. The\
+    cache is disabled if empty.
+
+    *Type*: DevString
+    """
+
+    DispatchPriority = device_property(
+        dtype='uint16', default_value=0
+    )
+    """
+    *Device property*
+
+    The real-time (SCHED_FIFO) priority of the threads dispatching the\
+    scheduled Scan/EndScan commands. 0 to keep the normal priority.
+
+    *Type*: DevUShort
+    """
+
+    StagedConfigurationsSize = device_property(
+        dtype='uint16', default_value=16
+    )
+    """
+    *Device property*
+
+    The max number of validated scan configurations kept by the subarray\
+    (see ValidateScanConfiguration).
+
+    *Type*: DevUShort
+    """
+
     # ----------
     # Attributes
     # ----------
@@ -644,6 +1732,91 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
     *Type*: DevString
     """
 
+    subscriptionStats = attribute(
+        dtype='str',
+        label="Event subscriptions statistics",
+        doc="The number of events received and the time of the last event for each "
+            "sub-element subarray attribute subscribed (JSON-encoded).",
+    )
+    """
+    *Class attribute*
+
+    The statistics of the sub-element subarrays events subscriptions:\
+    {device: {attribute: {"subscribed", "events", "errors", "last_event"}}}.
+
+    *Type*: DevString (JSON-encoded)
+    """
+
+    scanDispatchStats = attribute(
+        dtype='str',
+        label="Scan dispatch statistics",
+        doc="The pending dispatch time and the dispatch jitter and skew (ms) of the "
+            "scheduled Scan/EndScan commands (JSON-encoded).",
+    )
+    """
+    *Class attribute*
+
+    The statistics of the scheduled Scan and EndScan commands:\
+    {command: {"pending", "dispatched", "cancelled", "jitter", "skew", "last"}},\
+    where jitter is the delay of the dispatch from the scheduled time and skew\
+    the time between the first and the last sub-element subarray requests, in\
+    milliseconds, and last the scheduled, start and end times of the last\
+    dispatch (seconds since the epoch).
+
+    *Type*: DevString (JSON-encoded)
+    """
+
+    delayModelLatency = attribute(
+        dtype='str',
+        label="Delay model latency",
+        doc="The latency (ms) of the delay models from the TM publication to their "
+            "decoding and to their delivery to the VCCs (JSON-encoded).",
+    )
+    """
+    *Class attribute*
+
+    The statistics of the delay models received from TM:\
+    {"subscriptionPoint", "models", "discarded", "errors", "parse": latency,\
+    "delivery": latency}, with latency = {"count", "last", "mean", "max",\
+    "p50", "p99"} in milliseconds from the TM attribute timestamp.
+
+    *Type*: DevString (JSON-encoded)
+    """
+
+    resourcingProgress = attribute(
+        dtype='uint16',
+        label="Resourcing progress percentage",
+        max_value=100,
+        min_value=0,
+        doc="Percentage of the receptors added/removed by the running AddReceptors, "
+            "RemoveReceptors or RemoveAllReceptors command.",
+    )
+    """
+    *Class attribute*
+
+    The percentage of the receptors added/removed by the running (or last)\
+    AddReceptors/RemoveReceptors/RemoveAllReceptors command, as reported by the\
+    CbfSubarray *receptors* change events.
+
+    *Type*: DevUShort
+    """
+
+    assignedReceptors = attribute(
+        dtype=('uint16',),
+        max_dim_x=197,
+        label="Assigned receptors",
+        doc="The receptors assigned to the subarray, confirmed at the end of the last "
+            "AddReceptors, RemoveReceptors or RemoveAllReceptors command.",
+    )
+    """
+    *Class attribute*
+
+    The list of the receptor IDs assigned to the subarray at the end of the last\
+    resourcing command. One change event is pushed for each command.
+
+    *Type*: array of DevUShort
+    """
+
     fsp = attribute(
         dtype=('uint16',),
         max_dim_x=27,
@@ -663,7 +1836,8 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
     """
     *Class attribute*
 
-    The list of VCC IDs assigned to the subarray.
+    The list of VCC IDs assigned to the subarray. It is maintained by the\
+    CbfSubarray *receptors* change events and pushed on change.
 
     *Type*: array of DevUShort
     """
@@ -880,6 +2054,13 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         # visibile from the derived classes!!
         self._obs_mode  = ObsMode.IDLE
         self._obs_state = ObsState.IDLE
+        # the history of the SCM transitions of the subarray and of the
+        # sub-element subarrays
+        self._scm_history = ScmHistory(self.HistorySize)
+        self._scm_history.record(self.get_name(), "State", tango.DevState.INIT)
+        self._scm_history.record(self.get_name(), "healthState", self._health_state)
+        self._scm_history.record(self.get_name(), "adminMode", self._admin_mode)
+        self._scm_history.record(self.get_name(), "obsState", self._obs_state)
         # get subarray ID
         if self.SubID:
             self._subarray_id = int(self.SubID)
@@ -890,12 +2071,31 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         self._se_subarray_healthstate   = defaultdict(lambda: HealthState.UNKNOWN)
         self._se_subarray_obsstate      = defaultdict(lambda: ObsState.IDLE)
         self._se_subarray_adminmode     = defaultdict(lambda: AdminMode.OFFLINE)
+        # The SCM attributes are not polled: their change events are pushed when
+        # the sub-element subarray events update their values.
+        for attr_name in ["State", "healthState", "adminMode", "obsState", "obsMode",
+                          "cbfSubarrayState", "pssSubarrayState",
+                          "cbfSubarrayHealthState", "pssSubarrayHealthState",
+                          "cbfSubarrayObsState", "pssSubarrayObsState",
+                          "resourcingProgress", "assignedReceptors", "vcc"]:
+            self.set_change_event(attr_name, True, False)
+        # the receptors assignment/release commands run asynchronously on the
+        # CbfSubarray: their progress is tracked via the receptors change events
+        self._resourcing_lock = threading.Lock()
+        self._resourcing = None
+        self._resourcing_progress = 0
+        # the bitmap of the receptors assigned to the CbfSubarray (None until
+        # the first event is received) and the list confirmed by the last command
+        self._cbf_receptors = None
+        self._assigned_receptors = []
+        # the bitmap of the VCCs of the assigned receptors (bit vcc_id - 1)
+        self._vcc_mask = 0
         # initialize the list with the capabilities belonging to the sub-array
         # Do we need to know the max number of capabilities for each type?
         self._search_beams = []     # list of SearchBeams assigned to subarray
         self._timing_beams = []     # list of TimingBeams assigned to subarray
         self._vlbi_beams = []       # list of VlbiBeams assigned to subarray
-        self._vcc = []              # list of VCCs assigned to subarray
+        self._vcc = []              # list of VCCs assigned to subarray (see _vcc_mask)
         self._fsp = []              # list of FSPs assigned to subarray`
 
         self._cbf_subarray_fqdn = ''
@@ -903,10 +2103,34 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
 
         self._se_subarrays_fqdn = []
         self._se_subarrays_proxies = {}
-        self._se_subarray_event_id = {}
+        self._subscriptions = SubscriptionManager(self.dev_logging)
         self._receptor_to_vcc_map = {}
+        self._receptor_id_list = []
         self._csp_capabilities = ''
         self._valid_scan_configuration = ''
+        self._pending_scan_configuration = ''
+        # the scan configurations already validated, by hash
+        self._staged_configurations = StagedConfigurations(self.StagedConfigurationsSize)
+        # the delay models are received from TM and delivered to the VCCs by
+        # the subarray (see ConfigureScan)
+        self._delay_model_point = ''
+        self._pending_delay_model_point = ''
+        self._last_delay_model = None
+        self._vcc_proxies = {}
+        self._delay_model_counters = defaultdict(int)
+        self._delay_model_parse_latency = LatencyStats()
+        self._delay_model_delivery_latency = LatencyStats()
+        # the Scan/EndScan commands with an activation time are dispatched to
+        # the sub-element subarrays by the timer threads of the schedulers
+        self._scan_scheduler = DispatchScheduler("Scan", priority=self.DispatchPriority,
+                                                 log=self.dev_logging)
+        self._end_scan_scheduler = DispatchScheduler("EndScan", priority=self.DispatchPriority,
+                                                     log=self.dev_logging)
+        # warm restart: the scan ID and configuration are restored from the
+        # state journal, without waiting for the sub-elements
+        self._journal = None
+        if self.JournalDir:
+            self.__open_journal()
         # initialize proxy to CBFMaster device
         self._cbfMasterProxy = 0
         self._cbfAddress = ''
@@ -923,6 +2147,11 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         # build the sub-element sub-array FQDNs
         self._cbf_subarray_fqdn = '{}{:02d}'.format(self.CbfSubarrayPrefix, self._subarray_id)
         self._pss_subarray_fqdn = '{}{:02d}'.format(self.PssSubarrayPrefix, self._subarray_id)
+        # the static CBF topology is loaded from the cache (if enabled) at once and
+        # validated against CBF in background
+        self._topology_cache = None
+        if self.TopologyCacheDir:
+            self.__load_cbf_topology()
         try:
             self.__connect_to_master()
             self.__connect_to_subarrays()
@@ -944,42 +2173,20 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
     def delete_device(self):
         # PROTECTED REGION ID(CspSubarray.delete_device) ENABLED START #
 
+        # cancel the scheduled commands
+        self._scan_scheduler.stop()
+        self._end_scan_scheduler.stop()
         #release the allocated event resources
-        for fqdn in self._se_subarrays_fqdn:
-            event_to_remove = []
-            try:
-                for event_id in self._se_subarray_event_id[fqdn]:
-                    try:
-                        self._se_subarrays_proxies[fqdn].unsubscribe_event(event_id)
-                        # self._se_subarray_event_id[fqdn].remove(event_id)
-                        # in Pyton3 can't remove the element from the list while looping on it.
-                        # Store the unsubscribed events in a temporary list and remove them later.
-                        event_to_remove.append(event_id)
-                    except tango.DevFailed as df:
-                        msg = ("Unsubscribe event failure.Reason: {}. "
-                               "Desc: {}".format(df.args[0].reason, df.args[0].desc))
-                        self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
-                    except KeyError as key_err:
-                        # NOTE: in PyTango unsubscription of a not-existing event id raises a
-                        # KeyError exception not a DevFailed!!
-                        msg = "Unsubscribe event failure. Reason: {}".format(str(key_err))
-                        self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
-                # remove the events from the list
-                for k in event_to_remove:
-                    self._se_subarray_event_id[fqdn].remove(k)
-                # check if there are still some registered events. What to do in this case??
-                if self._se_subarray_event_id[fqdn]:
-                    msg = "Still subscribed events: {}".format(self._se_subarray_event_id)
-                    self.dev_logging(msg, tango.LogLevel.LOG_WARN)
-                else:
-                    # delete the dictionary entry
-                    self._se_subarray_event_id.pop(fqdn)
-            except KeyError as key_err:
-                msg = " Can't retrieve the information of key {}".format(key_err)
-                self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+        self._subscriptions.unsubscribe_all()
         # clear the subarrays list and dictionary
         self._se_subarrays_fqdn.clear()
         self._se_subarrays_proxies.clear()
+        self._vcc_proxies.clear()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self._topology_cache is not None:
+            self._topology_cache.stop()
 
         # PROTECTED REGION END #    //  CspSubarray.delete_device
 
@@ -987,6 +2194,24 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
     # Attributes methods
     # ------------------
 
+    def write_adminMode(self, value):
+        """
+        *Attribute method*
+
+        Set the subarray administration mode and push the change event.
+
+        Args:
+            value: one of the administration mode value (ON-LINE,\
+            OFF-LINE, MAINTENANCE, NOT-FITTED, RESERVED).
+        Returns:
+            None
+        """
+        # PROTECTED REGION ID(CspSubarray.adminMode_write) ENABLED START #
+        self._admin_mode = value
+        self._scm_history.record(self.get_name(), "adminMode", self._admin_mode)
+        self.push_change_event("adminMode", self._admin_mode)
+        # PROTECTED REGION END #    //  CspSubarray.adminMode_write
+
     def read_scanID(self):
         """
         *Attribute method*
@@ -1015,6 +2240,7 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         """
         # PROTECTED REGION ID(CspSubarray.scanID_write) ENABLED START #
         self._scan_ID = value
+        self.__journal_state({"scanID": self._scan_ID})
         return
         # PROTECTED REGION END #    //  CspSubarray.scanID_write
 
@@ -1187,6 +2413,77 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         return self._valid_scan_configuration
         # PROTECTED REGION END #    //  CspSubarray.validScanConfiguration_read
 
+    def read_subscriptionStats(self):
+        """
+        *Attribute method*
+
+        Returns:
+            The statistics of the sub-element subarrays events subscriptions.
+
+            *Type*: DevString (JSON-encoded)
+        """
+        # PROTECTED REGION ID(CspSubarray.subscriptionStats_read) ENABLED START #
+        return json.dumps(self._subscriptions.stats())
+        # PROTECTED REGION END #    //  CspSubarray.subscriptionStats_read
+
+    def read_scanDispatchStats(self):
+        """
+        *Attribute method*
+
+        Returns:
+            The statistics of the scheduled Scan and EndScan commands.
+
+            *Type*: DevString (JSON-encoded)
+        """
+        # PROTECTED REGION ID(CspSubarray.scanDispatchStats_read) ENABLED START #
+        return json.dumps({scheduler.name: scheduler.stats()
+                           for scheduler in [self._scan_scheduler, self._end_scan_scheduler]})
+        # PROTECTED REGION END #    //  CspSubarray.scanDispatchStats_read
+
+    def read_delayModelLatency(self):
+        """
+        *Attribute method*
+
+        Returns:
+            The statistics of the delay models received from TM.
+
+            *Type*: DevString (JSON-encoded)
+        """
+        # PROTECTED REGION ID(CspSubarray.delayModelLatency_read) ENABLED START #
+        stats = {"subscriptionPoint": self._delay_model_point,
+                 "parse": self._delay_model_parse_latency.stats(),
+                 "delivery": self._delay_model_delivery_latency.stats()}
+        for counter in ["models", "discarded", "errors"]:
+            stats[counter] = self._delay_model_counters[counter]
+        return json.dumps(stats)
+        # PROTECTED REGION END #    //  CspSubarray.delayModelLatency_read
+
+    def read_resourcingProgress(self):
+        """
+        *Attribute method*
+
+        Returns:
+            The progress percentage of the running (or last) resourcing command.
+
+            *Type*: DevUShort
+        """
+        # PROTECTED REGION ID(CspSubarray.resourcingProgress_read) ENABLED START #
+        return self._resourcing_progress
+        # PROTECTED REGION END #    //  CspSubarray.resourcingProgress_read
+
+    def read_assignedReceptors(self):
+        """
+        *Attribute method*
+
+        Returns:
+            The list of the receptor IDs confirmed at the end of the last resourcing command.
+
+            *Type*: array of DevUShort
+        """
+        # PROTECTED REGION ID(CspSubarray.assignedReceptors_read) ENABLED START #
+        return self._assigned_receptors
+        # PROTECTED REGION END #    //  CspSubarray.assignedReceptors_read
+
     def read_fsp(self):
         """
         *Attribute method*
@@ -1210,25 +2507,7 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
             *Type*: array of DevUShort.
         """
         # PROTECTED REGION ID(CspSubarray.vcc_read) ENABLED START #
-        self._vcc = []
-        try:
-            assigned_receptors = self._se_subarrays_proxies[self._cbf_subarray_fqdn].receptors
-            # NOTE: if receptors attribute is empty, assigned_receptors is an empty numpy array
-            # and it will just be skipped by the for loop
-            for receptor_id in assigned_receptors:
-                vcc_id = self._receptor_to_vcc_map[receptor_id]
-                self._vcc.append(vcc_id)
-        except KeyError as key_err:
-            msg = "No {} found".format(key_err)
-            tango.Except.throw_exception("Read attribute failure",
-                                         msg,
-                                         "read_vcc",
-                                         tango.ErrSeverity.ERR)
-        except tango.DevFailed as df:
-            tango.Except.throw_exception("Read attribute failure",
-                                         df.args[0].desc,
-                                         "read_vcc",
-                                         tango.ErrSeverity.ERR)
+        # the list is maintained by the CbfSubarray receptors change events
         return self._vcc
         # PROTECTED REGION END #    //  CspSubarray.vcc_read
 
@@ -1389,7 +2668,9 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         """
         *Class method*
         End the execution of a running scan. After successful execution, the CspSubarray \
-        *ObsState* is  IDLE.
+        *ObsState* is  IDLE.\n
+        If the start of the scan is scheduled, the scheduled Scan is cancelled.\
+        A scheduled end of the scan (EndScanAt) is cancelled too.
 
         Raises:
             tango.DevFailed: if the subarray *obsState* is not SCANNING or if an exception
@@ -1399,8 +2680,20 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
             only when the CspSubarray is *ONLINE* or *MAINTENANCE*
         """
         # PROTECTED REGION ID(CspSubarray.EndScan) ENABLED START #
+        # a scheduled EndScan would end the next scan
+        if self._end_scan_scheduler.cancel():
+            self.dev_logging("Scheduled EndScan cancelled", tango.LogLevel.LOG_INFO)
+        if self._scan_scheduler.cancel():
+            self.dev_logging("Scheduled Scan cancelled", tango.LogLevel.LOG_INFO)
+            return
         # Check if the EndScan command can be executed. This command is allowed when the
         # Subarray State is SCANNING.
+        if self._obs_state != ObsState.SCANNING and self._scan_scheduler.in_flight:
+            log_msg = "Scheduled Scan being dispatched: retry when the subarray is SCANNING"
+            tango.Except.throw_exception("Command failed",
+                                         log_msg,
+                                         "EndScan",
+                                         tango.ErrSeverity.ERR)
         if self._obs_state != ObsState.SCANNING:
             log_msg = ("Subarray obs_state is {}"
                        ", not SCANNING".format(ObsState(self._obs_state).name))
@@ -1408,39 +2701,62 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
                                          log_msg,
                                          "EndScan",
                                          tango.ErrSeverity.ERR)
-        proxy = 0
-        #TODO:the command is forwarded only to CBF. Future implementation has to
-        # check the observing mode and depending on this, the command is forwarded to
-        # the interested sub-elements.
-        if self.__is_subarray_available(self._cbf_subarray_fqdn):
-            try:
-                proxy = self._se_subarrays_proxies[self._cbf_subarray_fqdn]
-                # forward asynchrnously the command to the CbfSubarray
-                proxy.command_inout_asynch("EndScan", self.__cmd_ended)
-            except tango.DevFailed as df:
-                log_msg = ''
-                for item in df.args:
-                    log_msg += item.reason + " " + item.desc
-                self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
-                tango.Except.re_throw_exception(df, "Command failed",
-                                                "CspSubarray EndScan command failed",
-                                                "Command()",
-                                                tango.ErrSeverity.ERR)
-            except KeyError as key_err:
-                msg = " Can't retrieve the information of key {}".format(key_err)
-                self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
-                tango.Except.throw_exception("Command failed",
-                                             msg,
-                                             "EndScan",
-                                             tango.ErrSeverity.ERR)
-        else:
-            log_msg = "Subarray {} not registered".format(str(self._cbf_subarray_fqdn))
-            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
+        self.__dispatch_scan_command(self._end_scan_scheduler, None, None)
+        # PROTECTED REGION END #    //  CspSubarray.EndScan
+
+    def is_EndScanAt_allowed(self):
+        """
+        *TANGO is_allowed method*: filter the external request depending on the \
+        current device state.\n
+        Check if the EndScanAt method can be issued on the subarray.\n
+        The EndScanAt() method can be issue on a subarray if its *State* is *ON*.
+
+        Returns:
+            True if the command can be executed, otherwise False
+        """
+        if self.get_state() in [tango.DevState.ON]:
+            return True
+        return False
+
+    @command(
+        dtype_in='float',
+        doc_in="End time of the scan, as seconds since the Linux epoch (0 to end it now)",
+    )
+    @DebugIt()
+    def EndScanAt(self, argin):
+        """
+        *Class method*
+
+        Schedule the end of the running (or scheduled) scan: the EndScan command is \
+        dispatched to the sub-element subarrays at the specified time.
+
+        Args:
+            argin: the end time of the scan, as seconds since the Linux epoch. \
+            The scan is ended at once if the time is 0 or past.
+        Raises:
+            tango.DevFailed: if the subarray *obsState* is not SCANNING and no Scan is\
+            scheduled, if the end time is not after the start of the scheduled Scan,\
+            if the end of the scan is already scheduled or if an exception is\
+            caught during the command execution.
+        """
+        # PROTECTED REGION ID(CspSubarray.EndScanAt) ENABLED START #
+        if self._obs_state != ObsState.SCANNING and self._scan_scheduler.pending is None:
+            log_msg = ("Subarray obs_state is {}, not SCANNING and no Scan is "
+                       "scheduled".format(ObsState(self._obs_state).name))
             tango.Except.throw_exception("Command failed",
                                          log_msg,
-                                         "EndScan",
+                                         "EndScanAt",
                                          tango.ErrSeverity.ERR)
-        # PROTECTED REGION END #    //  CspSubarray.EndScan
+        start_time = self._scan_scheduler.pending
+        if start_time is not None and (argin or time.time()) <= start_time:
+            log_msg = ("End time {} not after the Scan scheduled at {} (EndScan to "
+                       "cancel it)".format(argin, start_time))
+            tango.Except.throw_exception("Command failed",
+                                         log_msg,
+                                         "EndScanAt",
+                                         tango.ErrSeverity.ERR)
+        self.__dispatch_scan_command(self._end_scan_scheduler, None, argin or None)
+        # PROTECTED REGION END #    //  CspSubarray.EndScanAt
 
     def is_Scan_allowed(self):
         """
@@ -1467,11 +2783,18 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         """
         *Class method*
 
-        Start the execution of scan.
+        Start the execution of scan.\n
+        If the activation time is in the future, the Scan command is dispatched to \
+        all the participating sub-element subarrays at that time by the subarray \
+        scheduler, otherwise it is forwarded at once. The argument is forwarded \
+        unchanged.
 
+        Args:
+            argin: the activation time of the scan, as seconds since the Linux epoch.
         Raises:
-            tango.DevFailed: if the subarray *obsState* is not READY or if an exception is caught\
-                    during the command execution.
+            tango.DevFailed: if the subarray *obsState* is not READY, if a Scan or an\
+                    EndScan is scheduled or if an exception is caught during the command\
+                    execution.
         Note:
             Still to implement the check on AdminMode values: the command can be processed \
             only when the CspSubarray is *ONLINE* or *MAINTENANCE*
@@ -1489,30 +2812,14 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
                                          log_msg,
                                          "Scan",
                                          tango.ErrSeverity.ERR)
-        proxy = 0
-        if self.__is_subarray_available(self._cbf_subarray_fqdn):
-            try:
-                proxy = self._se_subarrays_proxies[self._cbf_subarray_fqdn]
-                # forward the command to the CbfSubarray asynchrnously
-                proxy.command_inout_asynch("Scan", argin, self.__cmd_ended)
-                # self._obs_state = ObsState.SCANNING.value
-            except tango.DevFailed as df:
-                log_msg = ''
-                for item in df.args:
-                    log_msg += item.reason + " " + item.desc
-                self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
-                tango.Except.re_throw_exception(df, "Command failed",
-                                                "CspSubarray Scan command failed",
-                                                "Command()",
-                                                tango.ErrSeverity.ERR)
-            except KeyError as key_err:
-                msg = " Can't retrieve the information of key {}".format(key_err)
-                self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
-                tango.Except.throw_exception("Command failed", msg, "Scan", tango.ErrSeverity.ERR)
-        else:
-            log_msg = "Subarray {} not registered".format(str(self._cbf_subarray_fqdn))
-            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
-            tango.Except.throw_exception("Command failed", log_msg, "Scan", tango.ErrSeverity.ERR)
+        self.__check_scan_scheduled("Scan")
+        # the argument is forwarded as it is when it's not a time (as the
+        # previous versions did)
+        try:
+            start_time = float(argin)
+        except ValueError:
+            start_time = None
+        self.__dispatch_scan_command(self._scan_scheduler, argin, start_time)
         # PROTECTED REGION END #    //  CspSubarray.Scan
 
     def is_AddReceptors_allowed(self):
@@ -1538,7 +2845,10 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
 
         Add the specified receptor IDs to the subarray.
 
-        The command can be executed only if the CspSubarray *ObsState* is *IDLE*.
+        The command can be executed only if the CspSubarray *ObsState* is *IDLE*.\
+        It returns as soon as the request is forwarded to the CbfSubarray: the\
+        progress is reported by the *resourcingProgress* attribute and the final\
+        list of receptors by the *assignedReceptors* attribute.
 
         Args:
             argin: the list of receptor IDs
@@ -1546,8 +2856,8 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         Returns:
             None
         Raises:
-            tango.DevFailed: if the CbfSubarray is not available or if an exception\
-            is caught during command execution.
+            tango.DevFailed: if the CbfSubarray is not available, if a resourcing command\
+            is running or if an exception is caught during command execution.
         Note:
             Still to implement the check on AdminMode values: the command can be processed \
             only when the CspSubarray is *ONLINE* or *MAINTENANCE*
@@ -1574,6 +2884,8 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
                                          log_msg,
                                          "AddReceptors",
                                          tango.ErrSeverity.ERR)
+        # the receptors can't be assigned while the previous command is running
+        self.__check_resourcing("AddReceptors")
         # the list of available receptor IDs. This number is mantained by the CspMaster
         # and reported on request.
         available_receptors = []
@@ -1623,22 +2935,24 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
             msg = "Failure in reading {}: {}".format(str(attr_err.args[0]), attr_err.__doc__)
             tango.Except.throw_exception("Command failed", msg,
                                          "AddReceptors", tango.ErrSeverity.ERR)
-        for receptorId in argin:
-            # check if the specified receptor id is a valid number (that is, belongs to the list
-            # of provided receptors)
-            if receptorId in self._receptor_id_list:
-                # check if the receptor id is one of the available receptor Ids
-                if receptorId in available_receptors:
-                    receptor_to_assign.append(receptorId)
-                else:
-                    # retrieve the subarray owner
-                    sub_id = receptor_membership[receptorId - 1]
-                    log_msg = "Receptor {} already assigned to subarray {}".format(str(receptorId),
-                                                                                   str(sub_id))
-                    self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
-            else:
-                log_msg = "Invalid receptor id: {}".format(str(receptorId))
-                self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
+        # the checks are done on the receptors bitmaps: the repeated IDs are merged
+        if 0 in argin:
+            self.dev_logging("Invalid receptor id: 0", tango.LogLevel.LOG_WARN)
+        requested = receptor_mask(receptor_id for receptor_id in argin if receptor_id)
+        # check if the specified receptor ids are valid numbers (that is, belong to the list
+        # of provided receptors)
+        valid = requested & receptor_mask(self._receptor_id_list)
+        for receptorId in receptor_ids(requested & ~valid):
+            log_msg = "Invalid receptor id: {}".format(str(receptorId))
+            self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
+        # check if the receptor ids are in the list of the available receptor Ids
+        receptor_to_assign = receptor_ids(valid & receptor_mask(available_receptors))
+        for receptorId in receptor_ids(valid & ~receptor_mask(available_receptors)):
+            # retrieve the subarray owner
+            sub_id = receptor_membership[receptorId - 1]
+            log_msg = "Receptor {} already assigned to subarray {}".format(str(receptorId),
+                                                                           str(sub_id))
+            self.dev_logging(log_msg, tango.LogLevel.LOG_WARN)
 
         # check if the list of receptors to assign is empty
         if not receptor_to_assign:
@@ -1650,11 +2964,12 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         if self.__is_subarray_available(self._cbf_subarray_fqdn):
             try:
                 proxy = self._se_subarrays_proxies[self._cbf_subarray_fqdn]
-                # remove possible receptor repetition
-                tmp = set(receptor_to_assign)
-                receptor_to_assign = list(tmp)
-                # forward the command to the CbfSubarray
-                proxy.command_inout("AddReceptors", receptor_to_assign)
+                assigned = self.__get_assigned_receptors(proxy)
+                self.__start_resourcing("AddReceptors", assigned,
+                                        assigned | receptor_mask(receptor_to_assign))
+                # forward the command to the CbfSubarray: the command returns at once
+                # and the assignment is tracked via the receptors change events
+                proxy.command_inout_asynch("AddReceptors", receptor_to_assign, self.__cmd_ended)
             except KeyError as key_err:
                 msg = " Can't retrieve the information of key {}".format(key_err)
                 self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
@@ -1663,6 +2978,7 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
                                              "AddReceptors",
                                              tango.ErrSeverity.ERR)
             except tango.DevFailed as df:
+                self.__cancel_resourcing()
                 log_msg = "AddReceptor command failure."
                 for item in df.args:
                     log_msg += "Reason: {}. Desc: {}".format(item.reason, item.desc)
@@ -1675,6 +2991,7 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
                 # Raised when an operation or function is applied to an object of
                 # inappropriate type. The associated value is a string giving details about
                 # the type mismatch.
+                self.__cancel_resourcing()
                 log_msg = "TypeError: {}".format(str(err))
                 self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
                 tango.Except.throw_exception("Command failed",
@@ -1711,14 +3028,18 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         """
         Remove the receptor IDs from the subarray.
 
+        The command returns as soon as the request is forwarded to the CbfSubarray\
+        (see AddReceptors).
+
         Args:
             argin: The list of the receptor IDs to remove from the subarray.
             Type: array of DevUShort
         Returns:
             None
         Raises:
-            tango.DevFailed: raised if the subarray *obState* attribute is not IDLE, or \
-                    when an exception is caught during command execution.
+            tango.DevFailed: raised if the subarray *obState* attribute is not IDLE, if \
+                    a resourcing command is running or when an exception is caught \
+                    during command execution.
         """
         # PROTECTED REGION ID(CspSubarray.RemoveReceptors) ENABLED START #
 
@@ -1732,38 +3053,34 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
                                          log_msg,
                                          "RemoveReceptors",
                                          tango.ErrSeverity.ERR)
+        self.__check_resourcing("RemoveReceptors")
 
         # check if the CspSubarray is already connected to the CbfSubarray
         proxy = 0
         if self.__is_subarray_available(self._cbf_subarray_fqdn):
             try:
                 proxy = self._se_subarrays_proxies[self._cbf_subarray_fqdn]
-                # read from CbfSubarray the list of assigned receptors
-                receptors = proxy.receptors
-                #!!!!!!!!!!!!!!!!!
-                # 2019-09-20:  New images for TANGO and PyTango images has been released. PyTango
-                # is now compiled with th numpy support. In this case the proxy.receptors call
-                # does no more return an empty tuple but an empty numpy array.
-                # Checks on receptors content need to be changed (see below)
-                # NB: the receptors attribute implemented by the CbfSubarray is declared as RW.
-                # In this case the read method returns an empty numpy array ([]) whose length is 0.
-                #!!!!!!!!!!!!!!!!!
-
+                # the list of assigned receptors is maintained by the CbfSubarray events
+                assigned = self.__get_assigned_receptors(proxy)
                 # check if the list of assigned receptors is empty.
-                #if not receptors:
-                if len(receptors) == 0:
+                if not assigned:
                     self.dev_logging("RemoveReceptors: no receptor to remove",
                                      tango.LogLevel.LOG_INFO)
                     return
-                receptors_to_remove = []
                 # check if the receptors to remove belong to the subarray
-                for receptor_id in argin:
-                    if receptor_id in receptors:
-                        receptors_to_remove.append(receptor_id)
-                # forward the command to CbfSubarray
-                proxy.RemoveReceptors(receptors_to_remove)
-                receptors = proxy.receptors
+                requested = receptor_mask(receptor_id for receptor_id in argin if receptor_id)
+                to_remove = requested & assigned
+                if not to_remove:
+                    self.dev_logging("RemoveReceptors: the receptors are not assigned to the"
+                                     " subarray", tango.LogLevel.LOG_INFO)
+                    return
+                self.__start_resourcing("RemoveReceptors", assigned, assigned & ~to_remove)
+                # forward the command to CbfSubarray: the release is tracked via the
+                # receptors change events
+                proxy.command_inout_asynch("RemoveReceptors", receptor_ids(to_remove),
+                                           self.__cmd_ended)
             except tango.DevFailed as df:
+                self.__cancel_resourcing()
                 log_msg = "RemoveReceptors:" + df.args[0].desc
                 self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
                 tango.Except.re_throw_exception(df, "Command failed",
@@ -1799,11 +3116,15 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         *Class method.*
 
         Remove all the assigned receptors from the subarray.
+
+        The command returns as soon as the request is forwarded to the CbfSubarray\
+        (see AddReceptors).
         Returns:
             None
         Raises:
-            tango.DevFailed: raised if the subarray *obState* attribute is not IDLE or READY, or \
-            when an exception is caught during command execution.
+            tango.DevFailed: raised if the subarray *obState* attribute is not IDLE or READY, \
+            if a resourcing command is running or when an exception is caught during \
+            command execution.
         """
         # PROTECTED REGION ID(CspSubarray.RemoveAllReceptors) ENABLED START #
 
@@ -1816,29 +3137,24 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
                                          log_msg,
                                          "RemoveAllReceptors",
                                          tango.ErrSeverity.ERR)
+        self.__check_resourcing("RemoveAllReceptors")
         proxy = 0
         if self.__is_subarray_available(self._cbf_subarray_fqdn):
             try:
                 proxy = self._se_subarrays_proxies[self._cbf_subarray_fqdn]
                 # check if the list of assigned receptors is empty
-                receptors = proxy.receptors
-                #!!!!!!!!!!!!!!!!!
-                # 09/20/2019 ATT:  New images for TANGO and PyTango images has been released.
-                # PyTango is now compiled with th numpy support. In this case the proxy.receptors
-                # call does no more return an empty tuple but an empty numpy array.
-                # Checks on receptors content need to be changed (see below)
-                # NB: the receptors attribute implemented by the CbfSubarray is declared as RW.
-                # In this case the read method returns an empty numpy array ([]) whose length is 0
-                #!!!!!!!!!!!!!!!!!
-                #if not receptors:
-                if len(receptors) == 0:
+                assigned = self.__get_assigned_receptors(proxy)
+                if not assigned:
                     self.dev_logging("RemoveAllReceptors: no receptor to remove",
                                      tango.LogLevel.LOG_INFO)
                     return
-                # forward the command to the CbfSubarray
-                proxy.command_inout("RemoveAllReceptors")
+                self.__start_resourcing("RemoveAllReceptors", assigned, 0)
+                # forward the command to the CbfSubarray: the release is tracked via
+                # the receptors change events
+                proxy.command_inout_asynch("RemoveAllReceptors", self.__cmd_ended)
                 #self._vcc = []
             except tango.DevFailed as df:
+                self.__cancel_resourcing()
                 log_msg = ("RemoveAllReceptors failure. Reason: {} "
                            "Desc: {}".format(df.args[0].reason,
                                              df.args[0].desc))
@@ -1880,7 +3196,8 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
 
     @command(
         dtype_in='str',
-        doc_in="A Json-encoded string with the scan configuration.",
+        doc_in=("A Json-encoded string with the scan configuration or the hash of a "
+                "validated configuration."),
     )
     @DebugIt()
     def ConfigureScan(self, argin):
@@ -1895,10 +3212,13 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         The command can be execuced when the CspSubarray State is *ON* and the \
         ObsState is *IDLE* or *READY*.\n
         If the configuration for the scan is not correct (invalid parameters or invalid JSON)\
-        the configuration is not applied and the ObsState of the CspSubarray remains IDLE.
+        the configuration is not applied and the ObsState of the CspSubarray remains IDLE.\n
+        A configuration already validated (see ValidateScanConfiguration) is\
+        forwarded without parsing and validating it again.
 
         Args:
-            argin: a JSON-encoded string with the parameters to configure a scan.
+            argin: a JSON-encoded string with the parameters to configure a scan\
+                   or the hash of a validated configuration.
         Returns:
             None
         Raises:
@@ -1909,203 +3229,113 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
             only when the CspSubarray is *ONLINE* or *MAINTENANCE*
         """
         # PROTECTED REGION ID(CspSubarray.ConfigureScan) ENABLED START #
+        self.__check_configure_scan("ConfigureScan")
+        # a configuration already validated (by ValidateScanConfiguration or by
+        # a previous ConfigureScan) is not parsed again
+        staged = self._staged_configurations.get(argin)
+        if staged is None:
+            staged = self.__validate_scan_configuration(argin, "ConfigureScan")
+        else:
+            log_msg = "Staged scan configuration {} forwarded".format(staged.hash)
+            self.dev_logging(log_msg, tango.LogLevel.LOG_INFO)
+        self.__forward_scan_configuration(staged, "ConfigureScan")
+        # PROTECTED REGION END #    //  CspSubarray.ConfigureScan
 
-        # TODO: add check for adminMode.  The subarray is able to perform configuration only
-        # if its adminMode is ONLINE/MAINTENANCE,
-        #
-        # check obs_state: the subarray can be configured only when the obs_state is
-        # IDLE or READY (re-configuration)
+    @command(
+        dtype_in='str',
+        doc_in="A Json-encoded string with the scan configuration.",
+        dtype_out='str',
+        doc_out="The hash of the validated configuration.",
+    )
+    @DebugIt()
+    def ValidateScanConfiguration(self, argin):
+        """
+        *Class method.*
 
-        if self._obs_state not in [ObsState.IDLE, ObsState.READY]:
-            log_msg = ("Subarray is in {} state, not IDLE or"
-                       " READY".format(ObsState(self._obs_state).name))
-            tango.Except.throw_exception("Command failed",
-                                         log_msg,
-                                         "ConfgureScan",
-                                         tango.ErrSeverity.ERR)
-        # check connection with CbfSubarray
-        if not self.__is_subarray_available(self._cbf_subarray_fqdn):
-            log_msg = "Subarray {} not registered!".format(str(self._cbf_subarray_fqdn))
-            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
-            tango.Except.throw_exception("Command failed",
-                                         log_msg,
-                                         "ConfigureScan execution",
-                                         tango.ErrSeverity.ERR)
-        # the dictionary with the scan configuration
-        argin_dict = {}
-        try:
-            # for test purpose we load the json configuration from an
-            # external file.
-            # TO REMOVE!!
-            if "load" in argin:
-                # skip the 'load' chars and remove spaces from the filename
-                fn = (argin[4:]).strip()
-                filename = os.path.join(commons_pkg_path, fn)
-                with open(filename) as json_file:
-                    # load the file into a dictionary
-                    argin_dict = json.load(json_file)
-                    # dump the dictionary into the input string to forward
-                    # to CbfSubarray
-                    argin = json.dumps(argin_dict)
-            else:
-                argin_dict = json.loads(argin)
-        except FileNotFoundError as file_err:
-            self.dev_logging(str(file_err), tango.LogLevel.LOG_ERROR)
-            tango.Except.throw_exception("Command failed",
-                                         str(file_err),
-                                         "ConfigureScan execution",
-                                         tango.ErrSeverity.ERR)
-        except json.JSONDecodeError as e:  # argument not a valid JSON object
-            # this is a fatal error
-            msg = ("Scan configuration object is not a valid JSON object."
-                   "Aborting configuration:{}".format(str(e)))
-            self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
-            tango.Except.throw_exception("Command failed",
-                                         msg,
-                                         "ConfigureScan execution",
-                                         tango.ErrSeverity.ERR)
-        # Validate scanID.
-        # If not given, abort the scan configuration.
-        # If malformed, abort the scan configuration.
-        if "scanID" in argin_dict:
-            if int(argin_dict["scanID"]) <= 0:  # scanID not positive
-                msg = ("'scanID' must be positive (received {}). "
-                       "Aborting configuration.".format(int(argin_dict["scanID"])))
-                # this is a fatal error
-                self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
-                tango.Except.throw_exception("Command failed",
-                                             msg,
-                                             "ConfigureScan execution",
-                                             tango.ErrSeverity.ERR)
-            #TODO:add on CspMaster the an attribute with the list of scanID
-            # of each sub-array
-            #elif any(map(lambda i: i == int(argin_dict["scanID"]),
-            #             self._proxy_csp_master.subarrayScanID)):  # scanID already taken
-            #    msg = "'scanID' must be unique (received {}). "\
-            #        "Aborting configuration.".format(int(argin_dict["scanID"]))
-            # this is a fatal error
-            #    self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
-            #    tango.Except.throw_exception("Command failed", msg, "ConfigureScan execution",
-            #                                   tango.ErrSeverity.ERR)
-            else:  # scanID is valid
-                self._scan_ID = int(argin_dict["scanID"])
-        else:  # scanID not given
-            msg = "'scanID' must be given. Aborting configuration."
-            # this is a fatal error
-            self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
-            tango.Except.throw_exception("Command failed",
-                                         msg,
-                                         "ConfigureScan execution",
-                                         tango.ErrSeverity.ERR)
-        # Validate frequencyBand.
-        # If not given, abort the scan configuration.
-        # If malformed, abort the scan configuration.
-        frequency_band = 0
-        if "frequencyBand" in argin_dict:
-            frequency_bands = ["1", "2", "3", "4", "5a", "5b"]
-            if argin_dict["frequencyBand"] in frequency_bands:
-                frequency_band = frequency_bands.index(argin_dict["frequencyBand"])
-            else:
-                msg = ("'frequencyBand' must be one of {} (received {}). "
-                       "Aborting configuration.".format(frequency_bands,
-                                                        argin_dict["frequencyBand"]))
-                # this is a fatal error
-                self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
-                tango.Except.throw_exception("Command failed",
-                                             msg,
-                                             "ConfigureScan execution",
-                                             tango.ErrSeverity.ERR)
-        else:  # frequencyBand not given
-            msg = "'frequencyBand' must be given. Aborting configuration."
-            # this is a fatal error
-            self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
-            tango.Except.throw_exception("Command failed",
-                                         msg,
-                                         "ConfigureScan execution",
-                                         tango.ErrSeverity.ERR)
+        Validate a scan configuration ahead of time, without applying it.\n
+        The configuration is stored in canonical form under its hash: a\
+        following ConfigureScan with the hash (or with the same JSON string)\
+        skips the parsing and the validation of the configuration.
 
-        # ======================================================================= #
-        # At this point, self._scan_ID, self._receptors, and self._frequency_band #
-        # are guaranteed to be properly configured.                               #
-        # ======================================================================= #
+        Args:
+            argin: a JSON-encoded string with the parameters to configure a scan.
+        Returns:
+            The hash (SHA-256 of the canonical JSON) of the configuration.
+        Raises:
+            tango.DevFailed exception if the configuration is not valid.
+        """
+        # PROTECTED REGION ID(CspSubarray.ValidateScanConfiguration) ENABLED START #
+        staged = self.__validate_scan_configuration(argin, "ValidateScanConfiguration")
+        log_msg = "Scan configuration {} (scanID {}) staged".format(staged.hash,
+                                                                    staged.scan_id)
+        self.dev_logging(log_msg, tango.LogLevel.LOG_INFO)
+        return staged.hash
+        # PROTECTED REGION END #    //  CspSubarray.ValidateScanConfiguration
 
-        # Validate band5Tuning, if frequencyBand is 5a or 5b.
-        # If not given, abort the scan configuration.
-        # If malformed, abort the scan configuration.
-        if frequency_band in [4, 5]:  # frequency band is 5a or 5b
-            if "band5Tuning" in argin_dict:
-                # check if streamTuning is an array of length 2
-                try:
-                    assert len(argin_dict["band5Tuning"]) == 2
-                except (TypeError, AssertionError):
-                    msg = ("'band5Tuning' must be an array of length 2."
-                           "Aborting configuration.")
-                    # this is a fatal error
-                    self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
-                    tango.Except.throw_exception("Command failed",
-                                                 msg,
-                                                 "ConfigureScan execution",
-                                                 tango.ErrSeverity.ERR)
+    def is_ConfigureScanEncoded_allowed(self):
+        """
+        *TANGO is_allowed method*: filter the external request depending on the current\
+        device state.\n
+        Check if the ConfigureScanEncoded method can be issued on the subarray\
+        (see is_ConfigureScan_allowed).
 
-                stream_tuning = [*map(float, argin_dict["band5Tuning"])]
-                if frequency_band == 4:
-                    if not all([5.85 <= stream_tuning[i] <= 7.25 for i in [0, 1]]):
-                        msg = ("Elements in 'band5Tuning must be floats between"
-                               " 5.85 and 7.25 (received {} and {}) for a "
-                               "'frequencyBand' of 5a."
-                               "Aborting configuration.".format(stream_tuning[0],
-                                                                stream_tuning[1]))
-                        # this is a fatal error
-                        self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
-                        tango.Except.throw_exception("Command failed",
-                                                     msg,
-                                                     "ConfigureScan execution",
-                                                     tango.ErrSeverity.ERR)
-                else:  # self._frequency_band == 5
-                    if not all([9.55 <= stream_tuning[i] <= 14.05 for i in [0, 1]]):
-                        msg = ("Elements in 'band5Tuning must be floats between "
-                               "9.55 and 14.05 (received {} and {}) for a "
-                               "'frequencyBand' of 5b. "
-                               "Aborting configuration.".format(stream_tuning[0],
-                                                                stream_tuning[1]))
-                        # this is a fatal error
-                        self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
-                        tango.Except.throw_exception("Command failed",
-                                                     msg,
-                                                     "ConfigureScan execution",
-                                                     tango.ErrSeverity.ERR)
-            else:
-                msg = ("'band5Tuning' must be given for a"
-                       " 'frequencyBand' of {}. "
-                       "Aborting configuration".format(["5a", "5b"][frequency_band - 4]))
-                # this is a fatal error
-                self.dev_logging(msg, tango.LogLevel.LOG_ERROR)
+        Returns:
+            True if the command can be executed, otherwise False
+        """
+        return self.is_ConfigureScan_allowed()
+
+    @command(
+        dtype_in='DevEncoded',
+        doc_in="The encoding format (msgpack, cbor or json) and the encoded scan configuration.",
+    )
+    @DebugIt()
+    def ConfigureScanEncoded(self, argin):
+        """
+        *Class method.*
+
+        Configure a scan for the subarray with a binary encoded configuration.\n
+        The configuration is the same as the ConfigureScan one, encoded in\
+        msgpack or CBOR (see commons/encoded_configuration.py): the numeric\
+        arrays (for example the channelAveragingMap of the FSPs) are sent as\
+        typed arrays and decoded into NumPy arrays without creating an object\
+        for each element. The decoded configuration is validated as the\
+        ConfigureScan one and staged under the hash of the encoded bytes.\
+        The CbfSubarray takes a JSON configuration: the decoded arrays are\
+        converted into JSON lists once, when the configuration is first\
+        forwarded, and the payload is reused when the same encoded\
+        configuration is received again.
+
+        Args:
+            argin: the encoding format and the encoded configuration.
+        Returns:
+            None
+        Raises:
+            tango.DevFailed exception if the CspSubarray ObsState is not valid, if\
+            the format is not supported or if the configuration is not valid.
+        """
+        # PROTECTED REGION ID(CspSubarray.ConfigureScanEncoded) ENABLED START #
+        self.__check_configure_scan("ConfigureScanEncoded")
+        encoded_format, data = argin
+        # the encoded configurations already received are not decoded again
+        key = encoded_key(encoded_format, bytes(data))
+        staged = self._staged_configurations.get(key)
+        if staged is None:
+            try:
+                argin_dict = decode_configuration(encoded_format, data)
+            except ValueError as err:
+                log_msg = "Aborting configuration: {}".format(str(err))
+                self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
                 tango.Except.throw_exception("Command failed",
-                                             msg,
-                                             "ConfigureScan execution",
+                                             log_msg,
+                                             "ConfigureScanEncoded execution",
                                              tango.ErrSeverity.ERR)
-
-        # Forward the ConfigureScan command to CbfSubarray.
-        try:
-            proxy = self._se_subarrays_proxies[self._cbf_subarray_fqdn]
-            proxy.ping()
-            # self._obs_state = ObsState.CONFIGURING.value
-            # use asynchrnous model
-            # in this case the obsMode and the valid scan configuraiton are set
-            # at command end
-            proxy.command_inout_asynch("ConfigureScan", argin, self.__cmd_ended)
-            #self._valid_scan_configuration = argin
-        except tango.DevFailed as df:
-            log_msg = ''
-            for item in df.args:
-                log_msg += item.reason + " " + item.desc
-            self.dev_logging(log_msg, tango.LogLevel.LOG_ERROR)
-            tango.Except.re_throw_exception(df,
-                                            "Command failed",
-                                            "CspSubarray ConfigureScan command failed",
-                                            "Command()",
-                                            tango.ErrSeverity.ERR)
-        # PROTECTED REGION END #    //  CspSubarray.ConfigureScan
+            staged = self.__validate_scan_configuration(key, "ConfigureScanEncoded",
+                                                        argin_dict)
+        else:
+            log_msg = "Staged scan configuration {} forwarded".format(staged.hash)
+            self.dev_logging(log_msg, tango.LogLevel.LOG_INFO)
+        self.__forward_scan_configuration(staged, "ConfigureScanEncoded")
+        # PROTECTED REGION END #    //  CspSubarray.ConfigureScanEncoded
 
     @command(
         dtype_in='uint16',
@@ -2114,8 +3344,6 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
     @DebugIt()
     def AddNumOfSearchBeams(self, argin):
         """
-        Note:
-            Still to be implemented
         *Class method*
 
         Add the specified number of Search Beams capabilities to the subarray.
@@ -2126,7 +3354,8 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
             None
         """
         # PROTECTED REGION ID(CspSubarray.AddSearchBeams) ENABLED START #
-        return
+        self.__assign_beams("AddNumOfSearchBeams", "SearchBeam", self._search_beams,
+                            {"number": int(argin)})
         # PROTECTED REGION END #    //  CspSubarray.AddSearchBeams
 
     @command(
@@ -2138,8 +3367,6 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
     @DebugIt()
     def RemoveNumOfSearchBeams(self, argin):
         """
-        Note:
-            Still to be implemented
         *Class method*
 
         Remove the specified number of Search Beams capabilities from the subarray.
@@ -2153,7 +3380,10 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         """
 
         # PROTECTED REGION ID(CspSubarray.RemoveSearchBeams) ENABLED START #
-        return
+        # the beams with the highest IDs are released first: a number not lower
+        # than the number of assigned beams releases all of them
+        self.__release_beams("RemoveNumOfSearchBeams", "SearchBeam", self._search_beams,
+                             {"number": int(argin)})
         # PROTECTED REGION END #    //  CspSubarray.RemoveSearchBeams
 
     @command(
@@ -2163,8 +3393,6 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
     @DebugIt()
     def AddTimingBeams(self, argin):
         """
-        Note:
-            Still to be implemented
         *Class method*
 
         Add the specified Timing Beams Capability IDs to the subarray.
@@ -2176,7 +3404,8 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
             None
         """
         # PROTECTED REGION ID(CspSubarray.AddTimingBeams) ENABLED START #
-        return
+        self.__assign_beams("AddTimingBeams", "TimingBeam", self._timing_beams,
+                            {"beamIDs": [int(beam_id) for beam_id in argin]})
         # PROTECTED REGION END #    //  CspSubarray.AddTimingBeams
 
     @command(
@@ -2186,8 +3415,6 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
     @DebugIt()
     def AddVlbiBeams(self, argin):
         """
-        Note:
-            Still to be implemented
         *Class method*
 
         Add the specified Vlbi Beams Capability IDs to the subarray.
@@ -2199,7 +3426,8 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
             None
         """
         # PROTECTED REGION ID(CspSubarray.AddVlbiBeams) ENABLED START #
-        return
+        self.__assign_beams("AddVlbiBeams", "VlbiBeam", self._vlbi_beams,
+                            {"beamIDs": [int(beam_id) for beam_id in argin]})
         # PROTECTED REGION END #    //  CspSubarray.AddVlbiBeams
 
     @command(
@@ -2210,8 +3438,6 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
     @DebugIt()
     def AddSearchBeamsID(self, argin):
         """
-        Note:
-            Still to be implemented
         *Class method*
 
         Add the specified Search Beams Capability IDs to the subarray.
@@ -2228,7 +3454,8 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
             AddNumOfSearchBeams
         """
         # PROTECTED REGION ID(CspSubarray.AddSearchBeamsID) ENABLED START #
-        return
+        self.__assign_beams("AddSearchBeamsID", "SearchBeam", self._search_beams,
+                            {"beamIDs": [int(beam_id) for beam_id in argin]})
         # PROTECTED REGION END #    //  CspSubarray.AddSearchBeamsID
 
     @command(
@@ -2238,8 +3465,6 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
     @DebugIt()
     def RemoveSearchBeamsID(self, argin):
         """
-        Note:
-            Still to be implemented
         *Class method*
 
         Remove the specified Search Beam Capability IDs from the subarray.
@@ -2251,7 +3476,8 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
             None
         """
         # PROTECTED REGION ID(CspSubarray.RemoveSearchBeamsID) ENABLED START #
-        return
+        self.__release_beams("RemoveSearchBeamsID", "SearchBeam", self._search_beams,
+                             {"beamIDs": [int(beam_id) for beam_id in argin]})
         # PROTECTED REGION END #    //  CspSubarray.RemoveSearchBeamsID
 
     @command(
@@ -2259,11 +3485,8 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         doc_in="The list of Timing Beams IDs to remove from the sub-array.",
     )
     @DebugIt()
-    def RemoveTimingBeams(self):
+    def RemoveTimingBeams(self, argin):
         """
-        Note:
-            Still to be implemented
-
         *Class method*
 
         Remove the specified Timing Beam Capability IDs from the subarray.
@@ -2275,7 +3498,8 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
             None
         """
         # PROTECTED REGION ID(CspSubarray.RemoveTimingBeams) ENABLED START #
-        return
+        self.__release_beams("RemoveTimingBeams", "TimingBeam", self._timing_beams,
+                             {"beamIDs": [int(beam_id) for beam_id in argin]})
         # PROTECTED REGION END #    //  CspSubarray.RemoveTimingBeams
 
     @command(
@@ -2283,11 +3507,8 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
         doc_in="The list of Timing Beams IDs to remove from the sub-array.",
     )
     @DebugIt()
-    def RemoveVlbiBeams(self):
+    def RemoveVlbiBeams(self, argin):
         """
-        Note:
-            Still to be implemented
-
         *Class method*
 
         Remove the specified Vlbi Beam Capability IDs from the subarray.
@@ -2299,7 +3520,8 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
             None
         """
         # PROTECTED REGION ID(CspSubarray.RemoveVlbiBeams) ENABLED START #
-        return
+        self.__release_beams("RemoveVlbiBeams", "VlbiBeam", self._vlbi_beams,
+                             {"beamIDs": [int(beam_id) for beam_id in argin]})
         # PROTECTED REGION END #    //  CspSubarray.RemoveVlbiBeams
 
     def is_EndSB_allowed(self):
@@ -2344,6 +3566,7 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
                                          log_msg,
                                          "Scan",
                                          tango.ErrSeverity.ERR)
+        self.__check_scan_scheduled("EndSB")
         # check connection with CbfSubarray
         if not self.__is_subarray_available(self._cbf_subarray_fqdn):
             log_msg = "Subarray {} not registered!".format(str(self._cbf_subarray_fqdn))
@@ -2367,6 +3590,32 @@ class CspSubarray(with_metaclass(DeviceMeta, SKASubarray)):
                                             tango.ErrSeverity.ERR)
         # PROTECTED REGION END #    //  CspSubarray.EndSB
 
+    @command(
+        dtype_in='float',
+        doc_in="The time (seconds since the epoch) of the oldest transition to report. "
+               "0 to report all the recorded transitions.",
+        dtype_out='str',
+        doc_out="The JSON-encoded transitions: {sources, attributes, entries} where each "
+                "entry is [timestamp, source index, attribute index, value].",
+    )
+    @DebugIt()
+    def GetHistory(self, argin):
+        """
+        *Class method*
+
+        Report the State, healthState, adminMode and obsState transitions of the\
+        subarray and of the sub-element subarrays recorded after the specified time.\
+        The device keeps the last *HistorySize* transitions.
+
+        Args:
+            argin: the time (seconds since the epoch) of the oldest transition.
+        Returns:
+            The JSON-encoded transitions (see commons/scm_history.py).
+        """
+        # PROTECTED REGION ID(CspSubarray.GetHistory) ENABLED START #
+        return self._scm_history.to_json(argin)
+        # PROTECTED REGION END #    //  CspSubarray.GetHistory
+
 # ----------
 # Run server
 # ----------
@@ -34,14 +34,14 @@ setup(
       packages=pack,
       include_package_data=True,
       test_suite="test",
-      entry_points={'console_scripts':['CspSubarray = CspSubarray:main']},
+      entry_points={'console_scripts':['CspSubarray = CspSubarray.CspSubarray:main']},
       author='E.G',
       author_email='elisabetta.giani@inaf.it',
       license='BSD-3-Clause',
       long_description=long_description,
       url='www.tango-controls.org',
       platforms="All Platforms",
-      install_requires=['pytango==9.3.1', 'mock'],
+      install_requires=['pytango>=9.3.3', 'mock'],
       #test_suite='test',
       setup_requires=[
           # dependency for `python setup.py test`
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the csp-lmc-prototype project
+#
+#
+#
+# Distributed under the terms of the BSD-3-Clause license.
+# See LICENSE.txt for more info.
+"""Contain the tests for the state journal and the warm restart of the devices."""
+
+# Standard imports
+import sys
+import os
+import json
+
+# Tango imports
+from tango import DevState
+import pytest
+
+# Path
+file_path = os.path.dirname(os.path.abspath(__file__))
+# insert base package directory to import global_enum
+# module in commons folder
+commons_pkg_path = os.path.abspath(os.path.join(file_path, "../../commons"))
+sys.path.insert(0, commons_pkg_path)
+
+path = os.path.join(os.path.dirname(__file__), os.pardir)
+sys.path.insert(0, os.path.abspath(path))
+
+#Local imports
+from global_enum import ObsState
+from attribute_wait import wait_for_attribute
+from state_journal import StateJournal, journal_path, MAGIC, HEADER
+
+class TestStateJournal(object):
+
+    def test_replay(self, tmp_path):
+        """
+        Test that the state is rebuilt by merging the records in order.
+        """
+        journal_file = str(tmp_path / "device.journal")
+        journal = StateJournal(journal_file, size=4096)
+        journal.append({"scanID": 1, "validScanConfiguration": "{}"})
+        journal.append({"scanID": 2})
+        journal.close()
+        journal = StateJournal(journal_file)
+        assert journal.replay() == {"scanID": 2, "validScanConfiguration": "{}"}
+        journal.close()
+
+    def test_torn_record(self, tmp_path):
+        """
+        Test that a record failing the CRC check is discarded, together with
+        anything after it, and that its leftovers are not replayed after the
+        next appends.
+        """
+        journal_file = str(tmp_path / "device.journal")
+        journal = StateJournal(journal_file, size=4096)
+        journal.append({"scanID": 1})
+        journal.append({"scanID": 2, "validScanConfiguration": "torn"})
+        journal.close()
+        # corrupt the payload of the second record
+        first_length = len(json.dumps({"scanID": 1}, separators=(",", ":")))
+        torn_offset = len(MAGIC) + HEADER.size + first_length + HEADER.size
+        with open(journal_file, "r+b") as f:
+            f.seek(torn_offset)
+            f.write(b"X")
+        journal = StateJournal(journal_file)
+        assert journal.replay() == {"scanID": 1}
+        journal.append({"scanID": 3})
+        journal.close()
+        journal = StateJournal(journal_file)
+        assert journal.replay() == {"scanID": 3}
+        journal.close()
+
+    def test_compaction(self, tmp_path):
+        """
+        Test that a full journal is replaced by a new file holding only the
+        current state.
+        """
+        journal_file = str(tmp_path / "device.journal")
+        journal = StateJournal(journal_file, size=256)
+        record = {"scanID": 0, "receptorMembership": [1] * 8}
+        record_size = HEADER.size + len(json.dumps(record, separators=(",", ":")))
+        for scan_id in range(1, 101):
+            journal.append(dict(record, scanID=scan_id))
+        assert journal.replay()["scanID"] == 100
+        journal.close()
+        # the records don't fit in the file without compaction
+        assert os.path.getsize(journal_file) < 100 * record_size
+        assert not os.path.exists(journal_file + ".tmp")
+        journal = StateJournal(journal_file)
+        assert journal.replay() == {"scanID": 100, "receptorMembership": [1] * 8}
+        journal.close()
+
+    def test_invalid_file(self, tmp_path):
+        """
+        Test that a file without the journal header is rejected.
+        """
+        journal_file = str(tmp_path / "device.journal")
+        with open(journal_file, "wb") as f:
+            f.write(b"not a journal")
+        with pytest.raises(ValueError):
+            StateJournal(journal_file)
+
+@pytest.fixture(scope="class")
+def journaled_csp(tmp_path_factory):
+    """Run the CspMaster, the CspSubarray and the CBF simulators with the
+       state journal enabled.
+    """
+    try:
+        from sim_context import SimulatedCspContext
+    except ImportError:
+        # MultiDeviceTestContext requires PyTango >= 9.3.3
+        pytest.skip("MultiDeviceTestContext not available")
+    journal_dir = str(tmp_path_factory.mktemp("journal"))
+    with SimulatedCspContext(num_of_subarrays=1,
+                             csp_properties={"JournalDir": journal_dir}) as context:
+        context.journal_dir = journal_dir
+        yield context
+
+@pytest.mark.usefixtures("journaled_csp")
+
+class TestWarmRestart(object):
+
+    def test_subarray_scan_state(self, journaled_csp):
+        """
+        Test that the scanID and the scan configuration of the CspSubarray
+        survive the re-initialization of the device.
+        """
+        journaled_csp.csp_master.On([])
+        wait_for_attribute(journaled_csp.csp_master, "State", DevState.ON, timeout=5)
+        csp_subarray = journaled_csp.csp_subarrays[0]
+        csp_subarray.AddReceptors([1, 2, 3])
+        wait_for_attribute(csp_subarray, "State", DevState.ON, timeout=5)
+        filename = os.path.join(commons_pkg_path, "test_ConfigureScan_basic.json")
+        with open(filename) as f:
+            configuration = json.load(f)
+        configuration["scanID"] = 7
+        csp_subarray.ConfigureScan(json.dumps(configuration))
+        wait_for_attribute(csp_subarray, "obsState", ObsState.READY, timeout=10)
+        valid_configuration = csp_subarray.validScanConfiguration
+        csp_subarray.Init()
+        assert csp_subarray.scanID == 7
+        assert csp_subarray.validScanConfiguration == valid_configuration
+        assert os.path.exists(journal_path(journaled_csp.journal_dir,
+                                           csp_subarray.dev_name()))
+
+    def test_master_receptor_membership(self, journaled_csp):
+        """
+        Test that the receptors membership of the CspMaster survives the
+        re-initialization of the device.
+        """
+        csp_master = journaled_csp.csp_master
+        wait_for_attribute(csp_master, "receptorMembership",
+                           lambda membership: list(membership[:4]) == [1, 1, 1, 0],
+                           timeout=5)
+        csp_master.Init()
+        # the allocation table is restored from the journal before the first
+        # VCC report is received from CBF
+        assert list(csp_master.receptorMembership[:4]) == [1, 1, 1, 0]
+        journal = StateJournal(journal_path(journaled_csp.journal_dir, csp_master.dev_name()))
+        assert journal.replay()["receptorMembership"][:4] == [1, 1, 1, 0]
+        journal.close()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the csp-lmc-prototype project
+#
+#
+#
+# Distributed under the terms of the BSD-3-Clause license.
+# See LICENSE.txt for more info.
+"""Contain the tests for the CspSubarray running against the CBF simulators."""
+
+# Standard imports
+import sys
+import os
+
+# Tango imports
+import tango
+from tango import DevState
+import pytest
+
+# Path
+file_path = os.path.dirname(os.path.abspath(__file__))
+# insert base package directory to import global_enum
+# module in commons folder
+commons_pkg_path = os.path.abspath(os.path.join(file_path, "../../commons"))
+sys.path.insert(0, commons_pkg_path)
+
+path = os.path.join(os.path.dirname(__file__), os.pardir)
+sys.path.insert(0, os.path.abspath(path))
+
+#Local imports
+from global_enum import ObsState
+from attribute_wait import wait_for_attribute
+try:
+    from sim_context import SimulatedCspContext
+except ImportError:
+    # MultiDeviceTestContext requires PyTango >= 9.3.3
+    pytest.skip("MultiDeviceTestContext not available", allow_module_level=True)
+
+@pytest.fixture(scope="class")
+def simulated_csp():
+    """Run the CspMaster, the CspSubarray and the CBF simulators in
+       the same device server, without the TANGO DB
+    """
+    with SimulatedCspContext(num_of_subarrays=1) as context:
+        yield context
+
+# Device test case
+@pytest.mark.usefixtures("simulated_csp")
+
+class TestCspSubarraySimulated(object):
+
+    def test_add_receptors(self, simulated_csp):
+        """
+        Test the assignment of receptors to the CbfTestSubarray simulator
+        """
+        csp_subarray = simulated_csp.csp_subarrays[0]
+        cbf_subarray = simulated_csp.cbf_subarrays[0]
+        csp_subarray.AddReceptors([1, 2, 3])
+        wait_for_attribute(csp_subarray, "State", DevState.ON, timeout=5)
+        assert list(cbf_subarray.receptors) == [1, 2, 3]
+        assert cbf_subarray.state() == DevState.ON
+        assert csp_subarray.state() == DevState.ON
+        # the command completion is confirmed by the assignedReceptors attribute
+        wait_for_attribute(csp_subarray, "resourcingProgress", 100, timeout=5)
+        assert list(csp_subarray.assignedReceptors) == [1, 2, 3]
+        # the VCC membership is updated on the CBF Master simulator
+        vcc_membership = simulated_csp.cbf_master.reportVCCSubarrayMembership
+        assert list(vcc_membership[:4]) == [1, 1, 1, 0]
+        # the VCCs of the subarray are updated by the receptors change events
+        wait_for_attribute(csp_subarray, "vcc",
+                           lambda vcc: vcc is not None and list(vcc) == [1, 2, 3], timeout=5)
+
+    def test_configure_scan(self, simulated_csp):
+        """
+        Test the scan configuration: the obsState moves to READY
+        """
+        csp_subarray = simulated_csp.csp_subarrays[0]
+        cbf_subarray = simulated_csp.cbf_subarrays[0]
+        filename = os.path.join(commons_pkg_path, "test_ConfigureScan_basic.json")
+        with open(filename) as json_file:
+            csp_subarray.ConfigureScan(json_file.read())
+        wait_for_attribute(csp_subarray, "obsState", ObsState.READY, timeout=5)
+        assert cbf_subarray.obsState == ObsState.READY
+        assert csp_subarray.obsState == ObsState.READY
+        assert '"scanID": 1' in cbf_subarray.outputLinksDistribution
+
+    def test_scan_end_scan(self, simulated_csp):
+        """
+        Test the Scan and EndScan commands
+        """
+        csp_subarray = simulated_csp.csp_subarrays[0]
+        csp_subarray.Scan("0")
+        wait_for_attribute(csp_subarray, "obsState", ObsState.SCANNING, timeout=5)
+        assert csp_subarray.obsState == ObsState.SCANNING
+        csp_subarray.EndScan()
+        wait_for_attribute(csp_subarray, "obsState", ObsState.READY, timeout=5)
+        assert csp_subarray.obsState == ObsState.READY
+
+    def test_end_sb_remove_receptors(self, simulated_csp):
+        """
+        Test the EndSB and RemoveAllReceptors commands
+        """
+        csp_subarray = simulated_csp.csp_subarrays[0]
+        cbf_subarray = simulated_csp.cbf_subarrays[0]
+        csp_subarray.EndSB()
+        wait_for_attribute(csp_subarray, "obsState", ObsState.IDLE, timeout=5)
+        assert csp_subarray.obsState == ObsState.IDLE
+        csp_subarray.RemoveAllReceptors()
+        wait_for_attribute(csp_subarray, "State", DevState.OFF, timeout=5)
+        assert not cbf_subarray.receptors
+        assert cbf_subarray.state() == DevState.OFF
+        wait_for_attribute(csp_subarray, "assignedReceptors",
+                           lambda receptors: receptors is None or not receptors.any(),
+                           timeout=5)
+        assert csp_subarray.resourcingProgress == 100
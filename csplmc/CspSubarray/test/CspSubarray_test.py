@@ -13,6 +13,7 @@
 import sys
 import os
 import time
+import json
 import random
 import numpy as np
 
@@ -33,7 +34,10 @@ sys.path.insert(0, os.path.abspath(path))
 
 #Local imports
 from CspSubarray import CspSubarray
+from csplmc.commons.dispatch_scheduler import DispatchScheduler
 from global_enum import ObsState
+from attribute_wait import wait_for_attribute
+from encoded_configuration import encode_configuration, supported_formats
 
 # Device test case
 @pytest.mark.usefixtures("csp_master", "csp_subarray01", "cbf_subarray01", "csp_subarray02")
@@ -46,14 +50,14 @@ class TestCspSubarray(object):
         The CspSubarray State at start is OFF.
         """
         csp_subarray01.Init()
-        time.sleep(2)
+        wait_for_attribute(csp_subarray01, "State", DevState.DISABLE, timeout=5)
         state = csp_subarray01.state()
         assert state in [DevState.DISABLE]
         #switch-on the CspMaster
         csp_master_state = csp_master.state()
         assert csp_master_state == DevState.STANDBY
         csp_master.On("")
-        time.sleep(2)
+        wait_for_attribute(csp_subarray01, "State", DevState.OFF, timeout=5)
         state = csp_subarray01.state()
         assert state in [DevState.OFF]
 
@@ -75,7 +79,6 @@ class TestCspSubarray(object):
             if len(invalid_receptor_to_assign) > 3:
                 break
         csp_subarray01.AddReceptors(invalid_receptor_to_assign)
-        time.sleep(2)
         receptors = csp_subarray01.receptors
         # receptors is a numpy array. In this test the returned array has to be
         # empty (no receptor assigned)
@@ -99,8 +102,9 @@ class TestCspSubarray(object):
         # assert the array is not empty
         assert receptor_list.any()
         csp_subarray01.AddReceptors(receptor_list)
-        # sleep a while to wait for attribute updated
-        time.sleep(2)
+        # wait for attribute updated
+        wait_for_attribute(csp_subarray01, "receptors",
+                           lambda receptors: set(receptors) == set(receptor_list), timeout=5)
         # read the list of assigned receptors
         receptors = csp_subarray01.receptors
         assert set(receptor_list) == set(receptors)
@@ -116,7 +120,6 @@ class TestCspSubarray(object):
         # add to the subarray an already assigned receptor
         receptors_to_add = [assigned_receptors[0]]
         csp_subarray01.AddReceptors(receptors_to_add)
-        time.sleep(2)
         receptors = csp_subarray01.receptors
         # check the array read first and the array read last are equal
         assert np.array_equal(receptors, assigned_receptors)
@@ -134,6 +137,21 @@ class TestCspSubarray(object):
         state = csp_subarray01.state()
         assert state == DevState.ON
 
+    def test_history_after_receptors_assignment(self, csp_subarray01):
+        """
+        Test the SCM history: the transition of the CspSubarray State to ON
+        is reported by GetHistory.
+        """
+        history = json.loads(csp_subarray01.GetHistory(0))
+        source = history["sources"].index(csp_subarray01.dev_name())
+        attribute = history["attributes"].index("State")
+        states = [value for _, entry_source, entry_attribute, value in history["entries"]
+                  if (entry_source, entry_attribute) == (source, attribute)]
+        assert states[-1] == DevState.ON
+        # no transition is reported after the last one
+        last_timestamp = history["entries"][-1][0]
+        assert not json.loads(csp_subarray01.GetHistory(last_timestamp + 1))["entries"]
+
     def test_remove_receptors(self, csp_subarray01):
         """
         Test the partial deallocation of receptors from a
@@ -152,7 +170,9 @@ class TestCspSubarray(object):
         receptor_to_remove.append(i)
         # remove only one receptor (with a random ID)
         csp_subarray01.RemoveReceptors(receptor_to_remove)
-        time.sleep(4)
+        wait_for_attribute(csp_subarray01, "receptors",
+                           lambda receptors: len(receptors) == init_number_of_receptors - 1,
+                           timeout=5)
         assigned_receptors = csp_subarray01.receptors
         final_number_of_receptors = len(assigned_receptors)
         assert (init_number_of_receptors - final_number_of_receptors) == 1
@@ -186,7 +206,10 @@ class TestCspSubarray(object):
                     break
         assert receptors_to_add
         csp_subarray01.AddReceptors(receptors_to_add)
-        time.sleep(2)
+        wait_for_attribute(csp_subarray01, "receptors",
+                           lambda receptors: (len(receptors) ==
+                                              num_of_initial_receptors + num_of_valid_receptors),
+                           timeout=5)
         assigned_receptors = csp_subarray01.receptors
         final_number_of_receptors = len(assigned_receptors)
         assert final_number_of_receptors == (num_of_initial_receptors + num_of_valid_receptors)
@@ -202,11 +225,13 @@ class TestCspSubarray(object):
         assigned_receptors = csp_subarray01.receptors
         assert assigned_receptors.any()
         csp_subarray01.RemoveAllReceptors()
-        time.sleep(2)
+        wait_for_attribute(csp_subarray01, "receptors",
+                           lambda receptors: receptors is None or not receptors.any(),
+                           timeout=5)
         assigned_receptors = csp_subarray01.receptors
         # check the array is empty (any() in this case returns False)
         assert not assigned_receptors.any()
-        time.sleep(2)
+        wait_for_attribute(csp_subarray01, "State", DevState.OFF, timeout=5)
         assert csp_subarray01.state() == DevState.OFF
 
     def test_configureScan_invalid_state(self, csp_subarray01):
@@ -234,7 +259,6 @@ class TestCspSubarray(object):
         obs_state = csp_subarray01.obsState
         assert obs_state in [ObsState.IDLE, ObsState.READY]
         receptor_list = csp_master.availableReceptorIDs
-        time.sleep(2)
         # receptor_list is a numpy array. If there is no available receptor to assign,
         # receptor_list is a numpy array with only one element whose value is 0, that is:
         # receptor_list = [0] -> means no available receptor
@@ -246,17 +270,29 @@ class TestCspSubarray(object):
         # the configuration JSON file
         receptors_to_assign = [1, 4]
         csp_subarray01.AddReceptors(receptors_to_assign)
-        time.sleep(2)
+        wait_for_attribute(csp_subarray01, "State", DevState.ON, timeout=5)
         subarray_state = csp_subarray01.State()
         assert subarray_state == tango.DevState.ON
         filename = os.path.join(commons_pkg_path, "test_ConfigureScan_basic.json")
         f = open(filename)
         csp_subarray01.ConfigureScan(f.read().replace("\n", ""))
         f.close()
-        time.sleep(5)
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.READY, timeout=10)
         obs_state = csp_subarray01.obsState
         assert obs_state == ObsState.READY
 
+    def test_delay_model_subscription(self, csp_subarray01):
+        """
+        Test that the subarray subscribes the delay model of the scan
+        configuration and removes it from the configuration forwarded to CBF.
+        """
+        assert csp_subarray01.obsState == ObsState.READY
+        stats = json.loads(csp_subarray01.delayModelLatency)
+        assert stats["subscriptionPoint"] == ("ska_mid/tm_leaf_node/csp_subarray_01/"
+                                              "delayModel")
+        assert set(stats["delivery"]) == {"count", "last", "mean", "max", "p50", "p99"}
+        assert "delayModelSubscriptionPoint" in csp_subarray01.validScanConfiguration
+
     def test_start_scan(self, csp_subarray01):
         """
         Test that a subarray is able to process the
@@ -265,7 +301,7 @@ class TestCspSubarray(object):
         obs_state = csp_subarray01.obsState
         assert obs_state == ObsState.READY
         csp_subarray01.Scan(" ")
-        time.sleep(2)
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.SCANNING, timeout=5)
         obs_state = csp_subarray01.obsState
         assert obs_state == ObsState.SCANNING
 
@@ -277,10 +313,158 @@ class TestCspSubarray(object):
         obs_state = csp_subarray01.obsState
         assert obs_state == ObsState.SCANNING
         csp_subarray01.EndScan()
-        time.sleep(3)
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.READY, timeout=5)
         obs_state = csp_subarray01.obsState
         assert obs_state == ObsState.READY
 
+    def test_scheduled_scan(self, csp_subarray01):
+        """
+        Test the Scan and EndScan commands dispatched at the scheduled time
+        and the cancellation of a scheduled Scan.
+        """
+        assert csp_subarray01.obsState == ObsState.READY
+        start_time = time.time() + 1
+        csp_subarray01.Scan(str(start_time))
+        stats = json.loads(csp_subarray01.scanDispatchStats)
+        assert stats["Scan"]["pending"] == pytest.approx(start_time)
+        assert csp_subarray01.obsState == ObsState.READY
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.SCANNING, timeout=5)
+        assert time.time() >= start_time
+        csp_subarray01.EndScanAt(time.time() + 0.5)
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.READY, timeout=5)
+        stats = json.loads(csp_subarray01.scanDispatchStats)
+        assert stats["Scan"]["dispatched"] == 1
+        assert stats["EndScan"]["dispatched"] == 1
+        # the dispatch is not early; the bound is loose for the shared test hosts
+        # (see the benchmarks for the jitter measurements)
+        last = stats["Scan"]["last"]
+        assert last["scheduled"] == pytest.approx(start_time)
+        assert last["started"] >= last["scheduled"]
+        assert stats["Scan"]["jitter"]["max"] < 1000
+        # a scheduled Scan is cancelled by EndScan
+        csp_subarray01.Scan(str(time.time() + 60))
+        with pytest.raises(tango.DevFailed):
+            csp_subarray01.EndSB()
+        csp_subarray01.EndScan()
+        stats = json.loads(csp_subarray01.scanDispatchStats)
+        assert stats["Scan"]["pending"] is None
+        assert stats["Scan"]["cancelled"] == 1
+        assert csp_subarray01.obsState == ObsState.READY
+
+    def test_scheduled_scan_cancelled(self, csp_subarray01):
+        """
+        Test that a Scan cancelled by EndScan before its activation time is
+        never dispatched.
+        """
+        assert csp_subarray01.obsState == ObsState.READY
+        stats = json.loads(csp_subarray01.scanDispatchStats)
+        dispatched = stats["Scan"]["dispatched"]
+        cancelled = stats["Scan"]["cancelled"]
+        start_time = time.time() + 1
+        csp_subarray01.Scan(str(start_time))
+        csp_subarray01.EndScan()
+        # wait past the activation time
+        time.sleep(max(0, start_time - time.time()) + 0.5)
+        stats = json.loads(csp_subarray01.scanDispatchStats)
+        assert stats["Scan"]["pending"] is None
+        assert stats["Scan"]["dispatched"] == dispatched
+        assert stats["Scan"]["cancelled"] == cancelled + 1
+        assert csp_subarray01.obsState == ObsState.READY
+
+    def test_end_scan_cancels_scheduled_end(self, csp_subarray01):
+        """
+        Test that EndScan cancels a scheduled EndScan, so that it doesn't end
+        the next scan, and that the end of a scan can't be scheduled before
+        its start.
+        """
+        assert csp_subarray01.obsState == ObsState.READY
+        start_time = time.time() + 2
+        csp_subarray01.Scan(str(start_time))
+        with pytest.raises(tango.DevFailed):
+            csp_subarray01.EndScanAt(start_time - 1)
+        csp_subarray01.EndScan()
+        csp_subarray01.Scan(" ")
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.SCANNING, timeout=5)
+        end_time = time.time() + 2
+        csp_subarray01.EndScanAt(end_time)
+        csp_subarray01.EndScan()
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.READY, timeout=5)
+        stats = json.loads(csp_subarray01.scanDispatchStats)
+        assert stats["EndScan"]["pending"] is None
+        assert stats["EndScan"]["cancelled"] == 1
+        # the new scan is not blocked by the cancelled EndScan and it is not
+        # ended at the old end time
+        csp_subarray01.Scan(" ")
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.SCANNING, timeout=5)
+        time.sleep(max(0, end_time - time.time()) + 0.5)
+        assert csp_subarray01.obsState == ObsState.SCANNING
+        csp_subarray01.EndScan()
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.READY, timeout=5)
+        # no other scan can start or be ended while the end of a scan is scheduled
+        csp_subarray01.Scan(str(time.time() + 30))
+        csp_subarray01.EndScanAt(time.time() + 60)
+        with pytest.raises(tango.DevFailed):
+            csp_subarray01.Scan(" ")
+        with pytest.raises(tango.DevFailed):
+            csp_subarray01.EndSB()
+        csp_subarray01.EndScan()
+        stats = json.loads(csp_subarray01.scanDispatchStats)
+        assert stats["Scan"]["pending"] is None
+        assert stats["EndScan"]["pending"] is None
+        assert stats["EndScan"]["cancelled"] == 2
+        assert csp_subarray01.obsState == ObsState.READY
+
+    def test_staged_configuration(self, csp_subarray01):
+        """
+        Test that a scan configuration validated ahead of time is applied
+        by ConfigureScan with its hash.
+        """
+        assert csp_subarray01.obsState == ObsState.READY
+        with pytest.raises(tango.DevFailed):
+            csp_subarray01.ValidateScanConfiguration('{"frequencyBand": "1"}')
+        filename = os.path.join(commons_pkg_path, "test_ConfigureScan_basic.json")
+        with open(filename) as f:
+            configuration = json.load(f)
+        # a scanID not applied yet
+        configuration["scanID"] = 5
+        config_hash = csp_subarray01.ValidateScanConfiguration(json.dumps(configuration))
+        assert csp_subarray01.ValidateScanConfiguration(json.dumps(configuration)) == config_hash
+        # the validation doesn't change the subarray configuration
+        assert csp_subarray01.obsState == ObsState.READY
+        assert json.loads(csp_subarray01.validScanConfiguration)["scanID"] != 5
+        csp_subarray01.EndSB()
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.IDLE, timeout=5)
+        csp_subarray01.ConfigureScan(config_hash)
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.READY, timeout=10)
+        valid_configuration = json.loads(csp_subarray01.validScanConfiguration)
+        assert valid_configuration["scanID"] == 5
+        assert valid_configuration == configuration
+
+    def test_configure_scan_encoded(self, csp_subarray01):
+        """
+        Test the ConfigureScanEncoded command with each supported format.
+        """
+        assert csp_subarray01.obsState == ObsState.READY
+        with pytest.raises(tango.DevFailed):
+            csp_subarray01.ConfigureScanEncoded(("xml", b"<scan/>"))
+        filename = os.path.join(commons_pkg_path, "test_ConfigureScan_basic.json")
+        with open(filename) as f:
+            configuration = json.load(f)
+        channel_map = configuration["fsp"][0]["channelAveragingMap"]
+        configuration["fsp"][0]["channelAveragingMap"] = np.array(channel_map,
+                                                                  dtype=np.uint32)
+        for scan_id, encoded_format in enumerate(supported_formats(), 10):
+            configuration["scanID"] = scan_id
+            csp_subarray01.EndSB()
+            wait_for_attribute(csp_subarray01, "obsState", ObsState.IDLE, timeout=5)
+            csp_subarray01.ConfigureScanEncoded((encoded_format,
+                                                 encode_configuration(encoded_format,
+                                                                      configuration)))
+            wait_for_attribute(csp_subarray01, "obsState", ObsState.READY, timeout=10)
+            valid_configuration = json.loads(csp_subarray01.validScanConfiguration)
+            assert valid_configuration["scanID"] == scan_id
+            assert valid_configuration["fsp"][0]["channelAveragingMap"] == channel_map
+
     def test_remove_receptors_when_ready(self, csp_subarray01):
         """
         Test that the complete deallocation of receptors fails
@@ -305,11 +489,42 @@ class TestCspSubarray(object):
         assert obs_state == ObsState.READY
         # command transition to IDLE
         csp_subarray01.EndSB()
-        time.sleep(3)
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.IDLE, timeout=5)
         obs_state = csp_subarray01.obsState
         assert obs_state == ObsState.IDLE
         csp_subarray01.RemoveAllReceptors()
-        time.sleep(3)
+        wait_for_attribute(csp_subarray01, "State", DevState.OFF, timeout=5)
         subarray_state = csp_subarray01.state()
         assert subarray_state == tango.DevState.OFF
         assert obs_state == ObsState.IDLE
+
+class TestDispatchScheduler(object):
+
+    def test_cancel_while_spinning(self):
+        """
+        Test that a dispatch cancelled while the scheduler thread polls the
+        clock is not run, and that the next dispatch is run at its time.
+        """
+        dispatched = []
+        scheduler = DispatchScheduler("Scan", spin=0.5)
+        try:
+            when = time.time() + 0.6
+            scheduler.schedule(when, [lambda: dispatched.append(time.time())])
+            # the thread polls the clock from 0.5 sec before the dispatch time
+            time.sleep(0.3)
+            assert scheduler.pending == when
+            assert scheduler.cancel()
+            time.sleep(max(0, when - time.time()) + 0.2)
+            assert dispatched == []
+            assert scheduler.stats()["dispatched"] == 0
+            assert scheduler.stats()["cancelled"] == 1
+            when = time.time() + 0.2
+            scheduler.schedule(when, [lambda: dispatched.append(time.time())])
+            deadline = time.time() + 5
+            while not dispatched and time.time() < deadline:
+                time.sleep(0.05)
+            assert len(dispatched) == 1
+            assert dispatched[0] >= when
+            assert scheduler.stats()["last"]["scheduled"] == when
+        finally:
+            scheduler.stop()
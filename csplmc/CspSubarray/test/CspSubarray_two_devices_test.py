@@ -11,6 +11,7 @@
 import sys
 import os
 import time
+import json
 
 # Tango imports
 import tango
@@ -29,6 +30,7 @@ sys.path.insert(0, os.path.abspath(path))
 #Local imports
 from CspSubarray import CspSubarray
 from global_enum import ObsState
+from attribute_wait import wait_for_attribute
 
 # Device test case
 @pytest.mark.usefixtures("csp_master", "csp_subarray01", "cbf_subarray01",
@@ -43,11 +45,13 @@ class TestCspSubarray_two_devices(object):
         Both subarrays move to State ON after assignment.
         """
         csp_subarray01.Init()
-        time.sleep(2)
+        wait_for_attribute(csp_subarray01, "State",
+                           lambda state: state != DevState.INIT, timeout=5)
         tm_leafnode1.Init()
         if csp_master.state() == DevState.STANDBY:
             csp_master.On("")
-            time.sleep(2)
+            wait_for_attribute(csp_subarray01, "State", DevState.OFF, timeout=5)
+            wait_for_attribute(csp_subarray02, "State", DevState.OFF, timeout=5)
         assert (csp_subarray01.state() == DevState.OFF and
                 csp_subarray02.state() == DevState.OFF and
                 csp_subarray01.obsState == ObsState.IDLE and
@@ -55,11 +59,11 @@ class TestCspSubarray_two_devices(object):
         # add receptors 1,4 to subarray 01
         receptor_to_assign = [1, 4]
         csp_subarray01.AddReceptors(receptor_to_assign)
-        time.sleep(2)
+        wait_for_attribute(csp_subarray01, "State", DevState.ON, timeout=5)
         # add receptors 2,3 to subarray 02
         receptor_to_assign = [2, 3]
         csp_subarray02.AddReceptors(receptor_to_assign)
-        time.sleep(2)
+        wait_for_attribute(csp_subarray02, "State", DevState.ON, timeout=5)
         assert (csp_subarray01.obsState == ObsState.IDLE and
                 csp_subarray02.obsState == ObsState.IDLE and
                 csp_subarray01.state() == tango.DevState.ON and
@@ -77,7 +81,8 @@ class TestCspSubarray_two_devices(object):
         config_file2 = open(filename2)
         csp_subarray01.ConfigureScan(config_file1.read().replace("\n", ""))
         csp_subarray02.ConfigureScan(config_file2.read().replace("\n", ""))
-        time.sleep(4)
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.READY, timeout=10)
+        wait_for_attribute(csp_subarray02, "obsState", ObsState.READY, timeout=10)
         assert (csp_subarray01.obsState == ObsState.READY and
                 csp_subarray02.obsState == ObsState.READY)
         config_file1.close()
@@ -91,7 +96,8 @@ class TestCspSubarray_two_devices(object):
                 csp_subarray02.obsState == ObsState.READY)
         csp_subarray01.Scan(" ")
         csp_subarray02.Scan(" ")
-        time.sleep(2)
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.SCANNING, timeout=5)
+        wait_for_attribute(csp_subarray02, "obsState", ObsState.SCANNING, timeout=5)
         assert (csp_subarray01.obsState == ObsState.SCANNING and
                 csp_subarray02.obsState == ObsState.SCANNING)
 
@@ -103,6 +109,48 @@ class TestCspSubarray_two_devices(object):
                 csp_subarray02.obsState == ObsState.SCANNING)
         csp_subarray01.EndScan()
         csp_subarray02.EndScan()
-        time.sleep(2)
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.READY, timeout=5)
+        wait_for_attribute(csp_subarray02, "obsState", ObsState.READY, timeout=5)
         assert (csp_subarray01.obsState == ObsState.READY and
                 csp_subarray02.obsState == ObsState.READY)
+
+    def test_coordinated_scan(self, csp_master, csp_subarray01, csp_subarray02):
+        """
+        Test the Scan and EndScan of the two subarrays with one CspMaster call.
+        """
+        assert (csp_subarray01.obsState == ObsState.READY and
+                csp_subarray02.obsState == ObsState.READY)
+        result = json.loads(csp_master.ScanSubarrays(json.dumps({"subarrayIDs": [1, 2]})))
+        assert result["activationTime"] > time.time() - 1
+        for sub_id in ["1", "2"]:
+            assert result["subarrays"][sub_id]["acknowledged"]
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.SCANNING, timeout=5)
+        wait_for_attribute(csp_subarray02, "obsState", ObsState.SCANNING, timeout=5)
+        # the subarrays dispatched the scan at (not before) the activation time
+        wait_for_attribute(csp_master, "coordinatedDispatch",
+                           lambda value: json.loads(value)["spread"] is not None, timeout=5)
+        dispatch = json.loads(csp_master.coordinatedDispatch)
+        assert dispatch["command"] == "Scan"
+        assert dispatch["activationTime"] == pytest.approx(result["activationTime"])
+        for sub_id in ["1", "2"]:
+            assert dispatch["subarrays"][sub_id]["delay"] >= 0
+        assert dispatch["spread"] >= 0
+        result = json.loads(csp_master.EndScanSubarrays(json.dumps({"subarrayIDs": [1, 2]})))
+        for sub_id in ["1", "2"]:
+            assert result["subarrays"][sub_id]["acknowledged"]
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.READY, timeout=5)
+        wait_for_attribute(csp_subarray02, "obsState", ObsState.READY, timeout=5)
+        # a numeric scan argument is reported as the activation time
+        start_time = time.time() + 1
+        result = json.loads(csp_master.ScanSubarrays(json.dumps({"subarrayIDs": [1, 2],
+                                                                 "scanArgument": start_time})))
+        assert result["activationTime"] == pytest.approx(start_time)
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.SCANNING, timeout=5)
+        wait_for_attribute(csp_subarray02, "obsState", ObsState.SCANNING, timeout=5)
+        csp_master.EndScanSubarrays(json.dumps({"subarrayIDs": [1, 2], "endTime": 0}))
+        wait_for_attribute(csp_subarray01, "obsState", ObsState.READY, timeout=5)
+        wait_for_attribute(csp_subarray02, "obsState", ObsState.READY, timeout=5)
+        # a subarray not READY reports the failure
+        result = json.loads(csp_master.EndScanSubarrays(json.dumps({"subarrayIDs": [1, 99]})))
+        assert not result["subarrays"]["1"]["acknowledged"]
+        assert "No CspSubarray" in result["subarrays"]["99"]["error"]
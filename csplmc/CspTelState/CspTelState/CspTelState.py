@@ -18,7 +18,6 @@ for information exchange between CSP Sub-elements.
 from __future__ import absolute_import
 import sys
 import os
-from future.utils import with_metaclass
 # PROTECTED REGION END# //CspMaster.standardlibray_import
 
 # tango imports
@@ -27,21 +26,24 @@ from tango import DebugIt, DeviceProxy, EventType
 from tango.server import run, Device, DeviceMeta, attribute, command, device_property
 
 # PROTECTED REGION ID(CspTelState.additional_import) ENABLED START #
-# add the path to import global_enum package.
-file_path = os.path.dirname(os.path.abspath(__file__))
-commons_pkg_path = os.path.abspath(os.path.join(file_path, "../../commons"))
-sys.path.insert(0, commons_pkg_path)
+# The csplmc package is imported from the installed distribution or, when
+# the device runs from the source tree, from the repository root.
+try:
+    import csplmc
+except ImportError:
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                    "../../..")))
 
 # Additional import
-import global_enum as const
-from global_enum import HealthState, AdminMode
+from csplmc.commons.global_enum import HealthState, AdminMode
+from csplmc.commons.subscriptions import SubscriptionManager
 from skabase.SKATelState import SKATelState
 # PROTECTED REGION END #    //  CspTelState.additionnal_import
 
 __all__ = ["CspTelState", "main"]
 
 
-class CspTelState(with_metaclass(DeviceMeta, SKATelState)):
+class CspTelState(SKATelState, metaclass=DeviceMeta):
     """
     The CspTelState device expose CSP parameters used by other Elements, also used 
     for information exchange between CSP Sub-elements.
@@ -134,23 +136,22 @@ class CspTelState(with_metaclass(DeviceMeta, SKATelState)):
         """
 
         err_msg = ''
-        for fqdn in self._csp_subarrays_fqdn:
-            # initialize the list for each dictionary key-name
-            self._csp_subarray_event_id[fqdn] = []
+        subarrays_fqdn = self._csp_subarrays_fqdn
+        # add to the list of subarray FQDNS only registered subarrays
+        self._csp_subarrays_fqdn = []
+        for fqdn in subarrays_fqdn:
             try:
                 log_msg = "Trying connection to" + str(fqdn) + " device"
                 self.dev_logging(log_msg, int(tango.LogLevel.LOG_INFO))
                 device_proxy = tango.DeviceProxy(fqdn)
                 device_proxy.ping()
-                # add to the list of subarray FQDNS only registered subarrays
-                self._csp_subarrays_fqdn.append(fqdn)  
+                self._csp_subarrays_fqdn.append(fqdn)
                 # store the sub-element proxies 
                 self._csp_subarray_proxies[fqdn] = device_proxy
 
-                # Subscription of the sub-element State,healthState and adminMode
-                ev_id = device_proxy.subscribe_event("cbfOutputLink", EventType.CHANGE_EVENT,
-                        self.csp_subarray_change_callback, stateless=True)
-                self._csp_subarray_event_id[fqdn].append(ev_id)
+                # Subscription of the CSP subarray output links
+                self._subscriptions.subscribe(device_proxy, ["cbfOutputLink"],
+                                              self.csp_subarray_change_callback)
 
             except tango.DevFailed as df:
                 for item in df.args: 
@@ -286,7 +287,8 @@ class CspTelState(with_metaclass(DeviceMeta, SKATelState)):
         self._csp_master_proxy = 0          # CspMaster DeviceProxy
         self._csp_subarrays_fqdn = 0        # list of CspSubarray FQDNs
         # NOTE: the dict keys are the CspSubarrays FQDNs
-        self._csp_subarray_event_id = {}    # dict of the events subscribed for each CspSubarray
+        # the events subscribed for each CspSubarray
+        self._subscriptions = SubscriptionManager(self.dev_logging)
         self._csp_subarray_proxies = {}     # dict of CspSubarrays DeviceProxy
         self._cbf_output_links = ['']*16         # list with Cbf outputlinks  values
         try: 
@@ -310,7 +312,8 @@ class CspTelState(with_metaclass(DeviceMeta, SKATelState)):
 
     def delete_device(self):
         # PROTECTED REGION ID(CspTelState.delete_device) ENABLED START #
-        pass
+        self._subscriptions.unsubscribe_all()
+        self._csp_subarray_proxies.clear()
         # PROTECTED REGION END #    //  CspTelState.delete_device
 
     # ------------------
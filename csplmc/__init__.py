@@ -0,0 +1,7 @@
+"""
+SKA CSP.LMC prototype TANGO devices.
+
+The device classes are not imported here: each device server imports only
+its own module (see the console scripts defined in setup.py).
+"""
+from csplmc.release import version as __version__
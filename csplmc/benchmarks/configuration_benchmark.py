@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the csp-lmc-prototype project
+#
+#
+#
+# Distributed under the terms of the BSD-3-Clause license.
+# See LICENSE.txt for more info.
+"""
+Benchmark of the JSON and binary (DevEncoded) scan configuration paths.
+
+The scan configuration (commons/test_ConfigureScan_basic.json) is scaled to
+the requested number of FSPs and channelAveragingMap entries. For each
+encoding (json, and msgpack/cbor if installed, see
+commons/encoded_configuration.py) the benchmark measures:
+
+* the decoding time of the configuration
+* the staging time (hash of the canonical JSON configuration, or of the
+  encoded bytes, see commons/scan_configuration.py)
+* the time to prepare the JSON payload forwarded to the CbfSubarray
+* the latency of the CspSubarray ConfigureScan (json) and ConfigureScanEncoded
+  commands, with the devices running inside the local MultiDeviceTestContext
+  (see commons/sim_context.py). The scanID changes at each sample, so that
+  the staged configurations are not reused.
+
+Usage::
+
+    python configuration_benchmark.py --fsps 4 27 --channels 20 2000 -o configuration.json
+    python configuration_benchmark.py --skip-device
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import time
+from functools import partial
+
+import numpy as np
+
+file_path = os.path.dirname(os.path.abspath(__file__))
+csplmc_path = os.path.abspath(os.path.join(file_path, os.pardir))
+try:
+    import csplmc
+except ImportError:
+    sys.path.insert(0, os.path.abspath(os.path.join(csplmc_path, os.pardir)))
+import tango
+from tango import DevState
+from csplmc.benchmarks.csp_benchmark import (summary, git_commit, timed, CBF_MASTER_LATENCY,
+                                             CBF_SUBARRAY_LATENCY)
+from csplmc.commons.attribute_wait import wait_for_attribute
+from csplmc.commons.global_enum import ObsState
+from csplmc.commons.encoded_configuration import (encode_configuration,
+                                                  decode_configuration,
+                                                  supported_formats)
+from csplmc.commons.scan_configuration import StagedConfigurations, encoded_key
+
+# the results file format version: bump it when the metrics change meaning
+FORMAT_VERSION = 2
+
+def scaled_configuration(base, num_of_fsps, num_of_channels):
+    """
+    Returns:
+        The configuration with *num_of_fsps* FSPs, each one with a\
+        channelAveragingMap of *num_of_channels* entries (NumPy arrays).
+    """
+    configuration = copy.deepcopy(base)
+    template = base["fsp"][0]
+    configuration["fsp"] = []
+    for fsp_id in range(1, num_of_fsps + 1):
+        fsp = copy.deepcopy(template)
+        fsp["fspID"] = fsp_id
+        channels = np.arange(num_of_channels, dtype=np.uint32)
+        fsp["channelAveragingMap"] = np.stack([channels * 744 + 1,
+                                               np.full(num_of_channels, 8, dtype=np.uint32)],
+                                              axis=1)
+        configuration["fsp"].append(fsp)
+    return configuration
+
+def encoded_payloads(configuration):
+    """
+    Returns:
+        The dictionary {format: encoded configuration}. The json payload is\
+        the ConfigureScan input string.
+    """
+    payloads = {}
+    for encoded_format in supported_formats():
+        payloads[encoded_format] = encode_configuration(encoded_format, configuration)
+    payloads["json"] = payloads["json"].decode("utf-8")
+    return payloads
+
+def bench_decode(payloads, repeat):
+    """
+    Measure the decoding, the staging and the CBF payload time of each
+    payload. The encoded configurations are staged under the hash of their
+    bytes and converted into the JSON payload forwarded to CBF when it is
+    first used: the sum of the three times is the processing time of a new
+    configuration.
+    """
+    results = {}
+    for encoded_format, payload in payloads.items():
+        decode_samples = []
+        stage_samples = []
+        cbf_samples = []
+        cbf_bytes = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            if encoded_format == "json":
+                configuration = json.loads(payload)
+                key = payload
+            else:
+                configuration = decode_configuration(encoded_format, payload)
+                key = encoded_key(encoded_format, payload)
+            decoded = time.perf_counter()
+            # a new table: the configuration is always staged
+            entry = StagedConfigurations(1).add(key, configuration, configuration["scanID"])
+            staged = time.perf_counter()
+            cbf_bytes = len(entry.cbf_configuration)
+            forwarded = time.perf_counter()
+            decode_samples.append((decoded - start) * 1000.)
+            stage_samples.append((staged - decoded) * 1000.)
+            cbf_samples.append((forwarded - staged) * 1000.)
+        results[encoded_format] = {"size_bytes": len(payload),
+                                   "cbf_payload_bytes": cbf_bytes,
+                                   "decode_ms": summary(decode_samples),
+                                   "stage_ms": summary(stage_samples),
+                                   "cbf_payload_ms": summary(cbf_samples)}
+    return results
+
+def bench_device(configuration, repeat, timeout):
+    """
+    Measure the latency of the ConfigureScan and ConfigureScanEncoded
+    commands for each format. The subarray goes back to IDLE (EndSB) after
+    each sample.
+    """
+    from csplmc.commons.sim_context import SimulatedCspContext
+    samples = {encoded_format: [] for encoded_format in supported_formats()}
+    errors = []
+    with SimulatedCspContext(num_of_subarrays=1,
+                             cbf_master_latency=CBF_MASTER_LATENCY,
+                             cbf_subarray_latency=CBF_SUBARRAY_LATENCY,
+                             timeout=timeout) as context:
+        context.csp_master.On([])
+        wait_for_attribute(context.csp_master, "State", DevState.ON, timeout)
+        subarray = context.csp_subarrays[0]
+        subarray.AddReceptors([1, 2, 3, 4])
+        wait_for_attribute(subarray, "State", DevState.ON, timeout)
+        scan_id = 0
+        for _ in range(repeat):
+            for encoded_format in samples:
+                scan_id += 1
+                payload = encode_configuration(encoded_format,
+                                               dict(configuration, scanID=scan_id))
+                if encoded_format == "json":
+                    command = partial(subarray.ConfigureScan, payload.decode("utf-8"))
+                else:
+                    command = partial(subarray.ConfigureScanEncoded,
+                                      (encoded_format, payload))
+                try:
+                    samples[encoded_format].append(timed(command, subarray, "obsState",
+                                                         ObsState.READY, timeout))
+                    subarray.EndSB()
+                    wait_for_attribute(subarray, "obsState", ObsState.IDLE, timeout)
+                except tango.DevFailed as df:
+                    errors.append("{}: {}".format(encoded_format, df.args[0].desc))
+    return {"latency_ms": {encoded_format: summary(values)
+                           for encoded_format, values in samples.items()},
+            "errors": errors}
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Scan configuration input paths benchmark")
+    parser.add_argument("--fsps", type=int, nargs="+", default=[4, 27],
+                        help="numbers of FSPs of the configuration")
+    parser.add_argument("--channels", type=int, nargs="+", default=[20, 2000],
+                        help="numbers of channelAveragingMap entries of each FSP")
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="number of samples of each measurement")
+    parser.add_argument("--timeout", type=float, default=10.,
+                        help="max time (sec) to wait for the command end")
+    parser.add_argument("--config", default=os.path.join(csplmc_path, "commons",
+                                                         "test_ConfigureScan_basic.json"),
+                        help="the base scan configuration")
+    parser.add_argument("--skip-device", action="store_true",
+                        help="measure only the decoding and the staging time")
+    parser.add_argument("-o", "--output", default="configuration_benchmark.json",
+                        help="the JSON results file")
+    args = parser.parse_args(args)
+
+    with open(args.config) as json_file:
+        base = json.load(json_file)
+    report = {"format_version": FORMAT_VERSION,
+              "commit": git_commit(),
+              "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "platform": {"python": platform.python_version(),
+                           "machine": platform.machine(),
+                           "cpus": os.cpu_count()},
+              "parameters": {"repeat": args.repeat, "formats": supported_formats()},
+              "results": {}}
+    for num_of_fsps in args.fsps:
+        for num_of_channels in args.channels:
+            configuration = scaled_configuration(base, num_of_fsps, num_of_channels)
+            result = {"decode": bench_decode(encoded_payloads(configuration), args.repeat)}
+            if not args.skip_device:
+                result["device"] = bench_device(configuration, args.repeat, args.timeout)
+            key = "{}fsp_{}ch".format(num_of_fsps, num_of_channels)
+            report["results"][key] = result
+            for encoded_format, stats in result["decode"].items():
+                line = ("{:<12} {:<8} {:9d} B  decode {:8.3f} ms  stage {:8.3f} ms  "
+                        "cbf {:8.3f} ms").format(
+                            key, encoded_format, stats["size_bytes"],
+                            stats["decode_ms"]["median"], stats["stage_ms"]["median"],
+                            stats["cbf_payload_ms"]["median"])
+                if "device" in result and result["device"]["latency_ms"][encoded_format]["count"]:
+                    line += "  command {:8.1f} ms".format(
+                        result["device"]["latency_ms"][encoded_format]["median"])
+                print(line)
+    with open(args.output, "w") as json_file:
+        json.dump(report, json_file, indent=2, sort_keys=True)
+    print("Results written to {}".format(args.output))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
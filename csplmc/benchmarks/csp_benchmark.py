@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the csp-lmc-prototype project
+#
+#
+#
+# Distributed under the terms of the BSD-3-Clause license.
+# See LICENSE.txt for more info.
+"""
+Performance benchmark of the CSP.LMC commands.
+
+The CspMaster, the CspSubarrays and the CBF simulators run inside a local
+MultiDeviceTestContext (see commons/sim_context.py). The benchmark measures:
+
+* the latency of the CspMaster On/Standby commands
+* the latency of the CspSubarray AddReceptors, ConfigureScan, Scan, EndScan,
+  EndSB and RemoveAllReceptors commands, with all the subarrays executing the
+  workflow concurrently
+* the attribute-read throughput of the CspMaster and CspSubarray devices
+
+A latency is the time elapsed from the command invocation to the moment the
+device reports the end state. The simulators run with zero latency, so the
+results measure the CSP.LMC overhead only.
+
+Usage::
+
+    python csp_benchmark.py --subarrays 1 2 16 --repeat 5 -o results.json
+    python csp_benchmark.py --compare baseline.json results.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+file_path = os.path.dirname(os.path.abspath(__file__))
+commons_pkg_path = os.path.abspath(os.path.join(file_path, "../commons"))
+try:
+    import csplmc
+except ImportError:
+    sys.path.insert(0, os.path.abspath(os.path.join(file_path, os.pardir, os.pardir)))
+
+import tango
+from tango import DevState
+from csplmc.commons.global_enum import ObsState
+from csplmc.commons.attribute_wait import AttributeWaiter, wait_for_attribute
+
+# the results file format version: bump it when the metrics change meaning
+FORMAT_VERSION = 1
+
+# zero-latency simulators: the benchmark measures the CSP.LMC overhead
+CBF_MASTER_LATENCY = ["Init:fixed:0", "On:fixed:0", "Off:fixed:0", "Standby:fixed:0"]
+CBF_SUBARRAY_LATENCY = ["AddReceptors:fixed:0", "RemoveReceptors:fixed:0",
+                        "RemoveAllReceptors:fixed:0", "ConfigureScan:fixed:0",
+                        "Scan:fixed:0", "EndScan:fixed:0", "EndSB:fixed:0"]
+
+# number of receptors assigned to each subarray
+RECEPTORS_PER_SUBARRAY = 4
+
+MASTER_ATTRIBUTES = ["State", "healthState", "receptorMembership", "availableReceptorIDs"]
+SUBARRAY_ATTRIBUTES = ["State", "obsState", "cbfSubarrayState", "cbfSubarrayObsState"]
+
+def timed(command, proxy, attr_name, expected, timeout):
+    """
+    Execute the command and wait for the attribute to reach the end state.
+    The waiter subscribes the attribute before the command is issued, so the
+    subscription time is not accounted in the latency.
+
+    Returns:
+        The latency in ms.
+    """
+    with AttributeWaiter(proxy, attr_name, expected, poll_period=0.01) as waiter:
+        waiter.restart()
+        command()
+        return waiter.wait(timeout) * 1000.
+
+def summary(samples):
+    """
+    Returns:
+        A dictionary with the statistics of the samples.
+    """
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    return {"count": len(ordered),
+            "min": ordered[0],
+            "median": statistics.median(ordered),
+            "mean": statistics.mean(ordered),
+            "p90": ordered[min(len(ordered) - 1, int(0.9 * len(ordered)))],
+            "max": ordered[-1]}
+
+def git_commit():
+    """
+    Returns:
+        The current git commit hash, or "unknown".
+    """
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=file_path,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def bench_master(context, repeat, timeout):
+    """
+    Measure the CspMaster On/Standby latency.
+    """
+    master = context.csp_master
+    samples = {"On": [], "Standby": []}
+    for _ in range(repeat):
+        samples["On"].append(timed(lambda: master.On([]), master, "State",
+                                   DevState.ON, timeout))
+        samples["Standby"].append(timed(lambda: master.Standby([]), master, "State",
+                                        DevState.STANDBY, timeout))
+    return samples
+
+def subarray_workflow(context, index, scan_config, repeat, timeout, samples, errors):
+    """
+    Execute the subarray workflow and collect the latency of each command.
+    Each workflow runs in its own thread, with its own device proxies.
+    """
+    try:
+        subarray = context.get_device(context.csp_subarrays[index].dev_name())
+        receptors = [index * RECEPTORS_PER_SUBARRAY + i + 1
+                     for i in range(RECEPTORS_PER_SUBARRAY)]
+        config = dict(scan_config, scanID=index + 1)
+        steps = [
+            ("AddReceptors", lambda: subarray.AddReceptors(receptors),
+             "State", DevState.ON),
+            ("ConfigureScan", lambda: subarray.ConfigureScan(json.dumps(config)),
+             "obsState", ObsState.READY),
+            ("Scan", lambda: subarray.Scan("0"), "obsState", ObsState.SCANNING),
+            ("EndScan", subarray.EndScan, "obsState", ObsState.READY),
+            ("EndSB", subarray.EndSB, "obsState", ObsState.IDLE),
+            ("RemoveAllReceptors", subarray.RemoveAllReceptors, "State", DevState.OFF),
+        ]
+        for _ in range(repeat):
+            for name, command, attr_name, expected in steps:
+                latency = timed(command, subarray, attr_name, expected, timeout)
+                with samples["lock"]:
+                    samples[name].append(latency)
+    except tango.DevFailed as df:
+        errors.append("subarray {}: {}".format(index + 1, df.args[0].desc))
+
+def bench_subarrays(context, scan_config, repeat, timeout):
+    """
+    Run the subarray workflow concurrently on all the subarrays.
+    """
+    samples = {"lock": threading.Lock(), "AddReceptors": [], "ConfigureScan": [],
+               "Scan": [], "EndScan": [], "EndSB": [], "RemoveAllReceptors": []}
+    errors = []
+    threads = [threading.Thread(target=subarray_workflow,
+                                args=(context, index, scan_config, repeat, timeout,
+                                      samples, errors))
+               for index in range(context.num_of_subarrays)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    del samples["lock"]
+    return samples, errors
+
+def read_attributes(device_name, context, attributes, num_of_reads, counts):
+    """
+    Read the attributes of a device in a loop.
+    """
+    proxy = context.get_device(device_name)
+    done = 0
+    for _ in range(num_of_reads):
+        proxy.read_attributes(attributes)
+        done += len(attributes)
+    counts.append(done)
+
+def bench_reads(context, num_of_reads):
+    """
+    Measure the attribute-read throughput (reads/sec) of the CspMaster and
+    of all the CspSubarrays read concurrently.
+    """
+    results = {}
+    targets = {"CspMaster": [(context.csp_master.dev_name(), MASTER_ATTRIBUTES)],
+               "CspSubarray": [(proxy.dev_name(), SUBARRAY_ATTRIBUTES)
+                               for proxy in context.csp_subarrays]}
+    for label, devices in targets.items():
+        counts = []
+        threads = [threading.Thread(target=read_attributes,
+                                    args=(device_name, context, attributes,
+                                          num_of_reads, counts))
+                   for device_name, attributes in devices]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        results[label] = {"reads": sum(counts),
+                          "elapsed": elapsed,
+                          "throughput": sum(counts) / elapsed if elapsed else 0.}
+    return results
+
+def run_benchmark(num_of_subarrays, repeat, num_of_reads, timeout, scan_config):
+    """
+    Run the benchmark with the specified number of subarrays.
+
+    Returns:
+        A dictionary with the latency statistics (ms) of each command and
+        the attribute-read throughput.
+    """
+    from csplmc.commons.sim_context import SimulatedCspContext
+    with SimulatedCspContext(num_of_subarrays=num_of_subarrays,
+                             cbf_master_latency=CBF_MASTER_LATENCY,
+                             cbf_subarray_latency=CBF_SUBARRAY_LATENCY,
+                             timeout=timeout) as context:
+        latency = bench_master(context, repeat, timeout)
+        context.csp_master.On([])
+        wait_for_attribute(context.csp_master, "State", DevState.ON, timeout)
+        subarray_samples, errors = bench_subarrays(context, scan_config, repeat, timeout)
+        latency.update(subarray_samples)
+        reads = bench_reads(context, num_of_reads)
+    return {"latency_ms": {name: summary(values) for name, values in latency.items()},
+            "reads": reads,
+            "errors": errors}
+
+def compare(baseline_file, current_file, threshold):
+    """
+    Compare two results files: a latency median (throughput) is a regression
+    if it is larger (smaller) than the baseline value by more than *threshold*.
+
+    Returns:
+        The number of regressions.
+    """
+    with open(baseline_file) as json_file:
+        baseline = json.load(json_file)
+    with open(current_file) as json_file:
+        current = json.load(json_file)
+    regressions = 0
+    print("{:>4} {:<20} {:>12} {:>12} {:>8}".format("subs", "metric", "baseline",
+                                                   "current", "ratio"))
+    for subs, result in sorted(current["results"].items(), key=lambda item: int(item[0])):
+        if subs not in baseline["results"]:
+            continue
+        base = baseline["results"][subs]
+        rows = []
+        for name, stats in sorted(result["latency_ms"].items()):
+            base_stats = base["latency_ms"].get(name, {})
+            if "median" in stats and "median" in base_stats:
+                rows.append((name, base_stats["median"], stats["median"], False))
+        for name, stats in sorted(result["reads"].items()):
+            if name in base["reads"]:
+                rows.append((name + " reads/s", base["reads"][name]["throughput"],
+                             stats["throughput"], True))
+        for name, base_value, value, higher_is_better in rows:
+            ratio = value / base_value if base_value else float("inf")
+            if higher_is_better:
+                regression = ratio < 1 - threshold
+            else:
+                regression = ratio > 1 + threshold
+            regressions += regression
+            print("{:>4} {:<20} {:>12.3f} {:>12.3f} {:>8.2f}{}".format(
+                subs, name, base_value, value, ratio, "  REGRESSION" if regression else ""))
+    return regressions
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="CSP.LMC performance benchmark")
+    parser.add_argument("--subarrays", type=int, nargs="+", default=[1, 2, 16],
+                        help="the numbers of subarrays to benchmark")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of repetitions of each workflow")
+    parser.add_argument("--reads", type=int, default=1000,
+                        help="number of attribute reads for each device")
+    parser.add_argument("--timeout", type=float, default=10.,
+                        help="max time (sec) to reach a command end state")
+    parser.add_argument("--config", default=os.path.join(commons_pkg_path,
+                                                         "test_ConfigureScan_basic.json"),
+                        help="the scan configuration file")
+    parser.add_argument("-o", "--output", default="csp_benchmark.json",
+                        help="the JSON results file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="compare two results files and exit")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative change reported as regression")
+    args = parser.parse_args(args)
+
+    if args.compare:
+        return 1 if compare(args.compare[0], args.compare[1], args.threshold) else 0
+
+    with open(args.config) as json_file:
+        scan_config = json.load(json_file)
+    report = {"format_version": FORMAT_VERSION,
+              "commit": git_commit(),
+              "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "platform": {"python": platform.python_version(),
+                           "tango": tango.__version__,
+                           "machine": platform.machine(),
+                           "cpus": os.cpu_count()},
+              "parameters": {"repeat": args.repeat, "reads": args.reads,
+                             "receptors_per_subarray": RECEPTORS_PER_SUBARRAY,
+                             "config": os.path.basename(args.config)},
+              "results": {}}
+    for num_of_subarrays in args.subarrays:
+        print("Running the benchmark with {} subarrays".format(num_of_subarrays))
+        report["results"][str(num_of_subarrays)] = run_benchmark(num_of_subarrays,
+                                                                 args.repeat,
+                                                                 args.reads,
+                                                                 args.timeout,
+                                                                 scan_config)
+    with open(args.output, "w") as json_file:
+        json.dump(report, json_file, indent=2, sort_keys=True)
+    print("Results written to {}".format(args.output))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the csp-lmc-prototype project
+#
+#
+#
+# Distributed under the terms of the BSD-3-Clause license.
+# See LICENSE.txt for more info.
+"""
+Startup-time benchmark of the CSP.LMC device servers.
+
+A device server restarted by Docker or Kubernetes is available again after
+the interpreter start, the import of the device module and the execution of
+init_device. The benchmark measures:
+
+* the import time of each device module, each sample in a fresh interpreter,
+  together with the whole process time and the slowest imported modules
+  (from python -X importtime)
+* the init_device time of the CspMaster and CspSubarray devices, measured as
+  the duration of the Init command with the devices running inside the local
+  MultiDeviceTestContext (see commons/sim_context.py)
+
+Usage::
+
+    python startup_benchmark.py --repeat 5 -o startup.json
+    python startup_benchmark.py --skip-init
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+
+file_path = os.path.dirname(os.path.abspath(__file__))
+csplmc_path = os.path.abspath(os.path.join(file_path, os.pardir))
+try:
+    import csplmc
+except ImportError:
+    sys.path.insert(0, os.path.abspath(os.path.join(csplmc_path, os.pardir)))
+from csplmc.benchmarks.csp_benchmark import summary, git_commit
+
+# the results file format version: bump it when the metrics change meaning
+FORMAT_VERSION = 1
+
+# the device modules and the source tree directories of their packages
+DEVICE_MODULES = {"CspMaster": "CspMaster.CspMaster",
+                  "CspSubarray": "CspSubarray.CspSubarray",
+                  "CspTelState": "CspTelState.CspTelState"}
+
+IMPORT_SCRIPT = """
+import sys, time
+sys.path[:0] = {paths!r}
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(\S.*)$")
+
+def import_paths():
+    """
+    Returns:
+        The source tree directories containing the device packages.
+    """
+    return [os.path.join(csplmc_path, name) for name in DEVICE_MODULES]
+
+def time_import(module, importtime=False):
+    """
+    Import a module in a fresh interpreter.
+
+    Returns:
+        The import time (sec), the process time (sec) and the -X importtime\
+        report (empty if not requested).
+    """
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", IMPORT_SCRIPT.format(paths=import_paths(), module=module)]
+    start = time.perf_counter()
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             universal_newlines=True)
+    elapsed = time.perf_counter() - start
+    if process.returncode:
+        raise RuntimeError("import of {} failed:\n{}".format(module, process.stderr))
+    return float(process.stdout.split()[-1]), elapsed, process.stderr
+
+def slowest_imports(report, top):
+    """
+    Returns:
+        The *top* imported modules with the largest self import time (ms).
+    """
+    modules = []
+    for line in report.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            modules.append((int(match.group(1)) / 1000., match.group(3).strip()))
+    return [{"module": name, "self_ms": self_ms}
+            for self_ms, name in sorted(modules, reverse=True)[:top]]
+
+def bench_imports(repeat, top):
+    """
+    Measure the import time of the device modules.
+    """
+    results = {}
+    for device, module in DEVICE_MODULES.items():
+        import_ms = []
+        process_ms = []
+        for _ in range(repeat):
+            import_time, process_time, _ = time_import(module)
+            import_ms.append(import_time * 1000.)
+            process_ms.append(process_time * 1000.)
+        _, _, report = time_import(module, importtime=True)
+        results[device] = {"import_ms": summary(import_ms),
+                           "process_ms": summary(process_ms),
+                           "slowest_imports": slowest_imports(report, top)}
+    return results
+
+def bench_init(repeat, timeout):
+    """
+    Measure the context start time and the init_device time of the CspMaster
+    and CspSubarray devices.
+    """
+    from csplmc.commons.sim_context import SimulatedCspContext
+    start = time.perf_counter()
+    with SimulatedCspContext(num_of_subarrays=1, timeout=timeout) as context:
+        results = {"context_start_ms": (time.perf_counter() - start) * 1000.}
+        for device, proxy in [("CspMaster", context.csp_master),
+                              ("CspSubarray", context.csp_subarrays[0])]:
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                proxy.Init()
+                samples.append((time.perf_counter() - start) * 1000.)
+            results[device] = {"init_device_ms": summary(samples)}
+    return results
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="CSP.LMC device servers startup benchmark")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of samples of each measurement")
+    parser.add_argument("--top", type=int, default=10,
+                        help="number of slowest imported modules reported")
+    parser.add_argument("--timeout", type=float, default=10.,
+                        help="max time (sec) to wait for the devices initialization")
+    parser.add_argument("--skip-init", action="store_true",
+                        help="measure only the import time")
+    parser.add_argument("-o", "--output", default="startup_benchmark.json",
+                        help="the JSON results file")
+    args = parser.parse_args(args)
+
+    report = {"format_version": FORMAT_VERSION,
+              "commit": git_commit(),
+              "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "platform": {"python": platform.python_version(),
+                           "machine": platform.machine(),
+                           "cpus": os.cpu_count()},
+              "parameters": {"repeat": args.repeat},
+              "results": {"import": bench_imports(args.repeat, args.top)}}
+    for device, result in report["results"]["import"].items():
+        print("{:<12} import {:8.1f} ms   process {:8.1f} ms (median)".format(
+            device, result["import_ms"]["median"], result["process_ms"]["median"]))
+    if not args.skip_init:
+        report["results"]["init"] = bench_init(args.repeat, args.timeout)
+        init = report["results"]["init"]
+        print("context start {:8.1f} ms".format(init["context_start_ms"]))
+        for device in ["CspMaster", "CspSubarray"]:
+            print("{:<12} init_device {:8.1f} ms (median)".format(
+                device, init[device]["init_device_ms"]["median"]))
+    with open(args.output, "w") as json_file:
+        json.dump(report, json_file, indent=2, sort_keys=True)
+    print("Results written to {}".format(args.output))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
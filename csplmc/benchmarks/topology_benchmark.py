@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the csp-lmc-prototype project
+#
+#
+#
+# Distributed under the terms of the BSD-3-Clause license.
+# See LICENSE.txt for more info.
+"""
+Memory and command latency of the CSP.LMC deployment topologies.
+
+For each number of device server processes, the devices are registered and
+started via the launcher (see csplmc/launcher.py) together with the CBF
+simulators, and the benchmark measures:
+
+* the resident memory (RSS) of each CSP.LMC server process, after the
+  initialization and after the workflow
+* the latency of the CspMaster and CspSubarray commands, with all the
+  subarrays executing the workflow concurrently (see csp_benchmark.py)
+
+A running TANGO DB is required (TANGO_HOST). The memory is read from /proc.
+
+Usage::
+
+    python topology_benchmark.py --subarrays 16 --processes 1 2 4 17 -o topology.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+file_path = os.path.dirname(os.path.abspath(__file__))
+csplmc_path = os.path.abspath(os.path.join(file_path, os.pardir))
+try:
+    import csplmc
+except ImportError:
+    sys.path.insert(0, os.path.abspath(os.path.join(csplmc_path, os.pardir)))
+import tango
+from tango import DevState
+from csplmc import launcher
+from csplmc.benchmarks.csp_benchmark import (bench_master, bench_subarrays, summary,
+                                             git_commit, CBF_MASTER_LATENCY,
+                                             CBF_SUBARRAY_LATENCY)
+from csplmc.commons.attribute_wait import wait_for_attribute
+
+# the results file format version: bump it when the metrics change meaning
+FORMAT_VERSION = 1
+
+def rss_mb(pid):
+    """
+    Returns:
+        The resident memory (MB) of a process.
+    """
+    with open("/proc/{}/status".format(pid)) as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.
+    return 0.
+
+def memory(processes):
+    """
+    Returns:
+        The RSS (MB) of each server process and their sum.
+    """
+    per_process = {instance: rss_mb(process.pid) for instance, process in processes.items()}
+    return {"processes": per_process, "total": sum(per_process.values())}
+
+class Deployment(object):
+    """
+    The proxies to the deployed devices, with the interface of the
+    SimulatedCspContext used by the csp_benchmark functions.
+    """
+    def __init__(self, num_of_subarrays):
+        self.num_of_subarrays = num_of_subarrays
+        self.csp_master = tango.DeviceProxy(launcher.CSP_MASTER)
+        self.csp_subarrays = [tango.DeviceProxy(launcher.CSP_SUBARRAY.format(sub_id))
+                              for sub_id in range(1, num_of_subarrays + 1)]
+
+    @staticmethod
+    def get_device(device_name):
+        return tango.DeviceProxy(device_name)
+
+def configure_simulators(num_of_subarrays):
+    """
+    Set the zero-latency specifications of the CBF simulators.
+    """
+    db = launcher.connect()
+    db.put_device_property(launcher.CBF_MASTER, {"CommandLatency": CBF_MASTER_LATENCY})
+    for sub_id in range(1, num_of_subarrays + 1):
+        db.put_device_property(launcher.CBF_SUBARRAY.format(sub_id),
+                               {"CommandLatency": CBF_SUBARRAY_LATENCY})
+
+def run_topology(num_of_subarrays, num_of_processes, scan_config, repeat, timeout, log_dir):
+    """
+    Deploy the devices in *num_of_processes* servers and run the benchmark.
+    """
+    servers = launcher.topology(num_of_subarrays, num_of_processes)
+    launcher.register(servers, num_of_subarrays, with_simulators=True)
+    configure_simulators(num_of_subarrays)
+    simulators = launcher.start_servers([launcher.SIM_INSTANCE], launcher.SIM_SERVER_NAME,
+                                        log_dir)
+    processes = {}
+    try:
+        launcher.wait_for_devices([launcher.CBF_MASTER], timeout)
+        wait_for_attribute(tango.DeviceProxy(launcher.CBF_MASTER), "State", DevState.STANDBY,
+                           timeout)
+        start = time.perf_counter()
+        processes = launcher.start_servers(sorted(servers), launcher.SERVER_NAME, log_dir)
+        device_names = [name for classes in servers.values()
+                        for names in classes.values() for name in names]
+        launcher.wait_for_devices(device_names, timeout)
+        result = {"servers": len(servers),
+                  "startup_sec": time.perf_counter() - start,
+                  "memory_idle_mb": memory(processes)}
+        deployment = Deployment(num_of_subarrays)
+        latency = bench_master(deployment, repeat, timeout)
+        deployment.csp_master.On([])
+        wait_for_attribute(deployment.csp_master, "State", DevState.ON, timeout)
+        subarray_samples, errors = bench_subarrays(deployment, scan_config, repeat, timeout)
+        latency.update(subarray_samples)
+        result["memory_mb"] = memory(processes)
+        result["latency_ms"] = {name: summary(values) for name, values in latency.items()}
+        result["errors"] = errors
+        return result
+    finally:
+        launcher.stop_servers(processes)
+        launcher.stop_servers(simulators)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="CSP.LMC deployment topologies benchmark")
+    parser.add_argument("--subarrays", type=int, default=16,
+                        help="number of CspSubarray devices")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 17],
+                        help="the numbers of device server processes to benchmark")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="number of repetitions of each workflow")
+    parser.add_argument("--timeout", type=float, default=30.,
+                        help="max time (sec) to reach a command end state")
+    parser.add_argument("--config", default=os.path.join(csplmc_path, "commons",
+                                                         "test_ConfigureScan_basic.json"),
+                        help="the scan configuration file")
+    parser.add_argument("--log-dir", help="directory of the servers output files")
+    parser.add_argument("-o", "--output", default="topology_benchmark.json",
+                        help="the JSON results file")
+    args = parser.parse_args(args)
+
+    with open(args.config) as json_file:
+        scan_config = json.load(json_file)
+    report = {"format_version": FORMAT_VERSION,
+              "commit": git_commit(),
+              "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "platform": {"python": platform.python_version(),
+                           "tango": tango.__version__,
+                           "machine": platform.machine(),
+                           "cpus": os.cpu_count()},
+              "parameters": {"subarrays": args.subarrays, "repeat": args.repeat,
+                             "config": os.path.basename(args.config)},
+              "results": {}}
+    print("{:>9} {:>12} {:>12} {:>16} {:>16}".format("processes", "idle MB", "MB",
+                                                     "AddReceptors ms", "ConfigureScan ms"))
+    for num_of_processes in args.processes:
+        result = run_topology(args.subarrays, num_of_processes, scan_config, args.repeat,
+                              args.timeout, args.log_dir)
+        report["results"][str(result["servers"])] = result
+        print("{:>9} {:>12.1f} {:>12.1f} {:>16.1f} {:>16.1f}".format(
+            result["servers"], result["memory_idle_mb"]["total"], result["memory_mb"]["total"],
+            result["latency_ms"]["AddReceptors"].get("median", float("nan")),
+            result["latency_ms"]["ConfigureScan"].get("median", float("nan"))))
+    with open(args.output, "w") as json_file:
+        json.dump(report, json_file, indent=2, sort_keys=True)
+    print("Results written to {}".format(args.output))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Event-driven wait on TANGO attribute values.
+
+The waiter subscribes to the attribute change events and wakes up as soon
+as an event reports a value that satisfies the predicate. If the attribute
+does not push change events (no polling and no push from the device code)
+or the events are delayed by the polling period, the attribute is also read
+directly every *poll_period* sec, so the wait never lasts longer than
+needed by more than *poll_period*.
+
+Example::
+
+    with AttributeWaiter(csp_subarray, "obsState", ObsState.READY) as waiter:
+        csp_subarray.ConfigureScan(config)
+        latency = waiter.wait(timeout=5)
+
+    wait_for_attribute(csp_master, "State", DevState.ON, timeout=5)
+"""
+import threading
+import time
+
+import tango
+from tango import EventType
+
+# the default period (sec) of the direct attribute reads
+POLL_PERIOD = 0.1
+
+def as_predicate(expected):
+    """
+    Returns:
+        *expected* if it is callable, otherwise a predicate testing the\
+        equality with *expected*.
+    """
+    if callable(expected):
+        return expected
+    return lambda value: value == expected
+
+class AttributeWaiter(object):
+    """
+    Wait for an attribute to reach a value that satisfies a predicate.
+
+    The latency returned by wait() is measured from the waiter creation (or
+    the last call to restart()), so the waiter can be created before issuing
+    the command whose effect is awaited.
+
+    Args:
+        proxy: the DeviceProxy of the device.
+        attr_name: the attribute name.
+        expected: a predicate (callable on the attribute value) or the\
+                  expected value.
+        poll_period: the period (sec) of the direct reads of the attribute.
+    """
+    def __init__(self, proxy, attr_name, expected, poll_period=POLL_PERIOD):
+        self._proxy = proxy
+        self._attr_name = attr_name
+        self._predicate = as_predicate(expected)
+        self._poll_period = poll_period
+        self._condition = threading.Condition()
+        self._reached_at = None
+        self._last_value = None
+        self._last_error = ""
+        self._event_id = None
+        self._start = time.perf_counter()
+        try:
+            self._event_id = proxy.subscribe_event(attr_name, EventType.CHANGE_EVENT,
+                                                   self._event_callback, stateless=False)
+        except tango.DevFailed as df:
+            # the attribute does not push change events: use only the direct reads
+            self._last_error = df.args[0].desc
+        self._start = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Unsubscribe the change events.
+        """
+        if self._event_id is not None:
+            try:
+                self._proxy.unsubscribe_event(self._event_id)
+            except tango.DevFailed:
+                pass
+            self._event_id = None
+
+    def restart(self):
+        """
+        Restart the latency measurement (the value already reached is forgotten).
+        """
+        with self._condition:
+            self._reached_at = None
+            self._start = time.perf_counter()
+
+    def _check(self, value):
+        """
+        Record the value and wake up the waiting thread if the predicate is satisfied.
+        """
+        try:
+            satisfied = self._predicate(value)
+        except (TypeError, ValueError, AttributeError):
+            # for example, len() of an empty spectrum attribute read as None
+            satisfied = False
+        with self._condition:
+            self._last_value = value
+            if self._reached_at is None and satisfied:
+                self._reached_at = time.perf_counter()
+                self._condition.notify_all()
+
+    def _event_callback(self, evt):
+        if evt.err:
+            self._last_error = evt.errors[0].desc
+            return
+        self._check(evt.attr_value.value)
+
+    def _read(self):
+        try:
+            if self._attr_name.lower() == "state":
+                self._check(self._proxy.state())
+            else:
+                self._check(self._proxy.read_attribute(self._attr_name).value)
+        except tango.DevFailed as df:
+            self._last_error = df.args[0].desc
+
+    def wait(self, timeout):
+        """
+        Wait for the attribute value to satisfy the predicate.
+
+        Args:
+            timeout: the max waiting time (sec).
+        Returns:
+            The time (sec) elapsed from the waiter creation (or restart) to the\
+            first observation of a value satisfying the predicate.
+        Raises:
+            tango.DevFailed: if the value is not reached within *timeout* sec.
+        """
+        deadline = time.perf_counter() + timeout
+        self._read()
+        with self._condition:
+            while self._reached_at is None:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(min(remaining, self._poll_period))
+                if self._reached_at is None:
+                    self._condition.release()
+                    try:
+                        self._read()
+                    finally:
+                        self._condition.acquire()
+            if self._reached_at is not None:
+                # the value can be reached during the subscription
+                return max(0., self._reached_at - self._start)
+        msg = ("{}/{} did not reach the expected value within {} sec (last value: {}{})"
+               "".format(self._proxy.dev_name(), self._attr_name, timeout, self._last_value,
+                         ", last error: " + self._last_error if self._last_error else ""))
+        tango.Except.throw_exception("Wait timeout", msg, "AttributeWaiter.wait",
+                                     tango.ErrSeverity.ERR)
+
+def wait_for_attribute(proxy, attr_name, expected, timeout=10., poll_period=POLL_PERIOD):
+    """
+    Wait for an attribute to reach a value that satisfies a predicate.
+
+    Args:
+        proxy: the DeviceProxy of the device.
+        attr_name: the attribute name.
+        expected: a predicate (callable on the attribute value) or the\
+                  expected value.
+        timeout: the max waiting time (sec).
+        poll_period: the period (sec) of the direct reads of the attribute.
+    Returns:
+        The time (sec) elapsed until the value was observed.
+    Raises:
+        tango.DevFailed: if the value is not reached within *timeout* sec.
+    """
+    with AttributeWaiter(proxy, attr_name, expected, poll_period) as waiter:
+        return waiter.wait(timeout)
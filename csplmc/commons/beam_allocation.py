@@ -0,0 +1,315 @@
+"""
+Allocation of the CSP beam capabilities (SearchBeam, TimingBeam, VlbiBeam).
+
+The beams of a pool are identified by the IDs [1, num_of_beams]. The free
+beams and the beams of each subarray are kept as interval sets: sorted lists
+of disjoint ID ranges [start, end). The free ranges are also indexed by their
+length, so a request for N beams finds the smallest contiguous range holding
+them (best fit) with a binary search. When no free range is large enough, the
+largest ranges are granted first, to split the request in as few ranges as
+possible. The subarray membership of the beams is an array updated one range
+at a time (slice assignment), together with its run-length encoding.
+
+Example::
+
+    search_beams = BeamAllocation(1500, 16)
+    search_beams.allocate(1, 300)           # [1, 2, ..., 300]
+    search_beams.assign(2, [300, 301])      # ([301], {300: 1})
+    search_beams.release(1, num=100)        # [201, ..., 300]
+    search_beams.membership()[:3]           # [1, 1, 1]
+    search_beams.membership_runs()          # [1, 200, 1, 301, 1, 2]
+"""
+import bisect
+import threading
+from array import array
+
+from csplmc.commons.membership_runs import MembershipRuns
+
+def id_ranges(ids):
+    """
+    Returns:
+        The sorted list of the ranges [start, end) covering the IDs (the\
+        repeated IDs are merged).
+    """
+    ranges = []
+    for beam_id in sorted(set(int(beam_id) for beam_id in ids)):
+        if ranges and ranges[-1][1] == beam_id:
+            ranges[-1][1] = beam_id + 1
+        else:
+            ranges.append([beam_id, beam_id + 1])
+    return [tuple(id_range) for id_range in ranges]
+
+def range_ids(ranges):
+    """
+    Returns:
+        The list of the IDs of the ranges [start, end).
+    """
+    return [beam_id for start, end in ranges for beam_id in range(start, end)]
+
+class IntervalSet(object):
+    """
+    A set of integers stored as sorted, disjoint and not adjacent ranges
+    [start, end). The ranges are indexed by start and by length.
+
+    Args:
+        ranges: the initial ranges.
+    """
+    def __init__(self, ranges=()):
+        self._starts = []
+        self._ends = []
+        # the (length, start) pairs of the ranges, sorted
+        self._by_length = []
+        self._count = 0
+        for start, end in ranges:
+            self.add(start, end)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, value):
+        index = bisect.bisect_right(self._starts, value) - 1
+        return index >= 0 and value < self._ends[index]
+
+    def ranges(self):
+        """
+        Returns:
+            The sorted list of the ranges (start, end).
+        """
+        return list(zip(self._starts, self._ends))
+
+    def _replace(self, first, last, ranges):
+        """
+        Replace the ranges [first, last) of the lists with the new ones.
+        """
+        for start, end in zip(self._starts[first:last], self._ends[first:last]):
+            del self._by_length[bisect.bisect_left(self._by_length, (end - start, start))]
+            self._count -= end - start
+        self._starts[first:last] = [start for start, _ in ranges]
+        self._ends[first:last] = [end for _, end in ranges]
+        for start, end in ranges:
+            bisect.insort(self._by_length, (end - start, start))
+            self._count += end - start
+
+    def add(self, start, end):
+        """
+        Add the range [start, end), merging the overlapping and adjacent ranges.
+        """
+        if start >= end:
+            return
+        # the ranges ending at or after start and beginning at or before end
+        first = bisect.bisect_left(self._ends, start)
+        last = bisect.bisect_right(self._starts, end)
+        if first < last:
+            start = min(start, self._starts[first])
+            end = max(end, self._ends[last - 1])
+        self._replace(first, last, [(start, end)])
+
+    def remove(self, start, end):
+        """
+        Remove the range [start, end).
+
+        Returns:
+            The list of the removed ranges.
+        """
+        if start >= end:
+            return []
+        # the ranges overlapping [start, end)
+        first = bisect.bisect_right(self._ends, start)
+        last = bisect.bisect_left(self._starts, end)
+        if first >= last:
+            return []
+        removed = [(max(range_start, start), min(range_end, end)) for range_start, range_end
+                   in zip(self._starts[first:last], self._ends[first:last])]
+        remaining = []
+        if self._starts[first] < start:
+            remaining.append((self._starts[first], start))
+        if self._ends[last - 1] > end:
+            remaining.append((end, self._ends[last - 1]))
+        self._replace(first, last, remaining)
+        return removed
+
+    def intersection(self, start, end):
+        """
+        Returns:
+            The list of the ranges of the set inside [start, end).
+        """
+        first = bisect.bisect_right(self._ends, start)
+        last = bisect.bisect_left(self._starts, end)
+        return [(max(range_start, start), min(range_end, end)) for range_start, range_end
+                in zip(self._starts[first:last], self._ends[first:last])]
+
+    def best_fit(self, length):
+        """
+        Returns:
+            The start of the smallest range holding *length* values (the\
+            lowest one if more than one), or None.
+        """
+        index = bisect.bisect_left(self._by_length, (length, 0))
+        if index == len(self._by_length):
+            return None
+        return self._by_length[index][1]
+
+    def largest(self):
+        """
+        Returns:
+            The ranges (start, end), from the largest to the smallest.
+        """
+        return [(start, start + length) for length, start in reversed(self._by_length)]
+
+class BeamAllocation(object):
+    """
+    The allocation table of a pool of beams. All the methods are thread-safe.
+
+    Args:
+        num_of_beams: the number of beams (IDs in [1, num_of_beams]).
+        num_of_subarrays: the number of subarrays (IDs in [1, num_of_subarrays]).
+    """
+    def __init__(self, num_of_beams, num_of_subarrays):
+        self.num_of_beams = num_of_beams
+        self.num_of_subarrays = num_of_subarrays
+        self._free = IntervalSet([(1, num_of_beams + 1)])
+        # index 0 is not used: subarray IDs start from 1
+        self._subarray = [IntervalSet() for _ in range(num_of_subarrays + 1)]
+        self._membership = array('H', [0]) * num_of_beams
+        self._runs = MembershipRuns()
+        self._lock = threading.Lock()
+
+    def _check_subarray(self, sub_id):
+        if not 1 <= sub_id <= self.num_of_subarrays:
+            raise ValueError("Invalid subarray id: {}".format(sub_id))
+
+    def _grant(self, sub_id, ranges):
+        for start, end in ranges:
+            self._free.remove(start, end)
+            self._subarray[sub_id].add(start, end)
+            self._membership[start - 1:end - 1] = array('H', [sub_id]) * (end - start)
+            self._runs.set(start, end, sub_id)
+
+    def _release(self, sub_id, ranges):
+        for start, end in ranges:
+            self._subarray[sub_id].remove(start, end)
+            self._free.add(start, end)
+            self._membership[start - 1:end - 1] = array('H', [0]) * (end - start)
+            self._runs.set(start, end, 0)
+
+    @property
+    def available(self):
+        """
+        The number of free beams.
+        """
+        return len(self._free)
+
+    def allocate(self, sub_id, num):
+        """
+        Assign *num* free beams to the subarray, in the smallest contiguous
+        range holding them or, if there is none, in the largest free ranges.
+
+        Returns:
+            The sorted list of the assigned beam IDs.
+        Raises:
+            ValueError: if less than *num* beams are free.
+        """
+        self._check_subarray(sub_id)
+        with self._lock:
+            if num > len(self._free):
+                raise ValueError("Not enough free beams: {} requested, {} "
+                                 "available".format(num, len(self._free)))
+            start = self._free.best_fit(num)
+            if start is not None:
+                ranges = [(start, start + num)]
+            else:
+                ranges = []
+                missing = num
+                for start, end in self._free.largest():
+                    length = min(end - start, missing)
+                    ranges.append((start, start + length))
+                    missing -= length
+                    if not missing:
+                        break
+            self._grant(sub_id, ranges)
+        return range_ids(sorted(ranges))
+
+    def assign(self, sub_id, ids):
+        """
+        Assign the free beams of the list to the subarray.
+
+        Returns:
+            The sorted list of the assigned beam IDs and the dictionary\
+            {beam id: owner subarray id} of the beams not free.
+        Raises:
+            ValueError: if a beam ID is out of range.
+        """
+        self._check_subarray(sub_id)
+        requested = id_ranges(ids)
+        if requested and (requested[0][0] < 1 or requested[-1][1] > self.num_of_beams + 1):
+            raise ValueError("Invalid beam ids: {}".format(
+                [beam_id for beam_id in range_ids(requested)
+                 if not 1 <= beam_id <= self.num_of_beams]))
+        with self._lock:
+            granted = []
+            for start, end in requested:
+                granted.extend(self._free.intersection(start, end))
+            self._grant(sub_id, granted)
+            assigned = range_ids(granted)
+            conflicts = {beam_id: self._membership[beam_id - 1]
+                         for beam_id in sorted(set(range_ids(requested)) - set(assigned))
+                         if self._membership[beam_id - 1] != sub_id}
+        return assigned, conflicts
+
+    def release(self, sub_id, ids=None, num=None):
+        """
+        Release beams of the subarray: the beams of the list, the *num*
+        beams with the highest IDs or, if neither is specified, all of them.
+        The beams not assigned to the subarray are ignored.
+
+        Returns:
+            The sorted list of the released beam IDs.
+        """
+        self._check_subarray(sub_id)
+        with self._lock:
+            subarray = self._subarray[sub_id]
+            if ids is not None:
+                ranges = []
+                for start, end in id_ranges(ids):
+                    ranges.extend(subarray.intersection(start, end))
+            elif num is not None:
+                ranges = []
+                missing = num
+                for start, end in reversed(subarray.ranges()):
+                    if not missing:
+                        break
+                    length = min(end - start, missing)
+                    ranges.append((end - length, end))
+                    missing -= length
+            else:
+                ranges = subarray.ranges()
+            self._release(sub_id, ranges)
+        return range_ids(sorted(ranges))
+
+    def subarray_ids(self, sub_id):
+        """
+        Returns:
+            The sorted list of the beam IDs assigned to the subarray.
+        """
+        self._check_subarray(sub_id)
+        with self._lock:
+            return range_ids(self._subarray[sub_id].ranges())
+
+    def membership(self):
+        """
+        Returns:
+            The owner subarray ID of each beam (0 if not assigned), indexed by\
+            beam ID - 1.
+        """
+        with self._lock:
+            return self._membership.tolist()
+
+    def membership_runs(self):
+        """
+        Returns:
+            The run-length encoded membership: the flat list\
+            [start, length, subarray id, ...] of the runs of beams assigned\
+            to the same subarray (the free beams are not encoded).
+        """
+        with self._lock:
+            return self._runs.encoded()
@@ -0,0 +1,109 @@
+"""
+Decoding of the delay models published by TM.
+
+TM publishes the delay models of a subarray as a JSON-encoded attribute
+(the delayModelSubscriptionPoint of the scan configuration)::
+
+    {"delayModel": [{"epoch": <sec>,
+                     "delayDetails": [{"receptor": 1,
+                                       "receptorDelayDetails": [
+                                           {"fsid": 1, "delayCoeff": [c0, ..., c5]},
+                                           ...]},
+                                      ...]},
+                    ...]}
+
+Each model is decoded once into packed NumPy arrays: the receptor IDs, the
+offset of the first entry of each receptor, the FSP ID and the polynomial
+coefficients of each entry (one row for each entry). The entries of a
+receptor are slices (views) of the packed arrays, so the model is fanned out
+to the receptors without decoding it again.
+
+Example::
+
+    models = parse_delay_models(evt.attr_value.value)
+    for model in models:
+        for receptor_id in model.receptor_ids():
+            fsids, coeffs = model.details(receptor_id)
+            vcc_proxy.UpdateDelayModel(model.receptor_json(receptor_id))
+"""
+import json
+
+import numpy as np
+
+class DelayModel(object):
+    """
+    A delay model decoded into packed arrays.
+
+    Args:
+        epoch: the time (seconds since the epoch) the model applies from.
+        delay_details: the list of the delayDetails entries of the model.
+    Raises:
+        KeyError, TypeError, ValueError: if the model is malformed.
+    """
+    def __init__(self, epoch, delay_details):
+        self.epoch = float(epoch)
+        entries = [(int(detail["receptor"]), int(entry["fsid"]), entry["delayCoeff"])
+                   for detail in delay_details
+                   for entry in detail["receptorDelayDetails"]]
+        num_of_coeffs = max([len(coeffs) for _, _, coeffs in entries], default=0)
+        # the entries are grouped by receptor (stable sort: the FSP order is kept)
+        entries.sort(key=lambda entry: entry[0])
+        receptors = np.array([entry[0] for entry in entries], dtype=np.uint16)
+        self.fsids = np.array([entry[1] for entry in entries], dtype=np.uint16)
+        self.coeffs = np.zeros((len(entries), num_of_coeffs), dtype=np.float64)
+        for row, (_, _, coeffs) in enumerate(entries):
+            self.coeffs[row, :len(coeffs)] = coeffs
+        self.receptors, first = np.unique(receptors, return_index=True)
+        self.offsets = np.append(first, len(entries)).astype(np.int32)
+        self._index = {int(receptor_id): index
+                       for index, receptor_id in enumerate(self.receptors)}
+
+    def __len__(self):
+        return len(self.receptors)
+
+    def receptor_ids(self):
+        """
+        Returns:
+            The sorted list of the receptor IDs of the model.
+        """
+        return list(self._index)
+
+    def details(self, receptor_id):
+        """
+        Returns:
+            The FSP IDs and the coefficients (one row for each FSP) of the\
+            receptor, as views of the packed arrays.
+        Raises:
+            KeyError: if the receptor is not in the model.
+        """
+        index = self._index[receptor_id]
+        first, last = self.offsets[index], self.offsets[index + 1]
+        return self.fsids[first:last], self.coeffs[first:last]
+
+    def receptor_json(self, receptor_id):
+        """
+        Returns:
+            The JSON-encoded delayDetails of the receptor only, as expected by\
+            the VCC UpdateDelayModel command.
+        """
+        fsids, coeffs = self.details(receptor_id)
+        return json.dumps([{"receptor": receptor_id,
+                            "receptorDelayDetails": [
+                                {"fsid": fsid, "delayCoeff": row}
+                                for fsid, row in zip(fsids.tolist(), coeffs.tolist())]}])
+
+def parse_delay_models(value):
+    """
+    Decode the delay models of the JSON-encoded TM attribute value.
+
+    Returns:
+        The list of the DelayModel objects, sorted by epoch.
+    Raises:
+        ValueError: if the value is not a valid delay model.
+    """
+    try:
+        return sorted((DelayModel(model["epoch"], model["delayDetails"])
+                       for model in json.loads(value)["delayModel"]),
+                      key=lambda model: model.epoch)
+    except (KeyError, TypeError, ValueError) as err:
+        raise ValueError("Invalid delay model: {}".format(str(err)))
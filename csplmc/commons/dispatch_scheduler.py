@@ -0,0 +1,224 @@
+"""
+Time-scheduled dispatch of commands to the sub-element subarrays.
+
+A DispatchScheduler owns a timer thread that runs a set of actions (for
+example the asynchronous Scan requests to the participating sub-element
+subarrays) at an absolute time. The thread sleeps until *spin* seconds
+before the dispatch time and then polls the clock, so the wake-up latency
+of the OS timer does not add to the dispatch jitter. The actions are run
+back to back: each one should only send an asynchronous request, so that
+the sub-elements receive the command within a few milliseconds of each
+other.
+The dispatch jitter (delay of the first action from the scheduled time)
+and the skew (delay of the last action from the first one) are recorded,
+together with the times of the last dispatch, so that the dispatches of
+several devices scheduled at the same time can be compared.
+The dispatch is pending (and can be cancelled) until the actions are run;
+while they run the dispatch is in flight.
+
+Example::
+
+    scheduler = DispatchScheduler("Scan", log=self.dev_logging)
+    scheduler.schedule(time.time() + 5,
+                       [lambda: proxy.command_inout_asynch("Scan", argin, callback)
+                        for proxy in proxies])
+    ...
+    scheduler.stats()   # {"pending": None, "dispatched": 1, "jitter": {...}, ...}
+    scheduler.stop()
+"""
+import os
+import threading
+import time
+
+import tango
+
+from csplmc.commons.latency import LatencyStats
+
+class DispatchScheduler(object):
+    """
+    The scheduler of the dispatch of a command. One dispatch at a time can
+    be pending.
+
+    Args:
+        name: the name of the scheduled command (used in the log messages).
+        spin: the time (sec) the thread polls the clock before the dispatch.
+        priority: if not 0, the SCHED_FIFO priority of the timer thread (the\
+                  device needs the CAP_SYS_NICE capability).
+        log: the logging method of the device (dev_logging), called with the\
+             message and the TANGO log level.
+    """
+    def __init__(self, name, spin=0.002, priority=0, log=None):
+        self.name = name
+        self._spin = spin
+        self._priority = priority
+        self._log = log
+        self._cond = threading.Condition()
+        # the pending dispatch: (time, actions)
+        self._job = None
+        # True while the actions of a dispatch are run
+        self._in_flight = False
+        self._thread = None
+        self._stopped = False
+        self._dispatched = 0
+        self._cancelled = 0
+        self._jitter = LatencyStats()
+        self._skew = LatencyStats()
+        # the scheduled, start and end times of the last dispatch
+        self._last = None
+
+    def _log_msg(self, msg, level):
+        if self._log:
+            self._log(msg, level)
+
+    @property
+    def pending(self):
+        """
+        The time of the pending dispatch (None if there is none).
+        """
+        with self._cond:
+            return self._job[0] if self._job else None
+
+    @property
+    def in_flight(self):
+        """
+        True while the actions of a dispatch are run (the dispatch can't be\
+        cancelled anymore).
+        """
+        with self._cond:
+            return self._in_flight
+
+    def schedule(self, when, actions):
+        """
+        Schedule the dispatch of the actions.
+
+        Args:
+            when: the dispatch time (seconds since the epoch).
+            actions: the list of the callables to run.
+        Raises:
+            ValueError: if a dispatch is already pending.
+        """
+        with self._cond:
+            if self._job is not None:
+                raise ValueError("{} already scheduled at {}".format(self.name, self._job[0]))
+            self._job = (when, list(actions))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name="{}Scheduler".format(self.name))
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify()
+
+    def cancel(self):
+        """
+        Cancel the pending dispatch.
+
+        Returns:
+            True if a dispatch was pending, False if no dispatch was pending or\
+            if it is in flight.
+        """
+        with self._cond:
+            if self._job is None:
+                return False
+            self._job = None
+            self._cancelled += 1
+            self._cond.notify()
+            return True
+
+    def stop(self):
+        """
+        Cancel the pending dispatch and stop the timer thread.
+        """
+        with self._cond:
+            self._job = None
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        """
+        Returns:
+            The dictionary {"pending", "dispatched", "cancelled", "jitter", "skew",\
+            "last"}: the latencies are in milliseconds (see LatencyStats.stats())\
+            and last is {"scheduled", "started", "ended"} (seconds since the\
+            epoch) or None if nothing has been dispatched.
+        """
+        with self._cond:
+            pending = self._job[0] if self._job else None
+        return {"pending": pending,
+                "dispatched": self._dispatched,
+                "cancelled": self._cancelled,
+                "jitter": self._jitter.stats(),
+                "skew": self._skew.stats(),
+                "last": self._last}
+
+    def _set_priority(self):
+        if not self._priority:
+            return
+        try:
+            # on Linux pid 0 selects the calling thread
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(self._priority))
+        except (AttributeError, OSError) as err:
+            msg = "Can't set the {} scheduler priority: {}".format(self.name, str(err))
+            self._log_msg(msg, tango.LogLevel.LOG_WARN)
+
+    def _next_job(self):
+        """
+        Wait for the pending dispatch until *spin* seconds before its time.
+        The job stays pending (it can still be cancelled).
+
+        Returns:
+            The job (time, actions) or None if the scheduler is stopped.
+        """
+        with self._cond:
+            while not self._stopped:
+                if self._job is None:
+                    self._cond.wait()
+                    continue
+                remaining = self._job[0] - time.time()
+                if remaining <= self._spin:
+                    return self._job
+                self._cond.wait(remaining - self._spin)
+            return None
+
+    def _take_job(self, job):
+        """
+        Remove the job from the pending dispatch, if it was not cancelled.
+
+        Returns:
+            True if the job is to be dispatched.
+        """
+        with self._cond:
+            if self._job is not job:
+                return False
+            self._job = None
+            self._in_flight = True
+            return True
+
+    def _run(self):
+        self._set_priority()
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            when, actions = job
+            # the job can be cancelled while the thread polls the clock
+            while time.time() < when and self._job is job:
+                pass
+            if not self._take_job(job):
+                continue
+            start = time.time()
+            for action in actions:
+                try:
+                    action()
+                except Exception as err:
+                    msg = "{} dispatch failure: {}".format(self.name, str(err))
+                    self._log_msg(msg, tango.LogLevel.LOG_ERROR)
+            end = time.time()
+            with self._cond:
+                self._in_flight = False
+            self._dispatched += 1
+            self._jitter.record(start - when)
+            self._skew.record(end - start)
+            self._last = {"scheduled": when, "started": start, "ended": end}
@@ -0,0 +1,191 @@
+"""
+Binary encodings of the scan configuration (ConfigureScanEncoded command).
+
+The scan configuration can be sent to the CspSubarray as a DevEncoded
+value: the format string selects the encoding and the data are the encoded
+configuration. The numeric arrays (for example the channelAveragingMap of
+each FSP) are carried as typed arrays, that is as the raw bytes of the
+array, and are decoded into NumPy arrays that are views of the received
+buffer, without creating a Python object for each element:
+
+* "msgpack": the arrays are msgpack extension types (TYPED_ARRAY_EXT) whose
+  data are the header <dtype length><dtype string><ndim><shape (uint32)>
+  followed by the array bytes (requires the msgpack package).
+* "cbor": the arrays are RFC 8746 typed arrays (tags 64-87), wrapped in the
+  multi-dimensional array tag 40 if their rank is > 1 (requires the cbor2
+  package).
+* "json": UTF-8 encoded JSON text, for the clients without a binary encoder.
+
+msgpack and cbor2 are optional: the formats whose package is missing are
+rejected by decode_configuration().
+
+Example::
+
+    configuration["fsp"][0]["channelAveragingMap"] = np.array(channel_map, dtype=np.uint32)
+    data = encode_configuration("msgpack", configuration)
+    proxy.ConfigureScanEncoded(("msgpack", data))
+    ...
+    configuration = decode_configuration("msgpack", data)
+"""
+import json
+import struct
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+# the msgpack extension type of the typed arrays
+TYPED_ARRAY_EXT = 1
+# the RFC 8746 tag of the multi-dimensional (row-major) arrays
+CBOR_MULTI_DIM_TAG = 40
+
+def supported_formats():
+    """
+    Returns:
+        The list of the formats supported with the installed packages.
+    """
+    formats = ["json"]
+    if msgpack is not None:
+        formats.append("msgpack")
+    if cbor2 is not None:
+        formats.append("cbor")
+    return formats
+
+def _array_header(array):
+    dtype = array.dtype.str.encode("ascii")
+    return (struct.pack("<B", len(dtype)) + dtype +
+            struct.pack("<B{}I".format(array.ndim), array.ndim, *array.shape))
+
+def _msgpack_default(obj):
+    if isinstance(obj, np.ndarray):
+        array = np.ascontiguousarray(obj)
+        return msgpack.ExtType(TYPED_ARRAY_EXT, _array_header(array) + array.tobytes())
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError("Can't encode {}".format(type(obj)))
+
+def _msgpack_ext_hook(code, data):
+    if code != TYPED_ARRAY_EXT:
+        return msgpack.ExtType(code, data)
+    dtype_len = data[0]
+    dtype = np.dtype(bytes(data[1:1 + dtype_len]).decode("ascii"))
+    ndim = data[1 + dtype_len]
+    offset = 2 + dtype_len
+    shape = struct.unpack_from("<{}I".format(ndim), data, offset)
+    offset += 4 * ndim
+    return np.frombuffer(data, dtype=dtype, offset=offset).reshape(shape)
+
+def _cbor_tag(dtype):
+    """
+    Returns:
+        The RFC 8746 typed array tag of the dtype: 0b010fsell (f: float,\
+        s: signed, e: little endian, ll: size).
+    """
+    little_endian = dtype.byteorder == "<" or (dtype.byteorder == "=" and
+                                               np.little_endian)
+    if dtype.kind == "f":
+        size_bits = {2: 0, 4: 1, 8: 2, 16: 3}[dtype.itemsize]
+        return 0x50 | (little_endian << 2) | size_bits
+    size_bits = {1: 0, 2: 1, 4: 2, 8: 3}[dtype.itemsize]
+    # the single byte arrays have no endianness (e=1 is the clamped uint8)
+    return (0x40 | ((dtype.kind == "i") << 3) |
+            ((little_endian and dtype.itemsize > 1) << 2) | size_bits)
+
+def _cbor_dtype(tag):
+    """
+    Returns:
+        The dtype of a RFC 8746 typed array tag or None if the tag is not a\
+        typed array.
+    """
+    if not 64 <= tag <= 87 or tag == 76:
+        return None
+    size_bits, little_endian = tag & 0x3, (tag >> 2) & 0x1
+    if tag & 0x10:
+        kind, size = "f", 2 << size_bits
+    else:
+        kind, size = "i" if tag & 0x8 else "u", 1 << size_bits
+    return np.dtype("{}{}{}".format("<" if little_endian else ">", kind, size))
+
+def _cbor_default(encoder, obj):
+    if isinstance(obj, np.ndarray):
+        array = np.ascontiguousarray(obj)
+        typed_array = cbor2.CBORTag(_cbor_tag(array.dtype), array.tobytes())
+        if array.ndim > 1:
+            typed_array = cbor2.CBORTag(CBOR_MULTI_DIM_TAG, [list(array.shape), typed_array])
+        encoder.encode(typed_array)
+    elif isinstance(obj, np.generic):
+        encoder.encode(obj.item())
+    else:
+        raise TypeError("Can't encode {}".format(type(obj)))
+
+def _cbor_tag_hook(first, second):
+    # the hook is called with (decoder, tag) by cbor2 < 6 and with
+    # (tag, immutable) by the later versions
+    tag = first if isinstance(first, cbor2.CBORTag) else second
+    if tag.tag == CBOR_MULTI_DIM_TAG:
+        shape, array = tag.value
+        return array.reshape(shape)
+    dtype = _cbor_dtype(tag.tag)
+    if dtype is None:
+        return tag
+    return np.frombuffer(tag.value, dtype=dtype)
+
+def _json_default(obj):
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    raise TypeError("Can't encode {}".format(type(obj)))
+
+def _check_format(encoded_format):
+    encoded_format = encoded_format.lower()
+    if encoded_format not in supported_formats():
+        raise ValueError("Unsupported scan configuration format '{}' "
+                         "(supported: {})".format(encoded_format, supported_formats()))
+    return encoded_format
+
+def encode_configuration(encoded_format, configuration):
+    """
+    Encode a scan configuration: the NumPy arrays are encoded as typed arrays.
+
+    Returns:
+        The encoded configuration (bytes).
+    Raises:
+        ValueError: if the format is not supported.
+    """
+    encoded_format = _check_format(encoded_format)
+    if encoded_format == "msgpack":
+        return msgpack.packb(configuration, default=_msgpack_default, use_bin_type=True)
+    if encoded_format == "cbor":
+        return cbor2.dumps(configuration, default=_cbor_default)
+    return json.dumps(configuration, default=_json_default).encode("utf-8")
+
+def decode_configuration(encoded_format, data):
+    """
+    Decode a scan configuration: the typed arrays are decoded into read-only\
+    NumPy arrays backed by the received bytes, without decoding each element.
+
+    Returns:
+        The dictionary with the scan configuration.
+    Raises:
+        ValueError: if the format is not supported or the data are not a\
+        valid encoded dictionary.
+    """
+    encoded_format = _check_format(encoded_format)
+    try:
+        if encoded_format == "msgpack":
+            configuration = msgpack.unpackb(data, ext_hook=_msgpack_ext_hook, raw=False)
+        elif encoded_format == "cbor":
+            configuration = cbor2.loads(data, tag_hook=_cbor_tag_hook)
+        else:
+            configuration = json.loads(bytes(data).decode("utf-8"))
+    except Exception as err:
+        raise ValueError("Invalid {} scan configuration: {}".format(encoded_format, str(err)))
+    if not isinstance(configuration, dict):
+        raise ValueError("The {} scan configuration is not a dictionary".format(encoded_format))
+    return configuration
@@ -0,0 +1,270 @@
+"""
+Event-storm and fault-injection engine for the CSP.LMC sub-element simulators.
+
+The storm is configured via a JSON-encoded string, for example::
+
+    {
+        "duration": 10,
+        "rates": {"State": 200, "healthState": 200, "adminMode": 50,
+                  "reportVCCState": 1000},
+        "values": "random",
+        "burst": {"size": 2000, "period": 1.0},
+        "faults": {"eventTimeout": 5, "devFailed": 5,
+                   "commandTimeout": 0.1, "commandFailure": 0.1,
+                   "timeoutDelay": 4.0},
+        "seed": 1
+    }
+
+* *duration*: storm duration in sec (0 = run until stopped)
+* *rates*: the number of change events/sec emitted for each attribute
+* *values*: *current* to push the current attribute values, *random* to push\
+  random (but valid) values
+* *burst*: every *period* sec, *size* extra events are emitted at once\
+  (round-robin over the attributes with a configured rate)
+* *faults*: *eventTimeout* and *devFailed* are the rates (error events/sec) of\
+  API_EventTimeout and DevFailed error events; *commandTimeout* and\
+  *commandFailure* are the probabilities that a command is delayed by\
+  *timeoutDelay* sec (longer than the default client timeout) or fails.
+"""
+import json
+import random
+import threading
+import time
+
+import tango
+
+# the resolution of the event generator loop (sec)
+TICK = 0.001
+
+class EventStorm(object):
+    """
+    Scriptable generator of change events and faults.
+
+    Args:
+        push: callable with signature push(attr_name, value) used to push a\
+              change event (value can be a tango.DevFailed exception).
+        value_of: callable with signature value_of(attr_name, rnd) returning\
+                  the value to push. *rnd* is a random.Random instance when\
+                  random values are requested, otherwise None.
+        origin: the origin reported in the injected exceptions.
+    """
+    def __init__(self, push, value_of, origin="EventStorm"):
+        self._push = push
+        self._value_of = value_of
+        self._origin = origin
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._config = {}
+        self._random = random.Random()
+        self._report = self._empty_report()
+
+    @staticmethod
+    def _empty_report():
+        return {"running": False,
+                "start_time": 0.,
+                "elapsed": 0.,
+                "emitted": {},
+                "errors": {"API_EventTimeout": 0, "DevFailed": 0},
+                "push_failures": 0,
+                "bursts": 0,
+                "commands": {"timeouts": 0, "failures": 0},
+                "total": 0,
+                "rate": 0.}
+
+    @staticmethod
+    def _numbers(config, key):
+        """
+        Returns:
+            The dictionary of the numeric values of the *key* entry of the\
+            configuration (empty if the entry is missing).
+        Raises:
+            ValueError: if the entry is not a JSON object or a value is not a\
+                        number.
+        """
+        entry = config.get(key, {})
+        if not isinstance(entry, dict):
+            raise ValueError("{} must be a JSON object".format(key))
+        try:
+            return {str(name): float(value) for name, value in entry.items()}
+        except (TypeError, ValueError):
+            raise ValueError("The values of {} must be numbers".format(key))
+
+    def start(self, config_json):
+        """
+        Start a new event storm.
+
+        Args:
+            config_json: the JSON-encoded storm configuration.
+        Raises:
+            ValueError: if the configuration is not valid or a storm is already\
+                        running.
+        """
+        config = json.loads(config_json) if config_json.strip() else {}
+        if not isinstance(config, dict):
+            raise ValueError("The storm configuration must be a JSON object")
+        rates = self._numbers(config, "rates")
+        if any(rate < 0 for rate in rates.values()):
+            raise ValueError("Event rates must be positive")
+        # the other numeric entries are used by the generator thread
+        self._numbers(config, "burst")
+        self._numbers(config, "faults")
+        try:
+            float(config.get("duration", 0))
+        except (TypeError, ValueError):
+            raise ValueError("duration must be a number")
+        if config.get("values", "current") not in ["current", "random"]:
+            raise ValueError("values must be 'current' or 'random'")
+        with self._lock:
+            if self.is_running():
+                raise ValueError("An event storm is already running")
+            self._config = dict(config, rates=rates)
+            self._random = random.Random(config.get("seed"))
+            self._report = self._empty_report()
+            self._report["running"] = True
+            self._report["start_time"] = time.time()
+            self._report["emitted"] = {name: 0 for name in rates}
+            # the thread is assigned while holding the lock: a concurrent start()
+            # finds it running and a concurrent stop() can join it
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="EventStorm")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop the running event storm and wait for the generator thread exit.
+        """
+        with self._lock:
+            thread = self._thread
+            self._stop_event.set()
+        # the generator thread takes the lock: join it after the release
+        if thread is not None:
+            thread.join()
+            with self._lock:
+                if self._thread is thread:
+                    self._thread = None
+
+    def is_running(self):
+        """
+        Returns:
+            True if the event storm is running.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def report(self):
+        """
+        Returns:
+            A JSON-encoded string reporting what has been emitted/injected.
+        """
+        with self._lock:
+            return json.dumps(self._report, sort_keys=True)
+
+    def inject_command_fault(self, command_name):
+        """
+        Inject, with the configured probabilities, a timeout or a failure in
+        the execution of a command. Has no effect if no storm is running.
+
+        Args:
+            command_name: the name of the command.
+        Raises:
+            tango.DevFailed: when a command failure is injected.
+        """
+        if not self.is_running():
+            return
+        faults = self._config.get("faults", {})
+        with self._lock:
+            draw = self._random.random()
+        timeout_prob = float(faults.get("commandTimeout", 0))
+        failure_prob = float(faults.get("commandFailure", 0))
+        if draw < timeout_prob:
+            with self._lock:
+                self._report["commands"]["timeouts"] += 1
+            time.sleep(float(faults.get("timeoutDelay", 4.0)))
+        elif draw < timeout_prob + failure_prob:
+            with self._lock:
+                self._report["commands"]["failures"] += 1
+            tango.Except.throw_exception("SimulatedFailure",
+                                         "Injected failure of command {}".format(command_name),
+                                         self._origin,
+                                         tango.ErrSeverity.ERR)
+
+    def _exception(self, reason):
+        """
+        Build a DevFailed exception with the specified reason.
+        """
+        try:
+            tango.Except.throw_exception(reason,
+                                         "Injected {} error event".format(reason),
+                                         self._origin,
+                                         tango.ErrSeverity.ERR)
+        except tango.DevFailed as df:
+            return df
+
+    def _emit(self, attr_name, counter=None, value=None):
+        """
+        Push one change event and update the report.
+        """
+        try:
+            if value is None:
+                rnd = self._random if self._config.get("values") == "random" else None
+                value = self._value_of(attr_name, rnd)
+            self._push(attr_name, value)
+        except Exception:
+            with self._lock:
+                self._report["push_failures"] += 1
+            return
+        with self._lock:
+            if counter is None:
+                self._report["emitted"][attr_name] += 1
+            else:
+                self._report["errors"][counter] += 1
+            self._report["total"] += 1
+
+    def _run(self):
+        """
+        The event generator loop.
+        """
+        rates = self._config["rates"]
+        faults = self._config.get("faults", {})
+        error_rates = {"API_EventTimeout": float(faults.get("eventTimeout", 0)),
+                       "DevFailed": float(faults.get("devFailed", 0))}
+        burst = self._config.get("burst", {})
+        burst_size = int(burst.get("size", 0))
+        burst_period = float(burst.get("period", 0))
+        duration = float(self._config.get("duration", 0))
+        burst_targets = [name for name, rate in rates.items() if rate > 0] or list(rates)
+        # the number of events (errors) emitted so far by the rate-driven generator
+        sent = {name: 0 for name in rates}
+        sent_errors = {reason: 0 for reason in error_rates}
+        # attributes used to deliver the error events
+        error_targets = list(rates) or ["State"]
+        next_burst = burst_period
+        start = time.perf_counter()
+        while not self._stop_event.is_set():
+            elapsed = time.perf_counter() - start
+            if duration and elapsed >= duration:
+                break
+            for name, rate in rates.items():
+                due = int(rate * elapsed) - sent[name]
+                for _ in range(due):
+                    self._emit(name)
+                sent[name] += max(due, 0)
+            for reason, rate in error_rates.items():
+                due = int(rate * elapsed) - sent_errors[reason]
+                for i in range(due):
+                    target = error_targets[(sent_errors[reason] + i) % len(error_targets)]
+                    self._emit(target, reason, self._exception(reason))
+                sent_errors[reason] += max(due, 0)
+            if burst_size and burst_period and elapsed >= next_burst and burst_targets:
+                for i in range(burst_size):
+                    self._emit(burst_targets[i % len(burst_targets)])
+                with self._lock:
+                    self._report["bursts"] += 1
+                next_burst += burst_period
+            with self._lock:
+                self._report["elapsed"] = elapsed
+                self._report["rate"] = self._report["total"] / elapsed if elapsed else 0.
+            self._stop_event.wait(TICK)
+        with self._lock:
+            self._report["running"] = False
@@ -0,0 +1,146 @@
+"""
+Command latency models used by the CSP.LMC sub-element simulators and
+latency statistics of the CSP.LMC devices.
+
+A latency model is specified as a list of strings, one for each command,
+with the form::
+
+    <command>:<distribution>:<param1>[:<param2>]
+
+where *distribution* is one of:
+
+* *fixed*:   constant delay (param1 = delay in sec)
+* *uniform*: uniform delay in [param1, param2] sec
+* *gauss*:   normal delay with mean param1 and standard deviation param2 sec
+* *expo*:    exponential delay with mean param1 sec
+
+Example:
+    ["On:gauss:2.0:0.2", "Off:fixed:1", "Standby:uniform:1:3"]
+
+The LatencyStats class keeps the statistics (mean, max, percentiles) of a
+latency measured by a device, for example the delivery time of the delay
+models or the dispatch jitter of the scheduled commands.
+"""
+import random
+import threading
+
+import numpy as np
+
+DISTRIBUTIONS = {
+    "fixed":   (1, lambda rnd, p: p[0]),
+    "uniform": (2, lambda rnd, p: rnd.uniform(p[0], p[1])),
+    "gauss":   (2, lambda rnd, p: rnd.gauss(p[0], p[1])),
+    "expo":    (1, lambda rnd, p: rnd.expovariate(1. / p[0]) if p[0] > 0 else 0.),
+}
+
+class LatencyModel(object):
+    """
+    Per-command latency distributions.
+
+    Args:
+        specs: the list of latency specification strings.
+        default: the delay (sec) used for commands without specification.
+        seed: optional seed of the random generator, to get reproducible\
+              sequences of delays.
+    Raises:
+        ValueError: if a specification string is malformed.
+    """
+    def __init__(self, specs=None, default=0., seed=None):
+        self._default = float(default)
+        self._random = random.Random(seed)
+        self._models = {}
+        for spec in specs or []:
+            self.set(spec)
+
+    def set(self, spec):
+        """
+        Add or replace the latency distribution of a command.
+
+        Args:
+            spec: the specification string (see module documentation).
+        Raises:
+            ValueError: if the specification string is malformed.
+        """
+        items = [item.strip() for item in spec.split(":")]
+        if len(items) < 3:
+            raise ValueError("Invalid latency specification: {}".format(spec))
+        command, distribution = items[0], items[1].lower()
+        try:
+            num_of_params, _ = DISTRIBUTIONS[distribution]
+            params = [float(param) for param in items[2:]]
+        except KeyError:
+            raise ValueError("Unknown latency distribution {}".format(distribution))
+        if len(params) != num_of_params:
+            raise ValueError("Latency distribution {} requires {} "
+                             "parameters".format(distribution, num_of_params))
+        self._models[command.lower()] = (distribution, params)
+
+    def sample(self, command):
+        """
+        Draw a delay for the specified command.
+
+        Args:
+            command: the command name (case insensitive).
+        Returns:
+            The delay in seconds (never negative).
+        """
+        try:
+            distribution, params = self._models[command.lower()]
+        except KeyError:
+            return self._default
+        _, sampler = DISTRIBUTIONS[distribution]
+        return max(0., sampler(self._random, params))
+
+    def specs(self):
+        """
+        Returns:
+            The list of the latency specification strings currently configured.
+        """
+        return ["{}:{}:{}".format(command, distribution, ":".join(str(p) for p in params))
+                for command, (distribution, params) in sorted(self._models.items())]
+
+class LatencyStats(object):
+    """
+    The statistics of a latency, on the last *size* samples. All the methods
+    are thread-safe.
+
+    Args:
+        size: the number of samples kept to compute the percentiles.
+    """
+    def __init__(self, size=1024):
+        self._samples = np.zeros(size, dtype=np.float64)
+        self._count = 0
+        self._sum = 0.
+        self._max = 0.
+        self._last = None
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        """
+        Record a latency sample (sec).
+        """
+        with self._lock:
+            self._samples[self._count % len(self._samples)] = latency
+            self._count += 1
+            self._sum += latency
+            self._max = max(self._max, latency)
+            self._last = latency
+
+    def stats(self):
+        """
+        Returns:
+            The dictionary {"count", "last", "mean", "max", "p50", "p99"}: the\
+            latencies are in milliseconds (None if no sample is recorded).
+        """
+        with self._lock:
+            if not self._count:
+                return {"count": 0, "last": None, "mean": None, "max": None,
+                        "p50": None, "p99": None}
+            samples = self._samples[:min(self._count, len(self._samples))]
+            p50, p99 = np.percentile(samples, [50, 99])
+            return {"count": self._count,
+                    "last": self._last * 1000.,
+                    "mean": self._sum / self._count * 1000.,
+                    "max": self._max * 1000.,
+                    "p50": float(p50) * 1000.,
+                    "p99": float(p99) * 1000.}
@@ -0,0 +1,104 @@
+"""
+Run-length encoding of the subarray membership of a capability pool.
+
+The membership of a pool (receptors, beams) is mostly made of contiguous
+runs of capabilities assigned to the same subarray. The runs are kept as
+sorted lists of maximal ID ranges [start, end) with their owner: the free
+capabilities (owner 0) are not stored. Changing the owner of a range only
+touches the runs overlapping or adjacent to it, so the allocation tables
+update the encoding at each assignment/release instead of rebuilding it from
+the dense membership array.
+
+Example::
+
+    runs = MembershipRuns()
+    runs.set(1, 301, 1)         # beams [1, 300] to subarray 1
+    runs.set(301, 303, 2)       # beams [301, 302] to subarray 2
+    runs.set(201, 301, 0)       # beams [201, 300] released
+    runs.runs()                 # [(1, 200, 1), (301, 2, 2)]
+    runs.encoded()              # [1, 200, 1, 301, 2, 2]
+"""
+import bisect
+
+class MembershipRuns(object):
+    """
+    The membership runs (start, length, subarray id) of a pool of
+    capabilities. The owner of a range is changed in O(log n + k), with n
+    the number of runs and k the runs overlapping the range.
+    The class is not thread-safe: it is protected by the lock of the
+    allocation table owning it.
+    """
+    def __init__(self):
+        self._starts = []
+        self._ends = []
+        self._owners = []
+
+    def __len__(self):
+        return len(self._starts)
+
+    def set(self, start, end, owner):
+        """
+        Set the owner of the IDs [start, end) (0 to mark them as free).
+        """
+        if start >= end:
+            return
+        # the runs ending at or after start and beginning at or before end:
+        # the adjacent runs are included, to merge them with the new one
+        first = bisect.bisect_left(self._ends, start)
+        last = bisect.bisect_right(self._starts, end)
+        pieces = []
+        if first < last and self._starts[first] < start:
+            pieces.append((self._starts[first], start, self._owners[first]))
+        if owner:
+            pieces.append((start, end, owner))
+        if first < last and self._ends[last - 1] > end:
+            pieces.append((end, self._ends[last - 1], self._owners[last - 1]))
+        merged = []
+        for piece in pieces:
+            if merged and merged[-1][1] == piece[0] and merged[-1][2] == piece[2]:
+                merged[-1] = (merged[-1][0], piece[1], piece[2])
+            else:
+                merged.append(piece)
+        self._starts[first:last] = [piece[0] for piece in merged]
+        self._ends[first:last] = [piece[1] for piece in merged]
+        self._owners[first:last] = [piece[2] for piece in merged]
+
+    def set_ids(self, ids, owner):
+        """
+        Set the owner of the IDs of the list, one range of consecutive IDs
+        at a time.
+        """
+        start = end = None
+        for capability_id in sorted(set(ids)):
+            if capability_id == end:
+                end += 1
+                continue
+            if start is not None:
+                self.set(start, end, owner)
+            start, end = capability_id, capability_id + 1
+        if start is not None:
+            self.set(start, end, owner)
+
+    def runs(self):
+        """
+        Returns:
+            The sorted list of the runs (start, length, subarray id).
+        """
+        return [(start, end - start, owner)
+                for start, end, owner in zip(self._starts, self._ends, self._owners)]
+
+    def encoded(self, limit=None):
+        """
+        Args:
+            limit: if specified, only the IDs up to *limit* are encoded.
+        Returns:
+            The runs as the flat list [start, length, subarray id, ...].
+        """
+        encoded = []
+        for start, end, owner in zip(self._starts, self._ends, self._owners):
+            if limit is not None:
+                if start > limit:
+                    break
+                end = min(end, limit + 1)
+            encoded.extend((start, end - start, owner))
+        return encoded
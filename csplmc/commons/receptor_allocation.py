@@ -0,0 +1,310 @@
+"""
+Bitmap-based allocation table of the receptors.
+
+A set of receptors is represented by an integer bitmap: bit (id - 1) is set
+when the receptor *id* belongs to the set. The table keeps one bitmap for
+each subarray, the bitmap of the usable receptors (valid link to a working
+VCC) and the owner of each receptor, so that assignment, release and
+conflict checks are a few integer operations, whatever the number of
+requested receptors. The run-length encoding of the owners is updated with
+them.
+
+Example::
+
+    table = ReceptorAllocation(197, 16)
+    assigned, conflicts = table.assign(1, [1, 2, 3])
+    table.available_ids()       # [4, 5, ..., 197]
+    table.check_plan({2: [3, 4], 3: [5]})   # {2: {"assignable": [4], ...}, 3: ...}
+    table.membership()          # [1, 1, 1, 0, ..., 0]
+    table.membership_runs()     # [1, 3, 1]
+"""
+import threading
+
+from csplmc.commons.membership_runs import MembershipRuns
+
+def receptor_mask(ids):
+    """
+    Returns:
+        The bitmap of the receptor IDs (the repeated IDs are merged).
+    Raises:
+        ValueError: if an ID is not a positive number.
+    """
+    mask = 0
+    for receptor_id in ids:
+        receptor_id = int(receptor_id)
+        if receptor_id < 1:
+            raise ValueError("Invalid receptor id: {}".format(receptor_id))
+        mask |= 1 << (receptor_id - 1)
+    return mask
+
+def receptor_ids(mask):
+    """
+    Returns:
+        The sorted list of the receptor IDs of a bitmap.
+    """
+    ids = []
+    while mask:
+        lowest = mask & -mask
+        ids.append(lowest.bit_length())
+        mask ^= lowest
+    return ids
+
+class ReceptorAllocation(object):
+    """
+    The receptors allocation table: ownership and availability of the receptors.
+    All the methods are thread-safe.
+
+    Args:
+        num_of_receptors: the number of receptors (IDs in [1, num_of_receptors]).
+        num_of_subarrays: the number of subarrays (IDs in [1, num_of_subarrays]).
+    """
+    def __init__(self, num_of_receptors, num_of_subarrays):
+        self.num_of_receptors = num_of_receptors
+        self.num_of_subarrays = num_of_subarrays
+        self._all = (1 << num_of_receptors) - 1
+        self._usable = self._all
+        self._allocated = 0
+        # index 0 is not used: subarray IDs start from 1
+        self._subarray = [0] * (num_of_subarrays + 1)
+        self._owner = [0] * num_of_receptors
+        self._runs = MembershipRuns()
+        self._lock = threading.Lock()
+
+    def mask(self, ids):
+        """
+        Returns:
+            The bitmap of the receptor IDs.
+        Raises:
+            ValueError: if an ID is out of range.
+        """
+        mask = receptor_mask(ids)
+        if mask & ~self._all:
+            raise ValueError("Invalid receptor ids: {}".format(receptor_ids(mask & ~self._all)))
+        return mask
+
+    def _check_subarray(self, sub_id):
+        if not 1 <= sub_id <= self.num_of_subarrays:
+            raise ValueError("Invalid subarray id: {}".format(sub_id))
+
+    @property
+    def free_mask(self):
+        """
+        The bitmap of the usable receptors not assigned to any subarray.
+        """
+        return self._usable & ~self._allocated
+
+    @property
+    def usable_mask(self):
+        """
+        The bitmap of the usable receptors.
+        """
+        return self._usable
+
+    @property
+    def allocated_mask(self):
+        """
+        The bitmap of the receptors assigned to a subarray.
+        """
+        return self._allocated
+
+    def subarray_mask(self, sub_id):
+        """
+        Returns:
+            The bitmap of the receptors assigned to the subarray.
+        """
+        self._check_subarray(sub_id)
+        return self._subarray[sub_id]
+
+    def owner(self, receptor_id):
+        """
+        Returns:
+            The ID of the subarray owning the receptor (0 if not assigned).
+        """
+        return self._owner[receptor_id - 1]
+
+    def is_free(self, receptor_id):
+        """
+        Returns:
+            True if the receptor is usable and not assigned.
+        """
+        return bool(self.free_mask >> (receptor_id - 1) & 1)
+
+    def check(self, sub_id, ids):
+        """
+        Check the assignment of the receptors to a subarray.
+
+        Returns:
+            The bitmap of the receptors that can be assigned and the dictionary\
+            {receptor id: owner subarray id} of the receptors assigned to other\
+            subarrays. The receptors already assigned to the subarray and the\
+            not usable ones are in neither of them.
+        """
+        self._check_subarray(sub_id)
+        requested = self.mask(ids)
+        with self._lock:
+            owned = requested & self._allocated & ~self._subarray[sub_id]
+            conflicts = {receptor_id: self._owner[receptor_id - 1]
+                         for receptor_id in receptor_ids(owned)}
+            return requested & self.free_mask, conflicts
+
+    def check_plan(self, plan):
+        """
+        Check the assignment of the receptors to several subarrays in one pass.
+        A receptor requested for more than one subarray is granted to the
+        lowest subarray ID and reported as a conflict for the others.
+
+        Args:
+            plan: the dictionary {subarray id: list of receptor IDs}.
+        Returns:
+            The dictionary {subarray id: result}, where result is the dictionary:\
+            {"assignable": the receptors that can be assigned,\
+             "assigned": the receptors already assigned to the subarray,\
+             "conflicts": {receptor id: owner (or requesting) subarray id},\
+             "unavailable": the receptors not usable,\
+             "invalid": the out of range receptor IDs}.
+        Raises:
+            ValueError: if a subarray ID is out of range.
+        """
+        for sub_id in plan:
+            self._check_subarray(sub_id)
+        results = {}
+        # the receptors granted to the subarrays of the plan
+        planned = 0
+        planned_owner = {}
+        with self._lock:
+            for sub_id in sorted(plan):
+                ids = [int(receptor_id) for receptor_id in plan[sub_id]]
+                invalid = sorted(set(receptor_id for receptor_id in ids
+                                     if not 1 <= receptor_id <= self.num_of_receptors))
+                requested = receptor_mask(receptor_id for receptor_id in ids
+                                          if receptor_id not in invalid)
+                assigned = requested & self._subarray[sub_id]
+                owned = requested & self._allocated & ~assigned
+                conflicts = {receptor_id: self._owner[receptor_id - 1]
+                             for receptor_id in receptor_ids(owned)}
+                conflicts.update({receptor_id: planned_owner[receptor_id]
+                                  for receptor_id in receptor_ids(requested & planned)})
+                assignable = requested & self.free_mask & ~planned
+                planned |= assignable
+                for receptor_id in receptor_ids(assignable):
+                    planned_owner[receptor_id] = sub_id
+                results[sub_id] = {"assignable": receptor_ids(assignable),
+                                   "assigned": receptor_ids(assigned),
+                                   "conflicts": conflicts,
+                                   "unavailable": receptor_ids(requested & ~self._usable &
+                                                               ~self._allocated),
+                                   "invalid": invalid}
+        return results
+
+    def assign(self, sub_id, ids):
+        """
+        Assign the free receptors of the list to the subarray.
+
+        Returns:
+            The list of the assigned receptor IDs and the dictionary\
+            {receptor id: owner subarray id} of the conflicting receptors.
+        """
+        self._check_subarray(sub_id)
+        requested = self.mask(ids)
+        with self._lock:
+            owned = requested & self._allocated & ~self._subarray[sub_id]
+            conflicts = {receptor_id: self._owner[receptor_id - 1]
+                         for receptor_id in receptor_ids(owned)}
+            to_assign = requested & self.free_mask
+            self._allocated |= to_assign
+            self._subarray[sub_id] |= to_assign
+            assigned = receptor_ids(to_assign)
+            for receptor_id in assigned:
+                self._owner[receptor_id - 1] = sub_id
+            self._runs.set_ids(assigned, sub_id)
+        return assigned, conflicts
+
+    def release(self, sub_id, ids=None):
+        """
+        Release the receptors of the list (all the receptors if not specified)
+        from the subarray. The receptors not assigned to the subarray are ignored.
+
+        Returns:
+            The list of the released receptor IDs.
+        """
+        self._check_subarray(sub_id)
+        with self._lock:
+            to_release = self._subarray[sub_id]
+            if ids is not None:
+                to_release &= self.mask(ids)
+            self._allocated &= ~to_release
+            self._subarray[sub_id] &= ~to_release
+            released = receptor_ids(to_release)
+            for receptor_id in released:
+                self._owner[receptor_id - 1] = 0
+            self._runs.set_ids(released, 0)
+        return released
+
+    def set_usable(self, ids):
+        """
+        Set the list of the usable receptors.
+        """
+        mask = self.mask(ids)
+        with self._lock:
+            self._usable = mask
+
+    def update(self, membership):
+        """
+        Align the table with the subarray membership reported by the
+        sub-element.
+
+        Args:
+            membership: the owner subarray ID of each receptor (0 if not\
+                        assigned), indexed by receptor ID - 1.
+        Returns:
+            The bitmap of the receptors whose owner changed.
+        """
+        with self._lock:
+            changed = 0
+            # the receptors whose owner changed, grouped by new owner
+            new_owner = {}
+            for index, sub_id in enumerate(membership[:self.num_of_receptors]):
+                sub_id = int(sub_id)
+                previous = self._owner[index]
+                if sub_id == previous or sub_id > self.num_of_subarrays:
+                    continue
+                bit = 1 << index
+                changed |= bit
+                if previous:
+                    self._subarray[previous] &= ~bit
+                    self._allocated &= ~bit
+                if sub_id:
+                    self._subarray[sub_id] |= bit
+                    self._allocated |= bit
+                self._owner[index] = sub_id
+                new_owner.setdefault(sub_id, []).append(index + 1)
+            for sub_id, ids in new_owner.items():
+                self._runs.set_ids(ids, sub_id)
+            return changed
+
+    def membership(self, num_of_receptors=None):
+        """
+        Returns:
+            The owner subarray ID of the first *num_of_receptors* receptors\
+            (all if not specified), as reported by the receptorMembership attribute.
+        """
+        with self._lock:
+            return self._owner[:num_of_receptors or self.num_of_receptors]
+
+    def membership_runs(self, num_of_receptors=None):
+        """
+        Returns:
+            The run-length encoded membership of the first *num_of_receptors*\
+            receptors (all if not specified): the flat list\
+            [start, length, subarray id, ...] of the runs of receptors assigned\
+            to the same subarray (the free receptors are not encoded).
+        """
+        with self._lock:
+            return self._runs.encoded(num_of_receptors)
+
+    def available_ids(self):
+        """
+        Returns:
+            The sorted list of the usable receptors not assigned to any subarray.
+        """
+        return receptor_ids(self.free_mask)
@@ -0,0 +1,196 @@
+"""
+Staging of the validated scan configurations.
+
+A scan configuration validated ahead of time (ValidateScanConfiguration
+command) is stored in canonical form (JSON with sorted keys and no
+whitespace) under the SHA-256 hash of the canonical text. A later
+ConfigureScan carrying the hash or the same JSON text gets the staged entry
+with a dictionary lookup and forwards the payload prepared at validation
+time, without parsing and validating the configuration again.
+The table keeps the most recently used configurations.
+
+The binary encoded configurations (ConfigureScanEncoded command) are staged
+under the (format, SHA-256 hash of the encoded bytes) key: neither the key
+nor the hash require the canonical JSON text. The canonical text and the
+CBF payload are produced from the decoded configuration the first time the
+entry is forwarded, because the CbfSubarray ConfigureScan command takes a
+JSON string: the NumPy arrays are then converted into lists. A repeated
+submission of the same encoded configuration reuses them.
+
+Example::
+
+    staged = StagedConfigurations(16)
+    entry = staged.add(argin, json.loads(argin), scan_id=1)
+    staged.get(entry.hash) is staged.get(argin)     # True
+    entry.cbf_configuration                         # the payload forwarded to CBF
+
+    key = encoded_key("msgpack", data)
+    entry = staged.add(key, decode_configuration("msgpack", data), scan_id=2)
+    staged.get(key) is entry                        # True, nothing is encoded
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+def _to_json(obj):
+    # the arrays of the configurations decoded by ConfigureScanEncoded
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    raise TypeError("{} is not JSON serializable".format(type(obj)))
+
+def canonical_json(configuration):
+    """
+    Returns:
+        The canonical JSON text of the configuration: sorted keys and no\
+        whitespace, so that equivalent configurations have the same text.\
+        The NumPy arrays are encoded as lists.
+    """
+    return json.dumps(configuration, sort_keys=True, separators=(",", ":"),
+                      default=_to_json)
+
+def encoded_key(encoded_format, data):
+    """
+    Returns:
+        The key of an encoded configuration: the format and the SHA-256 hash\
+        of the encoded bytes.
+    """
+    return encoded_format.lower(), hashlib.sha256(data).hexdigest()
+
+def _encode_members(configuration):
+    """
+    Returns:
+        The canonical JSON text of the configuration and the payload forwarded\
+        to CBF (without the delay model subscription point). Each entry is\
+        encoded once for both.
+    """
+    members = [(key, "{}:{}".format(json.dumps(key), canonical_json(value)))
+               for key, value in sorted(configuration.items())]
+    canonical = "{" + ",".join(member for _, member in members) + "}"
+    cbf_configuration = "{" + ",".join(member for key, member in members
+                                       if key != "delayModelSubscriptionPoint") + "}"
+    return canonical, cbf_configuration
+
+class StagedConfiguration(object):
+    """
+    A validated scan configuration: its hash, its JSON text, the scan ID, the
+    delay model subscription point and the payload forwarded to the
+    CbfSubarray. The JSON text and the payload of an encoded configuration
+    are produced at their first use.
+    """
+    def __init__(self, config_hash, scan_id, delay_model_point, configuration=None,
+                 text=None, cbf_configuration=None):
+        self.hash = config_hash
+        self.scan_id = scan_id
+        self.delay_model_point = delay_model_point
+        self._configuration = configuration
+        self._text = text
+        self._cbf_configuration = cbf_configuration
+        self._lock = threading.Lock()
+
+    def _encode(self):
+        with self._lock:
+            if self._text is None:
+                self._text, self._cbf_configuration = _encode_members(self._configuration)
+                # the decoded arrays are no longer needed
+                self._configuration = None
+
+    @property
+    def text(self):
+        """
+        The canonical JSON text of the configuration.
+        """
+        if self._text is None:
+            self._encode()
+        return self._text
+
+    @property
+    def cbf_configuration(self):
+        """
+        The JSON payload forwarded to the CbfSubarray.
+        """
+        if self._text is None:
+            self._encode()
+        return self._cbf_configuration
+
+class StagedConfigurations(object):
+    """
+    The table of the staged scan configurations. All the methods are
+    thread-safe.
+
+    Args:
+        max_size: the max number of configurations kept (the least recently\
+                  used are discarded).
+    """
+    def __init__(self, max_size=16):
+        self._max_size = max(1, max_size)
+        # {hash: StagedConfiguration}, in order of use
+        self._entries = OrderedDict()
+        # {JSON text or encoded key: hash}: the texts received for each configuration
+        self._by_text = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, text, configuration, scan_id, delay_model_point=''):
+        """
+        Stage a validated configuration.
+
+        Args:
+            text: the JSON text of the configuration, as received, or the key\
+                  of the encoded configuration (see encoded_key()).
+            configuration: the decoded configuration.
+            scan_id: the validated scan ID.
+            delay_model_point: the delay model subscription point, removed from\
+                               the payload forwarded to CBF.
+        Returns:
+            The StagedConfiguration entry.
+        """
+        if isinstance(text, tuple):
+            # the encoded configurations are not converted into JSON here
+            config_hash = text[1]
+            entry = StagedConfiguration(config_hash, scan_id, delay_model_point,
+                                        configuration=configuration)
+            keys = [text]
+        else:
+            canonical, cbf_configuration = _encode_members(configuration)
+            config_hash = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+            entry = StagedConfiguration(config_hash, scan_id, delay_model_point,
+                                        text=canonical, cbf_configuration=cbf_configuration)
+            keys = [text, canonical]
+        with self._lock:
+            self._entries[config_hash] = entry
+            self._entries.move_to_end(config_hash)
+            for key in keys:
+                self._by_text[key] = config_hash
+            while len(self._entries) > self._max_size:
+                discarded, _ = self._entries.popitem(last=False)
+                self._by_text = {key: value for key, value in self._by_text.items()
+                                 if value != discarded}
+        return entry
+
+    def get(self, key):
+        """
+        Args:
+            key: the hash, the JSON text or the key of the encoded configuration.
+        Returns:
+            The StagedConfiguration entry or None if the configuration is not\
+            staged.
+        """
+        with self._lock:
+            config_hash = self._by_text.get(key, key)
+            entry = self._entries.get(config_hash)
+            if entry is not None:
+                self._entries.move_to_end(config_hash)
+            return entry
+
+    def hashes(self):
+        """
+        Returns:
+            The hashes of the staged configurations, the most recently used last.
+        """
+        with self._lock:
+            return list(self._entries)
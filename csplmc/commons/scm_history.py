@@ -0,0 +1,115 @@
+"""
+In-memory history of the SCM (State, healthState, adminMode, obsState)
+transitions of a device and of its sub-elements.
+
+The transitions are stored in a fixed-size ring buffer backed by typed
+arrays (one array per field, preallocated at creation): recording a
+transition never allocates memory and, when the buffer is full, the oldest
+entries are overwritten. A value equal to the last recorded one for the same
+source and attribute is not a transition and is not stored.
+
+The entries are exported in a compact JSON payload, the source names being
+sent once::
+
+    {"sources": ["mid_csp/elt/master", "mid_csp_cbf/sub_elt/master"],
+     "attributes": ["State", "healthState", "adminMode", "obsState"],
+     "entries": [[1572431245.021, 1, 0, 0], ...]}
+
+where each entry is [timestamp, source index, attribute index, value].
+"""
+import json
+import threading
+import time
+from array import array
+
+ATTRIBUTES = ["State", "healthState", "adminMode", "obsState"]
+DEFAULT_CAPACITY = 4096
+
+_ATTRIBUTE_INDEX = {attr_name.lower(): index for index, attr_name in enumerate(ATTRIBUTES)}
+
+class ScmHistory(object):
+    """
+    The ring buffer of the SCM transitions. The methods are thread-safe.
+
+    Args:
+        capacity: the max number of stored transitions.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._timestamps = array('d', [0.]) * capacity
+        self._sources = array('H', [0]) * capacity
+        self._attributes = array('B', [0]) * capacity
+        self._values = array('i', [0]) * capacity
+        self._source_names = []
+        self._source_index = {}
+        # the last recorded value of each (source, attribute)
+        self._last = {}
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def record(self, source, attr_name, value, timestamp=None):
+        """
+        Record the value of a SCM attribute, if it differs from the last one.
+
+        Args:
+            source: the device name.
+            attr_name: one of ATTRIBUTES (case insensitive).
+            value: the attribute value (an enumerated value).
+            timestamp: the time of the transition (now if not specified).
+        Returns:
+            True if the value is a transition and has been stored.
+        """
+        attr_index = _ATTRIBUTE_INDEX[attr_name.lower()]
+        value = int(value)
+        with self._lock:
+            source_index = self._source_index.get(source)
+            if source_index is None:
+                source_index = len(self._source_names)
+                self._source_names.append(source)
+                self._source_index[source] = source_index
+            if self._last.get((source_index, attr_index)) == value:
+                return False
+            self._last[(source_index, attr_index)] = value
+            position = self._next
+            self._timestamps[position] = time.time() if timestamp is None else timestamp
+            self._sources[position] = source_index
+            self._attributes[position] = attr_index
+            self._values[position] = value
+            self._next = (position + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+        return True
+
+    def entries(self, since=0.):
+        """
+        Returns:
+            The list of the transitions [timestamp, source index, attribute\
+            index, value] recorded after *since* (seconds since the epoch),\
+            oldest first, and the list of the source names.
+        """
+        with self._lock:
+            entries = []
+            position = self._next
+            # scan from the newest entry back to the first one older than since
+            for _ in range(self._count):
+                position = (position - 1) % self.capacity
+                timestamp = self._timestamps[position]
+                if timestamp < since:
+                    break
+                entries.append([timestamp, self._sources[position],
+                                self._attributes[position], self._values[position]])
+            entries.reverse()
+            return entries, list(self._source_names)
+
+    def to_json(self, since=0.):
+        """
+        Returns:
+            The JSON payload of the transitions recorded after *since* (see\
+            the module documentation).
+        """
+        entries, sources = self.entries(since)
+        return json.dumps({"sources": sources, "attributes": ATTRIBUTES, "entries": entries},
+                          separators=(",", ":"))
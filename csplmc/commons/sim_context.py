@@ -0,0 +1,156 @@
+"""
+In-process test context running the CspMaster and CspSubarray devices against
+the CBF sub-element simulators (CbfTestMaster and CbfTestSubarray).
+
+All the devices run in a single device server started by a
+tango.test_context.MultiDeviceTestContext: no TANGO DB and no containers are
+required. Example::
+
+    with SimulatedCspContext(num_of_subarrays=2) as context:
+        context.csp_master.On([])
+        context.csp_subarrays[0].AddReceptors([1, 2, 3])
+
+Note:
+    The forwarded attributes are not configured inside the context (their root
+    attribute is specified via TANGO DB attribute properties).
+"""
+import importlib.util
+import os
+import sys
+
+import tango
+from tango.test_context import MultiDeviceTestContext
+
+csplmc_path = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                           os.pardir))
+try:
+    import csplmc
+except ImportError:
+    sys.path.insert(0, os.path.abspath(os.path.join(csplmc_path, os.pardir)))
+from csplmc.commons.attribute_wait import wait_for_attribute
+
+if importlib.util.find_spec("CbfTestMaster") is None:
+    # uninstalled source tree: the device packages are in the csplmc directories
+    for pkg_path in [csplmc_path,
+                     os.path.join(csplmc_path, "CspMaster"),
+                     os.path.join(csplmc_path, "CspSubarray")]:
+        if pkg_path not in sys.path:
+            sys.path.insert(0, pkg_path)
+
+CSP_MASTER = "mid_csp/elt/master"
+CSP_SUBARRAY = "mid_csp/elt/subarray_{:02d}"
+CBF_MASTER = "mid_csp_cbf/sub_elt/master"
+CBF_SUBARRAY = "mid_csp_cbf/sub_elt/subarray_{:02d}"
+
+# the simulators latencies used by default inside the context: the CBF Master
+# initialization is immediate so that the CSP devices find it in STANDBY.
+CBF_MASTER_LATENCY = ["Init:fixed:0", "On:fixed:0.1", "Off:fixed:0.1", "Standby:fixed:0.1"]
+CBF_SUBARRAY_LATENCY = ["AddReceptors:fixed:0", "RemoveReceptors:fixed:0",
+                        "RemoveAllReceptors:fixed:0", "ConfigureScan:fixed:0.1",
+                        "Scan:fixed:0", "EndScan:fixed:0", "EndSB:fixed:0"]
+
+def devices_info(num_of_subarrays=1, cbf_master_latency=None, cbf_subarray_latency=None,
+                 csp_properties=None):
+    """
+    Build the description of the devices running inside the test context.
+
+    Args:
+        num_of_subarrays: the number of CSP (and CBF) subarrays.
+        cbf_master_latency: the command latency specifications of the CbfTestMaster.
+        cbf_subarray_latency: the command latency specifications of the CbfTestSubarrays.
+        csp_properties: further properties of the CspMaster and CspSubarray devices\
+                        (for example JournalDir).
+    Returns:
+        The devices_info tuple of the MultiDeviceTestContext.
+    """
+    from CbfTestMaster.CbfTestMaster import CbfTestMaster
+    from CbfTestSubarray.CbfTestSubarray import CbfTestSubarray
+    from CspMaster.CspMaster import CspMaster
+    from CspSubarray.CspSubarray import CspSubarray
+
+    sub_ids = range(1, num_of_subarrays + 1)
+    csp_properties = csp_properties or {}
+    return (
+        {"class": CbfTestMaster,
+         "devices": [{"name": CBF_MASTER,
+                      "properties": {"CommandLatency": cbf_master_latency or
+                                                       CBF_MASTER_LATENCY}}]},
+        {"class": CbfTestSubarray,
+         "devices": [{"name": CBF_SUBARRAY.format(sub_id),
+                      "properties": {"SubID": str(sub_id),
+                                     "CbfMaster": CBF_MASTER,
+                                     "CommandLatency": cbf_subarray_latency or
+                                                       CBF_SUBARRAY_LATENCY}}
+                     for sub_id in sub_ids]},
+        {"class": CspMaster,
+         "devices": [{"name": CSP_MASTER,
+                      "properties": dict(csp_properties,
+                                         CspMidCbf=CBF_MASTER,
+                                         CspSubarrays=[CSP_SUBARRAY.format(sub_id)
+                                                       for sub_id in sub_ids])}]},
+        {"class": CspSubarray,
+         "devices": [{"name": CSP_SUBARRAY.format(sub_id),
+                      "properties": dict(csp_properties,
+                                         SubID=str(sub_id),
+                                         CspMaster=CSP_MASTER)}
+                     for sub_id in sub_ids]},
+    )
+
+class SimulatedCspContext(object):
+    """
+    Context manager running the CSP.LMC devices and the CBF simulators in
+    a MultiDeviceTestContext.
+
+    Args:
+        num_of_subarrays: the number of CSP (and CBF) subarrays.
+        cbf_master_latency: the command latency specifications of the CbfTestMaster.
+        cbf_subarray_latency: the command latency specifications of the CbfTestSubarrays.
+        csp_properties: further properties of the CspMaster and CspSubarray devices.
+        timeout: the max time (sec) to wait for the devices initialization.
+        kwargs: further arguments passed to the MultiDeviceTestContext.
+    """
+    def __init__(self, num_of_subarrays=1, cbf_master_latency=None,
+                 cbf_subarray_latency=None, csp_properties=None, timeout=10, **kwargs):
+        self.num_of_subarrays = num_of_subarrays
+        self.timeout = timeout
+        self._context = MultiDeviceTestContext(devices_info(num_of_subarrays,
+                                                            cbf_master_latency,
+                                                            cbf_subarray_latency,
+                                                            csp_properties),
+                                               **kwargs)
+        self.csp_master = None
+        self.csp_subarrays = []
+        self.cbf_master = None
+        self.cbf_subarrays = []
+
+    def get_device(self, device_name):
+        """
+        Returns:
+            A DeviceProxy to the specified device of the context.
+        """
+        return self._context.get_device(device_name)
+
+    def __enter__(self):
+        self._context.start()
+        try:
+            sub_ids = range(1, self.num_of_subarrays + 1)
+            self.cbf_master = self.get_device(CBF_MASTER)
+            self.cbf_subarrays = [self.get_device(CBF_SUBARRAY.format(sub_id))
+                                  for sub_id in sub_ids]
+            self.csp_master = self.get_device(CSP_MASTER)
+            self.csp_subarrays = [self.get_device(CSP_SUBARRAY.format(sub_id))
+                                  for sub_id in sub_ids]
+            wait_for_attribute(self.cbf_master, "State", tango.DevState.STANDBY,
+                               timeout=self.timeout)
+            # The CSP devices connect to the sub-element devices during their
+            # initialization, possibly before the server exports the other devices
+            # of the context: re-initialize them once all the devices are running.
+            for proxy in [self.csp_master] + self.csp_subarrays:
+                proxy.Init()
+        except Exception:
+            self._context.stop()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._context.stop()
@@ -0,0 +1,170 @@
+"""
+Append-only, memory-mapped journal of the device state.
+
+Each record is a JSON-encoded dictionary of the changed state entries, so the
+state is rebuilt at device initialization by merging the records in order.
+The records are framed as::
+
+    | length (4 bytes) | crc32 (4 bytes) | JSON payload (length bytes) |
+
+The file is pre-allocated with zeros, so the end of the journal is the first
+zero length. A record interrupted by a crash (torn write) fails the CRC check
+and is discarded, together with anything after it. When the file is full the
+journal is compacted into a new file holding only the current state, which
+atomically replaces the old one.
+
+The records are written into the memory-mapped file: they survive a crash of
+the device server process as soon as the append returns. Use sync=True to
+flush each record to the disk too (survives an OS crash, at the cost of a
+msync per record).
+
+Example::
+
+    journal = StateJournal("/var/lib/csplmc/mid_csp_elt_subarray_01.journal")
+    state = journal.replay()        # {"scanID": 12, ...}
+    journal.append({"scanID": 13})
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+MAGIC = b"CSPJ\x01\x00\x00\x00"
+HEADER = struct.Struct("<II")
+DEFAULT_SIZE = 1 << 20
+
+def journal_path(directory, device_name):
+    """
+    Returns:
+        The journal file of a device: the slashes of the device name are\
+        replaced by underscores.
+    """
+    return os.path.join(directory, "{}.journal".format(device_name.replace("/", "_")))
+
+class StateJournal(object):
+    """
+    The state journal of a device. The methods are thread-safe.
+
+    Args:
+        path: the journal file (created if it does not exist).
+        size: the initial size (bytes) of the file.
+        sync: flush each record to the disk.
+    """
+    def __init__(self, path, size=DEFAULT_SIZE, sync=False):
+        self.path = path
+        self.sync = sync
+        self._lock = threading.Lock()
+        self._state = {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(path):
+            self._create(path, size)
+        self._open()
+        self._offset = self._load()
+
+    @staticmethod
+    def _create(path, size):
+        with open(path, "wb") as journal_file:
+            journal_file.truncate(max(size, len(MAGIC) + HEADER.size))
+            journal_file.write(MAGIC)
+
+    def _open(self):
+        self._file = open(self.path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def _load(self):
+        """
+        Merge the valid records into the state.
+
+        Returns:
+            The offset of the end of the journal.
+        """
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError("{} is not a state journal".format(self.path))
+        offset = len(MAGIC)
+        end = len(self._map)
+        while offset + HEADER.size <= end:
+            length, crc = HEADER.unpack_from(self._map, offset)
+            start = offset + HEADER.size
+            if not length or start + length > end:
+                break
+            payload = self._map[start:start + length]
+            if zlib.crc32(payload) != crc:
+                break
+            try:
+                self._state.update(json.loads(payload.decode()))
+            except ValueError:
+                break
+            offset = start + length
+        # clear a torn record so that its leftovers are not mistaken for valid
+        # records after the next appends
+        if offset + HEADER.size <= end and any(self._map[offset:offset + HEADER.size]):
+            self._map[offset:end] = bytes(end - offset)
+        return offset
+
+    def replay(self):
+        """
+        Returns:
+            A copy of the state rebuilt from the journal.
+        """
+        with self._lock:
+            return dict(self._state)
+
+    def append(self, changes):
+        """
+        Record the changed state entries.
+
+        Args:
+            changes: a dictionary of JSON-serializable values.
+        """
+        payload = json.dumps(changes, separators=(",", ":")).encode()
+        with self._lock:
+            self._state.update(changes)
+            if self._offset + 2 * HEADER.size + len(payload) > len(self._map):
+                self._compact(len(payload))
+                return
+            self._write(payload)
+
+    def _write(self, payload):
+        start = self._offset + HEADER.size
+        # the payload is written before the header: a crash leaves a zero length
+        self._map[start:start + len(payload)] = payload
+        self._map[self._offset:start] = HEADER.pack(len(payload), zlib.crc32(payload))
+        if self.sync:
+            self._map.flush()
+        self._offset = start + len(payload)
+
+    def _compact(self, min_free):
+        """
+        Replace the journal with a new file holding only the current state.
+        """
+        payload = json.dumps(self._state, separators=(",", ":")).encode()
+        size = len(self._map)
+        while len(MAGIC) + len(payload) + 2 * HEADER.size + min_free > size // 2:
+            size *= 2
+        tmp_path = self.path + ".tmp"
+        self._create(tmp_path, size)
+        self._close()
+        with open(tmp_path, "r+b") as journal_file:
+            journal_file.seek(len(MAGIC))
+            journal_file.write(HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(tmp_path, self.path)
+        self._open()
+        self._offset = len(MAGIC) + HEADER.size + len(payload)
+
+    def _close(self):
+        self._map.close()
+        self._file.close()
+
+    def close(self):
+        """
+        Flush and close the journal.
+        """
+        with self._lock:
+            self._map.flush()
+            self._close()
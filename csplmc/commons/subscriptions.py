@@ -0,0 +1,224 @@
+"""
+Event subscriptions of a device to the attributes of other devices.
+
+The SubscriptionManager subscribes a set of attributes of a device with one
+call, keeps track of the event IDs, resubscribes the attributes of a device
+after a reconnection (new DeviceProxy) and unsubscribes all the events, the
+devices in parallel, when the subscriber device is deleted.
+The callbacks are wrapped to count the events received by each subscription
+and record the time of the last one.
+
+Example::
+
+    subscriptions = SubscriptionManager(self.dev_logging)
+    failed = subscriptions.subscribe(proxy, ["State", "healthState"], self.callback)
+    ...
+    subscriptions.resubscribe(proxy.dev_name(), tango.DeviceProxy(proxy.dev_name()))
+    subscriptions.stats()   # {device: {attribute: {"events": 12, ...}}}
+    subscriptions.unsubscribe_all()
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import tango
+from tango import EventType
+
+class Subscription(object):
+    """
+    The subscription of a device attribute.
+    """
+    def __init__(self, proxy, attr_name, callback, event_type, stateless):
+        self.proxy = proxy
+        self.attr_name = attr_name
+        self.callback = callback
+        self.event_type = event_type
+        self.stateless = stateless
+        self.event_id = None
+        self.events = 0
+        self.errors = 0
+        self.last_event = None
+
+    def push_event(self, evt):
+        """
+        Count the event and forward it to the subscriber callback.
+        """
+        self.events += 1
+        self.last_event = time.time()
+        if evt.err:
+            self.errors += 1
+        self.callback(evt)
+
+    def stats(self):
+        """
+        Returns:
+            The number of events and errors received and the time of the last\
+            event (None if no event has been received).
+        """
+        return {"subscribed": self.event_id is not None,
+                "events": self.events,
+                "errors": self.errors,
+                "last_event": self.last_event}
+
+class SubscriptionManager(object):
+    """
+    The event subscriptions of a device.
+
+    Args:
+        log: the logging method of the subscriber device (dev_logging), called\
+             with the message and the TANGO log level.
+        max_workers: the max number of devices unsubscribed in parallel.
+    """
+    def __init__(self, log=None, max_workers=8):
+        self._log = log
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        # {device name (lower case): {attribute name (lower case): Subscription}}
+        self._subscriptions = {}
+
+    def _log_msg(self, msg, level):
+        if self._log:
+            self._log(msg, level)
+
+    def subscribe(self, proxy, attr_names, callback, event_type=EventType.CHANGE_EVENT,
+                  stateless=True):
+        """
+        Subscribe the events of a set of attributes of a device.
+        An attribute already subscribed is subscribed again with the new callback.
+
+        Args:
+            proxy: the DeviceProxy of the device.
+            attr_names: the list of the attribute names.
+            callback: the callback invoked with the event data.
+            event_type: the type of the events.
+            stateless: if True, the subscription succeeds even if the device is\
+                       not reachable (TANGO retries it periodically).
+        Returns:
+            The dictionary {attribute name: tango.DevFailed} of the failed\
+            subscriptions (they are retried by resubscribe()).
+        """
+        device = proxy.dev_name().lower()
+        failed = {}
+        for attr_name in attr_names:
+            subscription = Subscription(proxy, attr_name, callback, event_type, stateless)
+            with self._lock:
+                previous = self._subscriptions.setdefault(device, {}).get(attr_name.lower())
+                self._subscriptions[device][attr_name.lower()] = subscription
+            if previous is not None:
+                self._unsubscribe(previous)
+            try:
+                self._subscribe(subscription)
+            except tango.DevFailed as df:
+                failed[attr_name] = df
+                msg = "Failure in subscribing {}/{}: {}".format(device, attr_name,
+                                                                str(df.args[0].desc))
+                self._log_msg(msg, tango.LogLevel.LOG_WARN)
+        return failed
+
+    @staticmethod
+    def _subscribe(subscription):
+        subscription.event_id = subscription.proxy.subscribe_event(subscription.attr_name,
+                                                                   subscription.event_type,
+                                                                   subscription.push_event,
+                                                                   stateless=
+                                                                   subscription.stateless)
+
+    def _unsubscribe(self, subscription):
+        """
+        Returns:
+            True if the subscription has been removed (or was not active).
+        """
+        if subscription.event_id is None:
+            return True
+        try:
+            subscription.proxy.unsubscribe_event(subscription.event_id)
+        except tango.DevFailed as df:
+            msg = "Unsubscribe event failure. Reason: {}. Desc: {}".format(
+                df.args[0].reason, df.args[0].desc)
+            self._log_msg(msg, tango.LogLevel.LOG_ERROR)
+            return False
+        except KeyError as key_err:
+            # NOTE: in PyTango unsubscription of a not-existing event id raises a
+            # KeyError exception not a DevFailed!!
+            msg = "Unsubscribe event failure. Reason: {}".format(str(key_err))
+            self._log_msg(msg, tango.LogLevel.LOG_ERROR)
+        subscription.event_id = None
+        return True
+
+    def resubscribe(self, device_name, proxy=None):
+        """
+        Subscribe again the attributes of a device, for example after the
+        creation of a new DeviceProxy on reconnection. Only the failed
+        subscriptions are retried if the proxy is not specified.
+
+        Returns:
+            The dictionary {attribute name: tango.DevFailed} of the failed\
+            subscriptions.
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(device_name.lower(), {}).values())
+        failed = {}
+        for subscription in subscriptions:
+            if proxy is None and subscription.event_id is not None:
+                continue
+            self._unsubscribe(subscription)
+            if proxy is not None:
+                subscription.proxy = proxy
+            try:
+                self._subscribe(subscription)
+            except tango.DevFailed as df:
+                failed[subscription.attr_name] = df
+        return failed
+
+    def unsubscribe(self, device_name):
+        """
+        Unsubscribe all the events of a device.
+
+        Returns:
+            The list of the attributes whose unsubscription failed.
+        """
+        with self._lock:
+            subscriptions = self._subscriptions.pop(device_name.lower(), {})
+        return [subscription.attr_name for subscription in subscriptions.values()
+                if not self._unsubscribe(subscription)]
+
+    def unsubscribe_all(self):
+        """
+        Unsubscribe all the events, the devices in parallel.
+
+        Returns:
+            The dictionary {device name: list of attributes} of the failed\
+            unsubscriptions.
+        """
+        with self._lock:
+            devices = list(self._subscriptions)
+        if not devices:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self._max_workers, len(devices))) as executor:
+            results = dict(zip(devices, executor.map(self.unsubscribe, devices)))
+        failed = {device: attr_names for device, attr_names in results.items() if attr_names}
+        if failed:
+            self._log_msg("Still subscribed events: {}".format(failed),
+                          tango.LogLevel.LOG_WARN)
+        return failed
+
+    def event_ids(self, device_name):
+        """
+        Returns:
+            The list of the active event IDs of a device.
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(device_name.lower(), {}).values())
+        return [subscription.event_id for subscription in subscriptions
+                if subscription.event_id is not None]
+
+    def stats(self):
+        """
+        Returns:
+            The dictionary {device name: {attribute name: statistics}} (see\
+            Subscription.stats()).
+        """
+        with self._lock:
+            return {device: {subscription.attr_name: subscription.stats()
+                             for subscription in subscriptions.values()}
+                    for device, subscriptions in self._subscriptions.items()}
@@ -0,0 +1,187 @@
+"""
+On-disk cache of the static CBF topology.
+
+The CBF Master reports the receptor/VCC mapping (vccToReceptor and
+receptorToVcc attributes) and the number of CBF capabilities of each type
+(maxCapabilities attribute). These tables change only when the hardware
+changes, so the CspMaster and the CspSubarray devices read them from a local
+JSON file at initialization, without waiting for the CBF Master, and
+validate them against CBF in a background thread. The file is rewritten
+(atomically) only when CBF reports different tables.
+
+The cache file is shared by the devices of the same CSP instance and it is
+named after the CspMaster device. It has the format::
+
+    {"format_version": 1,
+     "version": "<sha1 of the tables>",
+     "timestamp": "2019-10-30T10:21:03",
+     "topology": {"cbfMasterAddress": "mid_csp_cbf/sub_elt/master",
+                  "vccToReceptor": ["1:4", ...],
+                  "receptorToVcc": ["4:1", ...],
+                  "maxCapabilities": ["VCC:4", "FSP:4"]}}
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+FORMAT_VERSION = 1
+TOPOLOGY_ATTRIBUTES = ["vccToReceptor", "receptorToVcc", "maxCapabilities"]
+
+def topology_cache_path(directory, csp_master):
+    """
+    Returns:
+        The cache file of the CSP instance: the slashes of the CspMaster FQDN\
+        are replaced by underscores.
+    """
+    return os.path.join(directory, "{}.topology.json".format(csp_master.replace("/", "_")))
+
+def topology_version(topology):
+    """
+    Returns:
+        The version stamp of the topology tables (sha1 of their JSON encoding).
+    """
+    encoded = json.dumps(topology, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha1(encoded).hexdigest()
+
+def read_cbf_topology(proxy):
+    """
+    Read the topology tables from the CBF Master with a single call.
+
+    Args:
+        proxy: the DeviceProxy of the CBF Master.
+    Returns:
+        The topology dictionary (see the module documentation).
+    Raises:
+        tango.DevFailed: if the CBF Master can't be read.
+    """
+    topology = {"cbfMasterAddress": proxy.dev_name()}
+    for attr_name, attr in zip(TOPOLOGY_ATTRIBUTES, proxy.read_attributes(TOPOLOGY_ATTRIBUTES)):
+        topology[attr_name] = list(attr.value) if attr.value is not None else []
+    return topology
+
+def id_map(pairs):
+    """
+    Returns:
+        The dictionary {int: int} of a list of "ID:ID" strings.
+    """
+    return dict([int(ID) for ID in pair.split(":")] for pair in pairs)
+
+def capabilities(topology):
+    """
+    Returns:
+        The dictionary {capability type: number of instances}.
+    """
+    capability_dict = {}
+    for capability in topology.get("maxCapabilities", []):
+        cap_type, cap_num = capability.split(":")
+        capability_dict[cap_type] = int(cap_num)
+    return capability_dict
+
+class TopologyCache(object):
+    """
+    The cache file of the CBF topology.
+
+    Args:
+        path: the cache file (see topology_cache_path()).
+    """
+    def __init__(self, path):
+        self.path = path
+        self.version = None
+        self._refresh_thread = None
+        self._stop = threading.Event()
+
+    def load(self):
+        """
+        Returns:
+            The cached topology, or None if the file is missing, unreadable or\
+            has been written by an incompatible format version.
+        """
+        try:
+            with open(self.path) as json_file:
+                content = json.load(json_file)
+            if content.get("format_version") != FORMAT_VERSION:
+                return None
+            topology = content["topology"]
+            if content.get("version") != topology_version(topology):
+                return None
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        self.version = content["version"]
+        return topology
+
+    def save(self, topology):
+        """
+        Write the topology into the cache file, replacing the previous one
+        atomically. The file is not rewritten if the version is unchanged.
+
+        Returns:
+            True if the file has been written.
+        """
+        version = topology_version(topology)
+        if version == self.version:
+            return False
+        content = {"format_version": FORMAT_VERSION,
+                   "version": version,
+                   "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "topology": topology}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # the temporary file is unique: the cache is shared by several devices
+        tmp_path = "{}.{}.{}.tmp".format(self.path, os.getpid(), threading.get_ident())
+        with open(tmp_path, "w") as json_file:
+            json.dump(content, json_file, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self.version = version
+        return True
+
+    def refresh(self, fetch, on_change, on_error=None, retry_period=10.):
+        """
+        Validate the cached topology in a background thread: *fetch* is
+        called (and retried every *retry_period* sec until it succeeds), the
+        result is saved and, if it differs from the cached version,
+        passed to *on_change*.
+
+        Args:
+            fetch: callable returning the topology read from CBF.
+            on_change: callable invoked with the new topology.
+            on_error: callable invoked with the exception raised by fetch.
+            retry_period: the time (sec) between two attempts.
+        """
+        self.stop()
+        self._stop.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh,
+                                                args=(fetch, on_change, on_error,
+                                                      retry_period),
+                                                name="topology-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def _refresh(self, fetch, on_change, on_error, retry_period):
+        while not self._stop.is_set():
+            try:
+                topology = fetch()
+            except Exception as err:
+                if on_error:
+                    on_error(err)
+                self._stop.wait(retry_period)
+                continue
+            previous = self.version
+            try:
+                self.save(topology)
+            except OSError as err:
+                if on_error:
+                    on_error(err)
+            if topology_version(topology) != previous:
+                on_change(topology)
+            return
+
+    def stop(self):
+        """
+        Stop the background validation.
+        """
+        self._stop.set()
+        if self._refresh_thread is not None:
+            self._refresh_thread.join()
+            self._refresh_thread = None
@@ -2,29 +2,125 @@
 # the start_prototype script.
 # Docker containers rely on dsconfig device to configure the TANGO Attribute properties.
 #!/usr/bin/env python
+"""
+Configure the attribute polling and change events of the CSP.LMC devices.
+
+The work is grouped per device: the polling status and the configuration of
+all the attributes of a device are read with one call each, the polling is
+started (or its period updated) only for the attributes that need it, the
+polling of the attributes whose change events are pushed by the device code
+(empty pollingPeriod) is stopped, and the modified attribute configurations
+are written back with one call. Devices are configured concurrently.
+
+Usage::
+
+    python csplmc/configureAttrProperties.py [--file csplmc/devices.json]
+"""
+import argparse
 import json
-from tango import AttributeProxy, ChangeEventInfo
-
-# Update file path to devices.json in order to test locally
-
-with open('./csplmc/devices.json', 'r') as file:
-    jsonDevices = file.read().replace('\n', '')
-
-# Loading devices.json file and creating an object
-json_devices = json.loads(jsonDevices)
-
-for device in json_devices:
-    deviceName = device["devName"]
-
-    for attributeProperty in device["attributeProperties"]:
-        if attributeProperty["attrPropName"] == "__root_att":
-            continue
-        attributeProxy = AttributeProxy(deviceName + "/" + attributeProperty["attributeName"])
-        if attributeProperty["pollingPeriod"] != "":
-            attributeProxy.poll(attributeProperty["pollingPeriod"])
-            if attributeProperty["changeEventAbs"] != "":
-                attrInfoEx = attributeProxy.get_config()
-                absChange = ChangeEventInfo()
-                absChange.abs_change = attributeProperty["changeEventAbs"]
-                attrInfoEx.events.ch_event = absChange
-                attributeProxy.set_config(attrInfoEx)
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tango import DeviceProxy
+
+POLLED_ATTR_RE = re.compile(r"Polled attribute name = (\S+)")
+POLLING_PERIOD_RE = re.compile(r"Polling period \(mS\) = (\d+)")
+
+def load_attribute_settings(filename):
+    """
+    Read the polling period and absolute change of the attributes from the
+    devices.json file.
+
+    Returns:
+        A dictionary {device name: {attribute name: (polling period, abs change)}}.\
+        The polling period is None for the attributes that are not polled.
+    """
+    with open(filename, 'r') as json_file:
+        json_devices = json.load(json_file)
+    settings = {}
+    for device in json_devices:
+        attributes = settings.setdefault(device["devName"], {})
+        for attribute_property in device["attributeProperties"]:
+            # forwarded attributes are configured on the root attribute
+            if attribute_property["attrPropName"] == "__root_att":
+                continue
+            if attribute_property["pollingPeriod"] == "":
+                # the change events are pushed by the device
+                attributes[attribute_property["attributeName"]] = (None, "")
+                continue
+            attributes[attribute_property["attributeName"]] = (
+                int(attribute_property["pollingPeriod"]),
+                str(attribute_property["changeEventAbs"]))
+    return settings
+
+def polled_attributes(proxy):
+    """
+    Returns:
+        A dictionary {attribute name (lower case): polling period} read with\
+        a single call.
+    """
+    polled = {}
+    for status in proxy.polling_status():
+        name = POLLED_ATTR_RE.search(status)
+        period = POLLING_PERIOD_RE.search(status)
+        if name and period:
+            polled[name.group(1).lower()] = int(period.group(1))
+    return polled
+
+def configure_device(device_name, attributes):
+    """
+    Configure polling and change events of the attributes of one device.
+
+    Returns:
+        The number of polling updates and of modified attribute configurations.
+    """
+    proxy = DeviceProxy(device_name)
+    polled = polled_attributes(proxy)
+    num_of_polled = 0
+    for attr_name, (period, _) in attributes.items():
+        if period is None:
+            if attr_name.lower() in polled:
+                proxy.stop_poll_attribute(attr_name)
+                num_of_polled += 1
+        elif polled.get(attr_name.lower()) != period:
+            proxy.poll_attribute(attr_name, period)
+            num_of_polled += 1
+    # the attribute names returned by the device can differ in case
+    abs_changes = {attr_name.lower(): abs_change
+                   for attr_name, (_, abs_change) in attributes.items() if abs_change != ""}
+    with_abs_change = [attr_name for attr_name in attributes
+                       if attr_name.lower() in abs_changes]
+    modified = []
+    if with_abs_change:
+        for config in proxy.get_attribute_config_ex(with_abs_change):
+            abs_change = abs_changes[config.name.lower()]
+            if config.events.ch_event.abs_change != abs_change:
+                config.events.ch_event.abs_change = abs_change
+                modified.append(config)
+        if modified:
+            proxy.set_attribute_config(modified)
+    return num_of_polled, len(modified)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Configure the attributes polling and events")
+    # Update file path to devices.json in order to test locally
+    parser.add_argument("-f", "--file", default="./csplmc/devices.json",
+                        help="the devices.json file")
+    parser.add_argument("-j", "--jobs", type=int, default=8,
+                        help="number of devices configured concurrently")
+    args = parser.parse_args(args)
+
+    settings = load_attribute_settings(args.file)
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        futures = {device_name: executor.submit(configure_device, device_name, attributes)
+                   for device_name, attributes in settings.items() if attributes}
+        for device_name, future in futures.items():
+            num_of_polled, num_of_configured = future.result()
+            print("{}: {} polling updates, {} attribute configurations".format(
+                device_name, num_of_polled, num_of_configured))
+    print("{} devices configured in {:.2f} sec".format(len(futures), time.time() - start))
+
+if __name__ == '__main__':
+    main()
@@ -1,66 +1,239 @@
-# This script is used only by the start_prototype script.
-# Docker containers rely on dsconfig device to configure the TANGO DB
-#!/usr/bin/env python
-import json
-import tango
-from tango import Database, DbDevInfo
-from time import sleep
-
-
-timeSleep = 30
-for x in range(10):
-    try:
-        # Connecting to the databaseds
-        db = Database()
-    except tango.DevFailed as df:
-        # Could not connect to the databaseds. Retry after: str(timeSleep) seconds.
-        print("Connection to Database failure: {}".format(str(df.args[0].desc)))
-        sleep(timeSleep)
-
-# Connected to the databaseds
-
-# Update file path to devices.json in order to test locally
-# To test on docker environment use path : /app/csplmc/devices.json
-
-with open('./csplmc/devices.json', 'r') as file:
-    jsonDevices = file.read().replace('\n', '')
-
-# Loading devices.json file and creating an object
-json_devices = json.loads(jsonDevices)
-
-for device in json_devices:
-    dev_info = DbDevInfo()
-    dev_info._class = device["class"]
-    dev_info.server = device["serverName"]
-    dev_info.name = device["devName"]
-
-    # Adding device
-    db.add_device(dev_info)
-
-    # Adding device properties
-    for classProperty in device["classProperties"]:
-        # Adding class property: classProperty["classPropValue"]
-        # with value: classProperty["classPropValue"]
-        if (classProperty["classPropName"]) != "" and (classProperty["classPropValue"] != ""): 
-            db.put_class_property(dev_info._class,
-                                  {classProperty["classPropName"]:classProperty["classPropValue"]})
-
-    # Adding device properties
-    for deviceProperty in device["deviceProperties"]:
-        # Adding device property: deviceProperty["devPropValue"]
-        # with value: deviceProperty["devPropValue"]
-        if (deviceProperty["devPropName"]) != "" and (deviceProperty["devPropValue"] != ""):
-            db.put_device_property(dev_info.name,
-                                   {deviceProperty["devPropName"]:
-                                        deviceProperty["devPropValue"]})
-
-    # Adding attribute properties
-    for attributeProperty in device["attributeProperties"]:
-        # Adding attribute property: attributeProperty["attrPropName"]
-        # for attribute: attributeProperty["attributeName"]
-        # with value: " + attributeProperty["attrPropValue"]
-        if(attributeProperty["attrPropName"]) != "" and (attributeProperty["attrPropValue"] != ""):
-            db.put_device_attribute_property(dev_info.name, 
-                                             {attributeProperty["attributeName"]:
-                                                 {attributeProperty["attrPropName"]:
-                                                     attributeProperty["attrPropValue"]}})
+# This script is used only by the start_prototype script.
+# Docker containers rely on dsconfig device to configure the TANGO DB
+#!/usr/bin/env python
+"""
+Provision the TANGO DB with the CSP.LMC devices and their class, device and
+attribute properties.
+
+The configuration is read from the devices.json file or from a dsconfig
+JSON file (see csplmc/data). The current DB content is fetched in bulk (one
+call per device and per class), compared with the configuration and only
+the differences are written, with one call per device for each kind of
+property. Devices are processed in parallel. A second run with the same
+configuration does not write anything.
+
+Usage::
+
+    python csplmc/configureDevices.py [--file csplmc/devices.json] [--dry-run]
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import tango
+from tango import Database, DbDevInfo
+
+def as_db_value(value):
+    """
+    Returns:
+        The property value as stored in the TANGO DB: a list of strings.
+    """
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value]
+    return [str(value)]
+
+def load_devices_json(config):
+    """
+    Convert the content of the devices.json file into the list of device
+    configurations and the dictionary of the class properties.
+    """
+    devices = []
+    class_properties = {}
+    for device in config:
+        for class_property in device.get("classProperties", []):
+            # skip the empty entries
+            if class_property["classPropName"] != "" and class_property["classPropValue"] != "":
+                class_properties.setdefault(device["class"], {})[
+                    class_property["classPropName"]] = as_db_value(class_property["classPropValue"])
+        properties = {}
+        for device_property in device.get("deviceProperties", []):
+            if device_property["devPropName"] != "" and device_property["devPropValue"] != "":
+                properties[device_property["devPropName"]] = as_db_value(
+                    device_property["devPropValue"])
+        attribute_properties = {}
+        for attribute_property in device.get("attributeProperties", []):
+            if (attribute_property["attrPropName"] != "" and
+                    attribute_property["attrPropValue"] != ""):
+                attribute_properties.setdefault(attribute_property["attributeName"], {})[
+                    attribute_property["attrPropName"]] = as_db_value(
+                        attribute_property["attrPropValue"])
+        devices.append({"name": device["devName"],
+                        "class": device["class"],
+                        "server": device["serverName"],
+                        "properties": properties,
+                        "attribute_properties": attribute_properties})
+    return devices, class_properties
+
+def load_dsconfig(config):
+    """
+    Convert the content of a dsconfig file into the list of device
+    configurations and the dictionary of the class properties.
+    """
+    devices = []
+    for server_name, instances in config.get("servers", {}).items():
+        for instance, classes in instances.items():
+            for class_name, class_devices in classes.items():
+                for device_name, device in class_devices.items():
+                    devices.append({
+                        "name": device_name,
+                        "class": class_name,
+                        "server": "{}/{}".format(server_name, instance),
+                        "properties": {name: as_db_value(value) for name, value in
+                                       device.get("properties", {}).items()},
+                        "attribute_properties": {
+                            attr_name: {name: as_db_value(value)
+                                        for name, value in properties.items()}
+                            for attr_name, properties in
+                            device.get("attribute_properties", {}).items()}})
+    class_properties = {class_name: {name: as_db_value(value) for name, value in
+                                     item.get("properties", {}).items()}
+                        for class_name, item in config.get("classes", {}).items()}
+    return devices, class_properties
+
+def load_configuration(filename):
+    """
+    Read the configuration file (devices.json or dsconfig format).
+    """
+    with open(filename, 'r') as json_file:
+        config = json.load(json_file)
+    if isinstance(config, dict):
+        return load_dsconfig(config)
+    return load_devices_json(config)
+
+def connect(retries=10, delay=1., max_delay=30.):
+    """
+    Connect to the TANGO DB, retrying with an increasing delay.
+
+    Raises:
+        tango.DevFailed: if the connection fails after all the retries.
+    """
+    for attempt in range(retries):
+        try:
+            return Database()
+        except tango.DevFailed as df:
+            if attempt == retries - 1:
+                raise
+            print("Connection to Database failure: {}. Retry in {} sec".format(
+                str(df.args[0].desc), delay))
+            time.sleep(delay)
+            delay = min(2 * delay, max_delay)
+
+class Provisioner(object):
+    """
+    Compute and apply the differences between the configuration and the DB.
+    Each worker thread uses its own Database connection.
+
+    Args:
+        dry_run: if True, the differences are only reported.
+    """
+    def __init__(self, dry_run=False):
+        self._dry_run = dry_run
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.changes = []
+
+    def _db(self):
+        if not hasattr(self._local, "db"):
+            self._local.db = connect()
+        return self._local.db
+
+    def _record(self, message):
+        with self._lock:
+            self.changes.append(message)
+
+    @staticmethod
+    def _diff(wanted, current):
+        """
+        Returns:
+            The properties of *wanted* whose values differ from *current*.
+        """
+        return {name: value for name, value in wanted.items()
+                if list(current.get(name, [])) != value}
+
+    def device(self, device):
+        """
+        Provision one device: registration, device and attribute properties.
+        """
+        db = self._db()
+        name = device["name"]
+        try:
+            info = db.get_device_info(name)
+            registered = (info.class_name == device["class"] and
+                          info.ds_full_name.lower() == device["server"].lower())
+        except tango.DevFailed:
+            registered = False
+        if not registered:
+            self._record("add device {} ({} {})".format(name, device["server"],
+                                                        device["class"]))
+            if not self._dry_run:
+                dev_info = DbDevInfo()
+                dev_info._class = device["class"]
+                dev_info.server = device["server"]
+                dev_info.name = name
+                db.add_device(dev_info)
+        # device properties: one read and (at most) one write
+        if device["properties"]:
+            current = db.get_device_property(name, list(device["properties"]))
+            changed = self._diff(device["properties"], current)
+            if changed:
+                self._record("{} properties: {}".format(name, sorted(changed)))
+                if not self._dry_run:
+                    db.put_device_property(name, changed)
+        # attribute properties: one read and (at most) one write
+        if device["attribute_properties"]:
+            current = db.get_device_attribute_property(name,
+                                                       list(device["attribute_properties"]))
+            changed = {}
+            for attr_name, properties in device["attribute_properties"].items():
+                attr_changed = self._diff(properties, current.get(attr_name, {}))
+                if attr_changed:
+                    changed[attr_name] = attr_changed
+            if changed:
+                self._record("{} attribute properties: {}".format(name, sorted(changed)))
+                if not self._dry_run:
+                    db.put_device_attribute_property(name, changed)
+
+    def device_class(self, class_name, properties):
+        """
+        Provision the properties of a class.
+        """
+        db = self._db()
+        current = db.get_class_property(class_name, list(properties))
+        changed = self._diff(properties, current)
+        if changed:
+            self._record("{} class properties: {}".format(class_name, sorted(changed)))
+            if not self._dry_run:
+                db.put_class_property(class_name, changed)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Provision the TANGO DB with the CSP.LMC devices")
+    # Update file path to devices.json in order to test locally
+    # To test on docker environment use path : /app/csplmc/devices.json
+    parser.add_argument("-f", "--file", default="./csplmc/devices.json",
+                        help="devices.json or dsconfig JSON file")
+    parser.add_argument("-n", "--dry-run", action="store_true",
+                        help="report the differences without writing to the DB")
+    parser.add_argument("-j", "--jobs", type=int, default=8,
+                        help="number of devices provisioned in parallel")
+    args = parser.parse_args(args)
+
+    devices, class_properties = load_configuration(args.file)
+    start = time.time()
+    provisioner = Provisioner(dry_run=args.dry_run)
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        futures = [executor.submit(provisioner.device_class, class_name, properties)
+                   for class_name, properties in class_properties.items() if properties]
+        futures += [executor.submit(provisioner.device, device) for device in devices]
+        for future in futures:
+            # re-raise the exceptions of the workers
+            future.result()
+    for change in sorted(provisioner.changes):
+        print(change)
+    print("{} devices checked, {} changes {} in {:.2f} sec".format(
+        len(devices), len(provisioner.changes),
+        "found" if args.dry_run else "applied", time.time() - start))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+"""
+Run the CSP.LMC devices in a configurable number of device server processes.
+
+The CspMaster, the CspSubarrays and the CspTelState devices are registered
+with the TANGO DB as devices of the *CspLmc* server: the first instance (p01)
+hosts the CspMaster and the CspTelState, the subarrays are distributed
+round-robin across all the instances. With one process all the devices run
+in the same device server. Optionally the CBF simulators (CbfTestMaster and
+CbfTestSubarray) are registered and run in the *CbfSim/sim* server.
+
+Each server imports only the modules of the device classes it hosts.
+
+Usage::
+
+    # register 16 subarrays in 4 processes, start the servers and wait
+    python csplmc/launcher.py deploy --subarrays 16 --processes 4 [--simulators]
+    # run one instance (registered by a previous deploy)
+    python csplmc/launcher.py run p01
+"""
+import argparse
+import importlib
+import os
+import signal
+import subprocess
+import sys
+import time
+
+try:
+    import csplmc
+except ImportError:
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                    os.pardir)))
+import tango
+from tango import DbDevInfo
+from tango.server import run
+from csplmc.configureDevices import connect
+
+SERVER_NAME = "CspLmc"
+SIM_SERVER_NAME = "CbfSim"
+SIM_INSTANCE = "sim"
+
+CSP_MASTER = "mid_csp/elt/master"
+CSP_SUBARRAY = "mid_csp/elt/subarray_{:02d}"
+CSP_TELSTATE = "mid_csp/elt/telstate"
+CBF_MASTER = "mid_csp_cbf/sub_elt/master"
+CBF_SUBARRAY = "mid_csp_cbf/sub_elt/subarray_{:02d}"
+
+# the modules of the device classes: each server imports only the classes it hosts
+DEVICE_MODULES = {"CspMaster": "CspMaster.CspMaster",
+                  "CspSubarray": "CspSubarray.CspSubarray",
+                  "CspTelState": "CspTelState.CspTelState",
+                  "CbfTestMaster": "CbfTestMaster.CbfTestMaster",
+                  "CbfTestSubarray": "CbfTestSubarray.CbfTestSubarray"}
+
+# the source tree directories of the device packages
+csplmc_path = os.path.dirname(os.path.abspath(__file__))
+DEVICE_PATHS = {"CspMaster": os.path.join(csplmc_path, "CspMaster"),
+                "CspSubarray": os.path.join(csplmc_path, "CspSubarray"),
+                "CspTelState": os.path.join(csplmc_path, "CspTelState"),
+                "CbfTestMaster": csplmc_path,
+                "CbfTestSubarray": csplmc_path}
+
+def instance_name(index):
+    """
+    Returns:
+        The name of the index-th (starting from 0) server instance.
+    """
+    return "p{:02d}".format(index + 1)
+
+def topology(num_of_subarrays, num_of_processes):
+    """
+    Distribute the CSP.LMC devices across the device server instances.
+
+    Args:
+        num_of_subarrays: the number of CspSubarray devices.
+        num_of_processes: the number of device server processes.
+    Returns:
+        A dictionary {instance: {class name: [device names]}}.
+    """
+    num_of_processes = max(1, min(num_of_processes, num_of_subarrays + 1))
+    servers = {instance_name(index): {} for index in range(num_of_processes)}
+    first = servers[instance_name(0)]
+    first["CspMaster"] = [CSP_MASTER]
+    first["CspTelState"] = [CSP_TELSTATE]
+    # the assignment starts from the second process: when the subarrays cannot be evenly
+    # distributed, the first process (hosting also the master) gets the fewest ones
+    offset = 1 if num_of_processes > 1 else 0
+    for sub_id in range(1, num_of_subarrays + 1):
+        instance = instance_name((sub_id - 1 + offset) % num_of_processes)
+        servers[instance].setdefault("CspSubarray", []).append(CSP_SUBARRAY.format(sub_id))
+    return servers
+
+def simulators(num_of_subarrays):
+    """
+    Returns:
+        The CBF simulators devices: {class name: [device names]}.
+    """
+    return {"CbfTestMaster": [CBF_MASTER],
+            "CbfTestSubarray": [CBF_SUBARRAY.format(sub_id)
+                                for sub_id in range(1, num_of_subarrays + 1)]}
+
+def register(servers, num_of_subarrays, with_simulators=False, db=None):
+    """
+    Register the devices with the TANGO DB, moving them to the server
+    instance specified by the topology. The device properties are preserved.
+
+    Args:
+        servers: the topology returned by topology().
+        num_of_subarrays: the number of CspSubarray devices.
+        with_simulators: register also the CBF simulators.
+        db: the Database object (a new connection is created if not specified).
+    """
+    db = db or connect()
+    devices = [("{}/{}".format(SERVER_NAME, instance), class_name, name)
+               for instance, classes in servers.items()
+               for class_name, names in classes.items() for name in names]
+    if with_simulators:
+        devices += [("{}/{}".format(SIM_SERVER_NAME, SIM_INSTANCE), class_name, name)
+                    for class_name, names in simulators(num_of_subarrays).items()
+                    for name in names]
+    for server, class_name, name in devices:
+        try:
+            info = db.get_device_info(name)
+            if (info.class_name == class_name and
+                    info.ds_full_name.lower() == server.lower()):
+                continue
+        except tango.DevFailed:
+            pass
+        dev_info = DbDevInfo()
+        dev_info._class = class_name
+        dev_info.server = server
+        dev_info.name = name
+        db.add_device(dev_info)
+    db.put_device_property(CSP_MASTER, {"CspSubarrays": [CSP_SUBARRAY.format(sub_id)
+                                                         for sub_id in
+                                                         range(1, num_of_subarrays + 1)]})
+    if with_simulators:
+        db.put_device_property(CSP_MASTER, {"CspMidCbf": [CBF_MASTER]})
+        for sub_id in range(1, num_of_subarrays + 1):
+            db.put_device_property(CBF_SUBARRAY.format(sub_id), {"SubID": [str(sub_id)],
+                                                                 "CbfMaster": [CBF_MASTER]})
+
+def device_class(class_name):
+    """
+    Import a device class. When the device packages are not installed, they
+    are imported from the source tree.
+    """
+    try:
+        module = importlib.import_module(DEVICE_MODULES[class_name])
+    except ImportError:
+        sys.path.insert(0, DEVICE_PATHS[class_name])
+        module = importlib.import_module(DEVICE_MODULES[class_name])
+    return getattr(module, class_name)
+
+def run_server(server_name, instance, args=None):
+    """
+    Run a device server instance with the device classes registered for it.
+    """
+    db = connect()
+    class_names = [name for name in db.get_server_class_list("{}/{}".format(server_name,
+                                                                           instance))
+                   if name in DEVICE_MODULES]
+    if not class_names:
+        raise ValueError("No CSP.LMC device registered for {}/{}".format(server_name, instance))
+    classes = [device_class(class_name) for class_name in class_names]
+    return run(classes, args=[server_name, instance] + list(args or []))
+
+def start_servers(instances, server_name=SERVER_NAME, log_dir=None):
+    """
+    Start the device server processes.
+
+    Returns:
+        A dictionary {instance: subprocess.Popen}.
+    """
+    processes = {}
+    for instance in instances:
+        if log_dir:
+            output = open(os.path.join(log_dir, "{}_{}.log".format(server_name, instance)), "w")
+        else:
+            output = subprocess.DEVNULL
+        processes[instance] = subprocess.Popen([sys.executable, os.path.abspath(__file__),
+                                                "run", instance, "--server", server_name],
+                                               stdout=output, stderr=subprocess.STDOUT)
+    return processes
+
+def stop_servers(processes, timeout=10.):
+    """
+    Terminate the device server processes.
+    """
+    for process in processes.values():
+        if process.poll() is None:
+            process.terminate()
+    for process in processes.values():
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def wait_for_devices(device_names, timeout=30.):
+    """
+    Wait for the devices to be exported and initialized.
+
+    Raises:
+        tango.DevFailed: if a device is not ready within *timeout* sec.
+    """
+    deadline = time.time() + timeout
+    for name in device_names:
+        while True:
+            try:
+                if tango.DeviceProxy(name).state() != tango.DevState.INIT:
+                    break
+            except tango.DevFailed:
+                pass
+            if time.time() > deadline:
+                tango.Except.throw_exception("Startup timeout",
+                                             "Device {} not ready within {} sec".format(
+                                                 name, timeout),
+                                             "wait_for_devices", tango.ErrSeverity.ERR)
+            time.sleep(0.1)
+
+def deploy(args):
+    servers = topology(args.subarrays, args.processes)
+    register(servers, args.subarrays, args.simulators)
+    for instance, classes in sorted(servers.items()):
+        print("{}/{}: {}".format(SERVER_NAME, instance,
+                                 ", ".join("{} x{}".format(name, len(devices))
+                                           for name, devices in sorted(classes.items()))))
+    if args.register_only:
+        return 0
+    processes = {}
+    try:
+        if args.simulators:
+            processes.update(start_servers([SIM_INSTANCE], SIM_SERVER_NAME, args.log_dir))
+            wait_for_devices([CBF_MASTER], args.timeout)
+        processes.update(start_servers(sorted(servers), SERVER_NAME, args.log_dir))
+        # the servers are stopped when the launcher receives SIGTERM
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        while all(process.poll() is None for process in processes.values()):
+            time.sleep(1)
+        print("A device server exited: stopping the others")
+        return 1
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        stop_servers(processes)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Run the CSP.LMC devices in one or more "
+                                                 "device server processes")
+    subparsers = parser.add_subparsers(dest="action")
+    deploy_parser = subparsers.add_parser("deploy", help="register the devices and start "
+                                                         "the servers")
+    deploy_parser.add_argument("-s", "--subarrays", type=int, default=16,
+                               help="number of CspSubarray devices")
+    deploy_parser.add_argument("-p", "--processes", type=int, default=1,
+                               help="number of device server processes")
+    deploy_parser.add_argument("--simulators", action="store_true",
+                               help="register and run also the CBF simulators")
+    deploy_parser.add_argument("--register-only", action="store_true",
+                               help="only register the devices with the TANGO DB")
+    deploy_parser.add_argument("--log-dir", help="directory of the servers output files")
+    deploy_parser.add_argument("--timeout", type=float, default=30.,
+                               help="max time (sec) to wait for the simulators startup")
+    run_parser = subparsers.add_parser("run", help="run a device server instance")
+    run_parser.add_argument("instance", help="the server instance, for example p01")
+    run_parser.add_argument("--server", default=SERVER_NAME, help="the server name")
+    run_parser.add_argument("server_args", nargs=argparse.REMAINDER,
+                            help="further arguments of the device server (e.g. -v4)")
+    args = parser.parse_args(args)
+
+    if args.action == "deploy":
+        return deploy(args)
+    if args.action == "run":
+        return run_server(args.server, args.instance, args.server_args)
+    parser.print_help()
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the CSP.LMC project
+#
+# Distributed under the terms of the BSD-3-Clause license.
+# See LICENSE.txt for more info.
+"""
+Install the csplmc package and the CSP.LMC device servers.
+
+The device packages keep their source tree layout (csplmc/<Device>/<Device>)
+and are installed as top-level packages, as done by the setup.py of each
+device. Each device server is started via its console script, for example::
+
+    pip install .
+    CspMaster csp
+    CspSubarray sub1
+"""
+import os
+from setuptools import setup
+
+setup_dir = os.path.dirname(os.path.abspath(__file__))
+
+INFO = {}
+release_filename = os.path.join(setup_dir, 'csplmc', 'release.py')
+exec(open(release_filename).read(), INFO)
+
+with open(os.path.join(setup_dir, 'README.md')) as file:
+    long_description = file.read()
+
+setup(
+        name=INFO['name'],
+        version=INFO['version'],
+        description=INFO['description'],
+        packages=[
+          'csplmc',
+          'csplmc.commons',
+          'csplmc.benchmarks',
+          'CspMaster',
+          'CspSubarray',
+          'CspTelState',
+          'CbfTestMaster',
+          'CbfTestSubarray',
+        ],
+        package_dir={
+          'CspMaster': 'csplmc/CspMaster/CspMaster',
+          'CspSubarray': 'csplmc/CspSubarray/CspSubarray',
+          'CspTelState': 'csplmc/CspTelState/CspTelState',
+          'CbfTestMaster': 'csplmc/CbfTestMaster',
+          'CbfTestSubarray': 'csplmc/CbfTestSubarray',
+        },
+        package_data={
+          'csplmc': ['devices.json', 'data/*.json'],
+          'csplmc.commons': ['*.json'],
+        },
+        entry_points={'console_scripts': [
+          'CspMaster = CspMaster.CspMaster:main',
+          'CspSubarray = CspSubarray.CspSubarray:main',
+          'CspTelState = CspTelState.CspTelState:main',
+          'CbfTestMaster = CbfTestMaster.CbfTestMaster:main',
+          'CbfTestSubarray = CbfTestSubarray.CbfTestSubarray:main',
+          'csplmc-configure-devices = csplmc.configureDevices:main',
+          'csplmc-configure-attributes = csplmc.configureAttrProperties:main',
+          'csplmc-launcher = csplmc.launcher:main',
+          'csplmc-benchmark = csplmc.benchmarks.csp_benchmark:main',
+          'csplmc-startup-benchmark = csplmc.benchmarks.startup_benchmark:main',
+          'csplmc-topology-benchmark = csplmc.benchmarks.topology_benchmark:main',
+          'csplmc-configuration-benchmark = csplmc.benchmarks.configuration_benchmark:main',
+        ]},
+        author=INFO['author'],
+        author_email=INFO['author_email'],
+        license=INFO['license'],
+        long_description=long_description,
+        long_description_content_type='text/markdown',
+        url=INFO['url'],
+        platforms="All Platforms",
+        python_requires='>=3.5',
+        install_requires=[
+            'pytango>=9.3.3',
+            'numpy',
+        ],
+        extras_require={
+            'dev':  ['pytest', 'pytest-cov', 'pylint'],
+            'encoded': ['msgpack', 'cbor2'],
+        },
+      )